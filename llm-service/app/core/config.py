@@ -19,6 +19,10 @@ class Settings(BaseSettings):
     mysql_password: str = Field(default="testpass", env="MYSQL_PASSWORD")
     mysql_database: str = Field(default="testdb", env="MYSQL_DATABASE")
     mysql_port: int = Field(default=3306, env="MYSQL_PORT")
+    mysql_pool_size: int = Field(default=5, env="MYSQL_POOL_SIZE")  # Số connections trong pool
+    mysql_max_overflow: int = Field(default=10, env="MYSQL_MAX_OVERFLOW")  # Số connections tạo thêm khi pool đầy
+    mysql_cache_ttl_seconds: float = Field(default=30.0, env="MYSQL_CACHE_TTL_SECONDS")  # Cache user/template (0 = tắt)
+    mysql_cache_max_entries: int = 5000
     
     # ChromaDB Configuration
     chroma_persist_directory: Path = Field(
@@ -29,6 +33,33 @@ class Settings(BaseSettings):
         default="ta_edu_knowledge",
         env="CHROMA_COLLECTION_NAME"
     )
+    # "dual": chunks lưu ở cả user_{id}_knowledge và global collection
+    # "single": chunks chỉ lưu một lần trong global collection, phân vùng theo user_id
+    vector_storage_mode: str = Field(default="dual", env="VECTOR_STORAGE_MODE")
+    
+    # Chia global collection thành N shards theo hash của shard key (1 = không chia)
+    vector_shard_count: int = Field(default=1, env="VECTOR_SHARD_COUNT")
+    vector_shard_key: str = Field(default="user_id", env="VECTOR_SHARD_KEY")  # "user_id" hoặc "document_id"
+    
+    # Vector Backend Configuration ("chroma" hoặc "hnsw")
+    vector_backend: str = Field(default="chroma", env="VECTOR_BACKEND")
+    hnsw_persist_directory: Path = Field(
+        default=BASE_DIR / "data" / "hnsw_db",
+        env="HNSW_PERSIST_DIRECTORY"
+    )
+    hnsw_vector_dtype: str = Field(default="float16", env="HNSW_VECTOR_DTYPE")  # "float16" hoặc "int8"
+    hnsw_persist_interval: float = Field(default=5.0, env="HNSW_PERSIST_INTERVAL")  # Giây giữa hai lần ghi index.bin (0 = sau mỗi thao tác ghi)
+    
+    # HNSW Index Configuration theo loại collection (chỉ áp dụng khi tạo collection mới)
+    # "user": user_{id}_knowledge, "global": global collection và các collection phụ
+    user_hnsw_space: str = Field(default="cosine", env="USER_HNSW_SPACE")  # "cosine", "l2" hoặc "ip"
+    user_hnsw_m: int = Field(default=16, env="USER_HNSW_M")
+    user_hnsw_construction_ef: int = Field(default=100, env="USER_HNSW_CONSTRUCTION_EF")
+    user_hnsw_search_ef: int = Field(default=50, env="USER_HNSW_SEARCH_EF")
+    global_hnsw_space: str = Field(default="cosine", env="GLOBAL_HNSW_SPACE")
+    global_hnsw_m: int = Field(default=32, env="GLOBAL_HNSW_M")
+    global_hnsw_construction_ef: int = Field(default=200, env="GLOBAL_HNSW_CONSTRUCTION_EF")
+    global_hnsw_search_ef: int = Field(default=100, env="GLOBAL_HNSW_SEARCH_EF")
     
     # Model Configuration
     model_path: Path = Field(
@@ -59,14 +90,151 @@ class Settings(BaseSettings):
     )
     
     # File processing limits
-    max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_extensions: List[str] = [".pdf", ".docx", ".pptx", ".txt"]
+    max_file_size: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10MB
+    # Thư mục file tạm của /extract-stream (local trên mỗi node, bị xóa sau khi xử lý)
+    upload_spool_directory: Path = Field(
+        default=BASE_DIR / "data" / "upload_spool",
+        env="UPLOAD_SPOOL_DIRECTORY"
+    )
+    allowed_extensions: List[str] = [".pdf", ".docx", ".pptx", ".txt", ".xlsx", ".csv"]
+    # "stream": đọc XML của DOCX/PPTX bằng lxml iterparse (thứ tự document, bộ nhớ cố định)
+    # "library": python-docx / python-pptx
+    office_extractor: str = Field(default="stream", env="OFFICE_EXTRACTOR")
+    # PDF: "pypdf" hoặc "pypdfium2" (nhanh hơn, cần cài thêm); các khoảng trang được extract song song
+    pdf_backend: str = Field(default="pypdf", env="PDF_BACKEND")
+    pdf_extraction_workers: int = Field(default=0, env="PDF_EXTRACTION_WORKERS")  # Số processes (0 = số CPU, 1 = tuần tự)
+    pdf_pages_per_task: int = Field(default=16, env="PDF_PAGES_PER_TASK")
+    pdf_parallel_min_pages: int = 32  # PDF ít trang hơn được extract tuần tự (tránh chi phí gửi task)
+    # Bảng tính (XLSX/CSV): đọc theo nhóm dòng, mỗi chunk tối đa N dòng (và không vượt giới hạn tokens)
+    spreadsheet_rows_per_chunk: int = Field(default=50, env="SPREADSHEET_ROWS_PER_CHUNK")
+    spreadsheet_embed_batch: int = 256  # Số chunks embed và ghi vào vector store mỗi lần
     
     # RAG Configuration
-    chunk_size: int = 512  # Kích thước mỗi chunk khi chia nhỏ document
-    chunk_overlap: int = 50  # Độ overlap giữa các chunks
-    top_k_results: int = 5  # Số lượng kết quả tìm kiếm tối đa
-    
+    chunk_size: int = Field(default=512, env="CHUNK_SIZE")  # Kích thước mỗi chunk khi chia nhỏ document
+    chunk_overlap: int = Field(default=50, env="CHUNK_OVERLAP")  # Độ overlap giữa các chunks
+    # "token": đếm bằng tokenizer của embedding model, không vượt max_seq_length
+    # "sentence": SentenceSplitter của LlamaIndex (tokenizer mặc định, chunk_size)
+    chunker: str = Field(default="token", env="CHUNKER")
+    chunk_max_tokens: int = Field(default=0, env="CHUNK_MAX_TOKENS")  # 0 = max_seq_length của model
+    top_k_results: int = Field(default=5, env="TOP_K_RESULTS")  # Số lượng kết quả tìm kiếm tối đa
+
+    # Template Routing Configuration
+    template_router_max_users: int = Field(default=200, env="TEMPLATE_ROUTER_MAX_USERS")  # Số user giữ index trong RAM (LRU)
+    template_router_top_k: int = 3  # Số template gợi ý mặc định
+    template_router_refresh_seconds: float = Field(default=60.0, env="TEMPLATE_ROUTER_REFRESH_SECONDS")  # Chu kỳ đối chiếu index với MySQL
+
+    # Fill Cache Configuration (cache kết quả /fill cho câu hỏi gần trùng)
+    fill_cache_enabled: bool = Field(default=True, env="FILL_CACHE_ENABLED")
+    fill_cache_similarity_threshold: float = Field(default=0.95, env="FILL_CACHE_SIMILARITY_THRESHOLD")
+    fill_cache_ttl_seconds: int = Field(default=3600, env="FILL_CACHE_TTL_SECONDS")
+    fill_cache_max_keys: int = 1000  # Số cặp (user_id, template_id) tối đa
+    fill_cache_entries_per_key: int = 20  # Số câu hỏi lưu cho mỗi cặp
+
+    # Search Batching Configuration (gộp các query đến cùng lúc vào một lần embed)
+    search_batching_enabled: bool = Field(default=True, env="SEARCH_BATCHING_ENABLED")
+    search_batch_max_size: int = Field(default=32, env="SEARCH_BATCH_MAX_SIZE")  # Số queries tối đa mỗi lần embed
+    search_batch_max_wait_ms: float = Field(default=5.0, env="SEARCH_BATCH_MAX_WAIT_MS")  # Thời gian chờ gom batch
+    search_batch_max_queries: int = Field(default=50, env="SEARCH_BATCH_MAX_QUERIES")  # Giới hạn của /search-batch
+
+    # Single-flight Configuration (gộp các request search/LLM giống nhau đang chạy đồng thời)
+    single_flight_enabled: bool = Field(default=True, env="SINGLE_FLIGHT_ENABLED")
+    single_flight_search_timeout_seconds: float = Field(default=30.0, env="SINGLE_FLIGHT_SEARCH_TIMEOUT_SECONDS")
+    single_flight_llm_timeout_seconds: float = Field(default=120.0, env="SINGLE_FLIGHT_LLM_TIMEOUT_SECONDS")  # Không tính thời gian chờ LLM lock
+    llm_lock_timeout_seconds: float = Field(default=60.0, env="LLM_LOCK_TIMEOUT_SECONDS")  # Request HTTP chờ LLM lock tối đa rồi bỏ job
+
+    # Fact Extraction Configuration (trích xuất facts lúc ingest)
+    fact_extraction_enabled: bool = Field(default=True, env="FACT_EXTRACTION_ENABLED")
+    fact_llm_fallback: bool = Field(default=False, env="FACT_LLM_FALLBACK")  # Dùng LLM cho biến regex không tìm được
+    fact_store_path: Path = Field(
+        default=BASE_DIR / "data" / "facts.sqlite3",
+        env="FACT_STORE_PATH"
+    )
+    fact_min_confidence: float = 0.6  # Ngưỡng confidence để /fill xét fact thay cho RAG
+    fact_direct_confidence: float = 0.8  # Câu hỏi không nhắc tới document (user chỉ có một document) cần confidence này
+    fact_llm_confidence: float = 0.6  # Confidence của facts do LLM trích xuất (chưa kiểm chứng)
+    fact_llm_max_context_chars: int = 3000  # Độ dài context tối đa gửi cho LLM mỗi batch
+
+    # Chunk Dedup Configuration (bỏ chunks gần trùng trong corpus của user lúc ingest, MinHash/LSH)
+    dedup_enabled: bool = Field(default=True, env="DEDUP_ENABLED")
+    dedup_similarity_threshold: float = Field(default=0.85, env="DEDUP_SIMILARITY_THRESHOLD")  # Jaccard ước lượng
+    dedup_num_perm: int = 128  # Số hàm hash của MinHash signature
+    dedup_bands: int = 16  # 16 bands x 8 rows: cặp có Jaccard >= 0.85 thành ứng viên với xác suất ~99%
+    dedup_shingle_size: int = 5  # Số từ mỗi shingle
+    dedup_store_path: Path = Field(
+        default=BASE_DIR / "data" / "dedup.sqlite3",
+        env="DEDUP_STORE_PATH"
+    )
+
+    # Content Store Configuration (dùng lại text/chunks/vectors của file trùng bytes giữa các users)
+    content_store_enabled: bool = Field(default=True, env="CONTENT_STORE_ENABLED")
+    content_store_directory: Path = Field(
+        default=BASE_DIR / "data" / "content_store",
+        env="CONTENT_STORE_DIRECTORY"
+    )
+
+    # Document Summary Configuration (tóm tắt phân cấp lúc ingest, chạy nền)
+    document_summaries_enabled: bool = Field(default=False, env="DOCUMENT_SUMMARIES_ENABLED")
+    summary_section_chars: int = 2500  # Số ký tự tối đa của một section khi tóm tắt
+    summary_max_tokens: int = 256  # Độ dài tối đa của mỗi bản tóm tắt
+    summary_job_delay_seconds: float = 1.0  # Nghỉ giữa các lần gọi LLM để nhường request khác
+
+    # Hierarchical Retrieval (chọn documents trước, rồi search chunks trong các documents đó)
+    hierarchical_retrieval_enabled: bool = Field(default=False, env="HIERARCHICAL_RETRIEVAL_ENABLED")
+    hierarchical_top_documents: int = Field(default=5, env="HIERARCHICAL_TOP_DOCUMENTS")
+
+    # Index Maintenance Configuration (rebuild collections bị xóa nhiều, snapshot, chạy giờ thấp điểm)
+    maintenance_enabled: bool = Field(default=False, env="MAINTENANCE_ENABLED")
+    maintenance_offpeak_start_hour: int = Field(default=1, env="MAINTENANCE_OFFPEAK_START_HOUR")  # Giờ bắt đầu (0-23)
+    maintenance_offpeak_end_hour: int = Field(default=5, env="MAINTENANCE_OFFPEAK_END_HOUR")  # Giờ kết thúc (không tính)
+    maintenance_check_interval_seconds: int = 600  # Chu kỳ kiểm tra của scheduler
+    maintenance_deleted_ratio_threshold: float = Field(default=0.2, env="MAINTENANCE_DELETED_RATIO_THRESHOLD")
+    maintenance_min_deleted: int = 100  # Bỏ qua collection có quá ít vectors đã xóa
+    maintenance_snapshot_directory: Path = Field(
+        default=BASE_DIR / "data" / "snapshots",
+        env="MAINTENANCE_SNAPSHOT_DIRECTORY"
+    )
+    maintenance_snapshot_keep: int = Field(default=3, env="MAINTENANCE_SNAPSHOT_KEEP")
+    maintenance_state_path: Path = Field(
+        default=BASE_DIR / "data" / "maintenance_state.json",
+        env="MAINTENANCE_STATE_PATH"
+    )
+
+    # Async Data Access Configuration (chạy MySQL/vector store trong thread pool riêng, không chặn event loop)
+    mysql_executor_workers: int = Field(default=0, env="MYSQL_EXECUTOR_WORKERS")  # 0 = pool_size + max_overflow
+    vector_executor_workers: int = Field(default=8, env="VECTOR_EXECUTOR_WORKERS")
+    ingest_executor_workers: int = Field(default=2, env="INGEST_EXECUTOR_WORKERS")  # Embed + ghi chunks của documents đang ingest
+    data_access_timing_window: int = 500  # Số lần gọi gần nhất dùng để tính p95 mỗi operation
+
+    # Instance lock: giữ bởi process sở hữu thư mục data (ChromaDB/HNSW files, scheduler
+    # bảo trì): service ở chế độ local, model server ở chế độ client, hoặc tool offline
+    instance_lock_path: Path = Field(
+        default=BASE_DIR / "data" / "llm-service.lock",
+        env="INSTANCE_LOCK_PATH"
+    )
+
+    # Shared State: version knowledge/templates và generation của job nền, dùng chung
+    # giữa các processes cùng thư mục data (uvicorn workers, model server, tools)
+    shared_state_path: Path = Field(
+        default=BASE_DIR / "data" / "shared_state.sqlite3",
+        env="SHARED_STATE_PATH"
+    )
+
+    # Model Server Configuration (process riêng giữ LLM + embedding model, dùng chung cho service và tools)
+    # "local": mỗi process tự load models; "client": gọi model server qua Unix socket
+    model_server_mode: str = Field(default="local", env="MODEL_SERVER_MODE")
+    model_server_socket: Path = Field(
+        default=BASE_DIR / "data" / "model_server.sock",
+        env="MODEL_SERVER_SOCKET"
+    )
+    model_server_authkey: str = Field(default="", env="MODEL_SERVER_AUTHKEY")  # Rỗng = key ngẫu nhiên trong MODEL_SERVER_AUTHKEY_PATH
+    model_server_authkey_path: Path = Field(
+        default=BASE_DIR / "data" / "model_server.key",
+        env="MODEL_SERVER_AUTHKEY_PATH"
+    )
+    model_server_startup_timeout: float = Field(default=300.0, env="MODEL_SERVER_STARTUP_TIMEOUT")  # Chờ server load models
+    model_server_pool_size: int = 8  # Số connections rảnh giữ lại mỗi process
+    model_server_embed_batch: int = 256  # Số texts mỗi lần gọi embed qua socket
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
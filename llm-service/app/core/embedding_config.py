@@ -19,6 +19,7 @@ class EmbeddingManager:
     def __init__(self):
         self.embed_model: Optional[HuggingFaceEmbedding] = None
         self.raw_model: Optional[SentenceTransformer] = None
+        self.tokenizer = None
         self.device: str = "cpu"
         
     def initialize(self) -> None:
@@ -27,6 +28,10 @@ class EmbeddingManager:
         Model được optimize cho tiếng Việt
         """
         try:
+            if settings.model_server_mode == "client":
+                self._initialize_remote()
+                return
+            
             logger.info(f"Đang khởi tạo Embedding Model: {settings.embedding_model}")
             
             # Xác định device (CPU/GPU)
@@ -68,6 +73,24 @@ class EmbeddingManager:
             logger.error(f"❌ Lỗi khi khởi tạo Embedding Model: {str(e)}")
             raise
     
+    def _initialize_remote(self) -> None:
+        """Dùng embedding model của model server (không load trọng số trong process này)"""
+        from core.model_client import RemoteEmbedding, model_server_client
+        
+        logger.info(f"Đang kết nối model server: {settings.model_server_socket}")
+        info = model_server_client.wait_until_ready()
+        if not info.get("embeddings"):
+            raise RuntimeError("Model server chưa load Embedding Model")
+        
+        self.device = f"model_server:{info.get('device', 'unknown')}"
+        self.embed_model = RemoteEmbedding(
+            client=model_server_client,
+            model_name=settings.embedding_model,
+            embed_batch_size=settings.model_server_embed_batch
+        )
+        logger.info("✅ Embedding Model (model server) sẵn sàng!")
+        self._test_model()
+    
     def _test_model(self) -> None:
         """Test model với text tiếng Việt"""
         try:
@@ -189,6 +212,30 @@ class EmbeddingManager:
         except:
             return -1
     
+    def get_tokenizer(self):
+        """
+        Tokenizer của embedding model (dùng để đếm tokens khi chia chunks)
+        
+        Nếu model chưa được load (vd. trong worker process của tool backfill)
+        thì chỉ load tokenizer, không load trọng số model.
+        """
+        if self.raw_model is not None:
+            return self.raw_model.tokenizer
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                settings.embedding_model,
+                cache_dir=str(settings.model_cache_dir)
+            )
+        return self.tokenizer
+    
+    def get_max_seq_length(self) -> int:
+        """Số tokens tối đa model nhận (phần vượt quá bị cắt khi embed)"""
+        if self.raw_model is not None:
+            return self.raw_model.max_seq_length
+        model_max = getattr(self.get_tokenizer(), "model_max_length", 512)
+        return min(model_max, 512)
+    
     def _get_max_length(self) -> int:
         """Lấy max length cho input text"""
         try:
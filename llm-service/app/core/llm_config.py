@@ -1,14 +1,24 @@
+import asyncio
 import logging
+import threading
+import time
 from typing import Optional, Any
 from pathlib import Path
 from llama_cpp import Llama
 from llama_index.llms.llama_cpp import LlamaCPP
-from llama_index.core.llms import ChatMessage
+from llama_index.core.llms import ChatMessage, CompletionResponse
 
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Chu kỳ kiểm tra request đã bị hủy trong lúc chờ LLM lock
+LOCK_POLL_SECONDS = 0.5
+
+
+class LLMBusyError(RuntimeError):
+    """LLM không nhận job: chờ lock quá hạn hoặc request đã bị hủy trước khi generate"""
+
 
 class LLMManager:
     """
@@ -19,6 +29,9 @@ class LLMManager:
     def __init__(self):
         self.llm: Optional[LlamaCPP] = None
         self.raw_model: Optional[Llama] = None
+        # llama.cpp không an toàn khi gọi đồng thời từ nhiều threads:
+        # mọi lời gọi LLM (request, summary executor, fact extraction) đi qua lock này
+        self.lock = threading.Lock()
         
     def initialize(self) -> None:
         """
@@ -26,6 +39,10 @@ class LLMManager:
         Model: Arcee-VyLinh (Vietnamese optimized)
         """
         try:
+            if settings.model_server_mode == "client":
+                self._initialize_remote()
+                return
+            
             model_path = Path(settings.model_path)
             
             # Kiểm tra file model tồn tại
@@ -80,6 +97,23 @@ class LLMManager:
             logger.error(f"❌ Lỗi khi khởi tạo LLM: {str(e)}")
             raise
     
+    def _initialize_remote(self) -> None:
+        """Dùng LLM của model server (không load GGUF trong process này)"""
+        from core.model_client import RemoteLLM, model_server_client
+        
+        logger.info(f"Đang kết nối model server: {settings.model_server_socket}")
+        info = model_server_client.wait_until_ready()
+        if not info.get("llm"):
+            raise RuntimeError("Model server chưa load LLM")
+        
+        self.llm = RemoteLLM(
+            client=model_server_client,
+            context_window=settings.llm_context_size,
+            num_output=settings.llm_max_tokens,
+            model_name=str(settings.model_path.name)
+        )
+        logger.info("✅ LLM (model server) sẵn sàng!")
+    
     def _test_model(self) -> None:
         """Test model với câu hỏi đơn giản"""
         try:
@@ -112,10 +146,82 @@ class LLMManager:
         generation_kwargs.update(kwargs)
         
         # Generate response
-        response = self.llm.complete(prompt, **generation_kwargs)
+        response = self.complete(prompt, **generation_kwargs)
         
         return response.text
     
+    def _acquire(self, timeout: Optional[float], cancel_event: Optional[threading.Event]) -> None:
+        """Chờ LLM lock tối đa ``timeout`` giây, bỏ job ngay khi request bị hủy"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise LLMBusyError("Request đã bị hủy khi đang chờ LLM")
+            wait = LOCK_POLL_SECONDS if deadline is None else min(LOCK_POLL_SECONDS, deadline - time.monotonic())
+            if wait <= 0:
+                raise LLMBusyError(f"LLM đang bận quá {timeout:g}s")
+            if self.lock.acquire(timeout=wait):
+                if cancel_event is not None and cancel_event.is_set():
+                    self.lock.release()
+                    raise LLMBusyError("Request đã bị hủy khi đang chờ LLM")
+                return
+    
+    def complete(
+        self,
+        prompt: str,
+        lock_timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **kwargs
+    ) -> CompletionResponse:
+        """
+        Gọi ``llm.complete`` (tuần tự qua ``self.lock``)
+        
+        Args:
+            prompt: Input prompt
+            lock_timeout: Thời gian chờ lock tối đa (None = chờ đến khi có lock)
+            cancel_event: Được set khi request không còn chờ kết quả (bỏ job nếu chưa generate)
+            **kwargs: Tham số generation (temperature, max_tokens, ...)
+            
+        Returns:
+            CompletionResponse của LlamaIndex
+            
+        Raises:
+            LLMBusyError: Nếu chờ lock quá hạn hoặc request đã bị hủy
+        """
+        if not self.llm:
+            raise RuntimeError("LLM chưa được khởi tạo!")
+        
+        self._acquire(lock_timeout, cancel_event)
+        try:
+            return self.llm.complete(prompt, **kwargs)
+        finally:
+            self.lock.release()
+    
+    async def acomplete(self, prompt: str, lock_timeout: Optional[float] = None, **kwargs) -> CompletionResponse:
+        """
+        Gọi ``complete`` trong thread cho request HTTP
+        
+        Thread đang chờ lock của request bị hủy (timeout, client ngắt kết nối)
+        bỏ job thay vì generate cho kết quả không ai nhận, nên timeout giải
+        phóng được LLM cho các request khác.
+        
+        Args:
+            prompt: Input prompt
+            lock_timeout: Thời gian chờ lock tối đa (mặc định ``llm_lock_timeout_seconds``)
+            **kwargs: Tham số generation
+            
+        Returns:
+            CompletionResponse của LlamaIndex
+        """
+        lock_timeout = settings.llm_lock_timeout_seconds if lock_timeout is None else lock_timeout
+        cancel_event = threading.Event()
+        try:
+            return await asyncio.to_thread(
+                self.complete, prompt, lock_timeout=lock_timeout, cancel_event=cancel_event, **kwargs
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+    
     def chat(self, messages: list[dict], **kwargs) -> str:
         """
         Chat completion với history
@@ -138,7 +244,8 @@ class LLMManager:
             chat_messages.append(ChatMessage(role=role, content=content))
         
         # Generate response
-        response = self.llm.chat(chat_messages, **kwargs)
+        with self.lock:
+            response = self.llm.chat(chat_messages, **kwargs)
         
         return response.message.content
     
@@ -154,6 +261,7 @@ class LLMManager:
             "temperature": settings.llm_temperature,
             "max_tokens": settings.llm_max_tokens,
             "n_gpu_layers": settings.llm_n_gpu_layers,
+            "mode": settings.model_server_mode,
         }
     
     def create_prompt_template(self, instruction: str, context: str = "", question: str = "") -> str:
@@ -0,0 +1,272 @@
+"""
+Client của model server (xem ``model_server.py``)
+
+Khi ``MODEL_SERVER_MODE=client``, process (service hoặc tool) không load GGUF và
+embedding model mà gửi request embedding/generation đến model server qua Unix
+socket (``multiprocessing.connection``: message có độ dài + pickle, xác thực
+HMAC bằng ``model_server_authkey()``). ``RemoteEmbedding`` và ``RemoteLLM``
+có cùng interface LlamaIndex với ``HuggingFaceEmbedding``/``LlamaCPP`` nên code
+gọi ``embedding_manager``/``llm_manager`` không cần thay đổi.
+
+Các methods đánh dấu ``@owner_call`` (vector store, index maintenance) được
+chạy trong model server, process duy nhất sở hữu thư mục data ở chế độ client.
+"""
+import functools
+import logging
+import os
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection
+from typing import Any, Callable, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    CompletionResponseGen,
+    CustomLLM,
+    LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelServerError(RuntimeError):
+    """Lỗi từ model server hoặc mất kết nối đến model server"""
+
+
+def model_server_authkey() -> bytes:
+    """
+    Authkey cho HMAC challenge của socket
+
+    Mặc định (``MODEL_SERVER_AUTHKEY`` rỗng) dùng key ngẫu nhiên của thư mục data,
+    được tạo ở lần dùng đầu tiên trong ``MODEL_SERVER_AUTHKEY_PATH`` (quyền 0600)
+    và đọc lại bởi server lẫn các clients, nên socket luôn được xác thực.
+    """
+    if settings.model_server_authkey:
+        return settings.model_server_authkey.encode("utf-8")
+
+    path = str(settings.model_server_authkey_path)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Ghi file tạm rồi link: process khác không đọc được key ghi dở,
+        # và chỉ một key thắng khi nhiều process cùng tạo
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    with open(path, encoding="utf-8") as f:
+        key = f.read().strip()
+    if not key:
+        raise ModelServerError(f"Authkey của model server rỗng: {path}")
+    return key.encode("utf-8")
+
+
+def owner_call(target: str) -> Callable:
+    """
+    Decorator cho method của service sở hữu thư mục data
+
+    Khi instance có ``remote = True`` (uvicorn worker ở chế độ client), method
+    được gửi đến model server và chạy trên instance ``target`` của server; tham
+    số và kết quả phải pickle được. Server chỉ nhận các methods có decorator này.
+
+    Args:
+        target: Tên instance phía server ("vector_store", "index_maintenance")
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.remote:
+                return model_server_client.call("owner", target, method.__name__, *args, **kwargs)
+            return method(self, *args, **kwargs)
+        wrapper.owner_call = True
+        return wrapper
+    return decorator
+
+
+class ModelServerClient:
+    """
+    Gọi model server, giữ một pool connections dùng lại giữa các threads
+
+    Mỗi connection chỉ phục vụ một request tại một thời điểm; các request đồng
+    thời (asyncio.to_thread, thread pools) mượn connections khác nhau.
+    """
+
+    def __init__(self):
+        self._idle: List[Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Connection:
+        return Client(str(settings.model_server_socket), family="AF_UNIX", authkey=model_server_authkey())
+
+    def _acquire(self) -> Connection:
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                # Connection rảnh có dữ liệu để đọc nghĩa là server đã đóng nó (restart)
+                try:
+                    if not conn.poll():
+                        return conn
+                except (EOFError, OSError):
+                    pass
+                conn.close()
+        return self._connect()
+
+    def _release(self, conn: Connection) -> None:
+        with self._lock:
+            if len(self._idle) < settings.model_server_pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def call(self, op: str, *args, **kwargs) -> Any:
+        """
+        Gửi một request đến model server
+
+        Args:
+            op: Tên operation ("ping", "embed_texts", "embed_query", "complete", "chat", "owner")
+            *args, **kwargs: Tham số của operation
+
+        Returns:
+            Kết quả của operation
+
+        Raises:
+            ModelServerError: Nếu server trả lỗi hoặc không kết nối được
+            Exception: Lỗi builtin (RuntimeError, ValueError, ...) của thao tác "owner"
+        """
+        # Chỉ thử lại khi request chưa đến server (gửi lỗi trên connection cũ đã đóng).
+        # Lỗi khi chờ response không thử lại: server có thể đã chạy request (complete/chat)
+        for attempt in range(2):
+            try:
+                conn = self._acquire()
+            except (OSError, AuthenticationError) as e:
+                raise ModelServerError(f"Không kết nối được model server {settings.model_server_socket}: {str(e)}")
+            try:
+                conn.send((op, args, kwargs))
+            except OSError as e:
+                conn.close()
+                if attempt:
+                    raise ModelServerError(f"Không gửi được request đến model server: {str(e)}")
+                continue
+            try:
+                status, payload = conn.recv()
+            except (EOFError, OSError) as e:
+                conn.close()
+                raise ModelServerError(f"Mất kết nối đến model server khi chờ {op}: {str(e)}")
+            self._release(conn)
+            if status == "raise":
+                raise payload
+            if status == "error":
+                raise ModelServerError(payload)
+            return payload
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> dict:
+        """
+        Chờ model server load xong models (server chỉ mở socket sau khi load)
+
+        Returns:
+            Thông tin của server (kết quả "ping")
+        """
+        timeout = settings.model_server_startup_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.call("ping")
+            except ModelServerError as e:
+                if time.monotonic() >= deadline:
+                    raise ModelServerError(f"Model server chưa sẵn sàng sau {timeout:.0f}s: {str(e)}")
+            time.sleep(1.0)
+
+    def close(self) -> None:
+        """Đóng các connections rảnh"""
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+
+class RemoteEmbedding(BaseEmbedding):
+    """Embedding model chạy trong model server"""
+
+    _client: ModelServerClient = PrivateAttr()
+
+    def __init__(self, client: ModelServerClient, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client = client
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RemoteEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._client.call("embed_query", query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._client.call("embed_texts", [text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._client.call("embed_texts", texts)
+
+
+class RemoteLLM(CustomLLM):
+    """LLM chạy trong model server (prompt được format bởi LlamaCPP phía server)"""
+
+    context_window: int = 4096
+    num_output: int = 2048
+    model_name: str = "model_server"
+
+    _client: ModelServerClient = PrivateAttr()
+
+    def __init__(self, client: ModelServerClient, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client = client
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RemoteLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=self.num_output,
+            model_name=self.model_name
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        text = self._client.call("complete", prompt, formatted=formatted, **kwargs)
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        # Server trả cả response một lần
+        text = self._client.call("complete", prompt, formatted=formatted, **kwargs)
+        yield CompletionResponse(text=text, delta=text)
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        payload = [{"role": str(message.role.value), "content": message.content or ""} for message in messages]
+        content = self._client.call("chat", payload, **kwargs)
+        return ChatResponse(message=ChatMessage(role="assistant", content=content))
+
+
+# Singleton instance
+model_server_client = ModelServerClient()
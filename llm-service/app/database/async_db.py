@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable
+
+from core.config import settings
+from database.mysql_client import mysql_client, get_mysql_client
+from database.vector_store import vector_store_manager
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedExecutor:
+    """
+    Thread pool có giới hạn số workers, đo thời gian chờ/chạy của từng operation
+
+    MySQL client (SQLAlchemy sync) và vector store đều là code blocking; chạy
+    chúng trong thread pool riêng giúp event loop tiếp tục phục vụ các request
+    khác. Số workers nên bằng số connections tối đa của resource phía sau để
+    request xếp hàng ở đây (đo được) thay vì chờ ngầm trong connection pool.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-io")
+        self.lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.saturated_calls = 0
+        self.operations: Dict[str, Dict[str, Any]] = {}
+
+    def _operation(self, operation: str) -> Dict[str, Any]:
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = {
+                "calls": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "total_wait_ms": 0.0,
+                "recent_ms": deque(maxlen=settings.data_access_timing_window)
+            }
+        return stats
+
+    def _call(self, operation: str, submitted_at: float, func: Callable, *args, **kwargs):
+        started_at = time.perf_counter()
+        with self.lock:
+            self.queued -= 1
+            self.active += 1
+
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            with self.lock:
+                self.active -= 1
+                stats = self._operation(operation)
+                stats["calls"] += 1
+                stats["errors"] += int(failed)
+                stats["total_ms"] += elapsed_ms
+                stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+                stats["total_wait_ms"] += (started_at - submitted_at) * 1000
+                stats["recent_ms"].append(elapsed_ms)
+
+    async def run(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Chạy hàm blocking trong thread pool và chờ kết quả
+
+        Args:
+            operation: Tên operation (dùng để gom thống kê)
+            func: Hàm blocking
+            *args, **kwargs: Tham số của hàm
+
+        Returns:
+            Kết quả của hàm
+        """
+        with self.lock:
+            # Tất cả workers đang bận: request này phải xếp hàng
+            if self.active + self.queued >= self.max_workers:
+                self.saturated_calls += 1
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(self._call, operation, time.perf_counter(), func, *args, **kwargs)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê mức sử dụng pool và thời gian của từng operation
+
+        Returns:
+            Stats dictionary
+        """
+        with self.lock:
+            operations = {}
+            for operation, stats in self.operations.items():
+                recent = sorted(stats["recent_ms"])
+                calls = max(stats["calls"], 1)
+                operations[operation] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_ms"] / calls, 2),
+                    "p95_ms": round(recent[int(len(recent) * 0.95) - 1], 2) if recent else 0.0,
+                    "max_ms": round(stats["max_ms"], 2),
+                    "avg_wait_ms": round(stats["total_wait_ms"] / calls, 2)
+                }
+
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "saturation": round(self.active / self.max_workers, 2),
+                "saturated_calls": self.saturated_calls,
+                "operations": operations
+            }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+class AsyncMySQLClient:
+    """
+    Các method của MySQLClient dưới dạng awaitable, chạy trong thread pool riêng
+    """
+
+    def __init__(self, client=mysql_client):
+        self.client = client
+        workers = settings.mysql_executor_workers or (settings.mysql_pool_size + settings.mysql_max_overflow)
+        self.executor = InstrumentedExecutor("mysql", workers)
+
+    async def get_user_info(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return await self.executor.run("get_user_info", self.client.get_user_info, user_id)
+
+    async def get_user_documents(self, user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        return await self.executor.run("get_user_documents", self.client.get_user_documents, user_id, limit)
+
+    async def get_document_by_id(self, document_id: int) -> Optional[Dict[str, Any]]:
+        return await self.executor.run("get_document_by_id", self.client.get_document_by_id, document_id)
+
+    async def get_user_templates(self, user_id: int) -> List[Dict[str, Any]]:
+        return await self.executor.run("get_user_templates", self.client.get_user_templates, user_id)
+
+    async def get_template_by_id(self, template_id: int) -> Optional[Dict[str, Any]]:
+        return await self.executor.run("get_template_by_id", self.client.get_template_by_id, template_id)
+
+    async def get_template_for_user(self, template_id: int, user_id: int) -> Dict[str, Any]:
+        # Cache hit: trả về ngay, không cần chuyển sang thread pool
+        cached = self.client.cached_template_for_user(template_id, user_id)
+        if cached is not None:
+            return cached
+        return await self.executor.run(
+            "get_template_for_user", self.client.get_template_for_user, template_id, user_id
+        )
+
+    async def get_document_for_user(self, document_id: int, user_id: int) -> Dict[str, Any]:
+        return await self.executor.run(
+            "get_document_for_user", self.client.get_document_for_user, document_id, user_id
+        )
+
+    async def update_document_status(self, document_id: int, status: str) -> bool:
+        return await self.executor.run(
+            "update_document_status", self.client.update_document_status, document_id, status
+        )
+
+    async def check_user_exists(self, user_id: int) -> bool:
+        if self.client.cache_enabled and self.client.user_cache.get(user_id):
+            return True
+        return await self.executor.run("check_user_exists", self.client.check_user_exists, user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.executor.get_stats()
+        stats["connection_pool"] = self.client.get_connection_info()
+        stats["cache"] = self.client.get_cache_stats()
+        return stats
+
+
+class AsyncVectorStore:
+    """
+    Chạy các thao tác vector store (search, count, delete, ...) trong thread pool riêng
+    """
+
+    def __init__(self, store=vector_store_manager):
+        self.store = store
+        self.executor = InstrumentedExecutor("vector", settings.vector_executor_workers)
+
+    async def run(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """Chạy một hàm blocking bất kỳ liên quan tới vector store (vd. hierarchical search)"""
+        return await self.executor.run(operation, func, *args, **kwargs)
+
+    async def search(self, **kwargs) -> List[Dict[str, Any]]:
+        return await self.executor.run("search", self.store.search, **kwargs)
+
+    async def count_where(self, filter_metadata: Dict[str, Any], collection_name: Optional[str] = None) -> int:
+        return await self.executor.run("count_where", self.store.count_where, filter_metadata, collection_name)
+
+    async def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
+        return await self.executor.run("get_collection_stats", self.store.get_collection_stats, collection_name)
+
+    async def delete_documents(self, document_ids: List[str], collection_name: Optional[str] = None) -> int:
+        return await self.executor.run(
+            "delete_documents", self.store.delete_documents,
+            document_ids=document_ids, collection_name=collection_name
+        )
+
+    async def clear_user_knowledge(self, user_id: int) -> bool:
+        return await self.executor.run("clear_user_knowledge", self.store.clear_user_knowledge, user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.executor.get_stats()
+
+
+# Singleton instances
+async_mysql_client = AsyncMySQLClient()
+async_vector_store = AsyncVectorStore()
+# Embed + ghi chunks lúc ingest (thao tác dài, tách khỏi pool phục vụ search)
+ingest_executor = InstrumentedExecutor("ingest", settings.ingest_executor_workers)
+
+
+def get_async_mysql_client() -> AsyncMySQLClient:
+    """Get async MySQL client cho dependency injection"""
+    get_mysql_client()
+    return async_mysql_client
+
+
+def get_data_access_stats() -> Dict[str, Any]:
+    """
+    Thống kê thread pools của data access layer
+
+    Returns:
+        {"mysql": {...}, "vector_store": {...}, "ingest": {...}}
+    """
+    return {
+        "mysql": async_mysql_client.get_stats(),
+        "vector_store": async_vector_store.get_stats(),
+        "ingest": ingest_executor.get_stats()
+    }
+
+
+def shutdown_data_access() -> None:
+    """Dừng các thread pools khi shutdown service"""
+    async_mysql_client.executor.shutdown()
+    async_vector_store.executor.shutdown()
+    ingest_executor.shutdown()
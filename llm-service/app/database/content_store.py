@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def pipeline_key() -> str:
+    """
+    Key của cấu hình chia chunks + embedding hiện tại
+
+    Chunks/vectors đã lưu chỉ được dùng lại khi cùng key; đổi chunker,
+    chunk size/overlap hoặc embedding model sẽ chia và embed lại từ text đã lưu.
+    """
+    config = {
+        "embedding_model": settings.embedding_model,
+        "chunker": settings.chunker,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "chunk_max_tokens": settings.chunk_max_tokens
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ContentStore:
+    """
+    Kho nội dung theo SHA-256 của file, dùng chung giữa các users
+
+    Lưu text đã extract, chunks (text + metadata phụ thuộc nội dung như trang,
+    số tokens) và vectors của mỗi file. Upload lần sau của cùng bytes (bởi bất
+    kỳ user nào) bỏ qua bước parse và embed, chỉ ghi chunks với metadata sở hữu
+    của user đó. Mỗi document (user_id, document_id) là một reference; nội dung
+    bị xóa khỏi đĩa khi reference cuối cùng được giải phóng.
+
+    Cấu trúc thư mục:
+        index.sqlite3
+        blobs/<sha[:2]>/<sha>/text.txt
+        blobs/<sha[:2]>/<sha>/<pipeline_key>/chunks.jsonl, vectors.npy
+    """
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+        self.directory: Optional[Path] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "text_hits": 0, "misses": 0, "released_contents": 0}
+
+    def initialize(self) -> None:
+        """Mở (hoặc tạo) index của content store"""
+        try:
+            self.directory = Path(settings.content_store_directory)
+            (self.directory / "blobs").mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.directory / "index.sqlite3"), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS contents (
+                    sha256 TEXT PRIMARY KEY,
+                    size_bytes INTEGER NOT NULL,
+                    text_chars INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_chunks (
+                    sha256 TEXT NOT NULL,
+                    pipeline TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    dimension INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (sha256, pipeline)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_refs (
+                    user_id INTEGER NOT NULL,
+                    document_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, document_id)
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_content_refs_sha ON content_refs (sha256)"
+            )
+            self.conn.commit()
+            logger.info(f"✅ Content store sẵn sàng: {self.directory}")
+
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi khởi tạo content store: {str(e)}")
+            raise
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        if not self.conn:
+            raise RuntimeError("Content store chưa được khởi tạo!")
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return rows
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """SHA-256 của file (đọc theo block, không nạp cả file vào RAM)"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _content_dir(self, sha256: str) -> Path:
+        return self.directory / "blobs" / sha256[:2] / sha256
+
+    @staticmethod
+    def _write_atomic(target: Path, write) -> None:
+        """Ghi vào thư mục tạm rồi rename, để reader không thấy dữ liệu ghi dở"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=target.parent, prefix=".tmp_"))
+        try:
+            write(tmp_dir)
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(tmp_dir, target)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def get_text(self, sha256: str) -> Optional[str]:
+        """Text đã extract của file (None nếu chưa có)"""
+        path = self._content_dir(sha256) / "text.txt"
+        if not self._execute("SELECT 1 FROM contents WHERE sha256 = ?", (sha256,)) or not path.exists():
+            return None
+        self.stats["text_hits"] += 1
+        return path.read_text(encoding="utf-8")
+
+    def get_chunks(self, sha256: str, pipeline: str) -> Optional[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """
+        Chunks và vectors của file với cấu hình pipeline
+
+        Returns:
+            (List {"text", "metadata"}, vectors float32 shape (n, dim)) hoặc None
+        """
+        rows = self._execute(
+            "SELECT chunk_count FROM content_chunks WHERE sha256 = ? AND pipeline = ?",
+            (sha256, pipeline)
+        )
+        directory = self._content_dir(sha256) / pipeline
+        if not rows or not directory.exists():
+            self.stats["misses"] += 1
+            return None
+
+        with open(directory / "chunks.jsonl", encoding="utf-8") as f:
+            pieces = [json.loads(line) for line in f if line.strip()]
+        vectors = np.load(directory / "vectors.npy")
+        if len(pieces) != rows[0][0] or len(vectors) != len(pieces):
+            logger.warning(f"Content {sha256[:12]} bị lệch số chunks, bỏ qua cache")
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return pieces, vectors
+
+    def put(
+        self,
+        sha256: str,
+        size_bytes: int,
+        text: str,
+        pipeline: str,
+        pieces: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ) -> None:
+        """
+        Lưu text, chunks và vectors của file
+
+        Args:
+            sha256: SHA-256 của file
+            size_bytes: Kích thước file
+            text: Text đã extract
+            pipeline: Key cấu hình từ ``pipeline_key()``
+            pieces: List {"text", "metadata"} (metadata chỉ gồm phần phụ thuộc nội dung)
+            embeddings: Vectors tương ứng với pieces
+        """
+        if not self.conn:
+            raise RuntimeError("Content store chưa được khởi tạo!")
+
+        content_dir = self._content_dir(sha256)
+        content_dir.mkdir(parents=True, exist_ok=True)
+        if not (content_dir / "text.txt").exists():
+            tmp_path = content_dir / ".text.txt.tmp"
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, content_dir / "text.txt")
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+        def write(directory: Path) -> None:
+            with open(directory / "chunks.jsonl", "w", encoding="utf-8") as f:
+                for piece in pieces:
+                    f.write(json.dumps(piece, ensure_ascii=False, default=str) + "\n")
+            np.save(directory / "vectors.npy", vectors)
+
+        self._write_atomic(content_dir / pipeline, write)
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO contents (sha256, size_bytes, text_chars) VALUES (?, ?, ?)",
+                (sha256, int(size_bytes), len(text))
+            )
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO content_chunks (sha256, pipeline, chunk_count, dimension)
+                VALUES (?, ?, ?, ?)
+                """,
+                (sha256, pipeline, len(pieces), int(vectors.shape[1]) if vectors.ndim == 2 else 0)
+            )
+            self.conn.commit()
+
+    def add_reference(self, sha256: str, user_id: int, document_id: Any) -> None:
+        """Ghi nhận document (user_id, document_id) dùng nội dung sha256"""
+        rows = self._execute(
+            "SELECT sha256 FROM content_refs WHERE user_id = ? AND document_id = ?",
+            (int(user_id), str(document_id))
+        )
+        if rows and rows[0][0] == sha256:
+            return
+        # Document được upload lại với nội dung khác: giải phóng nội dung cũ
+        if rows:
+            self.release(user_id, document_id)
+        self._execute(
+            "INSERT INTO content_refs (user_id, document_id, sha256) VALUES (?, ?, ?)",
+            (int(user_id), str(document_id), sha256)
+        )
+
+    def release(self, user_id: int, document_id: Any) -> bool:
+        """
+        Giải phóng reference của một document
+
+        Returns:
+            True nếu nội dung không còn reference nào và đã bị xóa
+        """
+        rows = self._execute(
+            "SELECT sha256 FROM content_refs WHERE user_id = ? AND document_id = ?",
+            (int(user_id), str(document_id))
+        )
+        if not rows:
+            return False
+        self._execute(
+            "DELETE FROM content_refs WHERE user_id = ? AND document_id = ?",
+            (int(user_id), str(document_id))
+        )
+        return self._collect(rows[0][0])
+
+    def release_user(self, user_id: int) -> int:
+        """
+        Giải phóng mọi reference của user
+
+        Returns:
+            Số nội dung đã bị xóa
+        """
+        rows = self._execute(
+            "SELECT DISTINCT sha256 FROM content_refs WHERE user_id = ?", (int(user_id),)
+        )
+        self._execute("DELETE FROM content_refs WHERE user_id = ?", (int(user_id),))
+        return sum(1 for (sha256,) in rows if self._collect(sha256))
+
+    def _collect(self, sha256: str) -> bool:
+        """Xóa nội dung nếu không còn reference"""
+        if not self.conn:
+            raise RuntimeError("Content store chưa được khởi tạo!")
+
+        with self._lock:
+            (count,) = self.conn.execute(
+                "SELECT COUNT(*) FROM content_refs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if count:
+                return False
+            self.conn.execute("DELETE FROM content_chunks WHERE sha256 = ?", (sha256,))
+            self.conn.execute("DELETE FROM contents WHERE sha256 = ?", (sha256,))
+            self.conn.commit()
+            shutil.rmtree(self._content_dir(sha256), ignore_errors=True)
+
+        self.stats["released_contents"] += 1
+        logger.info(f"Đã xóa nội dung {sha256[:12]} (không còn reference)")
+        return True
+
+    def get_reference_count(self, sha256: str) -> int:
+        """Số documents đang dùng nội dung"""
+        rows = self._execute("SELECT COUNT(*) FROM content_refs WHERE sha256 = ?", (sha256,))
+        return rows[0][0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê content store
+
+        Returns:
+            Stats dictionary (số nội dung, references, dung lượng, hit/miss)
+        """
+        contents, total_bytes = self._execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM contents")[0]
+        (chunk_sets,) = self._execute("SELECT COUNT(*) FROM content_chunks")[0]
+        references, shared = self._execute(
+            """
+            SELECT COALESCE(SUM(refs), 0), COALESCE(SUM(refs > 1), 0)
+            FROM (SELECT COUNT(*) AS refs FROM content_refs GROUP BY sha256)
+            """
+        )[0]
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "contents": contents,
+            "chunk_sets": chunk_sets,
+            "references": references,
+            "shared_contents": shared,
+            "source_bytes": total_bytes,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+
+# Singleton instance
+content_store = ContentStore()
+
+
+def initialize_content_store():
+    """Initialize Content Store - được gọi từ main.py"""
+    content_store.initialize()
@@ -0,0 +1,296 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from core.config import settings
+from database.vector_backends.base import where_to_sql
+
+logger = logging.getLogger(__name__)
+
+
+class DedupStore:
+    """
+    Sidecar SQLite cho dedup chunks gần trùng (MinHash/LSH) theo user
+
+    - ``chunks``: mọi chunk đã ingest (kể cả chunk trùng), kèm MinHash signature.
+      ``canonical_id`` là ID của chunk đang giữ vector; chunk giữ vector có
+      ``canonical_id = chunk_id``, chunk trùng trỏ tới chunk đó (source reference).
+    - ``lsh_buckets``: bucket LSH của các chunk giữ vector, dùng để tìm ứng viên
+    """
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def initialize(self) -> None:
+        """Mở (hoặc tạo) database dedup"""
+        try:
+            settings.dedup_store_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(settings.dedup_store_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    user_id INTEGER NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    canonical_id TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    metadata TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, chunk_id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    user_id INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chunks_user_doc ON chunks (user_id, document_id)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chunks_user_canonical ON chunks (user_id, canonical_id)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_buckets_user_bucket ON lsh_buckets (user_id, bucket)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_buckets_user_chunk ON lsh_buckets (user_id, chunk_id)"
+            )
+            self.conn.commit()
+            logger.info(f"✅ Dedup store sẵn sàng: {settings.dedup_store_path}")
+
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi khởi tạo dedup store: {str(e)}")
+            raise
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        if not self.conn:
+            raise RuntimeError("Dedup store chưa được khởi tạo!")
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return rows
+
+    def find_candidates(self, user_id: int, buckets: List[str]) -> List[Tuple[str, str, bytes]]:
+        """
+        Các chunk giữ vector của user nằm trong các bucket LSH
+
+        Returns:
+            List (bucket, chunk_id, signature)
+        """
+        if not buckets:
+            return []
+        placeholders = ",".join("?" * len(buckets))
+        return self._execute(
+            f"""
+            SELECT b.bucket, c.chunk_id, c.signature FROM lsh_buckets b
+            JOIN chunks c ON c.user_id = b.user_id AND c.chunk_id = b.chunk_id
+            WHERE b.user_id = ? AND b.bucket IN ({placeholders})
+            """,
+            (int(user_id), *buckets)
+        )
+
+    def register_chunks(self, user_id: int, document_id: Any, rows: List[Dict[str, Any]]) -> None:
+        """
+        Ghi các chunks của một lần ingest
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            rows: List {"chunk_id", "canonical_id", "signature" (bytes),
+                  "metadata" (dict), "buckets" (list, chỉ với chunk giữ vector)}
+        """
+        if not self.conn:
+            raise RuntimeError("Dedup store chưa được khởi tạo!")
+
+        user_id = int(user_id)
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO chunks (user_id, chunk_id, document_id, canonical_id, signature, metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        user_id, row["chunk_id"], str(document_id), row["canonical_id"],
+                        row["signature"], json.dumps(row["metadata"], ensure_ascii=False, default=str)
+                    )
+                    for row in rows
+                ]
+            )
+            self.conn.executemany(
+                "INSERT INTO lsh_buckets (user_id, bucket, chunk_id) VALUES (?, ?, ?)",
+                [
+                    (user_id, bucket, row["chunk_id"])
+                    for row in rows for bucket in row.get("buckets") or []
+                ]
+            )
+            self.conn.commit()
+
+    def get_document_references(self, user_id: int, document_id: Any) -> List[Dict[str, Any]]:
+        """
+        Các chunk của documents khác đang dùng vector của document này
+
+        Returns:
+            List {"canonical_id", "chunk_id", "document_id", "signature", "metadata"} theo thứ tự ingest
+        """
+        rows = self._execute(
+            """
+            SELECT r.canonical_id, r.chunk_id, r.document_id, r.signature, r.metadata FROM chunks r
+            JOIN chunks c ON c.user_id = r.user_id AND c.chunk_id = r.canonical_id
+            WHERE c.user_id = ? AND c.document_id = ? AND c.chunk_id = c.canonical_id
+              AND r.document_id != c.document_id
+            ORDER BY r.created_at, r.rowid
+            """,
+            (int(user_id), str(document_id))
+        )
+        return [
+            {
+                "canonical_id": canonical_id,
+                "chunk_id": chunk_id,
+                "document_id": doc_id,
+                "signature": signature,
+                "metadata": json.loads(metadata)
+            }
+            for canonical_id, chunk_id, doc_id, signature, metadata in rows
+        ]
+
+    def get_referenced_chunks(self, user_id: int, where: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Các chunk giữ vector được tham chiếu bởi chunks trùng có metadata khớp where clause
+
+        Args:
+            user_id: ID của user
+            where: Where clause dạng ChromaDB, áp dụng trên metadata của chunk trùng
+
+        Returns:
+            Dictionary {canonical_id: document_id của chunk giữ vector} (document_id
+            lấy từ metadata để cùng kiểu với metadata trong vector store)
+        """
+        where_sql, params = where_to_sql(where, "r.metadata")
+        rows = self._execute(
+            f"""
+            SELECT DISTINCT c.chunk_id, c.document_id, c.metadata FROM chunks r
+            JOIN chunks c ON c.user_id = r.user_id AND c.chunk_id = r.canonical_id
+            WHERE r.user_id = ? AND r.chunk_id != r.canonical_id AND {where_sql}
+            """,
+            (int(user_id), *params)
+        )
+        return {
+            chunk_id: json.loads(metadata).get("document_id", document_id)
+            for chunk_id, document_id, metadata in rows
+        }
+
+    def count_references(self, user_id: int, document_id: Any) -> int:
+        """Số chunks trùng (không giữ vector) của một document"""
+        rows = self._execute(
+            "SELECT COUNT(*) FROM chunks WHERE user_id = ? AND document_id = ? AND chunk_id != canonical_id",
+            (int(user_id), str(document_id))
+        )
+        return rows[0][0] or 0
+
+    def promote(self, user_id: int, old_canonical_id: str, new_canonical_id: str, buckets: Iterable[str]) -> None:
+        """Chuyển vai trò giữ vector từ old_canonical_id sang new_canonical_id"""
+        if not self.conn:
+            raise RuntimeError("Dedup store chưa được khởi tạo!")
+
+        user_id = int(user_id)
+        with self._lock:
+            self.conn.execute(
+                "UPDATE chunks SET canonical_id = ? WHERE user_id = ? AND canonical_id = ? AND chunk_id != ?",
+                (new_canonical_id, user_id, old_canonical_id, old_canonical_id)
+            )
+            self.conn.executemany(
+                "INSERT INTO lsh_buckets (user_id, bucket, chunk_id) VALUES (?, ?, ?)",
+                [(user_id, bucket, new_canonical_id) for bucket in buckets]
+            )
+            self.conn.commit()
+
+    def delete_document(self, user_id: int, document_id: Any) -> None:
+        """Xóa chunks và buckets của một document"""
+        if not self.conn:
+            raise RuntimeError("Dedup store chưa được khởi tạo!")
+
+        params = (int(user_id), str(document_id))
+        with self._lock:
+            self.conn.execute(
+                """
+                DELETE FROM lsh_buckets WHERE user_id = ? AND chunk_id IN (
+                    SELECT chunk_id FROM chunks WHERE user_id = ? AND document_id = ?
+                )
+                """,
+                (params[0], *params)
+            )
+            self.conn.execute("DELETE FROM chunks WHERE user_id = ? AND document_id = ?", params)
+            self.conn.commit()
+
+    def delete_user(self, user_id: int) -> None:
+        """Xóa toàn bộ dữ liệu dedup của user"""
+        if not self.conn:
+            raise RuntimeError("Dedup store chưa được khởi tạo!")
+
+        with self._lock:
+            self.conn.execute("DELETE FROM lsh_buckets WHERE user_id = ?", (int(user_id),))
+            self.conn.execute("DELETE FROM chunks WHERE user_id = ?", (int(user_id),))
+            self.conn.commit()
+
+    def get_sources(self, chunk_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Source references của các chunk giữ vector (không tính chính chunk đó)
+
+        Returns:
+            Dictionary {canonical_id: [{"document_id", "chunk_id", "file_name"}]}
+        """
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        rows = self._execute(
+            f"""
+            SELECT canonical_id, chunk_id, document_id, metadata FROM chunks
+            WHERE canonical_id IN ({placeholders}) AND chunk_id != canonical_id
+            ORDER BY created_at, rowid
+            """,
+            tuple(chunk_ids)
+        )
+        sources: Dict[str, List[Dict[str, Any]]] = {}
+        for canonical_id, chunk_id, document_id, metadata in rows:
+            sources.setdefault(canonical_id, []).append({
+                "document_id": document_id,
+                "chunk_id": chunk_id,
+                "file_name": json.loads(metadata).get("file_name")
+            })
+        return sources
+
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Số chunks đã ingest, số vectors thực sự lưu và tỉ lệ dedup của user"""
+        rows = self._execute(
+            """
+            SELECT COUNT(*), SUM(chunk_id = canonical_id), COUNT(DISTINCT document_id)
+            FROM chunks WHERE user_id = ?
+            """,
+            (int(user_id),)
+        )
+        total, stored, documents = rows[0]
+        total, stored = total or 0, stored or 0
+        return {
+            "documents": documents or 0,
+            "chunks": total,
+            "stored_vectors": stored,
+            "duplicates": total - stored,
+            "dedup_ratio": round((total - stored) / total, 4) if total else 0.0
+        }
+
+
+# Singleton instance
+dedup_store = DedupStore()
+
+
+def initialize_dedup_store():
+    """Initialize Dedup Store - được gọi từ main.py"""
+    dedup_store.initialize()
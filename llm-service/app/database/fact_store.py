@@ -0,0 +1,240 @@
+import logging
+import sqlite3
+import threading
+import unicodedata
+from typing import Optional, List, Dict, Any
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_for_match(text: str) -> str:
+    """Lowercase, bỏ dấu tiếng Việt và gộp khoảng trắng để so khớp"""
+    text = unicodedata.normalize("NFD", text or "")
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return " ".join(text.lower().split())
+
+
+class FactStore:
+    """
+    Bảng facts theo user được trích xuất lúc ingest (SQLite)
+    Mỗi fact gồm: tên biến, giá trị, chunk nguồn và confidence
+    """
+
+    # Các biến dùng để xác định document mà câu hỏi đang nhắc tới
+    HINT_VARIABLES = ("course_code", "subject", "class_name")
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def initialize(self) -> None:
+        """Mở (hoặc tạo) database facts"""
+        try:
+            settings.fact_store_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(settings.fact_store_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS facts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    document_id TEXT NOT NULL,
+                    variable TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    chunk_id TEXT,
+                    source TEXT,
+                    confidence REAL NOT NULL,
+                    extractor TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_facts_user_var ON facts (user_id, variable)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_facts_user_doc ON facts (user_id, document_id)"
+            )
+            self.conn.commit()
+            logger.info(f"✅ Fact store sẵn sàng: {settings.fact_store_path}")
+
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi khởi tạo fact store: {str(e)}")
+            raise
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        if not self.conn:
+            raise RuntimeError("Fact store chưa được khởi tạo!")
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return rows
+
+    def replace_document_facts(
+        self,
+        user_id: int,
+        document_id: Any,
+        facts: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Ghi facts của một document (xóa facts cũ của document đó trước)
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            facts: List [{"variable", "value", "chunk_id", "source", "confidence", "extractor"}]
+
+        Returns:
+            Số facts đã ghi
+        """
+        if not self.conn:
+            raise RuntimeError("Fact store chưa được khởi tạo!")
+
+        rows = [
+            (
+                int(user_id), str(document_id), fact["variable"], fact["value"],
+                fact.get("chunk_id"), fact.get("source"),
+                float(fact["confidence"]), fact.get("extractor", "regex")
+            )
+            for fact in facts
+        ]
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM facts WHERE user_id = ? AND document_id = ?",
+                (int(user_id), str(document_id))
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO facts (user_id, document_id, variable, value, chunk_id,
+                                   source, confidence, extractor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def delete_document_facts(self, user_id: int, document_id: Any) -> None:
+        """Xóa facts của một document"""
+        self._execute(
+            "DELETE FROM facts WHERE user_id = ? AND document_id = ?",
+            (int(user_id), str(document_id))
+        )
+
+    def delete_user_facts(self, user_id: int) -> None:
+        """Xóa toàn bộ facts của user"""
+        self._execute("DELETE FROM facts WHERE user_id = ?", (int(user_id),))
+
+    def _find_hint_documents(self, user_id: int, question: str) -> set:
+        """Tìm các documents có course_code/subject/class_name được nhắc tới trong câu hỏi"""
+        normalized_question = normalize_for_match(question)
+        placeholders = ",".join("?" * len(self.HINT_VARIABLES))
+        rows = self._execute(
+            f"SELECT document_id, value FROM facts WHERE user_id = ? AND variable IN ({placeholders})",
+            (int(user_id), *self.HINT_VARIABLES)
+        )
+        return {
+            document_id for document_id, value in rows
+            if len(value) >= 3 and normalize_for_match(value) in normalized_question
+        }
+
+    def _count_documents(self, user_id: int) -> int:
+        """Số documents của user có facts"""
+        rows = self._execute(
+            "SELECT COUNT(DISTINCT document_id) FROM facts WHERE user_id = ?",
+            (int(user_id),)
+        )
+        return rows[0][0] if rows else 0
+
+    def lookup(
+        self,
+        user_id: int,
+        variables: List[str],
+        question: str = "",
+        min_confidence: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Tìm giá trị cho các biến từ bảng facts
+
+        Chỉ trả về biến có câu trả lời rõ ràng: một giá trị duy nhất (hoặc
+        vượt hẳn các giá trị khác) thuộc document được nhắc tới trong câu hỏi.
+        Nếu câu hỏi không nhắc tới document nào, chỉ dùng facts khi user chỉ có
+        một document (và confidence >= ``fact_direct_confidence``); user có
+        nhiều khóa học/lớp thì không đoán document. Các biến mơ hồ để lại cho
+        RAG + LLM xử lý.
+
+        Args:
+            user_id: ID của user
+            variables: Các biến cần điền
+            question: Câu hỏi (dùng để chọn document liên quan)
+            min_confidence: Ngưỡng confidence tối thiểu
+
+        Returns:
+            Dict {variable: {"value", "confidence", "source", "document_id", "chunk_id"}}
+        """
+        if not variables or not self.conn:
+            return {}
+
+        min_confidence = settings.fact_min_confidence if min_confidence is None else min_confidence
+        placeholders = ",".join("?" * len(variables))
+        rows = self._execute(
+            f"""
+            SELECT variable, value, document_id, chunk_id, source, confidence
+            FROM facts
+            WHERE user_id = ? AND variable IN ({placeholders}) AND confidence >= ?
+            ORDER BY confidence DESC
+            """,
+            (int(user_id), *variables, float(min_confidence))
+        )
+        if not rows:
+            return {}
+
+        hint_documents = self._find_hint_documents(user_id, question) if question else set()
+        single_document = not hint_documents and self._count_documents(user_id) == 1
+
+        candidates: Dict[str, List[Dict[str, Any]]] = {}
+        for variable, value, document_id, chunk_id, source, confidence in rows:
+            candidates.setdefault(variable, []).append({
+                "value": value,
+                "document_id": document_id,
+                "chunk_id": chunk_id,
+                "source": source,
+                "confidence": confidence
+            })
+
+        answers = {}
+        for variable, facts in candidates.items():
+            hinted = [fact for fact in facts if fact["document_id"] in hint_documents]
+            if hinted:
+                facts = hinted
+            elif not single_document or facts[0]["confidence"] < settings.fact_direct_confidence:
+                # Không biết câu hỏi thuộc document nào: chỉ trả lời khi user có
+                # một document duy nhất và fact đủ chắc chắn (không phải LLM đoán)
+                continue
+
+            distinct_values = {normalize_for_match(fact["value"]) for fact in facts}
+            if len(distinct_values) == 1:
+                answers[variable] = facts[0]
+            elif facts[0]["confidence"] - facts[1]["confidence"] >= 0.2:
+                answers[variable] = facts[0]
+
+        return answers
+
+    def get_user_stats(self, user_id: int) -> Dict[str, int]:
+        """Số facts theo biến của user"""
+        rows = self._execute(
+            "SELECT variable, COUNT(*) FROM facts WHERE user_id = ? GROUP BY variable",
+            (int(user_id),)
+        )
+        return {variable: count for variable, count in rows}
+
+
+# Singleton instance
+fact_store = FactStore()
+
+
+def initialize_fact_store():
+    """Initialize Fact Store - được gọi từ main.py"""
+    fact_store.initialize()
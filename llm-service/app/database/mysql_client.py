@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from contextlib import contextmanager
 import pymysql
 from sqlalchemy import create_engine, text
@@ -7,9 +7,14 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from core.config import settings
+from database.shared_state import shared_state
+from utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Counter trong shared state, tăng mỗi khi template bị invalidate (ở bất kỳ worker nào)
+TEMPLATES_VERSION_KEY = "templates"
+
 
 class MySQLClient:
     """
@@ -20,6 +25,12 @@ class MySQLClient:
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        # Cache ngắn hạn cho các lookup nóng (user tồn tại, nội dung template)
+        self.cache_enabled = settings.mysql_cache_ttl_seconds > 0
+        self.user_cache = TTLCache(settings.mysql_cache_max_entries, settings.mysql_cache_ttl_seconds)
+        self.template_cache = TTLCache(settings.mysql_cache_max_entries, settings.mysql_cache_ttl_seconds)
+        # Version templates lúc cache template được đối chiếu lần cuối
+        self.template_cache_version = 0
         
     def initialize(self) -> None:
         """
@@ -31,8 +42,8 @@ class MySQLClient:
             # Tạo engine với connection pool
             self.engine = create_engine(
                 settings.mysql_url,
-                pool_size=5,  # Số connections trong pool
-                max_overflow=10,  # Số connections tối đa có thể tạo thêm
+                pool_size=settings.mysql_pool_size,  # Số connections trong pool
+                max_overflow=settings.mysql_max_overflow,  # Số connections tối đa có thể tạo thêm
                 pool_timeout=30,  # Timeout khi chờ connection từ pool
                 pool_recycle=3600,  # Recycle connections sau 1 giờ
                 echo=settings.log_level == "DEBUG"  # Log SQL queries nếu DEBUG mode
@@ -147,6 +158,66 @@ class MySQLClient:
             logger.error(f"Lỗi khi lấy documents: {str(e)}")
             return []
     
+    def iter_documents_keyset(
+        self,
+        batch_size: int = 500,
+        after_id: int = 0,
+        user_id: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Duyệt toàn bộ documents (cùng điều kiện với ``get_user_documents``)
+        theo từng batch, phân trang keyset theo id tăng dần
+        
+        Args:
+            batch_size: Số documents mỗi batch
+            after_id: Chỉ lấy documents có id lớn hơn (resume từ checkpoint)
+            user_id: Chỉ lấy documents của user này (None = tất cả)
+            
+        Yields:
+            List documents của từng batch
+        """
+        query = """
+            SELECT d.id, d.filename, d.original_name, d.file_path, d.file_type,
+                   d.status, d.created_at, d.folder_id, d.owner_id,
+                   u.name as owner_name, u.email as owner_email
+            FROM documents d
+            JOIN users u ON d.owner_id = u.id
+            WHERE d.id > :after_id
+              AND d.is_deleted = FALSE
+              AND d.status IN ('uploaded', 'ready')
+              {user_filter}
+            ORDER BY d.id
+            LIMIT :limit
+        """.format(user_filter="AND d.owner_id = :user_id" if user_id is not None else "")
+        
+        while True:
+            with self.get_session() as session:
+                rows = session.execute(
+                    text(query),
+                    {"after_id": after_id, "limit": batch_size, "user_id": user_id}
+                ).fetchall()
+            
+            if not rows:
+                return
+            
+            yield [
+                {
+                    "id": row[0],
+                    "filename": row[1],
+                    "original_name": row[2],
+                    "file_path": row[3],
+                    "file_type": row[4],
+                    "status": row[5],
+                    "created_at": row[6],
+                    "folder_id": row[7],
+                    "owner_id": row[8],
+                    "owner_name": row[9],
+                    "owner_email": row[10]
+                }
+                for row in rows
+            ]
+            after_id = rows[-1][0]
+    
     def get_document_by_id(self, document_id: int) -> Optional[Dict[str, Any]]:
         """
         Lấy thông tin document theo ID
@@ -243,6 +314,12 @@ class MySQLClient:
         Returns:
             Template info hoặc None
         """
+        version = self._sync_template_cache() if self.cache_enabled else 0
+        if self.cache_enabled:
+            cached = self.template_cache.get(template_id)
+            if cached is not None:
+                return cached
+        
         try:
             with self.get_session() as session:
                 query = """
@@ -258,21 +335,205 @@ class MySQLClient:
                 ).fetchone()
                 
                 if result:
-                    return {
-                        "id": result[0],
-                        "name": result[1],
-                        "content": result[2],
-                        "category": result[3],
-                        "variables": result[4],
-                        "owner_id": result[5],
-                        "created_at": result[6]
-                    }
+                    template = self._template_from_row(result)
+                    if self.cache_enabled:
+                        self._cache_template(template_id, template, version)
+                    return template
                 return None
                 
         except Exception as e:
             logger.error(f"Lỗi khi lấy template: {str(e)}")
             return None
     
+    @staticmethod
+    def _template_from_row(row) -> Dict[str, Any]:
+        """Chuyển row (id, name, content, category, variables, owner_id, created_at) thành dict"""
+        return {
+            "id": row[0],
+            "name": row[1],
+            "content": row[2],
+            "category": row[3],
+            "variables": row[4],
+            "owner_id": row[5],
+            "created_at": row[6]
+        }
+    
+    def _sync_template_cache(self) -> int:
+        """
+        Xóa cache template nếu template đã bị invalidate ở process khác
+        (``/route/sync`` chỉ đến một worker)
+        
+        Returns:
+            Version templates hiện tại (truyền cho ``_cache_template``)
+        """
+        version = shared_state.get(TEMPLATES_VERSION_KEY)
+        if version != self.template_cache_version:
+            self.template_cache.clear()
+            self.template_cache_version = version
+        return version
+    
+    def _cache_template(self, template_id: int, template: Dict[str, Any], version: int) -> None:
+        """Cache template vừa query, trừ khi có invalidate trong lúc query (dữ liệu có thể đã cũ)"""
+        if shared_state.get(TEMPLATES_VERSION_KEY) == version:
+            self.template_cache.set(template_id, template)
+    
+    def cached_template_for_user(self, template_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Kết quả của ``get_template_for_user`` nếu cả user và template đều có trong cache
+        
+        Returns:
+            {"user_exists": True, "template": dict} hoặc None (cần query DB)
+        """
+        if not self.cache_enabled or not self.user_cache.get(user_id):
+            return None
+        self._sync_template_cache()
+        template = self.template_cache.get(template_id)
+        if template is None:
+            return None
+        return {"user_exists": True, "template": template}
+    
+    def get_template_for_user(self, template_id: int, user_id: int) -> Dict[str, Any]:
+        """
+        Kiểm tra user tồn tại và lấy template trong một query
+        
+        Dùng cache khi có; nếu thiếu một trong hai thì chạy một SELECT
+        (users LEFT JOIN templates) thay cho hai query riêng.
+        
+        Args:
+            template_id: ID của template
+            user_id: ID của user
+            
+        Returns:
+            {"user_exists": bool, "template": dict hoặc None}
+        """
+        cached = self.cached_template_for_user(template_id, user_id)
+        if cached is not None:
+            return cached
+        
+        version = shared_state.get(TEMPLATES_VERSION_KEY) if self.cache_enabled else 0
+        try:
+            with self.get_session() as session:
+                query = """
+                    SELECT u.id, t.id, t.name, t.content, t.category, t.variables,
+                           t.owner_id, t.created_at
+                    FROM users u
+                    LEFT JOIN templates t ON t.id = :template_id
+                    WHERE u.id = :user_id
+                """
+                
+                result = session.execute(
+                    text(query),
+                    {"template_id": template_id, "user_id": user_id}
+                ).fetchone()
+                
+                if not result:
+                    return {"user_exists": False, "template": None}
+                
+                template = self._template_from_row(result[1:]) if result[1] is not None else None
+                if self.cache_enabled:
+                    self.user_cache.set(user_id, True)
+                    if template:
+                        self._cache_template(template_id, template, version)
+                return {"user_exists": True, "template": template}
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy template của user: {str(e)}")
+            return {"user_exists": False, "template": None}
+    
+    def get_document_for_user(self, document_id: int, user_id: int) -> Dict[str, Any]:
+        """
+        Kiểm tra user tồn tại và lấy document trong một query
+        
+        Document không được cache vì status thay đổi trong lúc extraction.
+        
+        Args:
+            document_id: ID của document
+            user_id: ID của user
+            
+        Returns:
+            {"user_exists": bool, "document": dict hoặc None}
+        """
+        try:
+            with self.get_session() as session:
+                query = """
+                    SELECT u.id, d.id, d.filename, d.original_name, d.file_path,
+                           d.file_type, d.status, d.created_at, d.owner_id,
+                           o.name as owner_name, o.email as owner_email
+                    FROM users u
+                    LEFT JOIN documents d ON d.id = :doc_id AND d.is_deleted = FALSE
+                    LEFT JOIN users o ON o.id = d.owner_id
+                    WHERE u.id = :user_id
+                """
+                
+                result = session.execute(
+                    text(query),
+                    {"doc_id": document_id, "user_id": user_id}
+                ).fetchone()
+                
+                if not result:
+                    return {"user_exists": False, "document": None}
+                
+                if self.cache_enabled:
+                    self.user_cache.set(user_id, True)
+                if result[1] is None:
+                    return {"user_exists": True, "document": None}
+                
+                return {
+                    "user_exists": True,
+                    "document": {
+                        "id": result[1],
+                        "filename": result[2],
+                        "original_name": result[3],
+                        "file_path": result[4],
+                        "file_type": result[5],
+                        "status": result[6],
+                        "created_at": result[7],
+                        "owner_id": result[8],
+                        "owner_name": result[9],
+                        "owner_email": result[10]
+                    }
+                }
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy document của user: {str(e)}")
+            return {"user_exists": False, "document": None}
+    
+    def invalidate_template(self, template_id: Optional[int] = None, user_id: Optional[int] = None) -> int:
+        """
+        Xóa template khỏi cache sau khi backend sửa/xóa template
+        
+        Version templates trong shared state được tăng để cache của các
+        processes khác cũng bị xóa ở lần đọc tiếp theo.
+        
+        Args:
+            template_id: ID của template (None = mọi template của user_id)
+            user_id: ID của user sở hữu templates
+            
+        Returns:
+            Số entries đã xóa
+        """
+        shared_state.bump(TEMPLATES_VERSION_KEY)
+        if template_id is not None:
+            self.template_cache.pop(template_id)
+            return 1
+        if user_id is not None:
+            return self.template_cache.discard_if(lambda template: template["owner_id"] == user_id)
+        self.template_cache.clear()
+        return 0
+    
+    def invalidate_user(self, user_id: int) -> None:
+        """Xóa user khỏi cache (vd. sau khi backend xóa user)"""
+        self.user_cache.pop(user_id)
+        self.invalidate_template(user_id=user_id)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Thống kê cache user/template"""
+        return {
+            "enabled": self.cache_enabled,
+            "users": self.user_cache.get_stats(),
+            "templates": self.template_cache.get_stats()
+        }
+    
     def update_document_status(self, document_id: int, status: str) -> bool:
         """
         Cập nhật status của document (chỉ dùng khi cần thiết)
@@ -315,6 +576,10 @@ class MySQLClient:
         Returns:
             True nếu user tồn tại
         """
+        # Chỉ cache kết quả tồn tại: user mới tạo không bị báo 404 đến hết TTL
+        if self.cache_enabled and self.user_cache.get(user_id):
+            return True
+        
         try:
             with self.get_session() as session:
                 result = session.execute(
@@ -322,6 +587,8 @@ class MySQLClient:
                     {"user_id": user_id}
                 ).scalar()
                 
+                if result > 0 and self.cache_enabled:
+                    self.user_cache.set(user_id, True)
                 return result > 0
                 
         except Exception as e:
@@ -0,0 +1,185 @@
+import fcntl
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Any, Iterator
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedState:
+    """
+    Counters dùng chung giữa các processes cùng thư mục data (SQLite)
+
+    Mỗi uvicorn worker (``MODEL_SERVER_MODE=client``) có caches riêng trong RAM
+    (fill cache, template router, cache MySQL); version knowledge của user,
+    version templates và generation của các job nền được lưu ở đây, nên thay
+    đổi ở một process được các process khác thấy ở lần đọc tiếp theo.
+    """
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def initialize(self) -> None:
+        """Mở (hoặc tạo) database; được gọi lazy ở lần dùng đầu tiên (vd: trong tools)"""
+        with self._lock:
+            self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            try:
+                settings.shared_state_path.parent.mkdir(parents=True, exist_ok=True)
+                # Autocommit: mỗi thao tác tự quản lý transaction; chờ process khác ghi tối đa 30s
+                conn = sqlite3.connect(
+                    str(settings.shared_state_path),
+                    timeout=30.0,
+                    isolation_level=None,
+                    check_same_thread=False
+                )
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS counters (
+                        key TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL
+                    )
+                """)
+                self.conn = conn
+                logger.info(f"✅ Shared state sẵn sàng: {settings.shared_state_path}")
+            except Exception as e:
+                logger.error(f"❌ Lỗi khi khởi tạo shared state: {str(e)}")
+                raise
+        return self.conn
+
+    def get(self, key: str) -> int:
+        """
+        Giá trị hiện tại của counter
+
+        Args:
+            key: Tên counter, vd: "knowledge:12"
+
+        Returns:
+            Giá trị (0 nếu chưa từng tăng)
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key: str) -> int:
+        """
+        Tăng counter thêm 1
+
+        Returns:
+            Giá trị mới
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO counters (key, value) VALUES (?, 1)
+                    ON CONFLICT(key) DO UPDATE SET value = value + 1
+                    """,
+                    (key,)
+                )
+                (value,) = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def bump_prefix(self, prefix: str) -> int:
+        """
+        Tăng mọi counter có key bắt đầu bằng prefix
+
+        Returns:
+            Số counters đã tăng
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE counters SET value = value + 1 WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix)
+            )
+        return cursor.rowcount
+
+    @contextmanager
+    def locked(self, name: str) -> Iterator[None]:
+        """
+        Lock độc quyền giữa mọi threads và processes cùng thư mục data
+
+        Dùng cho đoạn kiểm tra rồi ghi (vd: job nền kiểm tra generation rồi
+        ghi kết quả) để ``bump`` từ process khác không xen vào giữa. Không
+        lồng hai lần cùng ``name`` trong một thread.
+
+        Args:
+            name: Tên lock (file ``<name>.lock`` cạnh database)
+        """
+        path = settings.shared_state_path.with_name(f"{name}.lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class JobGenerations:
+    """
+    Lần schedule mới nhất của job nền theo document, dùng chung giữa các processes
+
+    Job chỉ ghi kết quả khi generation của nó còn là mới nhất: document bị xóa
+    (``cancel``) hoặc được schedule lại ở bất kỳ worker nào đều làm job cũ hết
+    hiệu lực. Kiểm tra và ghi kết quả chạy trong ``locked()``, cùng lock với
+    ``cancel``, nên xóa document (cancel rồi xóa) không xen vào giữa.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _key(self, user_id: int, document_id: Any = None) -> str:
+        prefix = f"{self.name}:{int(user_id)}:"
+        return prefix if document_id is None else prefix + str(document_id)
+
+    def locked(self):
+        return shared_state.locked(f"{self.name}_jobs")
+
+    def next(self, user_id: int, document_id: Any) -> int:
+        """Generation cho job mới của document"""
+        with self.locked():
+            return shared_state.bump(self._key(user_id, document_id))
+
+    def is_current(self, user_id: int, document_id: Any, generation: Optional[int]) -> bool:
+        """Job còn hiệu lực (document chưa bị xóa / schedule lại); None = không kiểm tra"""
+        return generation is None or shared_state.get(self._key(user_id, document_id)) == generation
+
+    def cancel(self, user_id: int, document_id: Any = None) -> None:
+        """
+        Làm các job đang chờ/đang chạy của document (hoặc của cả user) hết hiệu lực
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document (None = mọi document của user)
+        """
+        with self.locked():
+            if document_id is None:
+                shared_state.bump_prefix(self._key(user_id))
+            else:
+                shared_state.bump(self._key(user_id, document_id))
+
+
+# Singleton instance
+shared_state = SharedState()
+
+
+def initialize_shared_state():
+    """Initialize Shared State - được gọi từ main.py"""
+    shared_state.initialize()
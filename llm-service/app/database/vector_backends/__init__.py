@@ -0,0 +1,36 @@
+from pathlib import Path
+from typing import Optional
+
+from core.config import settings
+from database.vector_backends.base import VectorBackend, VectorCollection
+
+
+def create_backend(name: Optional[str] = None, persist_directory: Optional[Path] = None) -> VectorBackend:
+    """
+    Tạo vector backend theo tên
+
+    Args:
+        name: "chroma" hoặc "hnsw" (mặc định theo ``settings.vector_backend``)
+        persist_directory: Thư mục lưu dữ liệu (mặc định theo settings của backend)
+
+    Returns:
+        VectorBackend
+    """
+    name = name or settings.vector_backend
+
+    # Import trong hàm để chỉ cần cài thư viện của backend được chọn
+    if name == "chroma":
+        from database.vector_backends.chroma_backend import ChromaBackend
+        return ChromaBackend(persist_directory or settings.chroma_persist_directory)
+    if name == "hnsw":
+        from database.vector_backends.hnsw_backend import HnswBackend
+        return HnswBackend(
+            persist_directory or settings.hnsw_persist_directory,
+            settings.hnsw_vector_dtype,
+            settings.hnsw_persist_interval
+        )
+
+    raise ValueError(f"Vector backend không hợp lệ: {name}")
+
+
+__all__ = ["VectorBackend", "VectorCollection", "create_backend"]
@@ -0,0 +1,155 @@
+from abc import ABC, abstractmethod
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+# Các trường có thể yêu cầu trong ``include`` (giống ChromaDB)
+DEFAULT_QUERY_INCLUDE = ("documents", "metadatas", "distances")
+DEFAULT_GET_INCLUDE = ("documents", "metadatas")
+
+_COMPARISON_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: Dict[str, Any], column: str = "metadata") -> Tuple[str, List[Any]]:
+    """
+    Chuyển ChromaDB where clause thành điều kiện SQL trên cột JSON ``column``
+    (dùng chung cho hnsw backend và dedup store)
+
+    Hỗ trợ ``$and``, ``$or``, ``$eq``, ``$ne``, ``$gt``, ``$gte``, ``$lt``,
+    ``$lte``, ``$in``, ``$nin``. So sánh phân biệt kiểu như ChromaDB
+    ("1" khác 1).
+    """
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(condition, column) for condition in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for operator, operand in conditions.items():
+            path = f'$."{key}"'
+            if operator in _COMPARISON_OPERATORS:
+                clauses.append(f"json_extract({column}, ?) {_COMPARISON_OPERATORS[operator]} ?")
+                params.extend([path, operand])
+            elif operator in ("$in", "$nin"):
+                if not operand:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                placeholders = ",".join("?" * len(operand))
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"json_extract({column}, ?) {negate}IN ({placeholders})")
+                params.append(path)
+                params.extend(operand)
+            else:
+                raise ValueError(f"Operator không được hỗ trợ: {operator}")
+
+    return "(" + " AND ".join(clauses) + ")" if clauses else "1", params
+
+
+class VectorCollection(ABC):
+    """
+    Interface của một collection vector
+
+    API và format kết quả theo ChromaDB (``ids``/``documents``/``metadatas``/
+    ``distances``/``embeddings``, where clause dạng ``{"key": {"$eq": v}}``)
+    để ``VectorStoreManager`` dùng chung cho mọi backend.
+    """
+
+    name: str
+    metadata: Dict[str, Any]
+
+    @abstractmethod
+    def count(self) -> int:
+        """Số vectors (không tính vectors đã xóa)"""
+
+    @abstractmethod
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: Optional[List[List[float]]] = None
+    ) -> None:
+        """Thêm vectors mới (ID đã tồn tại bị bỏ qua)"""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: Optional[List[List[float]]] = None
+    ) -> None:
+        """Thêm hoặc ghi đè vectors theo ID"""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE
+    ) -> Dict[str, Any]:
+        """
+        Tìm kNN cho từng query
+
+        Returns:
+            Dict các list lồng nhau theo query: {"ids": [[...]], "distances": [[...]], ...}
+        """
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE
+    ) -> Dict[str, Any]:
+        """Lấy vectors theo ID và/hoặc metadata filter"""
+
+    @abstractmethod
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Xóa vectors theo ID và/hoặc metadata filter"""
+
+
+class VectorBackend(ABC):
+    """Interface của một vector engine (quản lý các collections)"""
+
+    name: str
+    # Backend có tự tạo embedding từ text không (ChromaDB có, HNSW thì không)
+    embeds_text: bool = False
+
+    @abstractmethod
+    def get_or_create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> VectorCollection:
+        """Lấy collection, tạo mới nếu chưa có"""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        """Lấy collection đã tồn tại (ValueError nếu không có)"""
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        """Xóa collection cùng toàn bộ dữ liệu"""
+
+    @abstractmethod
+    def rename_collection(self, name: str, new_name: str) -> None:
+        """Đổi tên collection (dùng khi rebuild để thay collection cũ)"""
+
+    @abstractmethod
+    def list_collections(self) -> List[VectorCollection]:
+        """Danh sách collections hiện có"""
+
+    def close(self) -> None:
+        """Ghi các thay đổi còn trong bộ nhớ xuống đĩa (khi shutdown)"""
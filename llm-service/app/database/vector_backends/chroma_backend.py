@@ -0,0 +1,94 @@
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+
+from database.vector_backends.base import (
+    VectorBackend, VectorCollection, DEFAULT_QUERY_INCLUDE, DEFAULT_GET_INCLUDE
+)
+
+
+class ChromaCollection(VectorCollection):
+    """Adapter mỏng quanh ``chromadb.Collection``"""
+
+    def __init__(self, collection: chromadb.Collection):
+        self.raw = collection
+
+    @property
+    def name(self) -> str:
+        return self.raw.name
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.raw.metadata or {}
+
+    def count(self) -> int:
+        return self.raw.count()
+
+    def add(self, ids, documents, metadatas, embeddings=None) -> None:
+        self.raw.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        self.raw.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE
+    ) -> Dict[str, Any]:
+        return self.raw.query(
+            query_embeddings=query_embeddings,
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            include=list(include)
+        )
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE
+    ) -> Dict[str, Any]:
+        return self.raw.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        self.raw.delete(ids=ids, where=where)
+
+
+class ChromaBackend(VectorBackend):
+    """Backend ChromaDB PersistentClient (mặc định)"""
+
+    name = "chroma"
+    embeds_text = True
+
+    def __init__(self, persist_directory: Path):
+        self.client = chromadb.PersistentClient(
+            path=str(persist_directory),
+            settings=ChromaSettings(
+                persist_directory=str(persist_directory),
+                anonymized_telemetry=False,  # Tắt telemetry
+                allow_reset=True,  # Cho phép reset database nếu cần
+            )
+        )
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> ChromaCollection:
+        return ChromaCollection(self.client.get_or_create_collection(name=name, metadata=metadata))
+
+    def get_collection(self, name: str) -> ChromaCollection:
+        return ChromaCollection(self.client.get_collection(name))
+
+    def delete_collection(self, name: str) -> None:
+        self.client.delete_collection(name)
+
+    def rename_collection(self, name: str, new_name: str) -> None:
+        self.client.get_collection(name).modify(name=new_name)
+
+    def list_collections(self) -> List[ChromaCollection]:
+        return [ChromaCollection(collection) for collection in self.client.list_collections()]
@@ -0,0 +1,594 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+import hnswlib
+import numpy as np
+
+from database.vector_backends.base import (
+    VectorBackend, VectorCollection, DEFAULT_QUERY_INCLUDE, DEFAULT_GET_INCLUDE, where_to_sql
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "collection.json"
+INDEX_FILE = "index.bin"
+VECTORS_FILE = "vectors.dat"
+SCALES_FILE = "scales.dat"
+METADATA_FILE = "metadata.sqlite3"
+
+
+class VectorFile:
+    """
+    Lưu vectors trong file memory-mapped dạng float16 hoặc int8
+
+    int8 dùng scale riêng cho từng vector (max |x| / 127), lưu trong file
+    float32 đi kèm. Hàng thứ i tương ứng với label i của HNSW index.
+    """
+
+    def __init__(self, directory: Path, dim: int, dtype: str, capacity: int):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"dtype không hợp lệ: {dtype}")
+        self.directory = directory
+        self.dim = dim
+        self.dtype = dtype
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self.resize(capacity)
+
+    def _open(self, file_name: str, dtype, shape: tuple) -> np.memmap:
+        path = self.directory / file_name
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def resize(self, capacity: int) -> None:
+        """Mở rộng file (dữ liệu cũ được giữ nguyên)"""
+        if capacity <= self.capacity:
+            return
+        self.flush()
+        self.vectors = self._open(VECTORS_FILE, np.dtype(self.dtype), (capacity, self.dim))
+        if self.dtype == "int8":
+            self.scales = self._open(SCALES_FILE, np.float32, (capacity,))
+        self.capacity = capacity
+
+    def write(self, start: int, vectors: np.ndarray) -> None:
+        end = start + len(vectors)
+        if self.dtype == "float16":
+            self.vectors[start:end] = vectors.astype(np.float16)
+        else:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.vectors[start:end] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales[start:end] = scales
+
+    def read(self, rows: Sequence[int]) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= np.asarray(self.scales[rows], dtype=np.float32)[:, None]
+        return vectors
+
+    def flush(self) -> None:
+        if self.vectors is not None:
+            self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    @property
+    def nbytes(self) -> int:
+        total = self.vectors.nbytes if self.vectors is not None else 0
+        return total + (self.scales.nbytes if self.scales is not None else 0)
+
+
+class HnswCollection(VectorCollection):
+    """
+    Collection dùng hnswlib cho kNN, vectors trong file memmap và metadata trong SQLite
+
+    Thư mục collection gồm:
+        collection.json   - cấu hình (dim, space, dtype, label tiếp theo, ...)
+        index.bin         - HNSW graph (hnswlib)
+        vectors.dat       - vectors float16/int8 (memmap), dùng cho brute-force,
+                            trả embeddings và rebuild index
+        metadata.sqlite3  - ID, text và metadata JSON theo label
+
+    Xóa dùng ``mark_deleted`` của hnswlib (tombstone); số vectors đã xóa
+    được lưu trong cấu hình để biết khi nào cần rebuild.
+
+    Vectors, metadata và cấu hình được ghi sau mỗi thao tác; index.bin (ghi
+    lại toàn bộ graph) chỉ được ghi khi có thay đổi, theo chu kỳ
+    ``persist_interval`` giây (``flush``) và khi đóng collection. Nếu process
+    dừng trước khi ghi index, các thay đổi sau lần ghi cuối được áp lại từ
+    vectors.dat và metadata lúc mở collection.
+    """
+
+    # Filter chọn ít vectors hơn ngưỡng này thì tính chính xác trên memmap thay vì đi HNSW graph
+    BRUTE_FORCE_LIMIT = 2000
+    INITIAL_CAPACITY = 1024
+
+    def __init__(
+        self,
+        directory: Path,
+        name: str,
+        metadata: Optional[Dict[str, Any]],
+        dtype: str,
+        persist_interval: float = 0.0
+    ):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.persist_interval = persist_interval
+        self._index_dirty = False
+        self._index_saved_at = time.monotonic()
+
+        config_path = self.directory / CONFIG_FILE
+        if config_path.exists():
+            self.config = json.loads(config_path.read_text(encoding="utf-8"))
+        else:
+            self.config = {
+                "name": name,
+                "metadata": metadata or {},
+                "dtype": dtype,
+                "dim": None,
+                "capacity": 0,
+                "next_label": 0,
+                "deleted": 0,
+                # Trạng thái lúc ghi index.bin lần cuối
+                "index_next_label": 0,
+                "index_deleted": 0
+            }
+
+        self.db = sqlite3.connect(str(self.directory / METADATA_FILE), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                label INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self.db.commit()
+
+        self.index: Optional[hnswlib.Index] = None
+        self.vector_file: Optional[VectorFile] = None
+        if self.config["dim"]:
+            self._open_index()
+        self._save_config()
+
+    @property
+    def name(self) -> str:
+        return self.config["name"]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.config["metadata"]
+
+    @property
+    def space(self) -> str:
+        return self.metadata.get("hnsw:space", "l2")
+
+    def _hnsw_param(self, key: str, default: int) -> int:
+        return int(self.metadata.get(f"hnsw:{key}", default))
+
+    def _open_index(self) -> None:
+        dim, capacity = self.config["dim"], self.config["capacity"]
+        self.vector_file = VectorFile(self.directory, dim, self.config["dtype"], capacity)
+        self.index = hnswlib.Index(space=self.space, dim=dim)
+        index_path = self.directory / INDEX_FILE
+        if index_path.exists():
+            self.index.load_index(str(index_path), max_elements=capacity)
+        else:
+            self.index.init_index(
+                max_elements=capacity,
+                ef_construction=self._hnsw_param("construction_ef", 100),
+                M=self._hnsw_param("M", 16)
+            )
+        self.index.set_ef(self._hnsw_param("search_ef", 10))
+        self._recover_index()
+
+    def _recover_index(self) -> None:
+        """Áp lại các thao tác ghi sau lần ghi index.bin cuối (process dừng trước khi flush)"""
+        # Collection tạo trước khi có các trường này: index luôn được ghi cùng mỗi thao tác
+        index_next_label = self.config.setdefault("index_next_label", self.config["next_label"])
+        index_deleted = self.config.setdefault("index_deleted", self.config["deleted"])
+        if index_next_label == self.config["next_label"] and index_deleted == self.config["deleted"]:
+            return
+
+        added = [
+            row[0] for row in self.db.execute(
+                "SELECT label FROM items WHERE label >= ? ORDER BY label", (index_next_label,)
+            )
+        ]
+        for start in range(0, len(added), 10000):
+            batch = added[start:start + 10000]
+            self.index.add_items(self.vector_file.read(batch), np.asarray(batch))
+
+        removed = 0
+        if index_deleted != self.config["deleted"]:
+            present = set(self._select_labels())
+            for label in self.index.get_ids_list():
+                if label not in present:
+                    try:
+                        self.index.mark_deleted(int(label))
+                        removed += 1
+                    except RuntimeError:
+                        pass
+
+        logger.warning(
+            f"Collection '{self.name}': áp lại {len(added)} vectors thêm và {removed} vectors xóa "
+            f"chưa có trong index.bin"
+        )
+        self._index_dirty = True
+    def _ensure_capacity(self, dim: int, needed: int) -> None:
+        if self.config["dim"] is None:
+            self.config["dim"] = dim
+            self.config["capacity"] = max(self.INITIAL_CAPACITY, needed)
+            self._open_index()
+            return
+        if dim != self.config["dim"]:
+            raise ValueError(f"Embedding có {dim} chiều, collection '{self.name}' dùng {self.config['dim']} chiều")
+        if needed > self.config["capacity"]:
+            capacity = max(needed, self.config["capacity"] * 2)
+            self.index.resize_index(capacity)
+            self.vector_file.resize(capacity)
+            self.config["capacity"] = capacity
+
+    def _save_config(self) -> None:
+        tmp_path = self.directory / (CONFIG_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(self.config, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.directory / CONFIG_FILE)
+
+    def _persist(self) -> None:
+        """Ghi vectors, metadata và cấu hình sau mỗi thao tác ghi; index.bin theo chu kỳ"""
+        if self.index is not None:
+            self.vector_file.flush()
+            self._index_dirty = True
+        self._save_config()
+        self.db.commit()
+        if self.persist_interval <= 0:
+            self._save_index()
+
+    def _save_index(self) -> None:
+        """Ghi HNSW graph xuống index.bin (gọi khi giữ lock)"""
+        if self.index is None or not self._index_dirty:
+            return
+        tmp_path = self.directory / (INDEX_FILE + ".tmp")
+        self.index.save_index(str(tmp_path))
+        os.replace(tmp_path, self.directory / INDEX_FILE)
+        self.config["index_next_label"] = self.config["next_label"]
+        self.config["index_deleted"] = self.config["deleted"]
+        self._save_config()
+        self._index_dirty = False
+        self._index_saved_at = time.monotonic()
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Ghi index.bin nếu có thay đổi
+
+        Args:
+            force: Ghi ngay, không chờ đủ ``persist_interval`` kể từ lần ghi trước
+        """
+        with self._lock:
+            if force or time.monotonic() - self._index_saved_at >= self.persist_interval:
+                self._save_index()
+
+    def count(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def deleted_count(self) -> int:
+        """Số vectors đã xóa nhưng còn trong HNSW graph"""
+        return self.config["deleted"]
+
+    def memory_bytes(self) -> int:
+        """Dung lượng vector storage (memmap) hiện tại"""
+        return self.vector_file.nbytes if self.vector_file is not None else 0
+
+    def _labels_for_ids(self, ids: List[str]) -> Dict[str, int]:
+        labels = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT id, label FROM items WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            labels.update(rows)
+        return labels
+
+    def _write(self, ids, documents, metadatas, embeddings) -> None:
+        if embeddings is None:
+            raise ValueError("HNSW backend cần embeddings (không tự embed text)")
+        if not ids:
+            return
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        start = self.config["next_label"]
+        self._ensure_capacity(vectors.shape[1], start + len(ids))
+
+        labels = np.arange(start, start + len(ids))
+        self.vector_file.write(start, vectors)
+        self.index.add_items(vectors, labels)
+        self.db.executemany(
+            "INSERT INTO items (label, id, document, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (int(label), doc_id, document, json.dumps(metadata or {}, ensure_ascii=False))
+                for label, doc_id, document, metadata in zip(labels, ids, documents, metadatas)
+            ]
+        )
+        self.config["next_label"] = start + len(ids)
+
+    def add(self, ids, documents, metadatas, embeddings=None) -> None:
+        with self._lock:
+            existing = self._labels_for_ids(list(ids))
+            if existing:
+                logger.warning(f"Bỏ qua {len(existing)} IDs đã tồn tại trong '{self.name}'")
+                keep = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+                ids = [ids[i] for i in keep]
+                documents = [documents[i] for i in keep]
+                metadatas = [metadatas[i] for i in keep]
+                embeddings = [embeddings[i] for i in keep] if embeddings is not None else None
+            self._write(ids, documents, metadatas, embeddings)
+            self._persist()
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        with self._lock:
+            self._delete_labels(list(self._labels_for_ids(list(ids)).values()))
+            self._write(ids, documents, metadatas, embeddings)
+            self._persist()
+
+    def _select_labels(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> List[int]:
+        clauses, params = [], []
+        if ids is not None:
+            if not ids:
+                return []
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            sql, where_params = where_to_sql(where)
+            clauses.append(sql)
+            params.extend(where_params)
+
+        query = "SELECT label FROM items"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY label"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset or 0])
+        return [row[0] for row in self.db.execute(query, params).fetchall()]
+
+    def _rows(self, labels: Sequence[int]) -> Dict[int, tuple]:
+        rows = {}
+        labels = [int(label) for label in labels]
+        for start in range(0, len(labels), 500):
+            batch = labels[start:start + 500]
+            for row in self.db.execute(
+                f"SELECT label, id, document, metadata FROM items WHERE label IN ({','.join('?' * len(batch))})",
+                batch
+            ):
+                rows[row[0]] = row
+        return rows
+
+    def _distances(self, query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Khoảng cách theo cùng quy ước với hnswlib/ChromaDB"""
+        if self.space == "l2":
+            return ((vectors - query) ** 2).sum(axis=1)
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1) * max(np.linalg.norm(query), 1e-12)
+            return 1.0 - (vectors @ query) / np.maximum(norms, 1e-12)
+        return 1.0 - vectors @ query
+
+    def _knn(self, query: np.ndarray, k: int, allowed: Optional[List[int]]) -> Tuple[List[int], List[float]]:
+        if allowed is not None and len(allowed) <= self.BRUTE_FORCE_LIMIT:
+            distances = self._distances(query, self.vector_file.read(allowed))
+            order = np.argsort(distances)[:k]
+            return [allowed[i] for i in order], [float(distances[i]) for i in order]
+
+        allowed_set = set(allowed) if allowed is not None else None
+        try:
+            self.index.set_ef(max(k, self._hnsw_param("search_ef", 10)))
+            labels, distances = self.index.knn_query(
+                query, k=k,
+                filter=(lambda label: label in allowed_set) if allowed_set is not None else None
+            )
+            return [int(label) for label in labels[0]], [float(d) for d in distances[0]]
+        except RuntimeError:
+            # hnswlib không tìm đủ k kết quả (filter quá chặt): tính chính xác
+            candidates = allowed if allowed is not None else self._select_labels()
+            distances = self._distances(query, self.vector_file.read(candidates))
+            order = np.argsort(distances)[:k]
+            return [candidates[i] for i in order], [float(distances[i]) for i in order]
+
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE
+    ) -> Dict[str, Any]:
+        if query_embeddings is None:
+            raise ValueError("HNSW backend cần query_embeddings (không tự embed text)")
+
+        result = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        with self._lock:
+            allowed = self._select_labels(where=where) if where else None
+            total = len(allowed) if allowed is not None else self.count()
+
+            for query in np.asarray(query_embeddings, dtype=np.float32):
+                k = min(n_results, total)
+                labels, distances = self._knn(query, k, allowed) if k > 0 and self.index is not None else ([], [])
+                rows = self._rows(labels)
+                hits = [(label, distance) for label, distance in zip(labels, distances) if label in rows]
+
+                result["ids"].append([rows[label][1] for label, _ in hits])
+                result["documents"].append([rows[label][2] for label, _ in hits])
+                result["metadatas"].append([json.loads(rows[label][3]) for label, _ in hits])
+                result["distances"].append([distance for _, distance in hits])
+                if "embeddings" in include:
+                    result["embeddings"].append(
+                        self.vector_file.read([label for label, _ in hits]).tolist() if hits else []
+                    )
+
+        return {key: value if key == "ids" or key in include else None for key, value in result.items()}
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE
+    ) -> Dict[str, Any]:
+        with self._lock:
+            labels = self._select_labels(ids, where, limit, offset)
+            rows = self._rows(labels)
+            return {
+                "ids": [rows[label][1] for label in labels],
+                "documents": [rows[label][2] for label in labels] if "documents" in include else None,
+                "metadatas": [json.loads(rows[label][3]) for label in labels] if "metadatas" in include else None,
+                "embeddings": (
+                    self.vector_file.read(labels).tolist() if labels else []
+                ) if "embeddings" in include else None
+            }
+
+    def _delete_labels(self, labels: List[int]) -> None:
+        if not labels:
+            return
+        for label in labels:
+            try:
+                self.index.mark_deleted(int(label))
+            except RuntimeError:
+                pass
+        for start in range(0, len(labels), 500):
+            batch = labels[start:start + 500]
+            self.db.execute(f"DELETE FROM items WHERE label IN ({','.join('?' * len(batch))})", batch)
+        self.config["deleted"] += len(labels)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        if ids is None and not where:
+            return
+        with self._lock:
+            self._delete_labels(self._select_labels(ids, where))
+            self._persist()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.vector_file is not None:
+                self.vector_file.flush()
+            self._save_index()
+            self.db.close()
+
+
+class HnswBackend(VectorBackend):
+    """
+    Vector engine chạy trong process: hnswlib + memmap float16/int8 + SQLite sidecar
+
+    Nhẹ hơn ChromaDB cho tenant nhỏ (không có server/segment riêng). Không tự
+    embed text: ``VectorStoreManager`` truyền embeddings đã tính sẵn.
+    """
+
+    name = "hnsw"
+    embeds_text = False
+
+    def __init__(self, root: Path, dtype: str = "float16", persist_interval: float = 0.0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dtype = dtype
+        self.persist_interval = persist_interval
+        self._collections: Dict[str, HnswCollection] = {}
+        self._lock = threading.Lock()
+
+        # Thread ghi index.bin của các collections có thay đổi theo chu kỳ
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if persist_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="hnsw-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.persist_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Ghi index.bin của các collections có thay đổi"""
+        with self._lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            try:
+                collection.flush(force=True)
+            except Exception as e:
+                logger.error(f"Không thể ghi index của collection '{collection.name}': {str(e)}")
+
+    def close(self) -> None:
+        """Dừng thread flush và đóng mọi collection (ghi index.bin còn thay đổi)"""
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self._lock:
+            collections, self._collections = list(self._collections.values()), {}
+        for collection in collections:
+            try:
+                collection.close()
+            except Exception as e:
+                logger.warning(f"Không thể đóng collection '{collection.name}': {str(e)}")
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> HnswCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = HnswCollection(
+                    self.root / name, name, metadata, self.dtype, self.persist_interval
+                )
+            return self._collections[name]
+
+    def get_collection(self, name: str) -> HnswCollection:
+        if name not in self._collections and not (self.root / name / CONFIG_FILE).exists():
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            if not (self.root / name).exists():
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(self.root / name)
+
+    def rename_collection(self, name: str, new_name: str) -> None:
+        with self._lock:
+            if (self.root / new_name).exists():
+                raise ValueError(f"Collection {new_name} already exists.")
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            os.rename(self.root / name, self.root / new_name)
+
+            config_path = self.root / new_name / CONFIG_FILE
+            config = json.loads(config_path.read_text(encoding="utf-8"))
+            config["name"] = new_name
+            config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+
+    def list_collections(self) -> List[HnswCollection]:
+        names = sorted(
+            path.name for path in self.root.iterdir()
+            if (path / CONFIG_FILE).exists()
+        )
+        return [self.get_or_create_collection(name) for name in names]
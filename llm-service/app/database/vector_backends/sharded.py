@@ -0,0 +1,201 @@
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Sequence, Set
+
+from database.vector_backends.base import (
+    VectorCollection, DEFAULT_QUERY_INCLUDE, DEFAULT_GET_INCLUDE
+)
+
+
+def shard_collection_name(name: str, shard: int) -> str:
+    """Tên sub-collection của shard"""
+    return f"{name}_shard_{shard}"
+
+
+class ShardedCollection(VectorCollection):
+    """
+    Collection logic chia thành N sub-collections theo hash của một metadata key
+
+    Vectors được ghi vào shard ``crc32(str(metadata[shard_key])) % N``.
+    Query có filter cố định shard key (``$eq``/``$in``) chỉ chạy trên các shard
+    tương ứng; query còn lại chạy song song trên tất cả shards (hnswlib nhả GIL
+    khi search nên các shard dùng được nhiều core) rồi gộp top-k theo khoảng cách.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        shards: List[VectorCollection],
+        shard_key: str,
+        max_workers: Optional[int] = None
+    ):
+        self._name = name
+        self.shards = shards
+        self.shard_key = shard_key
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(shards),
+            thread_name_prefix="shard-search"
+        )
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        # Các shards được tạo cùng cấu hình HNSW
+        return self.shards[0].metadata
+
+    def shard_for(self, value: Any) -> int:
+        """Shard chứa các vectors có giá trị shard key này"""
+        return zlib.crc32(str(value).encode("utf-8")) % len(self.shards)
+
+    def target_shards(self, where: Optional[Dict[str, Any]]) -> Optional[Set[int]]:
+        """
+        Các shards có thể chứa kết quả của where clause
+
+        Returns:
+            Set shard index, hoặc None nếu phải quét tất cả shards
+        """
+        if not where:
+            return None
+
+        targets: Optional[Set[int]] = None
+        for key, value in where.items():
+            found: Optional[Set[int]] = None
+            if key == "$and":
+                for condition in value:
+                    sub = self.target_shards(condition)
+                    if sub is not None:
+                        found = sub if found is None else found & sub
+            elif key == "$or":
+                subs = [self.target_shards(condition) for condition in value]
+                if subs and all(sub is not None for sub in subs):
+                    found = set().union(*subs)
+            elif key == self.shard_key:
+                if not isinstance(value, dict):
+                    found = {self.shard_for(value)}
+                elif "$eq" in value:
+                    found = {self.shard_for(value["$eq"])}
+                elif "$in" in value:
+                    found = {self.shard_for(v) for v in value["$in"]}
+            if found is not None:
+                targets = found if targets is None else targets & found
+        return targets
+
+    def _shards_for(self, where: Optional[Dict[str, Any]]) -> List[int]:
+        targets = self.target_shards(where)
+        return sorted(targets) if targets is not None else list(range(len(self.shards)))
+
+    def _route(self, ids, documents, metadatas, embeddings) -> Dict[int, Dict[str, list]]:
+        groups: Dict[int, Dict[str, list]] = {}
+        for i, doc_id in enumerate(ids):
+            metadata = metadatas[i] or {}
+            if self.shard_key not in metadata:
+                raise ValueError(f"Metadata của '{doc_id}' thiếu shard key '{self.shard_key}'")
+            group = groups.setdefault(
+                self.shard_for(metadata[self.shard_key]),
+                {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            )
+            group["ids"].append(doc_id)
+            group["documents"].append(documents[i])
+            group["metadatas"].append(metadata)
+            if embeddings is not None:
+                group["embeddings"].append(embeddings[i])
+        for group in groups.values():
+            if embeddings is None:
+                group["embeddings"] = None
+        return groups
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards)
+
+    def add(self, ids, documents, metadatas, embeddings=None) -> None:
+        for shard, group in self._route(ids, documents, metadatas, embeddings).items():
+            self.shards[shard].add(**group)
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        for shard, group in self._route(ids, documents, metadatas, embeddings).items():
+            self.shards[shard].upsert(**group)
+
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE
+    ) -> Dict[str, Any]:
+        include = list(include)
+        if "distances" not in include:
+            include.append("distances")
+
+        shards = self._shards_for(where)
+        futures = [
+            self.executor.submit(
+                self.shards[shard].query,
+                query_embeddings=query_embeddings,
+                query_texts=query_texts,
+                n_results=n_results,
+                where=where,
+                include=include
+            )
+            for shard in shards
+        ]
+        partials = [future.result() for future in futures]
+
+        n_queries = len(query_embeddings if query_embeddings is not None else query_texts)
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "distances", "embeddings") if key in include]
+        merged = {key: [] for key in keys}
+        for q in range(n_queries):
+            hits = []
+            for partial in partials:
+                for i, distance in enumerate(partial["distances"][q]):
+                    hits.append((distance, partial, i))
+            top = heapq.nsmallest(n_results, hits, key=lambda hit: hit[0])
+            for key in keys:
+                merged[key].append([partial[key][q][i] for _, partial, i in top])
+        return merged
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE
+    ) -> Dict[str, Any]:
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "embeddings") if key in include]
+        result = {key: [] for key in keys}
+        skip = offset or 0
+        remaining = limit
+
+        # Đọc lần lượt từng shard, áp dụng offset/limit trên thứ tự shard nối tiếp nhau.
+        # Mỗi shard chỉ trả về trang cần lấy (limit/offset được đẩy xuống shard)
+        for shard in self._shards_for(where):
+            if remaining is not None and remaining <= 0:
+                break
+            collection = self.shards[shard]
+            if skip and ids is None and where is None:
+                size = collection.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+            part = collection.get(ids=ids, where=where, limit=remaining, offset=skip or None, include=include)
+            if skip and not part["ids"]:
+                # Offset vượt quá số kết quả của shard: đếm kết quả (chỉ IDs) để trừ vào offset
+                skip -= min(skip, len(collection.get(ids=ids, where=where, include=[])["ids"]))
+                continue
+            skip = 0
+
+            for key in keys:
+                result[key].extend(part[key] or [])
+            if remaining is not None:
+                remaining -= len(part["ids"])
+
+        return {key: result.get(key) for key in ("ids", "documents", "metadatas", "embeddings")}
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        for shard in self._shards_for(where):
+            self.shards[shard].delete(ids=ids, where=where)
@@ -1,61 +1,90 @@
+import functools
 import logging
-from typing import Optional, List, Dict, Any
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+import threading
+from typing import Optional, List, Dict, Any, Callable
 from llama_index.core import VectorStoreIndex, StorageContext
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.schema import Document as LlamaDocument
 
 from core.config import settings
-from core.embedding_config import get_embed_model
+from core.embedding_config import get_embed_model, embedding_manager
+from core.model_client import owner_call
+from database.shared_state import shared_state
+from database.vector_backends import VectorBackend, VectorCollection, create_backend
+from database.vector_backends.sharded import ShardedCollection, shard_collection_name
 
 logger = logging.getLogger(__name__)
 
 
+def _write_locked(method):
+    """Chạy thao tác ghi trong write lock (maintenance giữ lock khi rebuild/snapshot)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class VectorStoreManager:
     """
-    Quản lý Vector Store sử dụng ChromaDB
+    Quản lý Vector Store (ChromaDB hoặc HNSW backend, xem ``settings.vector_backend``)
     Lưu trữ và tìm kiếm knowledge theo user_id
+    
+    Ở chế độ client (``MODEL_SERVER_MODE=client``), model server là process duy
+    nhất mở backend (HNSW index nằm trong RAM của process); các uvicorn workers
+    có ``remote = True`` và gửi các methods ``@owner_call`` đến model server.
+    Code bên ngoài chỉ dùng các methods public này, không dùng ``client``/``collections``.
     """
     
     def __init__(self):
-        self.chroma_client: Optional[chromadb.Client] = None
+        # True: backend nằm ở model server (uvicorn worker ở chế độ client)
+        self.remote = False
+        self.client: Optional[VectorBackend] = None
         self.vector_store: Optional[ChromaVectorStore] = None
-        self.collections: Dict[str, chromadb.Collection] = {}
+        self.collections: Dict[str, VectorCollection] = {}
+        
+        # Callbacks khi knowledge của user thay đổi trong process này (version
+        # knowledge nằm trong shared state, dùng chung giữa các processes)
+        self._knowledge_listeners: List[Callable[[int], None]] = []
+        
+        # Ghi/xóa và maintenance (rebuild, snapshot) không chạy đồng thời
+        self.write_lock = threading.RLock()
+        # Số vectors đã xóa theo collection kể từ lần rebuild gần nhất
+        self.deleted_counts: Dict[str, int] = {}
+        # Collections có vectors của embedding model khác model hiện tại
+        # (vd: tạo bằng embedding function mặc định của ChromaDB), cần re-embed
+        self.incompatible_collections: Dict[str, Dict[str, Any]] = {}
         
-    def initialize(self) -> None:
+    def initialize(self, run_self_test: bool = True) -> None:
         """
-        Khởi tạo ChromaDB client và collections
+        Khởi tạo vector backend và collections
+        
+        Args:
+            run_self_test: Chạy test add/query sau khi khởi tạo (tắt cho các CLI tools)
         """
         try:
-            logger.info("Đang khởi tạo ChromaDB Vector Store...")
+            logger.info(f"Đang khởi tạo Vector Store (backend: {settings.vector_backend})...")
             
-            # Cấu hình ChromaDB
-            chroma_settings = ChromaSettings(
-                persist_directory=str(settings.chroma_persist_directory),
-                anonymized_telemetry=False,  # Tắt telemetry
-                allow_reset=True,  # Cho phép reset database nếu cần
-            )
-            
-            # Khởi tạo ChromaDB client (persistent)
-            self.chroma_client = chromadb.PersistentClient(
-                path=str(settings.chroma_persist_directory),
-                settings=chroma_settings
-            )
+            # Khởi tạo vector backend (persistent)
+            self.client = create_backend(settings.vector_backend)
             
             # Tạo collection chính cho toàn bộ hệ thống
             self._ensure_collection(settings.chroma_collection_name)
             
+            # Kiểm tra embeddings đã lưu có cùng model/dimension với embedding model hiện tại
+            self.check_embedding_compatibility()
+            
             logger.info("✅ Vector Store khởi tạo thành công!")
             
             # Test vector store
-            self._test_vector_store()
+            if run_self_test:
+                self._test_vector_store()
             
         except Exception as e:
             logger.error(f"❌ Lỗi khi khởi tạo Vector Store: {str(e)}")
             raise
     
-    def _ensure_collection(self, collection_name: str) -> chromadb.Collection:
+    def _ensure_collection(self, collection_name: str) -> VectorCollection:
         """
         Đảm bảo collection tồn tại, tạo mới nếu chưa có
         
@@ -63,22 +92,37 @@ class VectorStoreManager:
             collection_name: Tên collection
             
         Returns:
-            ChromaDB Collection
+            Vector Collection
         """
         try:
-            # Get or create collection
-            collection = self.chroma_client.get_or_create_collection(
-                name=collection_name,
-                metadata={"description": f"Knowledge base for {collection_name}"}
-            )
+            if collection_name == settings.chroma_collection_name and settings.vector_shard_count > 1:
+                # Global collection chia shard: dùng lại wrapper đã tạo (giữ thread pool)
+                collection = self.collections.get(collection_name)
+                if not isinstance(collection, ShardedCollection):
+                    collection = ShardedCollection(
+                        collection_name,
+                        [
+                            self._open_collection(shard_collection_name(collection_name, i))
+                            for i in range(settings.vector_shard_count)
+                        ],
+                        settings.vector_shard_key
+                    )
+            else:
+                collection = self._open_collection(collection_name)
             
             # Cache collection
             self.collections[collection_name] = collection
             
-            # Create LlamaIndex vector store wrapper
-            if collection_name == settings.chroma_collection_name:
+            # Create LlamaIndex vector store wrapper (chỉ với ChromaDB backend;
+            # CLI tools có thể chạy không cần embedding model)
+            if (
+                collection_name == settings.chroma_collection_name
+                and self.client.name == "chroma"
+                and not isinstance(collection, ShardedCollection)
+                and embedding_manager.embed_model is not None
+            ):
                 self.vector_store = ChromaVectorStore(
-                    chroma_collection=collection,
+                    chroma_collection=collection.raw,
                     embed_model=get_embed_model()
                 )
             
@@ -89,6 +133,148 @@ class VectorStoreManager:
             logger.error(f"Lỗi khi tạo/lấy collection: {str(e)}")
             raise
     
+    @owner_call("vector_store")
+    def ensure_collection(self, collection_name: str) -> None:
+        """
+        Mở collection (tạo mới nếu chưa có) nếu chưa được mở
+        
+        Args:
+            collection_name: Tên collection
+        """
+        if collection_name not in self.collections:
+            self._ensure_collection(collection_name)
+    
+    @owner_call("vector_store")
+    def has_collection(self, collection_name: str) -> bool:
+        """Collection đã được mở (đã có dữ liệu được ghi hoặc đã ensure)"""
+        return collection_name in self.collections
+    
+    def _open_collection(self, collection_name: str) -> VectorCollection:
+        """Lấy collection từ backend, tạo mới với cấu hình HNSW theo loại collection nếu chưa có"""
+        hnsw_config = self.get_hnsw_config(collection_name)
+        try:
+            # Collection đã có: giữ nguyên cấu hình HNSW lúc tạo
+            collection = self.client.get_collection(collection_name)
+            self._check_hnsw_config(collection, hnsw_config)
+        except ValueError:
+            collection = self.client.get_or_create_collection(
+                name=collection_name,
+                metadata={
+                    "description": f"Knowledge base for {collection_name}",
+                    "embedding_model": settings.embedding_model,
+                    **hnsw_config
+                }
+            )
+        return collection
+    
+    def _logical_collection_name(self, collection_name: str) -> str:
+        """Tên collection logic (shard của global collection thuộc global collection)"""
+        global_name = settings.chroma_collection_name
+        if collection_name.startswith(f"{global_name}_shard_"):
+            return global_name
+        return collection_name
+    
+    def check_embedding_compatibility(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Tìm các collections có vectors không dùng được với embedding model hiện tại
+        
+        Collection không tương thích nếu vector đã lưu có dimension khác model
+        hiện tại, hoặc metadata ghi embedding model khác. Các collections này bị
+        chặn ghi/search (lỗi rõ ràng thay vì lỗi dimension của backend) cho tới
+        khi được re-embed bằng ``python -m tools.reembed_collections``.
+        
+        Returns:
+            {tên collection: {"stored_dimension", "model_dimension", "embedding_model"}}
+        """
+        self.incompatible_collections = {}
+        if embedding_manager.embed_model is None:
+            return self.incompatible_collections
+        
+        model_dimension = embedding_manager._get_embedding_dimension()
+        for collection in self.client.list_collections():
+            if collection.name.endswith(("__rebuild", "__old")) or collection.count() == 0:
+                continue
+            sample = collection.get(limit=1, include=["embeddings"])
+            embeddings = sample.get("embeddings")
+            stored_dimension = len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+            stored_model = (collection.metadata or {}).get("embedding_model")
+            if stored_dimension == model_dimension and stored_model in (None, settings.embedding_model):
+                continue
+            
+            self.incompatible_collections[collection.name] = {
+                "stored_dimension": stored_dimension,
+                "model_dimension": model_dimension,
+                "embedding_model": stored_model
+            }
+            logger.error(
+                f"Collection '{collection.name}' có vectors dimension {stored_dimension} "
+                f"(model: {stored_model or 'không rõ'}), khác embedding model hiện tại "
+                f"{settings.embedding_model} ({model_dimension}); "
+                f"chạy 'python -m tools.reembed_collections' để re-embed"
+            )
+        return self.incompatible_collections
+    
+    def _check_compatible(self, collection: VectorCollection) -> None:
+        """Chặn ghi/search trên collection cần re-embed"""
+        if not self.incompatible_collections:
+            return
+        name = collection.name
+        if name in self.incompatible_collections or any(
+            self._logical_collection_name(other) == name for other in self.incompatible_collections
+        ):
+            raise RuntimeError(
+                f"Collection '{name}' dùng embedding model khác model hiện tại, "
+                f"cần chạy 'python -m tools.reembed_collections'"
+            )
+    
+    def refresh_collection(self, collection_name: str) -> None:
+        """
+        Mở lại collection sau khi bị thay thế ở backend (vd: rebuild)
+        
+        Args:
+            collection_name: Tên collection (hoặc tên shard của global collection)
+        """
+        collection_name = self._logical_collection_name(collection_name)
+        self.collections.pop(collection_name, None)
+        self._ensure_collection(collection_name)
+    
+    def get_collection_class(self, collection_name: str) -> str:
+        """Loại collection: "user" (user_{id}_knowledge) hoặc "global" (còn lại)"""
+        if collection_name.startswith("user_") and collection_name.endswith("_knowledge"):
+            return "user"
+        return "global"
+    
+    def get_hnsw_config(self, collection_name: str) -> Dict[str, Any]:
+        """
+        Cấu hình HNSW cho collection theo loại collection
+        
+        Args:
+            collection_name: Tên collection
+            
+        Returns:
+            Metadata HNSW ({"hnsw:space", "hnsw:M", "hnsw:construction_ef", "hnsw:search_ef"})
+        """
+        prefix = self.get_collection_class(collection_name)
+        return {
+            "hnsw:space": getattr(settings, f"{prefix}_hnsw_space"),
+            "hnsw:M": getattr(settings, f"{prefix}_hnsw_m"),
+            "hnsw:construction_ef": getattr(settings, f"{prefix}_hnsw_construction_ef"),
+            "hnsw:search_ef": getattr(settings, f"{prefix}_hnsw_search_ef"),
+        }
+    
+    def _check_hnsw_config(self, collection: VectorCollection, expected: Dict[str, Any]) -> None:
+        """Cảnh báo nếu collection đã tạo với cấu hình HNSW khác settings hiện tại"""
+        metadata = collection.metadata or {}
+        different = [
+            key for key, value in expected.items()
+            if metadata.get(key, "l2" if key == "hnsw:space" else None) != value
+        ]
+        if different:
+            logger.warning(
+                f"Collection '{collection.name}' dùng cấu hình HNSW khác settings "
+                f"({', '.join(different)}); cần rebuild collection để áp dụng"
+            )
+    
     def _test_vector_store(self) -> None:
         """Test vector store với sample data"""
         try:
@@ -102,22 +288,16 @@ class VectorStoreManager:
             }
             
             # Test add
-            test_collection.add(
-                documents=[test_doc["text"]],
-                ids=[test_doc["id"]],
-                metadatas=[test_doc["metadata"]]
-            )
+            self.add_documents(documents=[test_doc], collection_name="test_collection")
             
             # Test query
-            results = test_collection.query(
-                query_texts=["test vector store"],
-                n_results=1
-            )
+            results = self._search_collection(test_collection, "test vector store", 1)
             
             logger.info("Test Vector Store thành công!")
             
             # Cleanup test collection
-            self.chroma_client.delete_collection("test_collection")
+            self.client.delete_collection("test_collection")
+            self.collections.pop("test_collection", None)
             
         except Exception as e:
             logger.error(f"Test Vector Store thất bại: {str(e)}")
@@ -135,11 +315,62 @@ class VectorStoreManager:
         """
         return f"user_{user_id}_knowledge"
     
+    def get_knowledge_version(self, user_id: int) -> int:
+        """
+        Lấy version hiện tại của knowledge base của user
+        
+        Version được lưu trong shared state nên thay đổi ở bất kỳ process nào
+        (worker khác, model server) đều làm cache phía trên (vd: fill cache) hết hạn.
+        
+        Args:
+            user_id: ID của user
+            
+        Returns:
+            Version (bắt đầu từ 0, tăng sau mỗi lần thay đổi)
+        """
+        return shared_state.get(f"knowledge:{int(user_id)}")
+    
+    def bump_knowledge_version(self, user_id: int) -> int:
+        """
+        Đánh dấu knowledge base của user đã thay đổi (ingest hoặc xóa)
+        và thông báo cho các listeners của process này
+        
+        Args:
+            user_id: ID của user
+            
+        Returns:
+            Version mới
+        """
+        user_id = int(user_id)
+        version = shared_state.bump(f"knowledge:{user_id}")
+        
+        for listener in list(self._knowledge_listeners):
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.warning(f"Knowledge listener lỗi: {str(e)}")
+        
+        return version
+    
+    def add_knowledge_listener(self, callback: Callable[[int], None]) -> None:
+        """
+        Đăng ký callback được gọi với user_id mỗi khi knowledge của user thay đổi
+        trong process này (process khác chỉ thấy version mới qua ``get_knowledge_version``)
+        
+        Args:
+            callback: Hàm nhận user_id
+        """
+        self._knowledge_listeners.append(callback)
+    
+    @owner_call("vector_store")
+    @_write_locked
     def add_documents(
         self,
         documents: List[Dict[str, Any]],
         user_id: Optional[int] = None,
-        collection_name: Optional[str] = None
+        collection_name: Optional[str] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        upsert: bool = False
     ) -> List[str]:
         """
         Thêm documents vào vector store
@@ -149,6 +380,8 @@ class VectorStoreManager:
                       [{"text": "...", "metadata": {...}, "id": "optional_id"}]
             user_id: ID của user (nếu lưu theo user)
             collection_name: Tên collection (nếu không dùng default)
+            embeddings: Vectors đã tính sẵn, tương ứng với documents (optional)
+            upsert: Ghi đè documents đã tồn tại cùng ID
             
         Returns:
             List document IDs đã thêm
@@ -166,6 +399,7 @@ class VectorStoreManager:
             texts = []
             metadatas = []
             ids = []
+            vectors = []
             
             for i, doc in enumerate(documents):
                 # Text content
@@ -175,6 +409,8 @@ class VectorStoreManager:
                     continue
                 
                 texts.append(text)
+                if embeddings is not None:
+                    vectors.append(embeddings[i])
                 
                 # Metadata
                 metadata = doc.get("metadata", {})
@@ -190,11 +426,19 @@ class VectorStoreManager:
                 logger.warning("Không có documents hợp lệ để thêm")
                 return []
             
-            # Add to ChromaDB
-            collection.add(
+            self._check_compatible(collection)
+            
+            # Backend không tự embed text (HNSW): tính embeddings bằng embedding model của service
+            if embeddings is None and not self.client.embeds_text:
+                embeddings = vectors = embedding_manager.embed_texts(texts)
+            
+            # Add to vector backend
+            write = collection.upsert if upsert else collection.add
+            write(
                 documents=texts,
                 metadatas=metadatas,
-                ids=ids
+                ids=ids,
+                embeddings=vectors if embeddings is not None else None
             )
             
             logger.info(f"Đã thêm {len(texts)} documents vào collection '{collection.name}'")
@@ -204,13 +448,15 @@ class VectorStoreManager:
             logger.error(f"Lỗi khi thêm documents: {str(e)}")
             raise
     
+    @owner_call("vector_store")
     def search(
         self,
         query: str,
         user_id: Optional[int] = None,
         collection_name: Optional[str] = None,
         n_results: int = 5,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Tìm kiếm documents trong vector store
@@ -221,6 +467,7 @@ class VectorStoreManager:
             collection_name: Tên collection
             n_results: Số kết quả tối đa
             filter_metadata: Metadata filters
+            query_embedding: Vector của query đã tính sẵn (optional)
             
         Returns:
             List kết quả với format: [{"text": "...", "metadata": {...}, "score": 0.9}]
@@ -229,6 +476,14 @@ class VectorStoreManager:
             # Xác định collection
             if collection_name:
                 collection = self._ensure_collection(collection_name)
+            elif user_id and settings.vector_storage_mode == "single":
+                # Single-collection mode: chunks chỉ nằm trong global collection
+                user_filter = dict(filter_metadata or {})
+                user_filter["user_id"] = str(user_id)
+                return self._search_collection(
+                    self.collections[settings.chroma_collection_name],
+                    query, n_results, user_filter, query_embedding
+                )
             elif user_id:
                 # Search trong cả user collection và global collection
                 results = []
@@ -238,16 +493,16 @@ class VectorStoreManager:
                 if user_collection_name in self.collections:
                     user_results = self._search_collection(
                         self.collections[user_collection_name],
-                        query, n_results // 2, filter_metadata
+                        query, n_results // 2, filter_metadata, query_embedding
                     )
                     results.extend(user_results)
                 
                 # Search global collection với filter user_id
-                global_filter = filter_metadata or {}
+                global_filter = dict(filter_metadata or {})
                 global_filter["user_id"] = str(user_id)
                 global_results = self._search_collection(
                     self.collections[settings.chroma_collection_name],
-                    query, n_results // 2, global_filter
+                    query, n_results // 2, global_filter, query_embedding
                 )
                 results.extend(global_results)
                 
@@ -258,34 +513,67 @@ class VectorStoreManager:
                 collection = self.collections[settings.chroma_collection_name]
             
             # Search single collection
-            return self._search_collection(collection, query, n_results, filter_metadata)
+            return self._search_collection(
+                collection, query, n_results, filter_metadata, query_embedding
+            )
             
         except Exception as e:
             logger.error(f"Lỗi khi search: {str(e)}")
             return []
     
+    @staticmethod
+    def build_where(filter_metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Chuyển dict filter thành ChromaDB where clause
+        
+        Giá trị thường được so sánh bằng ``$eq``; giá trị là dict operator
+        (vd: ``{"$in": [1, 2]}``) được giữ nguyên. ChromaDB yêu cầu ``$and``
+        có ít nhất 2 điều kiện nên filter 1 key được trả về trực tiếp.
+        
+        Args:
+            filter_metadata: Dict {key: value hoặc {operator: value}}
+            
+        Returns:
+            Where clause hoặc None
+        """
+        if not filter_metadata:
+            return None
+        
+        conditions = [
+            {key: value if isinstance(value, dict) else {"$eq": value}}
+            for key, value in filter_metadata.items()
+        ]
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
     def _search_collection(
         self,
-        collection: chromadb.Collection,
+        collection: VectorCollection,
         query: str,
         n_results: int,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search trong một collection cụ thể
         """
+        self._check_compatible(collection)
+        
         # Build where clause for metadata filtering
-        where_clause = None
-        if filter_metadata:
-            where_clause = {
-                "$and": [
-                    {key: {"$eq": value}} for key, value in filter_metadata.items()
-                ]
-            }
+        where_clause = self.build_where(filter_metadata)
+        
+        if query_embedding is None and not self.client.embeds_text:
+            query_embedding = embedding_manager.embed_text(query)
         
-        # Query ChromaDB
+        # Query vector backend
+        query_kwargs = (
+            {"query_embeddings": [query_embedding]}
+            if query_embedding is not None
+            else {"query_texts": [query]}
+        )
         results = collection.query(
-            query_texts=[query],
+            **query_kwargs,
             n_results=n_results,
             where=where_clause if where_clause else None,
             include=["documents", "metadatas", "distances"]
@@ -298,12 +586,21 @@ class VectorStoreManager:
             metadatas = results["metadatas"][0] if results["metadatas"] else [{}] * len(documents)
             distances = results["distances"][0] if results["distances"] else [0] * len(documents)
             
-            for doc, meta, dist in zip(documents, metadatas, distances):
+            ids = results["ids"][0] if results.get("ids") else [None] * len(documents)
+            
+            space = (collection.metadata or {}).get("hnsw:space", "l2")
+            
+            for doc_id, doc, meta, dist in zip(ids, documents, metadatas, distances):
                 # Convert distance to similarity score (0-1)
-                # ChromaDB uses L2 distance, so smaller is better
-                score = 1 / (1 + dist)  # Simple conversion
+                if space == "l2":
+                    # L2 distance, smaller is better
+                    score = 1 / (1 + dist)  # Simple conversion
+                else:
+                    # cosine/ip distance = 1 - similarity
+                    score = max(0.0, min(1.0, 1 - dist))
                 
                 formatted_results.append({
+                    "id": doc_id,
                     "text": doc,
                     "metadata": meta,
                     "score": score
@@ -311,6 +608,8 @@ class VectorStoreManager:
         
         return formatted_results
     
+    @owner_call("vector_store")
+    @_write_locked
     def delete_documents(
         self,
         document_ids: List[str],
@@ -336,15 +635,84 @@ class VectorStoreManager:
                 return 0
             
             # Delete documents
+            existing = collection.get(ids=document_ids, include=["metadatas"])
             collection.delete(ids=document_ids)
+            self._record_deleted_items(collection, existing)
+            deleted = len(existing.get("ids", []))
             
-            logger.info(f"Đã xóa {len(document_ids)} documents")
-            return len(document_ids)
+            logger.info(f"Đã xóa {deleted} documents")
+            return deleted
             
         except Exception as e:
             logger.error(f"Lỗi khi xóa documents: {str(e)}")
             return 0
     
+    @owner_call("vector_store")
+    @_write_locked
+    def delete_where(
+        self,
+        where: Dict[str, Any],
+        collection_name: Optional[str] = None
+    ) -> bool:
+        """
+        Xóa documents theo metadata filter
+        
+        Args:
+            where: ChromaDB where clause, vd: {"user_id": {"$eq": "1"}}
+            collection_name: Tên collection
+            
+        Returns:
+            Success status
+        """
+        try:
+            collection = self.collections.get(
+                collection_name or settings.chroma_collection_name
+            )
+            if not collection:
+                return False
+            
+            existing = collection.get(where=where, include=["metadatas"])
+            if existing.get("ids"):
+                # Global collection chia shard: where có shard key thì chỉ xóa trên shard đó
+                collection.delete(where=where)
+                self._record_deleted_items(collection, existing)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi xóa documents theo filter: {str(e)}")
+            return False
+    
+    @owner_call("vector_store")
+    def count_where(
+        self,
+        filter_metadata: Dict[str, Any],
+        collection_name: Optional[str] = None
+    ) -> int:
+        """
+        Đếm số documents thỏa metadata filter
+        
+        Args:
+            filter_metadata: Dict filter (xem ``build_where``)
+            collection_name: Tên collection
+            
+        Returns:
+            Số documents
+        """
+        try:
+            collection = self.collections.get(
+                collection_name or settings.chroma_collection_name
+            )
+            if not collection:
+                return 0
+            
+            results = collection.get(where=self.build_where(filter_metadata), include=[])
+            return len(results.get("ids", []))
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi đếm documents: {str(e)}")
+            return 0
+    
+    @owner_call("vector_store")
     def get_collection_stats(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Lấy thống kê về collection
@@ -373,6 +741,55 @@ class VectorStoreManager:
             logger.error(f"Lỗi khi lấy stats: {str(e)}")
             return {"error": str(e)}
     
+    @owner_call("vector_store")
+    def get_documents(
+        self,
+        ids: List[str],
+        collection_name: Optional[str] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Lấy documents theo IDs
+        
+        Args:
+            ids: List document IDs
+            collection_name: Tên collection (mặc định: global collection)
+            include: Các trường cần lấy ("documents", "metadatas", "embeddings")
+            
+        Returns:
+            Kết quả của backend ({"ids": [...], và các trường trong include})
+        """
+        collection_name = collection_name or settings.chroma_collection_name
+        self.ensure_collection(collection_name)
+        return self.collections[collection_name].get(
+            ids=ids, include=include or ["documents", "metadatas"]
+        )
+    
+    @owner_call("vector_store")
+    def get_health(self) -> str:
+        """Trạng thái cho health check: "healthy", "not initialized" hoặc collections cần re-embed"""
+        if self.client is None:
+            return "not initialized"
+        if self.incompatible_collections:
+            return f"cần re-embed: {', '.join(sorted(self.incompatible_collections))}"
+        return "healthy"
+    
+    def record_deleted(self, collection_name: str, count: int) -> None:
+        """Ghi nhận số vectors đã xóa (dùng để quyết định khi nào cần rebuild)"""
+        if count > 0:
+            self.deleted_counts[collection_name] = self.deleted_counts.get(collection_name, 0) + count
+    
+    def _record_deleted_items(self, collection: VectorCollection, items: Dict[str, Any]) -> None:
+        """Ghi nhận vectors đã xóa, theo từng shard nếu collection được chia shard"""
+        if not isinstance(collection, ShardedCollection):
+            self.record_deleted(collection.name, len(items.get("ids", [])))
+            return
+        for metadata in items.get("metadatas") or []:
+            shard = collection.shard_for((metadata or {}).get(collection.shard_key))
+            self.record_deleted(collection.shards[shard].name, 1)
+    
+    @owner_call("vector_store")
+    @_write_locked
     def clear_user_knowledge(self, user_id: int) -> bool:
         """
         Xóa toàn bộ knowledge của một user
@@ -387,22 +804,31 @@ class VectorStoreManager:
             # Xóa user-specific collection nếu có
             user_collection_name = self.get_user_collection_name(user_id)
             if user_collection_name in self.collections:
-                self.chroma_client.delete_collection(user_collection_name)
+                self.client.delete_collection(user_collection_name)
                 del self.collections[user_collection_name]
+                self.deleted_counts.pop(user_collection_name, None)
                 logger.info(f"Đã xóa collection '{user_collection_name}'")
             
             # Xóa documents của user trong global collection
-            global_collection = self.collections[settings.chroma_collection_name]
-            global_collection.delete(
-                where={"user_id": {"$eq": str(user_id)}}
+            self.delete_where(
+                {"user_id": {"$eq": str(user_id)}},
+                collection_name=settings.chroma_collection_name
             )
             
+            self.bump_knowledge_version(user_id)
             logger.info(f"Đã xóa toàn bộ knowledge của user {user_id}")
             return True
             
         except Exception as e:
             logger.error(f"Lỗi khi xóa user knowledge: {str(e)}")
             return False
+    
+    def close(self) -> None:
+        """Ghi các thay đổi còn trong bộ nhớ của backend xuống đĩa (khi shutdown)"""
+        if self.client is not None:
+            with self.write_lock:
+                self.client.close()
+            self.collections.clear()
 
 
 # Singleton instance
@@ -411,6 +837,11 @@ vector_store_manager = VectorStoreManager()
 
 def initialize_vector_store():
     """Initialize Vector Store - được gọi từ main.py"""
+    if settings.model_server_mode == "client":
+        # Model server sở hữu vector store, workers gửi thao tác qua socket
+        vector_store_manager.remote = True
+        logger.info(f"Vector Store chạy trong model server ({settings.model_server_socket})")
+        return
     vector_store_manager.initialize()
 
 
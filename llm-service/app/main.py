@@ -9,9 +9,20 @@ from core.config import settings
 from core.llm_config import initialize_llm
 from core.embedding_config import initialize_embeddings
 from core.error_handler import add_exception_handlers
-from database.vector_store import initialize_vector_store
+from database.vector_store import initialize_vector_store, vector_store_manager
 from database.mysql_client import mysql_client
-from routes import extraction, template
+from database.async_db import get_data_access_stats, shutdown_data_access
+from utils.single_flight import get_single_flight_stats
+from services.pdf_extraction import shutdown_pdf_pools
+from database.fact_store import initialize_fact_store
+from database.dedup_store import initialize_dedup_store
+from database.content_store import initialize_content_store
+from database.shared_state import initialize_shared_state
+from services.summary_service import summary_service
+from services.fact_extractor import fact_extractor
+from services.index_maintenance import index_maintenance
+from routes import extraction, template, maintenance
+from utils.file_utils import acquire_instance_lock
 
 # Cấu hình logging
 logging.basicConfig(
@@ -33,6 +44,15 @@ async def lifespan(app: FastAPI):
     logger.info(f"Khởi động {settings.service_name}...")
     
     try:
+        # Process sở hữu thư mục data (vector store, scheduler bảo trì): service ở
+        # chế độ local; ở chế độ client là model server, các uvicorn workers dùng chung
+        instance_lock = None
+        if settings.model_server_mode != "client":
+            instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+        
+        # Versions knowledge/templates và generation của job nền dùng chung giữa các workers
+        initialize_shared_state()
+        
         # Khởi tạo MySQL Client
         logger.info("Đang kết nối đến Backend Database...")
         mysql_client.initialize()
@@ -49,6 +69,27 @@ async def lifespan(app: FastAPI):
         logger.info("Đang khởi tạo Vector Store (ChromaDB)...")
         initialize_vector_store()
         
+        # Khởi tạo Fact Store
+        logger.info("Đang khởi tạo Fact Store...")
+        initialize_fact_store()
+        
+        # Khởi tạo Dedup Store (MinHash signatures của chunks)
+        logger.info("Đang khởi tạo Dedup Store...")
+        initialize_dedup_store()
+        
+        # Khởi tạo Content Store (text/chunks/vectors dùng chung theo SHA-256 của file)
+        logger.info("Đang khởi tạo Content Store...")
+        initialize_content_store()
+        
+        # Khởi động background job tóm tắt document
+        summary_service.start()
+        
+        # Khởi động background job LLM fact extraction (biến regex không tìm được)
+        fact_extractor.start()
+        
+        # Khởi động scheduler bảo trì vector index (giờ thấp điểm)
+        index_maintenance.start()
+        
         logger.info("Khởi tạo hoàn tất! AI Service sẵn sàng.")
         
     except Exception as e:
@@ -59,6 +100,14 @@ async def lifespan(app: FastAPI):
     
     # Cleanup khi shutdown
     logger.info("Đang dọn dẹp resources...")
+    await summary_service.stop()
+    await fact_extractor.stop()
+    await index_maintenance.stop()
+    shutdown_data_access()
+    shutdown_pdf_pools()
+    vector_store_manager.close()
+    if instance_lock is not None:
+        instance_lock.close()
     # Thêm cleanup logic nếu cần
 
 
@@ -95,6 +144,11 @@ app.include_router(
     prefix="/api/template",
     tags=["Template Processing"]
 )
+app.include_router(
+    maintenance.router,
+    prefix="/api/maintenance",
+    tags=["Index Maintenance"]
+)
 
 # Health check endpoint
 @app.get("/", tags=["Health Check"])
@@ -143,10 +197,7 @@ async def health_check():
             
         # Kiểm tra Vector Store
         from database.vector_store import vector_store_manager
-        if vector_store_manager.vector_store is not None:
-            health_status["components"]["vector_store"] = "healthy"
-        else:
-            health_status["components"]["vector_store"] = "not initialized"
+        health_status["components"]["vector_store"] = vector_store_manager.get_health()
             
         # Kiểm tra MySQL connection
         from database.mysql_client import test_connection
@@ -168,6 +219,21 @@ async def health_check():
     
     return health_status
 
+@app.get("/health/data-access", tags=["Health Check"])
+async def data_access_stats():
+    """
+    Thống kê thread pools của MySQL và vector store
+    (số workers đang bận, số request đang xếp hàng, thời gian từng operation)
+    """
+    return get_data_access_stats()
+
+@app.get("/health/single-flight", tags=["Health Check"])
+async def single_flight_stats():
+    """
+    Thống kê gộp request trùng (số lần chạy thật, số request chờ chung, timeouts)
+    """
+    return get_single_flight_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
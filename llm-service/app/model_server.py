@@ -0,0 +1,276 @@
+"""
+Model server: một process giữ LLM (GGUF), embedding model và vector store dùng chung
+
+Mỗi uvicorn worker tự load models sẽ nhân RAM lên theo số workers. Ở chế độ
+model server, process này load models một lần rồi phục vụ embedding/generation
+qua Unix socket; các process chạy với ``MODEL_SERVER_MODE=client`` (xem
+``core/model_client.py``) chỉ load tokenizer của embedding model (để chia
+chunks), nên service chạy được nhiều uvicorn workers trên nhiều cores, và
+restart service không phải load lại models.
+
+Model server cũng là process sở hữu thư mục data (giữ ``INSTANCE_LOCK_PATH``):
+vector store (ChromaDB/HNSW files, HNSW index trong RAM) và scheduler bảo trì
+chỉ chạy ở đây, workers gọi các methods ``@owner_call`` qua socket. State còn
+lại của workers dùng chung qua SQLite: versions knowledge/templates và
+generation của job nền (``database/shared_state.py``), fact/dedup/content stores;
+caches trong RAM của từng worker (fill cache, template router, cache MySQL)
+được kiểm tra lại với các versions này.
+
+    - Mỗi connection được phục vụ bởi một thread
+    - LLM (llama.cpp, tuần tự qua ``llm_manager.lock``) và embedding model
+      (tokenizer fast không an toàn khi gọi đồng thời, có lock riêng) không
+      chờ nhau, nên embedding không phải chờ generation đang chạy
+    - Socket được tạo với quyền 0600 và xác thực HMAC bằng ``MODEL_SERVER_AUTHKEY``
+      hoặc key ngẫu nhiên của thư mục data (``MODEL_SERVER_AUTHKEY_PATH``)
+
+Cách chạy (từ thư mục app/):
+    python -m model_server
+    MODEL_SERVER_MODE=client python -m uvicorn main:app --port 8001 --workers 4
+
+Các tools ghi vào thư mục data (backfill, re-embed, ...) giữ ``INSTANCE_LOCK_PATH``
+nên chỉ chạy khi service và model server đã dừng; ``python -m model_server
+--models-only`` chỉ phục vụ models (không mở thư mục data), để tools chạy với
+``MODEL_SERVER_MODE=client`` dùng chung models mà không phải load lại.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+from core.model_client import ModelServerError, model_server_authkey
+
+logger = logging.getLogger(__name__)
+
+
+class ModelServer:
+    """Phục vụ các operations của ``ModelServerClient`` bằng models và data của process này"""
+
+    def __init__(self, socket_path: str, load_llm: bool = True):
+        self.socket_path = socket_path
+        self.load_llm = load_llm
+        self.embed_lock = threading.Lock()
+        self.handlers: Dict[str, Callable[..., Any]] = {
+            "ping": self._ping,
+            "embed_texts": self._embed_texts,
+            "embed_query": self._embed_query,
+            "complete": self._complete,
+            "chat": self._chat,
+            "owner": self._owner,
+        }
+        # Instances nhận "owner" calls, chỉ có khi server sở hữu thư mục data
+        self.owner_targets: Dict[str, Any] = {}
+        self.instance_lock = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def load_models(self) -> None:
+        """Load models trong process này (bỏ qua MODEL_SERVER_MODE của file .env dùng chung)"""
+        from core.llm_config import initialize_llm
+        from core.embedding_config import initialize_embeddings
+
+        settings.model_server_mode = "local"
+        if self.load_llm:
+            logger.info("Đang khởi tạo Large Language Model...")
+            initialize_llm()
+        logger.info("Đang khởi tạo Embedding Model...")
+        initialize_embeddings()
+
+    def open_data(self) -> None:
+        """
+        Sở hữu thư mục data: mở vector store và chạy scheduler bảo trì
+
+        Gọi sau ``load_models`` (vector store embed bằng models của process này)
+        và trước ``serve_forever``, nên workers thấy socket là data đã sẵn sàng.
+        """
+        from database.shared_state import initialize_shared_state
+        from database.vector_store import vector_store_manager
+        from services.index_maintenance import index_maintenance
+        from utils.file_utils import acquire_instance_lock
+
+        self.instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+        initialize_shared_state()
+        logger.info("Đang khởi tạo Vector Store...")
+        vector_store_manager.initialize()
+
+        # Scheduler bảo trì là asyncio task: chạy event loop riêng trong thread nền
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start_maintenance(), self.loop).result()
+
+        self.owner_targets = {
+            "vector_store": vector_store_manager,
+            "index_maintenance": index_maintenance,
+        }
+
+    @staticmethod
+    async def _start_maintenance() -> None:
+        from services.index_maintenance import index_maintenance
+
+        index_maintenance.start()
+
+    def close_data(self) -> None:
+        """Dừng scheduler, ghi vector store xuống đĩa và nhả thư mục data"""
+        from database.vector_store import vector_store_manager
+        from services.index_maintenance import index_maintenance
+
+        if self.instance_lock is None:
+            return
+        self.owner_targets = {}
+        asyncio.run_coroutine_threadsafe(index_maintenance.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        vector_store_manager.close()
+        self.instance_lock.close()
+        self.instance_lock = None
+
+    def _ping(self) -> dict:
+        from core.llm_config import llm_manager
+        from core.embedding_config import embedding_manager
+
+        return {
+            "pid": os.getpid(),
+            "llm": llm_manager.llm is not None,
+            "embeddings": embedding_manager.embed_model is not None,
+            "embedding_model": settings.embedding_model,
+            "device": embedding_manager.device
+        }
+
+    def _embed_texts(self, texts):
+        from core.embedding_config import embedding_manager
+
+        with self.embed_lock:
+            return embedding_manager.embed_model.get_text_embedding_batch(texts)
+
+    def _embed_query(self, query: str):
+        from core.embedding_config import embedding_manager
+
+        with self.embed_lock:
+            return embedding_manager.embed_model.get_query_embedding(query)
+
+    def _complete(self, prompt: str, **kwargs) -> str:
+        from core.llm_config import llm_manager
+
+        return llm_manager.complete(prompt, **kwargs).text
+
+    def _chat(self, messages, **kwargs) -> str:
+        from core.llm_config import llm_manager
+
+        return llm_manager.chat(messages, **kwargs)
+
+    def _owner(self, target: str, method: str, *args, **kwargs) -> Any:
+        """Chạy method ``@owner_call`` của vector store / index maintenance"""
+        instance = self.owner_targets.get(target)
+        if instance is None:
+            raise ModelServerError(f"Model server không sở hữu thư mục data ({target}); chạy không có --models-only")
+        func = getattr(instance, method, None)
+        if not getattr(func, "owner_call", False):
+            raise ValueError(f"Method không hợp lệ: {target}.{method}")
+        return func(*args, **kwargs)
+
+    def _serve_connection(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    op, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    handler = self.handlers.get(op)
+                    if handler is None:
+                        raise ValueError(f"Operation không hợp lệ: {op}")
+                    response = ("ok", handler(*args, **kwargs))
+                except Exception as e:
+                    logger.error(f"Lỗi khi xử lý {op}: {str(e)}")
+                    if op == "owner" and type(e).__module__ == "builtins":
+                        # Giữ loại lỗi cho caller (vd: RuntimeError khi maintenance đang chạy -> 409)
+                        response = ("raise", e)
+                    else:
+                        response = ("error", f"{type(e).__name__}: {str(e)}")
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+    def _remove_stale_socket(self) -> None:
+        """Xóa socket còn sót của server đã dừng (không xóa socket của server đang chạy)"""
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            Client(self.socket_path, family="AF_UNIX", authkey=model_server_authkey()).close()
+        except AuthenticationError:
+            # Server khác (key khác) đang chạy trên socket này
+            pass
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        raise RuntimeError(f"Đã có model server đang chạy tại {self.socket_path}")
+
+    def serve_forever(self) -> None:
+        """Mở socket (sau khi load models) và phục vụ đến khi bị dừng"""
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        self._remove_stale_socket()
+
+        # Socket chỉ user chạy service truy cập được (tạo với quyền 0600 ngay từ đầu)
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.socket_path, family="AF_UNIX", authkey=model_server_authkey())
+        finally:
+            os.umask(old_umask)
+        logger.info(f"✅ Model server sẵn sàng tại {self.socket_path} (pid {os.getpid()})")
+
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    logger.warning(f"Không thể nhận connection: {str(e)}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model server dùng chung cho service và tools")
+    parser.add_argument("--socket", default=str(settings.model_server_socket), help="Đường dẫn Unix socket")
+    parser.add_argument("--no-llm", action="store_true", help="Chỉ load embedding model")
+    parser.add_argument(
+        "--models-only", action="store_true",
+        help="Không mở thư mục data (vector store, maintenance), dùng khi chạy tools"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    server = ModelServer(args.socket, load_llm=not args.no_llm)
+    server.load_models()
+    if not args.models_only:
+        from utils.file_utils import InstanceLockError
+
+        try:
+            server.open_data()
+        except InstanceLockError as e:
+            parser.exit(1, f"{e}\nDừng llm-service (chế độ local) hoặc tool đang chạy, hoặc dùng --models-only\n")
+    # SIGTERM (systemd, docker stop): dừng như Ctrl+C để ghi vector store xuống đĩa
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Dừng model server")
+    finally:
+        server.close_data()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ class DocumentType(str, Enum):
     DOCX = "docx"
     PPTX = "pptx"
     TXT = "txt"
+    XLSX = "xlsx"
+    CSV = "csv"
     UNKNOWN = "unknown"
 
 
@@ -193,6 +195,47 @@ class TemplateAnalysisResponse(BaseModel):
     suggestions: List[str] = Field(default=[], description="Gợi ý cải thiện template")
 
 
+class TemplateRouteRequest(BaseModel):
+    """Schema để chọn template phù hợp nhất cho câu hỏi"""
+    user_id: int = Field(..., description="ID của user sở hữu templates")
+    question: str = Field(..., min_length=1, max_length=500, description="Câu hỏi từ sinh viên")
+    top_k: int = Field(default=3, ge=1, le=20)
+    category: Optional[str] = Field(None, description="Chỉ xét templates thuộc category này")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "user_id": 1,
+                "question": "Deadline ASM môn toán lớp SE07102 là khi nào?",
+                "top_k": 3
+            }
+        }
+
+
+class TemplateRouteMatch(BaseModel):
+    """Một template được gợi ý"""
+    template_id: int
+    name: Optional[str] = None
+    category: Optional[str] = None
+    score: float = Field(..., ge=0.0, le=1.0, description="Cosine similarity với câu hỏi")
+
+
+class TemplateRouteResponse(BaseModel):
+    """Response cho template routing"""
+    question: str
+    matches: List[TemplateRouteMatch]
+    route_time: float = Field(..., description="Thời gian routing (seconds)")
+
+
+class TemplateIndexSyncRequest(BaseModel):
+    """Schema để đồng bộ template index khi backend thay đổi templates"""
+    user_id: int
+    template_id: Optional[int] = Field(
+        None,
+        description="Template vừa được tạo/sửa/xóa. Nếu None = build lại toàn bộ index của user"
+    )
+
+
 # =================== Search/Query Schemas ===================
 
 class SearchRequest(BaseModel):
@@ -246,6 +289,40 @@ class SearchResponse(BaseModel):
     search_time: float = Field(..., description="Thời gian search (seconds)")
 
 
+class BatchSearchRequest(BaseModel):
+    """Schema cho search nhiều queries trong một request"""
+    user_id: int
+    queries: List[str] = Field(..., min_length=1, description="Danh sách queries")
+    top_k: int = Field(default=5, ge=1, le=20)
+    search_scope: str = Field(
+        default="user",
+        description="Phạm vi search: 'user' hoặc 'global'"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        default={},
+        description="Filters cho metadata, áp dụng cho mọi query"
+    )
+    
+    @validator('search_scope')
+    def validate_scope(cls, v):
+        if v not in ['user', 'global']:
+            raise ValueError('search_scope phải là "user" hoặc "global"')
+        return v
+    
+    @validator('queries')
+    def validate_queries(cls, v):
+        if any(not query.strip() or len(query) > 500 for query in v):
+            raise ValueError('Mỗi query phải có từ 1 đến 500 ký tự')
+        return v
+
+
+class BatchSearchResponse(BaseModel):
+    """Response cho batch search request"""
+    total_queries: int
+    responses: List[SearchResponse]
+    search_time: float = Field(..., description="Tổng thời gian search (seconds)")
+
+
 # =================== Knowledge Management Schemas ===================
 
 class KnowledgeStats(BaseModel):
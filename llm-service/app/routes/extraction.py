@@ -1,7 +1,10 @@
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+import json
+import os
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request, Query
 from fastapi.responses import JSONResponse
+import asyncio
 import time
 
 from models.schemas import (
@@ -13,13 +16,20 @@ from models.schemas import (
     ErrorResponse,
     SearchRequest,
     SearchResponse,
+    BatchSearchRequest,
+    BatchSearchResponse,
     KnowledgeStats,
     DeleteKnowledgeRequest
 )
 from services.document_processor import DocumentProcessor
 from services.rag_service import RAGService
-from database.mysql_client import get_mysql_client, MySQLClient
+from services.query_batcher import query_batcher
+from services.token_chunker import token_chunker, chunk_stats
+from services.chunk_dedup import chunk_deduplicator
+from database.content_store import content_store
+from database.async_db import get_async_mysql_client, AsyncMySQLClient
 from core.config import settings
+from utils.file_utils import get_file_extension, spool_stream_to_file, FileTooLargeError
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +45,7 @@ rag_service = RAGService()
 async def extract_knowledge(
     request: DocumentUploadRequest,
     background_tasks: BackgroundTasks,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Extract knowledge từ một document
@@ -56,15 +66,16 @@ async def extract_knowledge(
         ExtractionResult: Kết quả extraction
     """
     try:
-        # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(request.user_id):
+        # Kiểm tra user tồn tại và lấy document trong một query
+        lookup = await mysql.get_document_for_user(request.document_id, request.user_id)
+        if not lookup["user_exists"]:
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {request.user_id} không tồn tại"
             )
         
         # Kiểm tra document tồn tại và thuộc về user
-        doc_info = mysql.get_document_by_id(request.document_id)
+        doc_info = lookup["document"]
         if not doc_info:
             raise HTTPException(
                 status_code=404,
@@ -78,7 +89,7 @@ async def extract_knowledge(
             )
         
         # Cập nhật status = processing
-        mysql.update_document_status(request.document_id, "processing")
+        await mysql.update_document_status(request.document_id, "processing")
         
         # Thực hiện extraction trong background
         background_tasks.add_task(
@@ -110,7 +121,8 @@ async def extract_knowledge(
 async def _process_document_extraction(
     request: DocumentUploadRequest,
     doc_info: dict,
-    mysql: MySQLClient
+    mysql: AsyncMySQLClient,
+    content_hash: Optional[str] = None
 ):
     """
     Background task để xử lý extraction
@@ -119,6 +131,7 @@ async def _process_document_extraction(
         request: Document upload request
         doc_info: Thông tin document từ DB
         mysql: MySQL client
+        content_hash: SHA-256 của file nếu đã tính khi nhận upload
     """
     start_time = time.time()
     
@@ -137,11 +150,12 @@ async def _process_document_extraction(
         chunks_extracted = await document_processor.process_document(
             file_path=request.file_path,
             user_id=request.user_id,
-            metadata=metadata
+            metadata=metadata,
+            content_hash=content_hash
         )
         
         # Cập nhật status = ready
-        mysql.update_document_status(request.document_id, "ready")
+        await mysql.update_document_status(request.document_id, "ready")
         
         processing_time = time.time() - start_time
         logger.info(
@@ -151,15 +165,157 @@ async def _process_document_extraction(
         
     except Exception as e:
         # Cập nhật status = error
-        mysql.update_document_status(request.document_id, "error")
+        await mysql.update_document_status(request.document_id, "error")
         logger.error(f"❌ Lỗi extraction document {request.document_id}: {str(e)}")
 
 
+@router.post("/extract-stream", response_model=ExtractionResult)
+async def extract_knowledge_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user_id: int = Query(..., description="ID của user sở hữu document"),
+    document_id: int = Query(..., description="ID của document từ backend"),
+    filename: Optional[str] = Query(None, description="Tên file gốc (mặc định theo DB)"),
+    metadata: Optional[str] = Query(None, description="Metadata bổ sung dạng JSON"),
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
+):
+    """
+    Extract knowledge từ nội dung file gửi trong request body
+    
+    Khác ``/extract`` (đọc ``file_path`` trên filesystem dùng chung với backend),
+    body được stream vào file tạm local của node đang xử lý request nên các
+    node llm-service không cần mount chung thư mục uploads. Giới hạn
+    ``max_file_size`` được kiểm tra theo Content-Length và trong lúc nhận
+    stream (413); SHA-256 được tính trong lúc ghi để content store không phải
+    đọc lại file. File tạm bị xóa sau khi extraction kết thúc.
+    
+    Args:
+        request: Request chứa bytes của document trong body
+        background_tasks: FastAPI background tasks
+        user_id: ID của user sở hữu document
+        document_id: ID của document
+        filename: Tên file gốc, quyết định parser theo extension
+        metadata: Metadata bổ sung (JSON object)
+        mysql: MySQL client dependency
+        
+    Returns:
+        ExtractionResult: Kết quả extraction
+    """
+    try:
+        try:
+            extra_metadata = json.loads(metadata) if metadata else {}
+        except json.JSONDecodeError:
+            extra_metadata = None
+        if not isinstance(extra_metadata, dict):
+            raise HTTPException(status_code=400, detail="metadata phải là JSON object")
+        
+        # Kiểm tra quyền trước khi nhận body
+        lookup = await mysql.get_document_for_user(document_id, user_id)
+        if not lookup["user_exists"]:
+            raise HTTPException(
+                status_code=404,
+                detail=f"User với ID {user_id} không tồn tại"
+            )
+        
+        doc_info = lookup["document"]
+        if not doc_info:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Document với ID {document_id} không tồn tại"
+            )
+        
+        if doc_info["owner_id"] != user_id:
+            raise HTTPException(
+                status_code=403,
+                detail="Bạn không có quyền truy cập document này"
+            )
+        
+        original_name = filename or doc_info["original_name"]
+        extension = get_file_extension(original_name).lower()
+        if extension not in settings.allowed_extensions:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Định dạng file không được hỗ trợ: {extension or original_name}"
+            )
+        
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.max_file_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File vượt quá giới hạn {settings.max_file_size} bytes"
+            )
+        
+        try:
+            file_path, size, content_hash = await spool_stream_to_file(
+                request.stream(),
+                str(settings.upload_spool_directory),
+                extension,
+                settings.max_file_size
+            )
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        if size == 0:
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Request body rỗng")
+        
+        logger.info(f"Đã nhận {size} bytes của document {document_id} qua stream")
+        
+        await mysql.update_document_status(document_id, "processing")
+        
+        upload_request = DocumentUploadRequest(
+            user_id=user_id,
+            document_id=document_id,
+            file_path=file_path,
+            metadata={**extra_metadata, "file_name": original_name}
+        )
+        background_tasks.add_task(
+            _process_stream_extraction,
+            upload_request,
+            doc_info,
+            mysql,
+            content_hash
+        )
+        
+        return ExtractionResult(
+            document_id=document_id,
+            status=ProcessingStatus.PROCESSING,
+            chunks_extracted=0,
+            error_message=None,
+            processing_time=None
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi extract document {document_id} qua stream: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi server: {str(e)}"
+        )
+
+
+async def _process_stream_extraction(
+    request: DocumentUploadRequest,
+    doc_info: dict,
+    mysql: AsyncMySQLClient,
+    content_hash: str
+):
+    """Background task của ``/extract-stream``: extract rồi xóa file tạm"""
+    try:
+        await _process_document_extraction(request, doc_info, mysql, content_hash)
+    finally:
+        try:
+            os.remove(request.file_path)
+        except OSError as e:
+            logger.warning(f"Không thể xóa file tạm {request.file_path}: {str(e)}")
+
+
 @router.post("/extract-batch", response_model=BatchExtractionResponse)
 async def extract_knowledge_batch(
     request: BatchExtractionRequest,
     background_tasks: BackgroundTasks,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Extract knowledge từ nhiều documents cùng lúc
@@ -174,7 +330,7 @@ async def extract_knowledge_batch(
     """
     try:
         # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(request.user_id):
+        if not await mysql.check_user_exists(request.user_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {request.user_id} không tồn tại"
@@ -186,7 +342,7 @@ async def extract_knowledge_batch(
         for doc_id in request.document_ids:
             try:
                 # Lấy thông tin document
-                doc_info = mysql.get_document_by_id(doc_id)
+                doc_info = await mysql.get_document_by_id(doc_id)
                 
                 if not doc_info:
                     results.append(ExtractionResult(
@@ -261,7 +417,7 @@ async def extract_knowledge_batch(
 @router.post("/search", response_model=SearchResponse)
 async def search_knowledge(
     request: SearchRequest,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Tìm kiếm trong knowledge base
@@ -275,7 +431,7 @@ async def search_knowledge(
     """
     try:
         # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(request.user_id):
+        if not await mysql.check_user_exists(request.user_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {request.user_id} không tồn tại"
@@ -310,10 +466,150 @@ async def search_knowledge(
         )
 
 
+@router.post("/search-batch", response_model=BatchSearchResponse)
+async def search_knowledge_batch(
+    request: BatchSearchRequest,
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
+):
+    """
+    Tìm kiếm nhiều queries trong một request
+    
+    Các queries được embed chung (micro-batching) và search song song
+    trên thread pool của vector store.
+    
+    Args:
+        request: Batch search request
+        mysql: MySQL client dependency
+        
+    Returns:
+        BatchSearchResponse: Kết quả của từng query theo đúng thứ tự
+    """
+    if len(request.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tối đa {settings.search_batch_max_queries} queries mỗi batch"
+        )
+    
+    try:
+        # Kiểm tra user tồn tại
+        if not await mysql.check_user_exists(request.user_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"User với ID {request.user_id} không tồn tại"
+            )
+        
+        start_time = time.time()
+        
+        async def _search_one(query: str) -> SearchResponse:
+            query_start = time.time()
+            results = await rag_service.search(
+                query=query,
+                user_id=request.user_id if request.search_scope == "user" else None,
+                top_k=request.top_k,
+                filters=request.filters
+            )
+            return SearchResponse(
+                query=query,
+                total_results=len(results),
+                results=results,
+                search_time=time.time() - query_start
+            )
+        
+        responses = await asyncio.gather(*(_search_one(query) for query in request.queries))
+        
+        return BatchSearchResponse(
+            total_queries=len(responses),
+            responses=list(responses),
+            search_time=time.time() - start_time
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi batch search: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi server: {str(e)}"
+        )
+
+
+@router.get("/search/batcher-stats")
+async def get_search_batcher_stats():
+    """
+    Thống kê micro-batching của search (batch size, độ trễ, throughput)
+    
+    Returns:
+        Batcher statistics
+    """
+    return query_batcher.get_stats()
+
+
+@router.get("/chunk-stats")
+async def get_chunk_stats():
+    """
+    Phân bố số tokens (tokenizer của embedding model) của các chunks đã tạo
+    
+    Returns:
+        Chunk statistics (min/mean/p50/p95/max, histogram, số chunks vượt giới hạn model)
+    """
+    try:
+        max_tokens = token_chunker.max_tokens
+    except Exception as e:
+        logger.warning(f"Không lấy được giới hạn tokens: {str(e)}")
+        max_tokens = None
+    
+    return {
+        "chunker": settings.chunker,
+        "max_tokens": max_tokens,
+        **chunk_stats.get_stats()
+    }
+
+
+@router.get("/dedup-stats")
+async def get_dedup_stats(user_id: Optional[int] = None):
+    """
+    Thống kê dedup chunks gần trùng lúc ingest
+    
+    Args:
+        user_id: Lấy thêm số chunks/vectors và dedup ratio của user này
+        
+    Returns:
+        Dedup statistics (dedup_ratio = số chunks chỉ lưu reference / tổng số chunks)
+    """
+    try:
+        return await asyncio.to_thread(chunk_deduplicator.get_stats, user_id)
+        
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy thống kê dedup: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
+
+
+@router.get("/content-store-stats")
+async def get_content_store_stats():
+    """
+    Thống kê kho nội dung dùng chung theo SHA-256 của file
+    
+    Returns:
+        Content store statistics (số nội dung, references, nội dung dùng chung, hit rate)
+    """
+    if content_store.conn is None:
+        return {"enabled": False}
+    
+    try:
+        return {
+            "enabled": settings.content_store_enabled,
+            **await asyncio.to_thread(content_store.get_stats)
+        }
+        
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy thống kê content store: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
+
+
 @router.get("/stats/{user_id}", response_model=KnowledgeStats)
 async def get_knowledge_stats(
     user_id: int,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Lấy thống kê về knowledge base của user
@@ -327,7 +623,7 @@ async def get_knowledge_stats(
     """
     try:
         # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(user_id):
+        if not await mysql.check_user_exists(user_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {user_id} không tồn tại"
@@ -337,7 +633,7 @@ async def get_knowledge_stats(
         stats = await rag_service.get_user_stats(user_id)
         
         # Lấy thông tin documents từ MySQL
-        documents = mysql.get_user_documents(user_id)
+        documents = await mysql.get_user_documents(user_id)
         
         return KnowledgeStats(
             user_id=user_id,
@@ -360,7 +656,7 @@ async def get_knowledge_stats(
 @router.post("/delete-knowledge")
 async def delete_knowledge(
     request: DeleteKnowledgeRequest,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Xóa knowledge của user
@@ -381,7 +677,7 @@ async def delete_knowledge(
             )
         
         # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(request.user_id):
+        if not await mysql.check_user_exists(request.user_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {request.user_id} không tồn tại"
@@ -420,7 +716,7 @@ async def delete_knowledge(
 @router.get("/extraction-status/{document_id}")
 async def get_extraction_status(
     document_id: int,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Kiểm tra trạng thái extraction của document
@@ -434,7 +730,7 @@ async def get_extraction_status(
     """
     try:
         # Lấy thông tin document
-        doc_info = mysql.get_document_by_id(document_id)
+        doc_info = await mysql.get_document_by_id(document_id)
         
         if not doc_info:
             raise HTTPException(
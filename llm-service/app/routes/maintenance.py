@@ -0,0 +1,82 @@
+import logging
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from services.index_maintenance import index_maintenance
+
+logger = logging.getLogger(__name__)
+
+# Khởi tạo router
+router = APIRouter()
+
+
+@router.get("/status")
+async def get_maintenance_status():
+    """
+    Trạng thái index maintenance và tỷ lệ vectors đã xóa của từng collection
+    
+    Returns:
+        Maintenance status
+    """
+    try:
+        return await run_in_threadpool(index_maintenance.get_status)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy maintenance status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
+
+
+@router.post("/run")
+async def run_maintenance(
+    rebuild: bool = True,
+    snapshot: bool = True,
+    collections: Optional[List[str]] = Query(default=None)
+):
+    """
+    Chạy maintenance ngay (không chờ giờ thấp điểm)
+    
+    Args:
+        rebuild: Rebuild collections vượt ngưỡng tỷ lệ xóa
+        snapshot: Tạo snapshot sau khi rebuild
+        collections: Chỉ rebuild các collections này (bỏ qua ngưỡng)
+        
+    Returns:
+        Báo cáo của lượt chạy
+    """
+    try:
+        return await run_in_threadpool(index_maintenance.run, rebuild, snapshot, collections)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Lỗi khi chạy maintenance: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
+
+
+@router.post("/snapshot")
+async def create_snapshot():
+    """
+    Tạo snapshot nhất quán của vector store
+    
+    Returns:
+        Đường dẫn và dung lượng snapshot
+    """
+    try:
+        return await run_in_threadpool(index_maintenance.create_snapshot)
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
+
+
+@router.get("/disk-usage")
+async def get_disk_usage():
+    """
+    Dung lượng đĩa theo collection
+    
+    Returns:
+        Disk usage (MB)
+    """
+    try:
+        return await run_in_threadpool(index_maintenance.get_disk_usage)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy disk usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, Any, List
 from fastapi import APIRouter, HTTPException, Depends
@@ -9,11 +10,22 @@ from models.schemas import (
     TemplateAnalysisRequest,
     TemplateAnalysisResponse,
     TemplateVariable,
+    TemplateRouteRequest,
+    TemplateRouteResponse,
+    TemplateRouteMatch,
+    TemplateIndexSyncRequest,
     ErrorResponse
 )
 from services.template_service import TemplateService
 from services.rag_service import RAGService
-from database.mysql_client import get_mysql_client, MySQLClient
+from services.template_router import template_router
+from services.fill_cache import fill_cache
+from database.fact_store import fact_store
+from database.vector_store import vector_store_manager
+from services.summary_service import summary_service
+from services.query_batcher import query_batcher
+from database.async_db import get_async_mysql_client, AsyncMySQLClient, async_vector_store
+from database.mysql_client import mysql_client
 from core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -29,7 +41,7 @@ rag_service = RAGService()
 @router.post("/fill", response_model=FilledTemplate)
 async def fill_template(
     request: TemplateFillRequest,
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Điền thông tin vào template dựa trên câu hỏi và RAG
@@ -37,9 +49,10 @@ async def fill_template(
     Quy trình xử lý:
     1. Lấy template từ backend database
     2. Phân tích câu hỏi để hiểu context
-    3. Tìm kiếm thông tin liên quan từ RAG
-    4. Sử dụng LLM để điền các biến trong template
-    5. Trả về template đã điền đầy đủ
+    3. Tra bảng facts (trích xuất lúc ingest) cho các biến phổ biến
+    4. Tìm kiếm thông tin liên quan từ RAG cho các biến còn lại
+    5. Sử dụng LLM để điền các biến chưa có giá trị
+    6. Trả về template đã điền đầy đủ
     
     Args:
         request: Template fill request
@@ -57,15 +70,15 @@ async def fill_template(
             - Filled: "Deadline môn Toán cao cấp là 23:59 ngày 31/07/2025"
     """
     try:
-        # Kiểm tra user tồn tại
-        if not mysql.check_user_exists(request.user_id):
+        # Kiểm tra user tồn tại và lấy template (cache hoặc một query)
+        lookup = await mysql.get_template_for_user(request.template_id, request.user_id)
+        if not lookup["user_exists"]:
             raise HTTPException(
                 status_code=404,
                 detail=f"User với ID {request.user_id} không tồn tại"
             )
         
-        # Lấy template từ database
-        template_info = mysql.get_template_by_id(request.template_id)
+        template_info = lookup["template"]
         if not template_info:
             raise HTTPException(
                 status_code=404,
@@ -94,24 +107,65 @@ async def fill_template(
                 sources=[]
             )
         
-        # Bước 2: Tìm kiếm thông tin từ RAG nếu được yêu cầu
+        # Kiểm tra cache: câu hỏi gần trùng với câu đã trả lời cho cùng template
+        # Version knowledge lấy trước khi tra facts/RAG để không cache kết quả từ dữ liệu cũ
+        knowledge_version = vector_store_manager.get_knowledge_version(request.user_id)
+        query_embedding = None
+        variant_key = fill_cache.make_variant_key(
+            template_content, request.context, request.use_rag
+        )
+        if settings.fill_cache_enabled:
+            try:
+                query_embedding = await query_batcher.embed_query(request.question)
+                cached = fill_cache.lookup(
+                    request.user_id, request.template_id, query_embedding, variant_key
+                )
+                if cached:
+                    return FilledTemplate(**cached)
+            except Exception as e:
+                logger.warning(f"Bỏ qua fill cache: {str(e)}")
+        
+        # Bước 2: Tra bảng facts đã trích xuất lúc ingest
         relevant_info = []
         sources = []
+        prefilled = {}
+        
+        if settings.fact_extraction_enabled:
+            fact_answers = await async_vector_store.run(
+                "fact_lookup", fact_store.lookup, request.user_id, variables, request.question
+            )
+            for var, fact in fact_answers.items():
+                prefilled[var] = fact["value"]
+                if fact.get("source"):
+                    sources.append(fact["source"])
+        
+        # Chỉ dùng RAG + LLM cho các biến bảng facts không trả lời được
+        remaining_variables = [var for var in variables if var not in prefilled]
         
-        if request.use_rag:
+        # Bước 3: Tìm kiếm thông tin từ RAG nếu được yêu cầu
+        if request.use_rag and remaining_variables:
             # Tạo query từ câu hỏi và variables
             search_query = template_service.create_search_query(
                 question=request.question,
-                variables=variables,
+                variables=remaining_variables,
                 context=request.context
             )
             
+            # Câu hỏi tổng quan: một summary thay cho nhiều chunks rời rạc
+            search_results = []
+            if summary_service.is_overview_question(request.question):
+                search_results = await rag_service.search_overview(
+                    query=request.question,
+                    user_id=request.user_id
+                )
+            
             # Search trong RAG
-            search_results = await rag_service.search(
-                query=search_query,
-                user_id=request.user_id,
-                top_k=settings.top_k_results
-            )
+            if not search_results:
+                search_results = await rag_service.search(
+                    query=search_query,
+                    user_id=request.user_id,
+                    top_k=settings.top_k_results
+                )
             
             # Extract relevant information
             for result in search_results:
@@ -119,23 +173,24 @@ async def fill_template(
                 if result.source:
                     sources.append(result.source)
         
-        # Bước 3: Sử dụng LLM để điền template
+        # Bước 4: Sử dụng LLM để điền template (bỏ qua nếu facts đã đủ)
         filled_result = await template_service.fill_template_with_llm(
             template=template_content,
             variables=variables,
             question=request.question,
             context=request.context,
-            relevant_info=relevant_info
+            relevant_info=relevant_info,
+            prefilled=prefilled
         )
         
-        # Bước 4: Tính confidence score
+        # Bước 5: Tính confidence score
         confidence_score = template_service.calculate_confidence(
             filled_variables=filled_result["variables_filled"],
             required_variables=variables,
-            has_rag_support=len(relevant_info) > 0
+            has_rag_support=len(relevant_info) > 0 or len(prefilled) > 0
         )
         
-        return FilledTemplate(
+        result = FilledTemplate(
             template_id=request.template_id,
             original_template=template_content,
             filled_content=filled_result["filled_content"],
@@ -144,6 +199,14 @@ async def fill_template(
             sources=list(set(sources))  # Remove duplicates
         )
         
+        if query_embedding is not None and not filled_result.get("degraded"):
+            fill_cache.store(
+                request.user_id, request.template_id, query_embedding,
+                variant_key, result.model_dump(), knowledge_version=knowledge_version
+            )
+        
+        return result
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -242,11 +305,129 @@ async def analyze_template(request: TemplateAnalysisRequest):
         )
 
 
+@router.post("/route", response_model=TemplateRouteResponse)
+async def route_template(
+    request: TemplateRouteRequest,
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
+):
+    """
+    Chọn template phù hợp nhất cho câu hỏi (semantic routing)
+
+    Dùng index embedding các templates của user (name + category + content)
+    được giữ trong RAM, không cần load và so sánh toàn bộ templates mỗi lần.
+    Kết quả dùng để chọn template_id trước khi gọi /fill.
+
+    Args:
+        request: Template route request
+        mysql: MySQL client dependency
+
+    Returns:
+        TemplateRouteResponse: Các template phù hợp nhất kèm score
+    """
+    try:
+        # Kiểm tra user tồn tại
+        if not await mysql.check_user_exists(request.user_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"User với ID {request.user_id} không tồn tại"
+            )
+
+        start_time = time.time()
+
+        # Embed câu hỏi trên embedding worker; build/refresh index (MySQL + embed
+        # templates) và tính điểm chạy trong thread, không chặn event loop
+        query_embedding = await query_batcher.embed_query(request.question)
+        matches = await asyncio.to_thread(
+            template_router.route,
+            user_id=request.user_id,
+            question=request.question,
+            top_k=request.top_k,
+            category=request.category,
+            query_embedding=query_embedding
+        )
+
+        return TemplateRouteResponse(
+            question=request.question,
+            matches=[TemplateRouteMatch(**match) for match in matches],
+            route_time=time.time() - start_time
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Lỗi khi route template: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi server: {str(e)}"
+        )
+
+
+@router.post("/route/sync")
+async def sync_template_index(request: TemplateIndexSyncRequest):
+    """
+    Đồng bộ template index sau khi backend tạo/sửa/xóa template
+
+    - Có template_id: chỉ embed lại template đó (hoặc xóa khỏi index)
+    - Không có template_id: bỏ index của user, build lại ở lần route tiếp theo
+
+    Cache template của MySQL client cũng bị xóa tương ứng để /fill đọc nội dung mới.
+
+    Args:
+        request: Template index sync request
+
+    Returns:
+        Kết quả đồng bộ
+    """
+    try:
+        mysql_client.invalidate_template(request.template_id, user_id=request.user_id)
+
+        if request.template_id is None:
+            template_router.invalidate_user(request.user_id)
+            return {"user_id": request.user_id, "status": "invalidated"}
+
+        status = await asyncio.to_thread(template_router.sync_template, request.user_id, request.template_id)
+        fill_cache.invalidate_template(request.template_id)
+        return {
+            "user_id": request.user_id,
+            "template_id": request.template_id,
+            "status": status
+        }
+
+    except Exception as e:
+        logger.error(f"Lỗi khi sync template index: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi server: {str(e)}"
+        )
+
+
+@router.get("/route/stats")
+async def get_template_router_stats():
+    """
+    Thống kê về template routing index
+
+    Returns:
+        Router statistics
+    """
+    return template_router.get_stats()
+
+
+@router.get("/fill/cache-stats")
+async def get_fill_cache_stats():
+    """
+    Thống kê về fill cache (hit rate, số entries)
+    
+    Returns:
+        Cache statistics
+    """
+    return fill_cache.get_stats()
+
+
 @router.post("/preview/{template_id}")
 async def preview_filled_template(
     template_id: int,
     sample_data: Dict[str, Any],
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Preview template với sample data (không dùng RAG)
@@ -263,7 +444,7 @@ async def preview_filled_template(
     """
     try:
         # Lấy template từ database
-        template_info = mysql.get_template_by_id(template_id)
+        template_info = await mysql.get_template_by_id(template_id)
         if not template_info:
             raise HTTPException(
                 status_code=404,
@@ -379,7 +560,7 @@ async def get_common_variables():
 @router.post("/batch-fill")
 async def batch_fill_templates(
     requests: List[TemplateFillRequest],
-    mysql: MySQLClient = Depends(get_mysql_client)
+    mysql: AsyncMySQLClient = Depends(get_async_mysql_client)
 ):
     """
     Điền nhiều templates cùng lúc
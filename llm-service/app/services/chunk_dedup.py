@@ -0,0 +1,403 @@
+import hashlib
+import logging
+import zlib
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+
+from core.config import settings
+from database.dedup_store import dedup_store
+from database.shared_state import shared_state
+from database.vector_store import vector_store_manager
+from services.token_chunker import SECTION_MARKER
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Số buckets mỗi lần query SQLite (giới hạn số tham số của một câu lệnh)
+BUCKET_QUERY_BATCH = 500
+# Số kết quả lấy thêm khi search trong documents giữ vectors được chunks trùng tham chiếu
+SCOPED_SEARCH_OVERSAMPLE = 3
+
+
+class MinHasher:
+    """
+    MinHash signature trên word shingles và các bucket LSH (banding)
+
+    Signature có ``num_perm`` giá trị, chia thành ``bands`` dải; hai chunks
+    thành ứng viên khi trùng toàn bộ một dải. Jaccard giữa hai tập shingles
+    được ước lượng bằng tỉ lệ vị trí trùng nhau của hai signatures.
+    """
+
+    def __init__(self, num_perm: int, bands: int, shingle_size: int, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) phải chia hết cho bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Hệ số của các hàm hash (a * x + b) mod p; x < 2^32 nên a * x + b không tràn uint64
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(MAX_HASH), size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, int(MAX_HASH), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> set:
+        """Word shingles của text (bỏ marker trang/slide, chữ thường)"""
+        words = SECTION_MARKER.sub(" ", text or "").lower().split()
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)} if words else set()
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (uint64, num_perm giá trị); None nếu text rỗng"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME
+        return np.bitwise_and(permuted, MAX_HASH).min(axis=0)
+
+    def buckets(self, signature: np.ndarray) -> List[str]:
+        """Key bucket LSH của từng band"""
+        return [
+            f"{band}:" + hashlib.blake2b(
+                signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8
+            ).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Jaccard ước lượng từ hai signatures"""
+        return float(np.mean(first == second))
+
+
+class ChunkDeduplicator:
+    """
+    Bỏ chunks gần trùng trong corpus của một user lúc ingest
+
+    Chunk mới có Jaccard ước lượng >= ngưỡng với một chunk đã lưu (của bất kỳ
+    document nào của user, kể cả chính document đang ingest) không được ghi
+    vào vector store; thay vào đó nó được ghi nhận là source reference của
+    chunk đang giữ vector trong dedup store. Khi search, các references được
+    gắn vào metadata của kết quả (``duplicate_sources``).
+    """
+
+    def __init__(self):
+        self.hasher = MinHasher(
+            num_perm=settings.dedup_num_perm,
+            bands=settings.dedup_bands,
+            shingle_size=settings.dedup_shingle_size
+        )
+        self.threshold = settings.dedup_similarity_threshold
+        self.stats = {"documents": 0, "chunks": 0, "duplicates": 0, "promoted": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.dedup_enabled and dedup_store.conn is not None
+
+    def _locked(self):
+        # Các uvicorn workers cùng ghi dedup store: lock giữa các processes
+        return shared_state.locked("dedup")
+
+    def _load_candidates(
+        self,
+        user_id: int,
+        buckets: List[str]
+    ) -> Tuple[Dict[str, List[str]], Dict[str, np.ndarray]]:
+        """Bucket -> chunk IDs và signatures của các chunks đã lưu nằm trong các buckets"""
+        bucket_map: Dict[str, List[str]] = {}
+        signatures: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(buckets))
+        for offset in range(0, len(unique), BUCKET_QUERY_BATCH):
+            for bucket, chunk_id, signature in dedup_store.find_candidates(
+                user_id, unique[offset:offset + BUCKET_QUERY_BATCH]
+            ):
+                bucket_map.setdefault(bucket, []).append(chunk_id)
+                signatures[chunk_id] = np.frombuffer(signature, dtype=np.uint64)
+        return bucket_map, signatures
+
+    def deduplicate(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ) -> Tuple[List[Dict[str, Any]], List[List[float]], List[Dict[str, Any]]]:
+        """
+        Lọc chunks gần trùng
+
+        Source references chưa được ghi vào dedup store: gọi ``register`` với
+        rows trả về sau khi đã ghi các chunks giữ vector vào vector store, để
+        một lần ghi lỗi không để lại references trỏ tới vectors không tồn tại.
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document đang ingest
+            chunks: Chunks từ ``build_chunks``
+            embeddings: Vectors tương ứng với chunks
+
+        Returns:
+            (chunks cần ghi vào vector store, embeddings tương ứng, rows cho ``register``)
+        """
+        if not self.enabled or document_id is None or not chunks:
+            return chunks, embeddings, []
+
+        signatures = [self.hasher.signature(chunk["text"]) for chunk in chunks]
+        chunk_buckets = [self.hasher.buckets(sig) if sig is not None else [] for sig in signatures]
+
+        with self._locked():
+            bucket_map, known = self._load_candidates(
+                user_id, [bucket for buckets in chunk_buckets for bucket in buckets]
+            )
+
+            kept_chunks, kept_embeddings, rows = [], [], []
+            for chunk, embedding, signature, buckets in zip(chunks, embeddings, signatures, chunk_buckets):
+                chunk_id = chunk["id"]
+                canonical_id, best = chunk_id, 0.0
+                if signature is not None:
+                    candidates = {
+                        candidate for bucket in buckets for candidate in bucket_map.get(bucket, ())
+                        if candidate != chunk_id
+                    }
+                    for candidate in candidates:
+                        score = self.hasher.similarity(signature, known[candidate])
+                        if score >= self.threshold and score > best:
+                            canonical_id, best = candidate, score
+
+                duplicate = canonical_id != chunk_id
+                if not duplicate:
+                    kept_chunks.append(chunk)
+                    kept_embeddings.append(embedding)
+                    # Chunk giữ vector trở thành ứng viên cho các chunks sau (kể cả trong document này)
+                    if signature is not None:
+                        known[chunk_id] = signature
+                        for bucket in buckets:
+                            bucket_map.setdefault(bucket, []).append(chunk_id)
+
+                rows.append({
+                    "chunk_id": chunk_id,
+                    "canonical_id": canonical_id,
+                    "signature": signature.tobytes() if signature is not None else b"",
+                    "metadata": chunk.get("metadata", {}),
+                    "buckets": [] if duplicate else buckets
+                })
+
+        duplicates = len(chunks) - len(kept_chunks)
+        self.stats["documents"] += 1
+        self.stats["chunks"] += len(chunks)
+        self.stats["duplicates"] += duplicates
+        if duplicates:
+            logger.info(
+                f"Dedup document {document_id}: bỏ {duplicates}/{len(chunks)} chunks gần trùng "
+                f"(ratio {duplicates / len(chunks):.1%})"
+            )
+        return kept_chunks, kept_embeddings, rows
+
+    def register(self, user_id: int, document_id: Any, rows: List[Dict[str, Any]]) -> None:
+        """
+        Ghi các chunks (kể cả source references) của một lần ingest vào dedup store
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            rows: Rows từ ``deduplicate``
+        """
+        if not self.enabled or document_id is None or not rows:
+            return
+        with self._locked():
+            dedup_store.register_chunks(user_id, document_id, rows)
+
+    def scoped_search(
+        self,
+        search: Callable[..., List[Dict[str, Any]]],
+        user_id: Optional[int],
+        n_results: int,
+        filter_metadata: Optional[Dict[str, Any]],
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Search có metadata filter, tính cả chunks bị dedup khớp filter
+
+        Chunk trùng không có vector riêng nên không khớp filter theo metadata của
+        nó (document_id, file_name, môn học, lớp, ...). Metadata đó được lưu trong
+        dedup store: các vectors mà chunks trùng khớp filter tham chiếu được search
+        thêm (trong các documents đang giữ chúng) rồi gộp với kết quả theo score.
+
+        Args:
+            search: Hàm search (``VectorStoreManager.search`` hoặc partial của nó)
+            user_id: ID của user (references được lưu theo user)
+            n_results: Số kết quả
+            filter_metadata: Metadata filters
+            **kwargs: Tham số khác của ``search``
+
+        Returns:
+            List kết quả giống ``search``
+        """
+        results = search(n_results=n_results, filter_metadata=filter_metadata, **kwargs)
+
+        # Dedup theo từng user: filter chỉ có user_id không loại chunk trùng nào
+        if not self.enabled or user_id is None or not set(filter_metadata or {}) - {"user_id"}:
+            return results
+        try:
+            references = dedup_store.get_referenced_chunks(
+                user_id, vector_store_manager.build_where(filter_metadata)
+            )
+        except Exception as e:
+            logger.warning(f"Không thể lấy chunks tham chiếu: {str(e)}")
+            return results
+        if not references:
+            return results
+
+        owner_filter = {"document_id": {"$in": list(dict.fromkeys(references.values()))}}
+        if "user_id" in filter_metadata:
+            owner_filter["user_id"] = filter_metadata["user_id"]
+        referenced = search(
+            n_results=n_results * SCOPED_SEARCH_OVERSAMPLE,
+            filter_metadata=owner_filter,
+            **kwargs
+        )
+
+        seen = {result.get("id") for result in results}
+        merged = results + [
+            result for result in referenced
+            if result.get("id") in references and result.get("id") not in seen
+        ]
+        merged.sort(key=lambda result: result["score"], reverse=True)
+        return merged[:n_results]
+
+    def count_references(self, user_id: int, document_id: Any) -> int:
+        """Số chunks của document không có vector riêng (dùng vector của chunk khác)"""
+        if not self.enabled or document_id is None:
+            return 0
+        return dedup_store.count_references(user_id, document_id)
+
+    def release_document(self, user_id: int, document_id: Any) -> int:
+        """
+        Gỡ một document khỏi dedup store trước khi xóa vectors của nó
+
+        Vector của document đang được documents khác dùng chung sẽ được ghi lại
+        dưới ID chunk của document tham chiếu đầu tiên (promote), để các
+        documents đó không mất nội dung khi document này bị xóa.
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+
+        Returns:
+            Số vectors đã promote
+        """
+        if not self.enabled or document_id is None:
+            return 0
+
+        vectors: Dict[str, Tuple[str, List[float]]] = {}
+        with self._locked():
+            # Reference đầu tiên của mỗi chunk giữ vector sẽ giữ vector thay
+            successors: Dict[str, Dict[str, Any]] = {}
+            for reference in dedup_store.get_document_references(user_id, document_id):
+                successors.setdefault(reference["canonical_id"], reference)
+
+            if successors:
+                stored = vector_store_manager.get_documents(
+                    list(successors), settings.chroma_collection_name, include=["embeddings", "documents"]
+                )
+                vectors = {
+                    chunk_id: (text, [float(x) for x in embedding])
+                    for chunk_id, text, embedding in zip(stored["ids"], stored["documents"], stored["embeddings"])
+                }
+
+                promoted = []
+                for canonical_id, reference in successors.items():
+                    if canonical_id not in vectors:
+                        logger.warning(f"Không tìm thấy vector {canonical_id} để promote")
+                        continue
+                    text, embedding = vectors[canonical_id]
+                    promoted.append(({"id": reference["chunk_id"], "text": text, "metadata": reference["metadata"]}, embedding))
+
+                if promoted:
+                    collection_names = [settings.chroma_collection_name]
+                    if settings.vector_storage_mode != "single":
+                        collection_names.insert(0, vector_store_manager.get_user_collection_name(user_id))
+                    for collection_name in collection_names:
+                        vector_store_manager.add_documents(
+                            documents=[document for document, _ in promoted],
+                            collection_name=collection_name,
+                            embeddings=[embedding for _, embedding in promoted],
+                            upsert=True
+                        )
+
+                for canonical_id, reference in successors.items():
+                    if canonical_id in vectors:
+                        signature = reference["signature"]
+                        buckets = self.hasher.buckets(np.frombuffer(signature, dtype=np.uint64)) if signature else []
+                        dedup_store.promote(user_id, canonical_id, reference["chunk_id"], buckets)
+
+            dedup_store.delete_document(user_id, document_id)
+
+        promoted_count = len(vectors)
+        self.stats["promoted"] += promoted_count
+        if promoted_count:
+            logger.info(f"Đã promote {promoted_count} vectors dùng chung của document {document_id}")
+        return promoted_count
+
+    def release_user(self, user_id: int) -> None:
+        """Xóa toàn bộ dữ liệu dedup của user"""
+        if self.enabled:
+            dedup_store.delete_user(user_id)
+
+    def attach_sources(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Gắn source references (``duplicate_sources``) vào metadata của kết quả search
+
+        Args:
+            results: Kết quả từ vector store (có "id" và "metadata")
+        """
+        if not self.enabled or not results:
+            return
+        try:
+            sources = dedup_store.get_sources([result["id"] for result in results if result.get("id")])
+        except Exception as e:
+            logger.warning(f"Không thể lấy source references: {str(e)}")
+            return
+        for result in results:
+            references = sources.get(result.get("id"))
+            if references:
+                result.setdefault("metadata", {})["duplicate_sources"] = references
+
+    def get_stats(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Thống kê dedup
+
+        Args:
+            user_id: Lấy thêm thống kê từ dedup store cho user này
+
+        Returns:
+            Stats dictionary (dedup_ratio = số chunks bị bỏ / số chunks đã ingest)
+        """
+        chunks = self.stats["chunks"]
+        stats = {
+            "enabled": self.enabled,
+            "similarity_threshold": self.threshold,
+            "num_perm": self.hasher.num_perm,
+            "bands": self.hasher.bands,
+            "since_start": {
+                **self.stats,
+                "dedup_ratio": round(self.stats["duplicates"] / chunks, 4) if chunks else 0.0
+            }
+        }
+        if user_id is not None and self.enabled:
+            stats["user"] = dedup_store.get_user_stats(user_id)
+        return stats
+
+
+# Singleton instance
+chunk_deduplicator = ChunkDeduplicator()
@@ -1,14 +1,15 @@
 import logging
 import os
-from typing import List, Dict, Any, Optional
+import re
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import asyncio
 
 # Document parsing libraries
-import pypdf
 from docx import Document as DocxDocument
 from pptx import Presentation
-import pandas as pd
+import numpy as np
 
 # LlamaIndex imports
 from llama_index.core import Document as LlamaDocument
@@ -16,7 +17,18 @@ from llama_index.core.node_parser import SimpleNodeParser
 from llama_index.core.text_splitter import SentenceSplitter
 
 from core.config import settings
+from core.embedding_config import embedding_manager
 from database.vector_store import vector_store_manager
+from database.content_store import content_store, pipeline_key
+from database.async_db import ingest_executor
+from services.fact_extractor import fact_extractor
+from services.summary_service import summary_service
+from services.hierarchical_retriever import hierarchical_retriever
+from services.chunk_dedup import chunk_deduplicator
+from services.token_chunker import token_chunker, chunk_stats
+from services.office_extractors import extract_docx_text, extract_pptx_text
+from services.pdf_extraction import extract_pdf_pages
+from services.spreadsheet_extractor import SPREADSHEET_EXTENSIONS, iter_spreadsheet_chunks, extract_spreadsheet_text
 from utils.file_utils import get_file_extension, read_text_file
 
 logger = logging.getLogger(__name__)
@@ -25,7 +37,7 @@ logger = logging.getLogger(__name__)
 class DocumentProcessor:
     """
     Service xử lý documents và extract knowledge
-    Hỗ trợ các định dạng: PDF, DOCX, PPTX, TXT
+    Hỗ trợ các định dạng: PDF, DOCX, PPTX, TXT, XLSX, CSV
     """
     
     def __init__(self):
@@ -51,7 +63,8 @@ class DocumentProcessor:
         self,
         file_path: str,
         user_id: int,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        content_hash: Optional[str] = None
     ) -> int:
         """
         Process document và extract knowledge
@@ -60,6 +73,7 @@ class DocumentProcessor:
             file_path: Đường dẫn đến file document
             user_id: ID của user sở hữu document
             metadata: Metadata bổ sung
+            content_hash: SHA-256 của file nếu đã tính sẵn (vd: lúc nhận stream upload)
             
         Returns:
             Số chunks đã extract
@@ -72,75 +86,92 @@ class DocumentProcessor:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File không tồn tại: {file_path}")
             
-            # Extract text từ document
-            logger.info(f"Đang extract text từ: {file_path}")
-            text_content = await self._extract_text(file_path)
+            document_id = (metadata or {}).get("document_id")
+            
+            # Bảng tính: đọc và embed theo từng nhóm dòng, không nạp cả file
+            if get_file_extension(file_path).lower() in SPREADSHEET_EXTENSIONS:
+                logger.info(f"Đang ingest bảng tính: {file_path}")
+                count = await ingest_executor.run("ingest_spreadsheet", self._ingest_spreadsheet, file_path, user_id, metadata)
+                logger.info(f"✅ Hoàn thành xử lý bảng tính: {count} chunks")
+                return count
+            
+            # File có cùng nội dung (SHA-256) đã được xử lý (bởi bất kỳ user nào):
+            # dùng lại chunks và vectors, chỉ ghi metadata sở hữu của user này
+            if not (settings.content_store_enabled and content_store.conn is not None and document_id is not None):
+                content_hash = None
+            elif content_hash is None:
+                content_hash = await asyncio.to_thread(content_store.hash_file, file_path)
+            if content_hash:
+                cached = await ingest_executor.run(
+                    "content_get_chunks", content_store.get_chunks, content_hash, pipeline_key()
+                )
+                if cached is not None:
+                    pieces, vectors = cached
+                    doc_metadata = self._document_metadata(file_path, user_id, metadata)
+                    documents_to_add = self._chunks_from_pieces(pieces, user_id, document_id, doc_metadata)
+                    logger.info(
+                        f"Dùng lại {len(documents_to_add)} chunks đã embed của nội dung {content_hash[:12]}"
+                    )
+                    await ingest_executor.run(
+                        "store_chunks", self.store_chunks, user_id, documents_to_add, vectors.tolist(), doc_metadata
+                    )
+                    await ingest_executor.run(
+                        "content_add_reference", content_store.add_reference, content_hash, user_id, document_id
+                    )
+                    return len(documents_to_add)
+            
+            # Extract text từ document (text của cùng nội dung có thể đã được lưu
+            # khi cấu hình chia chunks/embedding khác)
+            text_content = None
+            if content_hash:
+                text_content = await ingest_executor.run("content_get_text", content_store.get_text, content_hash)
+            if text_content is None:
+                logger.info(f"Đang extract text từ: {file_path}")
+                text_content = await self._extract_text(file_path)
             
             if not text_content or len(text_content.strip()) < 10:
                 logger.warning(f"Document rỗng hoặc quá ngắn: {file_path}")
                 return 0
             
-            # Tạo LlamaIndex document
-            doc_metadata = metadata or {}
-            doc_metadata.update({
-                "file_path": file_path,
-                "file_name": os.path.basename(file_path),
-                "user_id": str(user_id),
-                "extraction_time": str(asyncio.get_event_loop().time())
-            })
-            
-            llama_doc = LlamaDocument(
-                text=text_content,
-                metadata=doc_metadata
-            )
-            
-            # Parse document thành nodes/chunks
+            # Chia document thành chunks
             logger.info("Đang chia document thành chunks...")
-            nodes = self.node_parser.get_nodes_from_documents([llama_doc])
+            documents_to_add, doc_metadata = self.build_chunks(
+                text_content, file_path, user_id, metadata
+            )
             
-            if not nodes:
+            if not documents_to_add:
                 logger.warning("Không thể tạo chunks từ document")
                 return 0
             
-            logger.info(f"Đã tạo {len(nodes)} chunks")
-            
-            # Chuẩn bị data cho vector store
-            documents_to_add = []
-            for i, node in enumerate(nodes):
-                # Thêm metadata cho mỗi chunk
-                chunk_metadata = {
-                    **node.metadata,
-                    "chunk_index": i,
-                    "total_chunks": len(nodes),
-                    "chunk_id": f"{metadata.get('document_id', 'unknown')}_{i}"
-                }
-                
-                # Nếu node có relationships (prev/next), thêm vào metadata
-                if node.relationships:
-                    chunk_metadata["has_relationships"] = True
-                
-                documents_to_add.append({
-                    "text": node.get_content(),
-                    "metadata": chunk_metadata,
-                    "id": f"doc_{user_id}_{metadata.get('document_id', 'unknown')}_{i}"
-                })
-            
-            # Thêm vào vector store
-            logger.info("Đang thêm chunks vào vector store...")
+            logger.info(f"Đã tạo {len(documents_to_add)} chunks")
             
-            # Lưu vào cả user collection và global collection
-            # User collection
-            user_collection = vector_store_manager.get_user_collection_name(user_id)
-            vector_store_manager.add_documents(
-                documents=documents_to_add,
-                collection_name=user_collection
+            # Tạo embeddings một lần bằng embedding model của service,
+            # dùng chung cho các collections và document index
+            logger.info("Đang tạo embeddings cho chunks...")
+            embeddings = await ingest_executor.run(
+                "embed_chunks", embedding_manager.embed_texts, [doc["text"] for doc in documents_to_add]
             )
             
-            # Global collection với user_id trong metadata
-            vector_store_manager.add_documents(
-                documents=documents_to_add,
-                collection_name=settings.chroma_collection_name
-            )
+            # Thêm vào vector store
+            logger.info("Đang thêm chunks vào vector store...")
+            await ingest_executor.run("store_chunks", self.store_chunks, user_id, documents_to_add, embeddings, doc_metadata)
+            
+            if content_hash:
+                try:
+                    await ingest_executor.run(
+                        "content_put",
+                        self._save_content,
+                        content_hash,
+                        user_id,
+                        document_id,
+                        file_path,
+                        text_content,
+                        documents_to_add,
+                        doc_metadata,
+                        embeddings
+                    )
+                except Exception as e:
+                    logger.warning(f"Không thể lưu nội dung vào content store: {str(e)}")
             
             logger.info(f"✅ Hoàn thành xử lý document: {len(documents_to_add)} chunks")
             return len(documents_to_add)
@@ -149,6 +180,371 @@ class DocumentProcessor:
             logger.error(f"❌ Lỗi khi process document {file_path}: {str(e)}")
             raise
     
+    def _save_content(
+        self,
+        content_hash: str,
+        user_id: int,
+        document_id: Any,
+        file_path: str,
+        text_content: str,
+        documents_to_add: List[Dict[str, Any]],
+        doc_metadata: Dict[str, Any],
+        embeddings: List[List[float]]
+    ) -> None:
+        """Lưu text/chunks/vectors của nội dung vào content store và ghi nhận document tham chiếu"""
+        content_store.put(
+            content_hash,
+            os.path.getsize(file_path),
+            text_content,
+            pipeline_key(),
+            self._pieces_from_chunks(documents_to_add, doc_metadata),
+            embeddings
+        )
+        content_store.add_reference(content_hash, user_id, document_id)
+    
+    def build_chunks(
+        self,
+        text_content: str,
+        file_path: str,
+        user_id: int,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Chia text của document thành chunks kèm metadata (chưa embed)
+        
+        Args:
+            text_content: Text đã extract từ document
+            file_path: Đường dẫn file document
+            user_id: ID của user sở hữu document
+            metadata: Metadata bổ sung (nên có document_id)
+            
+        Returns:
+            (List chunks [{"text", "metadata", "id"}], metadata của document)
+        """
+        # Tạo LlamaIndex document
+        doc_metadata = self._document_metadata(file_path, user_id, metadata)
+        document_id = doc_metadata.get("document_id", "unknown")
+        
+        if settings.chunker == "token":
+            return self._build_token_chunks(text_content, user_id, document_id, doc_metadata), doc_metadata
+        
+        llama_doc = LlamaDocument(
+            text=text_content,
+            metadata=doc_metadata
+        )
+        
+        # Parse document thành nodes/chunks
+        nodes = self.node_parser.get_nodes_from_documents([llama_doc])
+        
+        # Chuẩn bị data cho vector store
+        chunks = []
+        for i, node in enumerate(nodes):
+            # Thêm metadata cho mỗi chunk
+            chunk_metadata = {
+                **node.metadata,
+                "chunk_index": i,
+                "total_chunks": len(nodes),
+                "chunk_id": f"{document_id}_{i}"
+            }
+            
+            # Nếu node có relationships (prev/next), thêm vào metadata
+            if node.relationships:
+                chunk_metadata["has_relationships"] = True
+            
+            chunk_text = node.get_content()
+            if not chunk_text.strip():
+                continue
+            
+            chunks.append({
+                "text": chunk_text,
+                "metadata": chunk_metadata,
+                "id": f"doc_{user_id}_{document_id}_{i}"
+            })
+        
+        self._record_chunk_stats([chunk["text"] for chunk in chunks])
+        return chunks, doc_metadata
+    
+    @staticmethod
+    def _document_metadata(
+        file_path: str,
+        user_id: int,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Metadata sở hữu của document, được gắn vào mọi chunk"""
+        doc_metadata = dict(metadata or {})
+        doc_metadata.update({
+            "file_path": file_path,
+            # Upload qua stream truyền tên file gốc (file_path là file tạm)
+            "file_name": doc_metadata.get("file_name") or os.path.basename(file_path),
+            "user_id": str(user_id),
+            "extraction_time": str(time.time())
+        })
+        return doc_metadata
+    
+    @staticmethod
+    def _pieces_from_chunks(
+        chunks: List[Dict[str, Any]],
+        doc_metadata: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Bỏ metadata sở hữu khỏi chunks, chỉ giữ phần phụ thuộc nội dung (để dùng chung)"""
+        return [
+            {
+                "text": chunk["text"],
+                "metadata": {
+                    key: value for key, value in chunk["metadata"].items()
+                    if key not in doc_metadata and key != "chunk_id"
+                }
+            }
+            for chunk in chunks
+        ]
+    
+    @staticmethod
+    def _chunks_from_pieces(
+        pieces: List[Dict[str, Any]],
+        user_id: int,
+        document_id: Any,
+        doc_metadata: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Tạo lại chunks của một document từ nội dung dùng chung và metadata sở hữu"""
+        chunks = []
+        for i, piece in enumerate(pieces):
+            chunk_index = piece["metadata"].get("chunk_index", i)
+            chunks.append({
+                "text": piece["text"],
+                "metadata": {
+                    **doc_metadata,
+                    **piece["metadata"],
+                    "chunk_id": f"{document_id}_{chunk_index}"
+                },
+                "id": f"doc_{user_id}_{document_id}_{chunk_index}"
+            })
+        return chunks
+    
+    def _build_token_chunks(
+        self,
+        text_content: str,
+        user_id: int,
+        document_id: Any,
+        doc_metadata: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Chia chunks bằng tokenizer của embedding model (xem ``TokenChunker``)
+        
+        Returns:
+            List chunks [{"text", "metadata", "id"}]
+        """
+        pieces = token_chunker.chunk(text_content)
+        chunks = []
+        for i, piece in enumerate(pieces):
+            chunk_metadata = {
+                **doc_metadata,
+                "chunk_index": i,
+                "total_chunks": len(pieces),
+                "chunk_id": f"{document_id}_{i}",
+                "token_count": piece["token_count"]
+            }
+            for key in ("page", "slide"):
+                if key in piece:
+                    chunk_metadata[key] = piece[key]
+            
+            chunks.append({
+                "text": piece["text"],
+                "metadata": chunk_metadata,
+                "id": f"doc_{user_id}_{document_id}_{i}"
+            })
+        
+        chunk_stats.record([piece["token_count"] for piece in pieces], token_chunker.max_tokens)
+        return chunks
+    
+    def _record_chunk_stats(self, texts: List[str]) -> None:
+        """Đếm tokens của chunks từ SentenceSplitter để so sánh với giới hạn của model"""
+        try:
+            chunk_stats.record(token_chunker.count_tokens(texts), token_chunker.max_tokens)
+        except Exception as e:
+            logger.debug(f"Bỏ qua thống kê chunk: {str(e)}")
+    
+    def store_chunks(
+        self,
+        user_id: int,
+        chunks: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        doc_metadata: Dict[str, Any],
+        replace: bool = False,
+        fact_llm_fallback: Optional[bool] = None
+    ) -> int:
+        """
+        Ghi chunks đã embed vào vector store và cập nhật các index phụ
+        (document index, facts, summaries, knowledge version)
+        
+        Args:
+            user_id: ID của user
+            chunks: Chunks từ ``build_chunks``
+            embeddings: Vectors tương ứng với chunks
+            doc_metadata: Metadata của document từ ``build_chunks``
+            replace: Xóa chunks cũ của document trước khi ghi (re-index)
+            fact_llm_fallback: Dùng LLM khi trích xuất facts (mặc định theo settings)
+            
+        Returns:
+            Số chunks của document (kể cả chunks gần trùng chỉ lưu reference)
+        """
+        document_id = doc_metadata.get("document_id")
+        
+        if replace and document_id is not None:
+            self._delete_document_vectors(user_id, document_id)
+        self._write_chunks(user_id, document_id, chunks, embeddings, upsert=replace)
+        
+        # Cập nhật document index (centroid) cho hierarchical retrieval
+        if document_id is not None:
+            hierarchical_retriever.index_document(
+                user_id, document_id, embeddings, doc_metadata
+            )
+        
+        # Trích xuất facts (deadline, course_code, ...) để /fill tra cứu trực tiếp
+        if settings.fact_extraction_enabled and document_id is not None:
+            try:
+                fact_extractor.extract_and_store(
+                    user_id, document_id, chunks, use_llm=fact_llm_fallback
+                )
+            except Exception as e:
+                logger.warning(f"Không thể trích xuất facts: {str(e)}")
+        
+        # Tóm tắt document trong background job (nếu bật)
+        if document_id is not None:
+            summary_service.schedule(user_id, document_id, chunks)
+        
+        # Knowledge của user đã thay đổi -> các cache liên quan hết hạn
+        vector_store_manager.bump_knowledge_version(user_id)
+        return len(chunks)
+    
+    @staticmethod
+    def _collection_names(user_id: int) -> List[str]:
+        """Các collections chứa chunks của user"""
+        # Dual mode: lưu vào cả user collection và global collection
+        # Single mode: chỉ lưu vào global collection (đã có user_id trong metadata)
+        collection_names = [settings.chroma_collection_name]
+        if settings.vector_storage_mode != "single":
+            collection_names.insert(0, vector_store_manager.get_user_collection_name(user_id))
+        return collection_names
+    
+    def _delete_document_vectors(self, user_id: int, document_id: Any) -> None:
+        """Xóa chunks cũ của document (re-index)"""
+        # Vectors của document đang được documents khác dùng chung (dedup) được giữ lại trước khi xóa
+        chunk_deduplicator.release_document(user_id, document_id)
+        for collection_name in self._collection_names(user_id):
+            vector_store_manager.ensure_collection(collection_name)
+            vector_store_manager.delete_where(
+                {"$and": [
+                    {"user_id": {"$eq": str(user_id)}},
+                    {"document_id": {"$eq": document_id}}
+                ]},
+                collection_name=collection_name
+            )
+    
+    def _write_chunks(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        upsert: bool = False
+    ) -> int:
+        """
+        Ghi chunks vào các collections của user (sau khi bỏ chunks gần trùng)
+        
+        Returns:
+            Số chunks thực sự được ghi
+        """
+        # Bỏ chunks gần trùng với chunks đã có trong corpus của user (chỉ lưu source reference)
+        unique_chunks, unique_embeddings, dedup_rows = chunk_deduplicator.deduplicate(
+            user_id, document_id, chunks, embeddings
+        )
+        
+        if unique_chunks:
+            for collection_name in self._collection_names(user_id):
+                vector_store_manager.add_documents(
+                    documents=unique_chunks,
+                    collection_name=collection_name,
+                    embeddings=unique_embeddings,
+                    upsert=upsert
+                )
+        # Chỉ ghi references sau khi vectors đã được lưu
+        chunk_deduplicator.register(user_id, document_id, dedup_rows)
+        return len(unique_chunks)
+    
+    def _ingest_spreadsheet(
+        self,
+        file_path: str,
+        user_id: int,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Ingest bảng tính theo luồng: đọc từng nhóm dòng, embed và ghi theo batch
+        
+        Không giữ toàn bộ sheet hay toàn bộ chunks trong bộ nhớ; centroid cho
+        document index được cộng dồn qua các batch. Facts và summaries (cần
+        toàn bộ chunks) không được tạo cho bảng tính.
+        
+        Args:
+            file_path: Đường dẫn XLSX/CSV
+            user_id: ID của user sở hữu document
+            metadata: Metadata bổ sung (nên có document_id)
+            
+        Returns:
+            Số chunks đã tạo
+        """
+        doc_metadata = self._document_metadata(file_path, user_id, metadata)
+        document_id = doc_metadata.get("document_id", "unknown")
+        batch_size = max(1, settings.spreadsheet_embed_batch)
+        
+        total = 0
+        vector_sum = None
+        token_counts = []
+        batch: List[Dict[str, Any]] = []
+        
+        def flush() -> None:
+            nonlocal vector_sum
+            # Đo lại tokens trên text cuối cùng (token_count của extractor là ước lượng)
+            token_counts.extend(token_chunker.count_tokens([chunk["text"] for chunk in batch]))
+            embeddings = embedding_manager.embed_texts([chunk["text"] for chunk in batch])
+            self._write_chunks(user_id, document_id, batch, embeddings)
+            batch_sum = np.asarray(embeddings, dtype=np.float32).sum(axis=0)
+            vector_sum = batch_sum if vector_sum is None else vector_sum + batch_sum
+            batch.clear()
+        
+        for piece in iter_spreadsheet_chunks(file_path):
+            batch.append({
+                "text": piece["text"],
+                "metadata": {
+                    **doc_metadata,
+                    "chunk_index": total,
+                    "chunk_id": f"{document_id}_{total}",
+                    "token_count": piece["token_count"],
+                    "sheet": piece["sheet"],
+                    "row_start": piece["row_start"],
+                    "row_end": piece["row_end"]
+                },
+                "id": f"doc_{user_id}_{document_id}_{total}"
+            })
+            total += 1
+            if len(batch) >= batch_size:
+                flush()
+                logger.info(f"Đã ghi {total} chunks từ bảng tính")
+        if batch:
+            flush()
+        
+        if not total:
+            logger.warning(f"Bảng tính rỗng: {file_path}")
+            return 0
+        
+        chunk_stats.record(token_counts, token_chunker.max_tokens)
+        if document_id is not None:
+            # Trung bình và tổng cùng hướng, centroid được normalize lại
+            hierarchical_retriever.index_document(
+                user_id, document_id, [vector_sum.tolist()], doc_metadata, total_chunks=total
+            )
+        vector_store_manager.bump_knowledge_version(user_id)
+        return total
+    
     async def _extract_text(self, file_path: str) -> str:
         """
         Extract text từ document dựa vào file type
@@ -170,6 +566,8 @@ class DocumentProcessor:
                 return await self._extract_pptx(file_path)
             elif ext == '.txt':
                 return await read_text_file(file_path)
+            elif ext in SPREADSHEET_EXTENSIONS:
+                return await asyncio.to_thread(extract_spreadsheet_text, file_path)
             else:
                 logger.warning(f"Định dạng file không được hỗ trợ: {ext}")
                 return ""
@@ -191,19 +589,14 @@ class DocumentProcessor:
         try:
             text_parts = []
             
-            with open(file_path, 'rb') as file:
-                pdf_reader = pypdf.PdfReader(file)
-                
-                # Extract từng page
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            # Thêm page number để tracking
-                            text_parts.append(f"[Trang {page_num + 1}]\n{page_text}")
-                    except Exception as e:
-                        logger.warning(f"Không thể extract trang {page_num + 1}: {str(e)}")
-                        continue
+            # Extract các khoảng trang song song trên process pool (backend theo settings)
+            pages = await asyncio.to_thread(extract_pdf_pages, file_path)
+            for page_num, page_text, error in pages:
+                if error:
+                    logger.warning(f"Không thể extract trang {page_num}: {error}")
+                elif page_text:
+                    # Thêm page number để tracking
+                    text_parts.append(f"[Trang {page_num}]\n{page_text}")
             
             # Join all pages
             full_text = "\n\n".join(text_parts)
@@ -229,6 +622,11 @@ class DocumentProcessor:
             Extracted text
         """
         try:
+            if settings.office_extractor == "stream":
+                full_text = self._clean_text(await asyncio.to_thread(extract_docx_text, file_path))
+                logger.info(f"Extracted {len(full_text)} characters từ DOCX")
+                return full_text
+            
             doc = DocxDocument(file_path)
             text_parts = []
             
@@ -267,6 +665,11 @@ class DocumentProcessor:
             Extracted text
         """
         try:
+            if settings.office_extractor == "stream":
+                full_text = self._clean_text(await asyncio.to_thread(extract_pptx_text, file_path))
+                logger.info(f"Extracted {len(full_text)} characters từ PPTX")
+                return full_text
+            
             prs = Presentation(file_path)
             text_parts = []
             
@@ -333,15 +736,13 @@ class DocumentProcessor:
         Returns:
             Cleaned text
         """
-        # Remove multiple spaces
-        text = " ".join(text.split())
-        
         # Remove multiple newlines nhưng giữ paragraph breaks
         lines = text.split('\n')
         cleaned_lines = []
         
         for line in lines:
-            line = line.strip()
+            # Gộp khoảng trắng trong từng dòng (không gộp xuống dòng)
+            line = re.sub(r"[ \t\r\f\v\u00a0]+", " ", line).strip()
             if line:
                 cleaned_lines.append(line)
             elif cleaned_lines and cleaned_lines[-1] != '':
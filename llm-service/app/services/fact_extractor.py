@@ -0,0 +1,359 @@
+import logging
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from core.config import settings
+from database.fact_store import fact_store
+from database.shared_state import JobGenerations
+from database.vector_store import vector_store_manager
+
+logger = logging.getLogger(__name__)
+
+
+# Ngày giờ dạng: "23:59 ngày 31/07/2025", "31/07/2025", "31-07-2025 23h59"
+_DATE = r"\d{1,2}[/\-.]\d{1,2}(?:[/\-.]\d{2,4})?"
+_TIME = r"\d{1,2}\s*(?::|h|giờ)\s*\d{0,2}"
+_DATETIME = rf"(?:{_TIME}\s*(?:,\s*)?(?:ngày\s*)?{_DATE}|{_DATE}(?:\s*(?:lúc\s*)?{_TIME})?)"
+
+# Giá trị dạng tên/cụm từ: dừng ở cuối dòng hoặc dấu câu ngắt
+# (không ngắt sau học hàm viết tắt như "TS.", "ThS.")
+_PHRASE = r"([^\n;|]{2,80}?)(?=\s*(?:\n|;|\||$|(?<!TS)(?<!GS)(?<!KS)(?<!Dr)(?<!ThS)\.\s))"
+
+
+class FactExtractor:
+    """
+    Trích xuất facts có cấu trúc từ chunks của document lúc ingest
+    Thứ tự: regex/rule extractors trước (lúc ingest), LLM (batch) cho các biến
+    còn thiếu trong background worker
+    """
+
+    def __init__(self):
+        # (variable, pattern, confidence). Group 1 là giá trị
+        self.rules = [
+            ("deadline", re.compile(
+                rf"(?:hạn\s*nộp|hạn\s*chót|deadline|due\s*date|nộp\s*bài\s*(?:trước|trước\s*ngày))\s*[:\-]?\s*(?:là\s*)?(?:vào\s*)?({_DATETIME})",
+                re.IGNORECASE), 0.9),
+            ("course_code", re.compile(
+                r"(?:mã\s*(?:môn|môn\s*học|học\s*phần|HP)|course\s*code|unit\s*code)\s*[:\-]?\s*([A-Z]{2,5}\s?\d{3,6}[A-Z]?)",
+                re.IGNORECASE), 0.95),
+            ("course_code", re.compile(r"\b([A-Z]{2,4}\d{4,5})\b"), 0.6),
+            ("subject", re.compile(
+                rf"(?:tên\s*môn(?:\s*học)?|môn\s*học|học\s*phần|subject|unit\s*title)\s*[:\-]\s*{_PHRASE}",
+                re.IGNORECASE), 0.85),
+            ("teacher_name", re.compile(
+                rf"(?:giảng\s*viên|giáo\s*viên|GV|lecturer|teacher|tutor)\s*(?:phụ\s*trách\s*)?[:\-]\s*{_PHRASE}",
+                re.IGNORECASE), 0.85),
+            ("location", re.compile(
+                rf"(?:địa\s*điểm|location|venue)\s*[:\-]\s*{_PHRASE}",
+                re.IGNORECASE), 0.85),
+            ("location", re.compile(
+                r"\b((?:phòng|P\.)\s*[A-Z]?\d{2,4}[A-Z]?(?:\s*[-,]\s*(?:tòa|toà|nhà)\s*\w+)?)",
+                re.IGNORECASE), 0.7),
+            ("class_name", re.compile(
+                r"(?:lớp|class)\s*[:\-]?\s*([A-Z]{2,4}\d{4,6}[A-Z0-9]*)",
+                re.IGNORECASE), 0.85),
+            ("semester", re.compile(
+                r"(?:học\s*kỳ|học\s*kì|semester)\s*[:\-]?\s*((?:\d|I{1,3}|[A-Za-z]+\s*\d{2,4})\b)",
+                re.IGNORECASE), 0.8),
+            ("academic_year", re.compile(
+                r"(?:năm\s*học|academic\s*year)\s*[:\-]?\s*(\d{4}\s*[-–]\s*\d{4})",
+                re.IGNORECASE), 0.9),
+            ("assignment_name", re.compile(
+                r"\b((?:Assignment|ASM|Bài\s*tập\s*lớn)\s*\d{1,2})\b",
+                re.IGNORECASE), 0.75),
+        ]
+
+        # Các biến nên thử LLM nếu regex không tìm được
+        self.llm_variables = ["subject", "course_code", "teacher_name", "deadline", "location"]
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.worker_task: Optional[asyncio.Task] = None
+        # Một thread riêng cho LLM (như summary job)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="facts")
+        # Lần extract mới nhất của mỗi document (dùng chung giữa các workers): job
+        # LLM cũ (document đã extract lại hoặc bị xóa) không ghi đè facts
+        self.generations = JobGenerations("facts")
+        self.stats = {"scheduled": 0, "completed": 0, "failed": 0, "discarded": 0}
+
+    def extract_with_rules(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Chạy regex extractors trên từng chunk
+
+        Args:
+            chunks: List [{"text", "metadata", "id"}] như khi thêm vào vector store
+
+        Returns:
+            List facts (mỗi (variable, value) chỉ giữ lần xuất hiện có confidence cao nhất)
+        """
+        best: Dict[tuple, Dict[str, Any]] = {}
+
+        for chunk in chunks:
+            text = chunk.get("text", "")
+            metadata = chunk.get("metadata", {})
+            for variable, pattern, confidence in self.rules:
+                for match in pattern.finditer(text):
+                    value = " ".join(match.group(1).split()).strip(" .,:-")
+                    if not value:
+                        continue
+                    key = (variable, value.lower())
+                    if key in best and best[key]["confidence"] >= confidence:
+                        continue
+                    best[key] = {
+                        "variable": variable,
+                        "value": value,
+                        "chunk_id": chunk.get("id"),
+                        "source": metadata.get("original_name") or metadata.get("file_name"),
+                        "confidence": confidence,
+                        "extractor": "regex"
+                    }
+
+        return list(best.values())
+
+    def extract_with_llm(
+        self,
+        chunks: List[Dict[str, Any]],
+        variables: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Dùng LLM trích xuất các biến còn thiếu, gom nhiều chunks trong một prompt
+
+        Args:
+            chunks: Chunks của document
+            variables: Các biến cần tìm
+
+        Returns:
+            List facts do LLM trích xuất
+        """
+        if not variables or not chunks:
+            return []
+
+        # Gom chunks thành các batch theo độ dài (đánh số để LLM chỉ ra chunk nguồn);
+        # dừng khi đã tìm được mọi biến
+        facts, missing = [], list(variables)
+        batch, length = [], 0
+        for i, chunk in enumerate(chunks):
+            text = chunk.get("text", "")
+            if length + len(text) > settings.fact_llm_max_context_chars and batch:
+                found = self._extract_batch(chunks, batch, missing)
+                facts.extend(found)
+                missing = [var for var in missing if var not in {fact["variable"] for fact in found}]
+                if not missing:
+                    return facts
+                batch, length = [], 0
+            batch.append(f"[{i}] {text}")
+            length += len(text)
+
+        if batch:
+            facts.extend(self._extract_batch(chunks, batch, missing))
+        return facts
+
+    def _extract_batch(
+        self,
+        chunks: List[Dict[str, Any]],
+        batch: List[str],
+        variables: List[str]
+    ) -> List[Dict[str, Any]]:
+        """Một lần gọi LLM cho một batch chunks đã đánh số"""
+        from core.llm_config import llm_manager
+
+        prompt = f"""Trích xuất thông tin từ tài liệu dưới đây.
+
+TÀI LIỆU (mỗi đoạn có số thứ tự trong ngoặc vuông):
+{chr(10).join(batch)}
+
+CÁC THÔNG TIN CẦN TÌM:
+{chr(10).join(f'- {var}' for var in variables)}
+
+Chỉ điền thông tin có trong tài liệu, bỏ qua nếu không có.
+Trả về JSON dạng: {{"tên_biến": {{"value": "giá trị", "chunk": số_thứ_tự_đoạn}}}}
+
+JSON:"""
+
+        try:
+            response = llm_manager.complete(prompt, temperature=0.0).text
+            json_start = response.find("{")
+            json_end = response.rfind("}") + 1
+            if json_start < 0 or json_end <= json_start:
+                return []
+            parsed = json.loads(response[json_start:json_end])
+        except Exception as e:
+            logger.warning(f"LLM fact extraction thất bại: {str(e)}")
+            return []
+
+        first_index = int(batch[0][1:batch[0].index("]")])
+        facts = []
+        for variable in variables:
+            item = parsed.get(variable)
+            if isinstance(item, str):
+                item = {"value": item}
+            if not isinstance(item, dict) or not str(item.get("value", "")).strip():
+                continue
+
+            chunk = chunks[first_index]
+            index = item.get("chunk")
+            if isinstance(index, int) and 0 <= index < len(chunks):
+                chunk = chunks[index]
+
+            facts.append({
+                "variable": variable,
+                "value": str(item["value"]).strip(),
+                "chunk_id": chunk.get("id"),
+                "source": chunk.get("metadata", {}).get("original_name") or chunk.get("metadata", {}).get("file_name"),
+                # Chưa được kiểm chứng: chỉ dùng trực tiếp khi câu hỏi nhắc tới document (xem fact_store.lookup)
+                "confidence": settings.fact_llm_confidence,
+                "extractor": "llm"
+            })
+        return facts
+
+    def extract_and_store(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        use_llm: Optional[bool] = None
+    ) -> int:
+        """
+        Trích xuất facts từ chunks của document và ghi vào fact store
+
+        Facts từ regex được ghi ngay; các biến còn thiếu được tìm bằng LLM
+        trong background worker (chạy trực tiếp nếu worker chưa khởi động,
+        vd. khi chạy tools).
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            chunks: Chunks của document
+            use_llm: Có dùng LLM fallback không (mặc định theo settings)
+
+        Returns:
+            Số facts đã lưu (chưa tính facts do LLM tìm trong background)
+        """
+        use_llm = settings.fact_llm_fallback if use_llm is None else use_llm
+
+        generation = self.generations.next(user_id, document_id)
+        facts = self.extract_with_rules(chunks)
+        count = fact_store.replace_document_facts(user_id, document_id, facts)
+        logger.info(f"Đã lưu {count} facts cho document {document_id} (user {user_id})")
+
+        found = {fact["variable"] for fact in facts if fact["confidence"] >= settings.fact_min_confidence}
+        missing = [var for var in self.llm_variables if var not in found]
+        if use_llm and missing and not self.schedule(user_id, document_id, chunks, facts, missing, generation):
+            count = self._complete_with_llm(user_id, document_id, chunks, facts, missing, generation)
+        return count
+
+    def cancel(self, user_id: int, document_id: Any = None) -> None:
+        """
+        Bỏ các job LLM đang chờ/đang chạy của document (hoặc của cả user) khi bị xóa
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document (None = mọi document của user)
+        """
+        self.generations.cancel(user_id, document_id)
+
+    def _complete_with_llm(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        facts: List[Dict[str, Any]],
+        missing: List[str],
+        generation: int
+    ) -> int:
+        """
+        Tìm các biến còn thiếu bằng LLM và ghi lại facts nếu document chưa extract lại/bị xóa
+
+        Facts mới được ghi sau khi ingest đã tăng knowledge version, nên version
+        được tăng lại để các kết quả /fill đã cache (không có facts này) hết hạn.
+        """
+        llm_facts = self.extract_with_llm(chunks, missing)
+        with self.generations.locked():
+            if not self.generations.is_current(user_id, document_id, generation):
+                self.stats["discarded"] += 1
+                return 0
+            if not llm_facts:
+                return len(facts)
+            count = fact_store.replace_document_facts(user_id, document_id, facts + llm_facts)
+        vector_store_manager.bump_knowledge_version(user_id)
+        logger.info(f"LLM tìm thêm {len(llm_facts)} facts cho document {document_id} (user {user_id})")
+        return count
+
+    def start(self) -> None:
+        """Khởi động background worker cho LLM fallback (gọi trong lifespan)"""
+        if self.worker_task is None:
+            self.loop = asyncio.get_running_loop()
+            self.queue = asyncio.Queue()
+            self.worker_task = asyncio.create_task(self._worker())
+            logger.info("Fact extraction worker đã khởi động")
+
+    async def stop(self) -> None:
+        """Dừng background worker"""
+        if self.worker_task is not None:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+            self.worker_task = None
+            self.queue = None
+        self.executor.shutdown(wait=False)
+
+    def schedule(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        facts: List[Dict[str, Any]],
+        missing: List[str],
+        generation: int
+    ) -> bool:
+        """
+        Đưa job LLM fallback vào hàng đợi (an toàn khi gọi từ thread khác)
+
+        Returns:
+            True nếu đã đưa vào hàng đợi, False nếu worker chưa khởi động
+        """
+        if self.queue is None or self.loop is None or self.loop.is_closed():
+            return False
+
+        job = (user_id, document_id, chunks, facts, missing, generation)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.queue.put_nowait(job)
+        else:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, job)
+        self.stats["scheduled"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        """Xử lý lần lượt các job LLM fallback"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                await loop.run_in_executor(self.executor, self._complete_with_llm, *job)
+                self.stats["completed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Lỗi LLM fact extraction cho document {job[1]}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê về LLM fact extraction job"""
+        return {
+            **self.stats,
+            "llm_fallback": settings.fact_llm_fallback,
+            "pending": self.queue.qsize() if self.queue else 0
+        }
+
+
+# Singleton instance
+fact_extractor = FactExtractor()
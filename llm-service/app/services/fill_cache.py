@@ -0,0 +1,210 @@
+import logging
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from database.vector_store import vector_store_manager
+
+logger = logging.getLogger(__name__)
+
+
+class FillCacheEntry:
+    """Một kết quả /fill đã cache kèm embedding của câu hỏi"""
+
+    def __init__(
+        self,
+        query_embedding: np.ndarray,
+        variant_key: str,
+        knowledge_version: int,
+        result: Dict[str, Any]
+    ):
+        self.query_embedding = query_embedding
+        self.variant_key = variant_key
+        self.knowledge_version = knowledge_version
+        self.result = result
+        self.created_at = time.time()
+
+
+class FillResultCache:
+    """
+    Cache kết quả điền template cho các câu hỏi gần trùng nhau
+
+    Key: (user_id, template_id). Một câu hỏi mới được coi là trùng nếu
+    cosine similarity giữa embedding của nó và câu hỏi đã cache vượt ngưỡng.
+    Entry chỉ hợp lệ khi version knowledge base của user (shared state, dùng
+    chung giữa các workers) không đổi: ingest/xóa knowledge ở bất kỳ process
+    nào làm entry hết hạn, và process thực hiện thay đổi xóa luôn cache của user.
+    Entry gắn với nội dung template qua ``variant_key`` nên template bị sửa
+    không trả về kết quả cũ.
+    """
+
+    def __init__(self):
+        self.entries: "OrderedDict[Tuple[int, int], List[FillCacheEntry]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "stale_skipped": 0, "invalidations": 0}
+
+        # Tự động invalidate khi knowledge của user thay đổi
+        vector_store_manager.add_knowledge_listener(self.invalidate_user)
+
+    @staticmethod
+    def make_variant_key(template_content: str, context: Optional[Dict[str, Any]], use_rag: bool) -> str:
+        """
+        Tạo key phân biệt các biến thể của cùng một request
+        (nội dung template, context bổ sung, có dùng RAG hay không)
+        """
+        payload = json.dumps(
+            {"template": template_content, "context": context or {}, "use_rag": use_rag},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _is_valid(self, entry: FillCacheEntry, knowledge_version: int) -> bool:
+        if entry.knowledge_version != knowledge_version:
+            return False
+        return time.time() - entry.created_at <= settings.fill_cache_ttl_seconds
+
+    def lookup(
+        self,
+        user_id: int,
+        template_id: int,
+        query_embedding: List[float],
+        variant_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Tìm kết quả đã cache cho câu hỏi gần trùng
+
+        Args:
+            user_id: ID của user
+            template_id: ID của template
+            query_embedding: Embedding của câu hỏi mới
+            variant_key: Key từ ``make_variant_key``
+
+        Returns:
+            Kết quả đã cache hoặc None
+        """
+        if not settings.fill_cache_enabled:
+            return None
+
+        query_vector = self._normalize(query_embedding)
+        key = (user_id, template_id)
+        knowledge_version = vector_store_manager.get_knowledge_version(user_id)
+
+        with self._lock:
+            bucket = self.entries.get(key)
+            if bucket:
+                # Bỏ các entry hết hạn
+                bucket[:] = [entry for entry in bucket if self._is_valid(entry, knowledge_version)]
+
+                best_entry, best_score = None, -1.0
+                for entry in bucket:
+                    if entry.variant_key != variant_key:
+                        continue
+                    score = float(entry.query_embedding @ query_vector)
+                    if score > best_score:
+                        best_entry, best_score = entry, score
+
+                if best_entry is not None and best_score >= settings.fill_cache_similarity_threshold:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    logger.debug(f"Fill cache hit {key} (similarity={best_score:.4f})")
+                    return best_entry.result
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        user_id: int,
+        template_id: int,
+        query_embedding: List[float],
+        variant_key: str,
+        result: Dict[str, Any],
+        knowledge_version: Optional[int] = None
+    ) -> None:
+        """
+        Lưu kết quả /fill vào cache
+
+        Args:
+            user_id: ID của user
+            template_id: ID của template
+            query_embedding: Embedding của câu hỏi
+            variant_key: Key từ ``make_variant_key``
+            result: Kết quả (FilledTemplate dạng dict)
+            knowledge_version: Version knowledge của user lấy trước khi tra facts/RAG
+                (mặc định: version hiện tại)
+        """
+        if not settings.fill_cache_enabled:
+            return
+
+        current_version = vector_store_manager.get_knowledge_version(user_id)
+        if knowledge_version is None:
+            knowledge_version = current_version
+        elif knowledge_version != current_version:
+            # Knowledge thay đổi trong lúc điền template: kết quả có thể dựa trên dữ liệu cũ
+            with self._lock:
+                self.stats["stale_skipped"] += 1
+            return
+
+        entry = FillCacheEntry(
+            query_embedding=self._normalize(query_embedding),
+            variant_key=variant_key,
+            knowledge_version=knowledge_version,
+            result=result
+        )
+        key = (user_id, template_id)
+
+        with self._lock:
+            bucket = self.entries.setdefault(key, [])
+            bucket.append(entry)
+            if len(bucket) > settings.fill_cache_entries_per_key:
+                del bucket[0]
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > settings.fill_cache_max_keys:
+                self.entries.popitem(last=False)
+
+            self.stats["stores"] += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Xóa toàn bộ cache của user (gọi khi knowledge của user thay đổi)"""
+        with self._lock:
+            for key in [key for key in self.entries if key[0] == int(user_id)]:
+                del self.entries[key]
+            self.stats["invalidations"] += 1
+
+    def invalidate_template(self, template_id: int) -> None:
+        """Xóa cache của một template (gọi khi template bị sửa/xóa)"""
+        with self._lock:
+            for key in [key for key in self.entries if key[1] == int(template_id)]:
+                del self.entries[key]
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê về fill cache"""
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "enabled": settings.fill_cache_enabled,
+                "keys": len(self.entries),
+                "entries": sum(len(bucket) for bucket in self.entries.values()),
+                "hit_rate": round(self.stats["hits"] / total, 4) if total else 0.0
+            }
+
+
+# Singleton instance
+fill_cache = FillResultCache()
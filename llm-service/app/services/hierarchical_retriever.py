@@ -0,0 +1,227 @@
+import logging
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from core.config import settings
+from database.vector_store import vector_store_manager, VectorStoreManager
+from services.chunk_dedup import chunk_deduplicator
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchicalRetriever:
+    """
+    Retrieval hai bước
+
+    1. Search trong document index nhỏ (mỗi document một vector centroid)
+       để chọn top N documents
+    2. Search chunks chỉ trong các documents đó (filter ``document_id $in``)
+
+    Bước 1 chạy trên số vector bằng số documents thay vì số chunks,
+    bước 2 chỉ xét chunks của vài documents nên không phụ thuộc vào
+    kích thước của global collection.
+    """
+
+    def __init__(
+        self,
+        store: Optional[VectorStoreManager] = None,
+        chunk_collection: Optional[str] = None,
+        document_collection: Optional[str] = None
+    ):
+        self.store = store or vector_store_manager
+        self._chunk_collection = chunk_collection
+        self._document_collection = document_collection
+
+    @property
+    def chunk_collection(self) -> str:
+        return self._chunk_collection or settings.chroma_collection_name
+
+    @property
+    def document_collection(self) -> str:
+        return self._document_collection or f"{settings.chroma_collection_name}_documents"
+
+    @staticmethod
+    def compute_centroid(embeddings: List[List[float]]) -> List[float]:
+        """Trung bình các vectors chunk rồi normalize"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        centroid = matrix.mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroid = centroid / norm
+        return centroid.tolist()
+
+    def index_document(
+        self,
+        user_id: int,
+        document_id: Any,
+        embeddings: List[List[float]],
+        metadata: Optional[Dict[str, Any]] = None,
+        total_chunks: Optional[int] = None
+    ) -> None:
+        """
+        Thêm/cập nhật vector centroid của document vào document index
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document (cùng kiểu với metadata của chunks)
+            embeddings: Vectors của các chunks
+            metadata: Metadata của document (file_name, original_name, ...)
+            total_chunks: Số chunks của document khi embeddings đã được gộp sẵn
+        """
+        if not embeddings:
+            return
+
+        metadata = metadata or {}
+        self.store.ensure_collection(self.document_collection)
+        self.store.add_documents(
+            documents=[{
+                "id": f"docvec_{user_id}_{document_id}",
+                "text": metadata.get("original_name") or metadata.get("file_name") or str(document_id),
+                "metadata": {
+                    "user_id": str(user_id),
+                    "document_id": document_id,
+                    "total_chunks": total_chunks or len(embeddings),
+                    "file_name": metadata.get("file_name", "")
+                }
+            }],
+            collection_name=self.document_collection,
+            embeddings=[self.compute_centroid(embeddings)],
+            upsert=True
+        )
+
+    def rebuild_index(self, page_size: int = 2000) -> int:
+        """
+        Tính lại toàn bộ document index từ embeddings của chunks
+
+        Dùng sau khi chunks được re-embed bằng model khác (centroid không thể
+        re-embed từ text như các collection khác). Đọc trực tiếp backend nên
+        chỉ chạy trong process sở hữu thư mục data (``tools.reembed_collections``).
+
+        Returns:
+            Số documents đã index
+        """
+        sums: Dict[tuple, np.ndarray] = {}
+        counts: Dict[tuple, int] = {}
+        metadatas: Dict[tuple, Dict[str, Any]] = {}
+
+        collection = self.store._ensure_collection(self.chunk_collection)
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset, include=["metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            for metadata, embedding in zip(page["metadatas"], page["embeddings"]):
+                if not metadata or metadata.get("user_id") is None or metadata.get("document_id") is None:
+                    continue
+                key = (metadata["user_id"], metadata["document_id"])
+                vector = np.asarray(embedding, dtype=np.float32)
+                if key in sums:
+                    sums[key] += vector
+                    counts[key] += 1
+                else:
+                    sums[key] = vector.copy()
+                    counts[key] = 1
+                    metadatas[key] = metadata
+            offset += len(page["ids"])
+
+        try:
+            self.store.client.delete_collection(self.document_collection)
+        except ValueError:
+            pass
+        self.store.collections.pop(self.document_collection, None)
+        self.store.incompatible_collections.pop(self.document_collection, None)
+
+        for (user_id, document_id), total in sums.items():
+            self.index_document(
+                int(user_id),
+                document_id,
+                [(total / counts[(user_id, document_id)]).tolist()],
+                metadatas[(user_id, document_id)],
+                total_chunks=counts[(user_id, document_id)]
+            )
+        logger.info(f"Đã build lại document index: {len(sums)} documents")
+        return len(sums)
+
+    def remove_document(self, user_id: int, document_id: Any) -> None:
+        """Xóa document khỏi document index"""
+        self.store.delete_documents(
+            document_ids=[f"docvec_{user_id}_{document_id}"],
+            collection_name=self.document_collection
+        )
+
+    def remove_user(self, user_id: int) -> None:
+        """Xóa toàn bộ documents của user khỏi document index"""
+        self.store.delete_where(
+            {"user_id": {"$eq": str(user_id)}},
+            collection_name=self.document_collection
+        )
+
+    def route_documents(
+        self,
+        query_embedding: List[float],
+        user_id: Optional[int] = None,
+        n_documents: Optional[int] = None
+    ) -> List[Any]:
+        """
+        Bước 1: chọn các documents gần với query nhất
+
+        Returns:
+            List document IDs
+        """
+        self.store.ensure_collection(self.document_collection)
+
+        results = self.store.search(
+            query="",
+            collection_name=self.document_collection,
+            n_results=n_documents or settings.hierarchical_top_documents,
+            filter_metadata={"user_id": str(user_id)} if user_id is not None else None,
+            query_embedding=query_embedding
+        )
+        return [r["metadata"]["document_id"] for r in results if "document_id" in r["metadata"]]
+
+    def search(
+        self,
+        query_embedding: List[float],
+        user_id: Optional[int] = None,
+        n_results: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        n_documents: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search hai bước: document routing rồi chunk search
+
+        Args:
+            query_embedding: Vector của query
+            user_id: ID của user (None = toàn hệ thống)
+            n_results: Số chunks trả về
+            filter_metadata: Metadata filters bổ sung
+            n_documents: Số documents chọn ở bước 1
+
+        Returns:
+            List kết quả giống ``VectorStoreManager.search``.
+            Rỗng nếu document index chưa có document nào phù hợp
+        """
+        document_ids = self.route_documents(query_embedding, user_id, n_documents)
+        if not document_ids:
+            return []
+
+        chunk_filter = dict(filter_metadata or {})
+        if user_id is not None:
+            chunk_filter["user_id"] = str(user_id)
+        chunk_filter["document_id"] = {"$in": document_ids}
+
+        # Documents có chunks bị dedup: tính cả vectors mà chúng tham chiếu
+        return chunk_deduplicator.scoped_search(
+            self.store.search,
+            user_id,
+            n_results,
+            chunk_filter,
+            query="",
+            collection_name=self.chunk_collection,
+            query_embedding=query_embedding
+        )
+
+
+# Singleton instance
+hierarchical_retriever = HierarchicalRetriever()
@@ -0,0 +1,432 @@
+import asyncio
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from core.config import settings
+from core.embedding_config import embedding_manager
+from core.model_client import owner_call
+from database.vector_store import vector_store_manager
+from utils.file_utils import get_directory_size_mb, get_file_size_mb
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 2000
+REBUILD_SUFFIX = "__rebuild"
+OLD_SUFFIX = "__old"
+
+
+class IndexMaintenance:
+    """
+    Bảo trì vector index chạy nền vào giờ thấp điểm
+
+    - Rebuild collections có tỷ lệ vectors đã xóa vượt ngưỡng (tombstones
+      trong HNSW làm index phân mảnh và search chậm dần)
+    - Snapshot nhất quán thư mục lưu vector store
+    - Báo cáo dung lượng đĩa theo collection
+
+    Số vectors đã xóa được ``VectorStoreManager`` đếm ở mỗi lần xóa và lưu
+    lại trong file state để không mất sau khi restart.
+
+    Ở chế độ client, scheduler chạy trong model server (process sở hữu vector
+    store); các uvicorn workers có ``remote = True`` và gửi các thao tác của
+    routes maintenance đến model server.
+    """
+
+    def __init__(self):
+        # True: maintenance chạy trong model server (uvicorn worker ở chế độ client)
+        self.remote = False
+        self.task: Optional[asyncio.Task] = None
+        self._run_lock = threading.Lock()
+        self.state: Dict[str, Any] = {"deleted_counts": {}, "last_run": None, "last_report": None}
+
+    # ----- State -----
+
+    def load_state(self) -> None:
+        """Đọc state và khôi phục bộ đếm vectors đã xóa"""
+        path = settings.maintenance_state_path
+        if path.exists():
+            try:
+                self.state.update(json.loads(path.read_text(encoding="utf-8")))
+            except Exception as e:
+                logger.warning(f"Không đọc được maintenance state: {str(e)}")
+        for name, count in self.state.get("deleted_counts", {}).items():
+            vector_store_manager.deleted_counts[name] = max(
+                vector_store_manager.deleted_counts.get(name, 0), count
+            )
+
+    def save_state(self) -> None:
+        """Ghi state (bộ đếm xóa, lần chạy gần nhất) xuống đĩa"""
+        self.state["deleted_counts"] = dict(vector_store_manager.deleted_counts)
+        path = settings.maintenance_state_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.state, ensure_ascii=False, default=str), encoding="utf-8")
+        tmp_path.replace(path)
+
+    # ----- Scheduler -----
+
+    def start(self) -> None:
+        """Khởi động scheduler (gọi trong lifespan)"""
+        if settings.model_server_mode == "client":
+            self.remote = True
+            return
+        self.load_state()
+        if settings.maintenance_enabled and self.task is None:
+            self.task = asyncio.create_task(self._scheduler())
+            logger.info(
+                f"Index maintenance scheduler đã khởi động "
+                f"({settings.maintenance_offpeak_start_hour}h-{settings.maintenance_offpeak_end_hour}h)"
+            )
+
+    async def stop(self) -> None:
+        """Dừng scheduler và lưu state"""
+        if self.remote:
+            return
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.save_state()
+
+    def is_offpeak(self, now: Optional[datetime] = None) -> bool:
+        """Giờ hiện tại có nằm trong khung giờ thấp điểm không (hỗ trợ khung qua nửa đêm)"""
+        hour = (now or datetime.now()).hour
+        start, end = settings.maintenance_offpeak_start_hour, settings.maintenance_offpeak_end_hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def _due(self) -> bool:
+        """Mỗi ngày chỉ chạy một lần trong khung giờ thấp điểm"""
+        last_run = self.state.get("last_run")
+        return last_run is None or time.time() - last_run >= 20 * 3600
+
+    async def _scheduler(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.maintenance_check_interval_seconds)
+            try:
+                if self.is_offpeak() and self._due():
+                    await loop.run_in_executor(None, self.run)
+                else:
+                    await loop.run_in_executor(None, self.save_state)
+            except Exception as e:
+                logger.error(f"Lỗi khi chạy index maintenance: {str(e)}")
+
+    # ----- Maintenance -----
+
+    def get_deleted_ratio(self, collection_name: str) -> Dict[str, Any]:
+        """Số vectors còn lại, đã xóa và tỷ lệ đã xóa của collection"""
+        collection = vector_store_manager.client.get_collection(collection_name)
+        count = collection.count()
+        # HNSW backend tự lưu số tombstones; ChromaDB dùng bộ đếm của VectorStoreManager
+        if hasattr(collection, "deleted_count"):
+            deleted = collection.deleted_count()
+        else:
+            deleted = vector_store_manager.deleted_counts.get(collection_name, 0)
+        total = count + deleted
+        return {
+            "count": count,
+            "deleted": deleted,
+            "deleted_ratio": round(deleted / total, 4) if total else 0.0
+        }
+
+    def find_collections_to_rebuild(self) -> List[str]:
+        """Collections có tỷ lệ đã xóa vượt ngưỡng"""
+        names = []
+        for collection in vector_store_manager.client.list_collections():
+            if collection.name.endswith((REBUILD_SUFFIX, OLD_SUFFIX)):
+                continue
+            stats = self.get_deleted_ratio(collection.name)
+            if (
+                stats["deleted"] >= settings.maintenance_min_deleted
+                and stats["deleted_ratio"] >= settings.maintenance_deleted_ratio_threshold
+            ):
+                names.append(collection.name)
+        return names
+
+    def rebuild_collection(self, collection_name: str, reembed: bool = False) -> Dict[str, Any]:
+        """
+        Build lại collection không có tombstones, với cấu hình HNSW hiện tại
+
+        Copy vectors (kèm embeddings) sang collection tạm, rồi đổi tên để thay
+        collection cũ. Giữ write lock trong suốt quá trình nên không mất ghi;
+        search vẫn chạy trên collection cũ cho tới lúc đổi tên.
+
+        Args:
+            collection_name: Tên collection
+            reembed: Tính lại embeddings từ text bằng embedding model hiện tại
+                (collection tạo bởi model khác, xem ``tools.reembed_collections``)
+
+        Returns:
+            Thông tin rebuild
+        """
+        client = vector_store_manager.client
+        start = time.time()
+
+        with vector_store_manager.write_lock:
+            before = self.get_deleted_ratio(collection_name)
+            source = client.get_collection(collection_name)
+            tmp_name = collection_name + REBUILD_SUFFIX
+            old_name = collection_name + OLD_SUFFIX
+            for name in (tmp_name, old_name):
+                try:
+                    client.delete_collection(name)
+                except ValueError:
+                    pass
+
+            target = client.get_or_create_collection(
+                tmp_name,
+                metadata={
+                    "description": f"Knowledge base for {collection_name}",
+                    "embedding_model": settings.embedding_model,
+                    **vector_store_manager.get_hnsw_config(collection_name)
+                }
+            )
+
+            offset = 0
+            while True:
+                page = source.get(
+                    limit=PAGE_SIZE,
+                    offset=offset,
+                    include=["documents", "metadatas"] if reembed else ["documents", "metadatas", "embeddings"]
+                )
+                if not page["ids"]:
+                    break
+                if reembed:
+                    embeddings = embedding_manager.embed_texts(page["documents"])
+                    if len(embeddings) != len(page["ids"]):
+                        client.delete_collection(tmp_name)
+                        raise RuntimeError(f"Re-embed '{collection_name}' thất bại: có documents rỗng")
+                else:
+                    embeddings = page["embeddings"]
+                target.add(
+                    ids=page["ids"],
+                    documents=page["documents"],
+                    metadatas=page["metadatas"],
+                    embeddings=embeddings
+                )
+                offset += len(page["ids"])
+
+            if target.count() != before["count"]:
+                client.delete_collection(tmp_name)
+                raise RuntimeError(
+                    f"Rebuild '{collection_name}' thất bại: copy {target.count()}/{before['count']} vectors"
+                )
+
+            client.rename_collection(collection_name, old_name)
+            client.rename_collection(tmp_name, collection_name)
+            client.delete_collection(old_name)
+
+            # Làm mới cache collection (và LlamaIndex wrapper / shards của global collection)
+            vector_store_manager.refresh_collection(collection_name)
+            vector_store_manager.deleted_counts.pop(collection_name, None)
+            vector_store_manager.incompatible_collections.pop(collection_name, None)
+
+        result = {
+            "collection": collection_name,
+            "count": before["count"],
+            "removed_tombstones": before["deleted"],
+            "reembedded": reembed,
+            "seconds": round(time.time() - start, 2)
+        }
+        logger.info(f"Đã rebuild collection '{collection_name}': {result}")
+        return result
+
+    def _persist_directory(self) -> Path:
+        if vector_store_manager.client.name == "chroma":
+            return Path(settings.chroma_persist_directory)
+        return Path(settings.hnsw_persist_directory)
+
+    @owner_call("index_maintenance")
+    def create_snapshot(self) -> Dict[str, Any]:
+        """
+        Snapshot nhất quán thư mục vector store
+
+        Giữ write lock khi copy; file SQLite được copy bằng backup API
+        (bao gồm cả dữ liệu còn trong WAL). Chỉ giữ lại
+        ``maintenance_snapshot_keep`` snapshots gần nhất.
+
+        Returns:
+            Thông tin snapshot
+        """
+        source = self._persist_directory()
+        snapshot_root = Path(settings.maintenance_snapshot_directory)
+        snapshot_root.mkdir(parents=True, exist_ok=True)
+        name = f"{vector_store_manager.client.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        partial = snapshot_root / (name + ".partial")
+        start = time.time()
+
+        with vector_store_manager.write_lock:
+            for path in source.rglob("*"):
+                relative = path.relative_to(source)
+                target = partial / relative
+                if path.is_dir():
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+                if path.name.endswith(("-wal", "-shm")):
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if path.suffix == ".sqlite3":
+                    src_conn = sqlite3.connect(str(path))
+                    dst_conn = sqlite3.connect(str(target))
+                    with dst_conn:
+                        src_conn.backup(dst_conn)
+                    src_conn.close()
+                    dst_conn.close()
+                else:
+                    shutil.copy2(path, target)
+
+            manifest = {
+                "backend": vector_store_manager.client.name,
+                "created_at": datetime.now().isoformat(),
+                "collections": {
+                    collection.name: collection.count()
+                    for collection in vector_store_manager.client.list_collections()
+                }
+            }
+
+        (partial / "snapshot_manifest.json").write_text(
+            json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        final = snapshot_root / name
+        partial.rename(final)
+
+        # Xóa snapshots cũ
+        snapshots = sorted(
+            path for path in snapshot_root.iterdir()
+            if path.is_dir() and not path.name.endswith(".partial")
+        )
+        for old in snapshots[:-settings.maintenance_snapshot_keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+        result = {
+            "path": str(final),
+            "size_mb": round(get_directory_size_mb(str(final)), 2),
+            "seconds": round(time.time() - start, 2)
+        }
+        logger.info(f"Đã tạo snapshot vector store: {result}")
+        return result
+
+    @owner_call("index_maintenance")
+    def get_disk_usage(self) -> Dict[str, Any]:
+        """
+        Dung lượng đĩa theo collection
+
+        ChromaDB: thư mục segment HNSW của từng collection (metadata và text
+        nằm chung trong chroma.sqlite3, báo cáo riêng). HNSW backend: thư mục
+        của từng collection.
+        """
+        root = self._persist_directory()
+        usage: Dict[str, Any] = {"backend": vector_store_manager.client.name, "collections": {}}
+
+        if vector_store_manager.client.name == "chroma":
+            db_path = root / "chroma.sqlite3"
+            segments: Dict[str, List[str]] = {}
+            if db_path.exists():
+                conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(
+                        "SELECT s.id, c.name FROM segments s JOIN collections c ON s.collection = c.id"
+                    ).fetchall()
+                finally:
+                    conn.close()
+                for segment_id, collection_name in rows:
+                    segments.setdefault(collection_name, []).append(segment_id)
+                usage["shared_sqlite_mb"] = round(get_file_size_mb(str(db_path)), 2)
+            for collection_name, segment_ids in segments.items():
+                usage["collections"][collection_name] = round(sum(
+                    get_directory_size_mb(str(root / segment_id))
+                    for segment_id in segment_ids if (root / segment_id).exists()
+                ), 2)
+        else:
+            for path in root.iterdir():
+                if path.is_dir():
+                    usage["collections"][path.name] = round(get_directory_size_mb(str(path)), 2)
+
+        usage["total_mb"] = round(get_directory_size_mb(str(root)), 2)
+        return usage
+
+    @owner_call("index_maintenance")
+    def run(
+        self,
+        rebuild: bool = True,
+        snapshot: bool = True,
+        collections: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Chạy một lượt maintenance (đồng bộ, gọi từ thread riêng)
+
+        Args:
+            rebuild: Rebuild collections vượt ngưỡng tỷ lệ xóa
+            snapshot: Tạo snapshot sau khi rebuild
+            collections: Chỉ rebuild các collections này (bỏ qua ngưỡng)
+
+        Returns:
+            Báo cáo của lượt chạy
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("Index maintenance đang chạy")
+
+        try:
+            report: Dict[str, Any] = {
+                "started_at": datetime.now().isoformat(),
+                "rebuilt": [],
+                "failed": [],
+                "snapshot": None
+            }
+
+            if rebuild:
+                for name in (collections or self.find_collections_to_rebuild()):
+                    try:
+                        report["rebuilt"].append(self.rebuild_collection(name))
+                    except Exception as e:
+                        logger.error(f"Lỗi khi rebuild '{name}': {str(e)}")
+                        report["failed"].append({"collection": name, "error": str(e)})
+
+            if snapshot:
+                report["snapshot"] = self.create_snapshot()
+
+            report["disk_usage"] = self.get_disk_usage()
+            report["finished_at"] = datetime.now().isoformat()
+
+            self.state["last_run"] = time.time()
+            self.state["last_report"] = report
+            self.save_state()
+            return report
+
+        finally:
+            self._run_lock.release()
+
+    @owner_call("index_maintenance")
+    def get_status(self) -> Dict[str, Any]:
+        """Trạng thái maintenance và tỷ lệ xóa của từng collection"""
+        return {
+            "enabled": settings.maintenance_enabled,
+            "running": self._run_lock.locked(),
+            "offpeak_hours": [settings.maintenance_offpeak_start_hour, settings.maintenance_offpeak_end_hour],
+            "deleted_ratio_threshold": settings.maintenance_deleted_ratio_threshold,
+            "last_run": (
+                datetime.fromtimestamp(self.state["last_run"]).isoformat()
+                if self.state.get("last_run") else None
+            ),
+            "collections": {
+                collection.name: self.get_deleted_ratio(collection.name)
+                for collection in vector_store_manager.client.list_collections()
+            },
+            "last_report": self.state.get("last_report")
+        }
+
+
+# Singleton instance
+index_maintenance = IndexMaintenance()
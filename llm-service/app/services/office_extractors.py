@@ -0,0 +1,258 @@
+"""
+Extractor DOCX/PPTX đọc trực tiếp XML trong file zip bằng ``lxml.etree.iterparse``
+
+So với python-docx/python-pptx:
+    - Đọc tuần tự, giải phóng từng phần tử sau khi xử lý nên bộ nhớ không phụ
+      thuộc kích thước document (không dựng cả cây XML / object model)
+    - Paragraphs và các dòng của bảng được trả về đúng thứ tự trong document
+      (python-docx đọc hết paragraphs rồi mới đến tables)
+    - Mỗi dòng bảng được đọc một lần (``row.cells`` của python-docx dựng lại cả
+      lưới cells mỗi lần gọi, bậc hai theo số dòng)
+    - PPTX: lấy cả text trong bảng và group shapes
+"""
+import posixpath
+import zipfile
+from typing import Iterator, List, Tuple, Optional
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+MC_NS = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+
+W = f"{{{W_NS}}}"
+A = f"{{{A_NS}}}"
+P = f"{{{P_NS}}}"
+# Nội dung thay thế (mc:Fallback) lặp lại mc:Choice, bỏ qua để không trùng text
+FALLBACK = f"{{{MC_NS}}}Fallback"
+
+# Block trả về theo thứ tự document: ("paragraph", text) hoặc ("row", cells, table_index)
+Block = Tuple
+
+
+def _iter_content(xml) -> Iterator[Tuple[str, object]]:
+    """iterparse (start, end), bỏ qua các phần tử nằm trong mc:Fallback"""
+    skipping = 0
+    for event, elem in etree.iterparse(xml, events=("start", "end")):
+        if elem.tag == FALLBACK:
+            skipping += 1 if event == "start" else -1
+            if event == "end":
+                _release(elem)
+            continue
+        if not skipping:
+            yield event, elem
+
+
+def _release(elem) -> None:
+    """Xóa phần tử đã xử lý và các anh em phía trước để cây XML không lớn dần"""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[Block]:
+    """
+    Duyệt word/document.xml theo thứ tự
+
+    Yields:
+        ("paragraph", text) cho paragraph ngoài bảng,
+        ("row", [cell texts], table_index) cho mỗi dòng của bảng cấp ngoài cùng
+        (bảng lồng trong cell được gộp thành text của cell đó)
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        paragraphs: List[List[str]] = []  # Stack buffer (paragraph trong textbox lồng trong paragraph)
+        # Stack các bảng đang mở (bảng lồng trong cell): dòng và cell hiện tại của mỗi bảng
+        tables: List[dict] = []
+        table_index = -1
+
+        for event, elem in _iter_content(xml):
+            tag = elem.tag
+            if event == "start":
+                if tag == f"{W}p":
+                    paragraphs.append([])
+                elif tag == f"{W}tbl":
+                    if not tables:
+                        table_index += 1
+                    tables.append({"row": None, "cell": None})
+                elif tag == f"{W}tr" and tables:
+                    tables[-1]["row"] = []
+                elif tag == f"{W}tc" and tables:
+                    tables[-1]["cell"] = []
+                continue
+
+            if tag == f"{W}t":
+                if paragraphs and elem.text:
+                    paragraphs[-1].append(elem.text)
+            elif tag == f"{W}tab":
+                if paragraphs:
+                    paragraphs[-1].append("\t")
+            elif tag in (f"{W}br", f"{W}cr"):
+                if paragraphs:
+                    paragraphs[-1].append("\n")
+            elif tag == f"{W}p":
+                text = "".join(paragraphs.pop()) if paragraphs else ""
+                if tables and tables[-1]["cell"] is not None:
+                    tables[-1]["cell"].append(text)
+                elif text.strip():
+                    yield ("paragraph", text)
+                _release(elem)
+            elif tag == f"{W}tc" and tables:
+                table = tables[-1]
+                if table["row"] is not None and table["cell"] is not None:
+                    table["row"].append("\n".join(table["cell"]).strip())
+                table["cell"] = None
+                _release(elem)
+            elif tag == f"{W}tr" and tables:
+                cells = tables[-1]["row"] or []
+                tables[-1]["row"] = None
+                if len(tables) == 1:
+                    if any(cells):
+                        yield ("row", cells, table_index)
+                elif any(cells) and tables[-2]["cell"] is not None:
+                    # Bảng lồng: dòng của nó trở thành một dòng text trong cell chứa bảng
+                    tables[-2]["cell"].append(" | ".join(cells))
+                _release(elem)
+            elif tag == f"{W}tbl" and tables:
+                tables.pop()
+                _release(elem)
+
+
+def extract_docx_text(file_path: str) -> str:
+    """
+    Text của DOCX theo thứ tự document (chưa clean)
+
+    Bảng được format giống extractor python-docx: dòng ``[Bảng]`` rồi mỗi dòng
+    bảng là các cells nối bằng `` | ``.
+    """
+    parts: List[str] = []
+    rows: List[str] = []
+    current_table: Optional[int] = None
+
+    def flush_table() -> None:
+        if rows:
+            parts.append("[Bảng]\n" + "\n".join(rows))
+            rows.clear()
+
+    for block in iter_docx_blocks(file_path):
+        if block[0] == "row":
+            if block[2] != current_table:
+                flush_table()
+                current_table = block[2]
+            rows.append(" | ".join(block[1]))
+        else:
+            flush_table()
+            current_table = None
+            parts.append(block[1])
+    flush_table()
+
+    return "\n\n".join(parts)
+
+
+def _presentation_slide_parts(archive: zipfile.ZipFile) -> List[str]:
+    """Đường dẫn các slide theo thứ tự trình chiếu (sldIdLst của presentation.xml)"""
+    presentation = etree.fromstring(archive.read("ppt/presentation.xml"))
+    relationships = etree.fromstring(archive.read("ppt/_rels/presentation.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in relationships.iter(f"{{{PKG_REL_NS}}}Relationship")}
+
+    parts = []
+    for slide_id in presentation.iter(f"{P}sldId"):
+        target = targets.get(slide_id.get(f"{{{R_NS}}}id"))
+        if not target:
+            continue
+        if target.startswith("/"):
+            parts.append(target.lstrip("/"))
+        else:
+            parts.append(posixpath.normpath(posixpath.join("ppt", target)))
+    return parts
+
+
+def iter_slide_shapes(xml) -> Iterator[str]:
+    """
+    Text của từng shape trong một slide theo thứ tự (kể cả shape trong group)
+
+    Shape text: các paragraph nối bằng xuống dòng (giống ``shape.text`` của
+    python-pptx). Bảng: mỗi dòng là các cells nối bằng `` | ``.
+    """
+    paragraph: Optional[List[str]] = None
+    body: Optional[List[str]] = None
+    cell: Optional[List[str]] = None
+    row: Optional[List[str]] = None
+    table_rows: Optional[List[str]] = None
+
+    for event, elem in _iter_content(xml):
+        tag = elem.tag
+        if event == "start":
+            if tag == f"{A}p":
+                paragraph = []
+            elif tag == f"{P}txBody":
+                body = []
+            elif tag == f"{A}txBody":
+                cell = []
+            elif tag == f"{A}tr":
+                row = []
+            elif tag == f"{A}tbl":
+                table_rows = []
+            continue
+
+        if tag == f"{A}t":
+            if paragraph is not None and elem.text:
+                paragraph.append(elem.text)
+        elif tag == f"{A}br":
+            if paragraph is not None:
+                paragraph.append("\n")
+        elif tag == f"{A}p":
+            text = "".join(paragraph or [])
+            paragraph = None
+            if cell is not None:
+                cell.append(text)
+            elif body is not None:
+                body.append(text)
+        elif tag == f"{A}txBody":
+            if row is not None and cell is not None:
+                row.append("\n".join(cell).strip())
+            cell = None
+        elif tag == f"{A}tr":
+            if table_rows is not None and row and any(row):
+                table_rows.append(" | ".join(row))
+            row = None
+        elif tag == f"{A}tbl":
+            if table_rows:
+                yield "\n".join(table_rows)
+            table_rows = None
+        elif tag == f"{P}txBody":
+            text = "\n".join(body or [])
+            body = None
+            if text:
+                yield text
+        elif tag in (f"{P}sp", f"{P}graphicFrame"):
+            _release(elem)
+
+
+def iter_pptx_slides(file_path: str) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Duyệt các slide theo thứ tự trình chiếu
+
+    Yields:
+        (số thứ tự slide bắt đầu từ 1, list text của các shapes)
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        for number, part in enumerate(_presentation_slide_parts(archive), start=1):
+            try:
+                with archive.open(part) as xml:
+                    yield number, list(iter_slide_shapes(xml))
+            except KeyError:
+                continue
+
+
+def extract_pptx_text(file_path: str) -> str:
+    """Text của PPTX (chưa clean), mỗi slide bắt đầu bằng marker ``[Slide N]``"""
+    parts = []
+    for number, shapes in iter_pptx_slides(file_path):
+        if shapes:
+            parts.append(f"[Slide {number}]\n" + "\n".join(shapes))
+    return "\n\n".join(parts)
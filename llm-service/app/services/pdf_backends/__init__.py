@@ -0,0 +1,44 @@
+from typing import List, Optional
+
+from core.config import settings
+from services.pdf_backends.base import PdfBackend, PageResult
+
+PDF_BACKENDS = ("pypdf", "pypdfium2")
+
+
+def create_pdf_backend(name: Optional[str] = None) -> PdfBackend:
+    """
+    Tạo PDF backend theo tên
+
+    Args:
+        name: "pypdf" hoặc "pypdfium2" (mặc định theo ``settings.pdf_backend``)
+
+    Returns:
+        PdfBackend
+    """
+    name = name or settings.pdf_backend
+
+    # Import trong hàm để chỉ cần cài thư viện của backend được chọn
+    if name == "pypdf":
+        from services.pdf_backends.pypdf_backend import PypdfBackend
+        return PypdfBackend()
+    if name == "pypdfium2":
+        from services.pdf_backends.pdfium_backend import PdfiumBackend
+        return PdfiumBackend()
+
+    raise ValueError(f"PDF backend không hợp lệ: {name}")
+
+
+def available_pdf_backends() -> List[str]:
+    """Các backend có thư viện đã được cài"""
+    available = []
+    for name in PDF_BACKENDS:
+        try:
+            create_pdf_backend(name)
+            available.append(name)
+        except ImportError:
+            continue
+    return available
+
+
+__all__ = ["PdfBackend", "PageResult", "PDF_BACKENDS", "create_pdf_backend", "available_pdf_backends"]
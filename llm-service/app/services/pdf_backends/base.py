@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+# Kết quả của một trang: (số trang bắt đầu từ 1, text hoặc None nếu lỗi, thông báo lỗi)
+PageResult = Tuple[int, Optional[str], Optional[str]]
+
+
+class PdfBackend(ABC):
+    """
+    Interface của thư viện extract text từ PDF
+
+    Backend phải dùng được trong process con (được tạo lại theo tên trong
+    mỗi worker), và lỗi của một trang không được làm hỏng các trang khác.
+    """
+
+    name: str
+
+    @abstractmethod
+    def page_count(self, file_path: str) -> int:
+        """Số trang của PDF"""
+
+    @abstractmethod
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[PageResult]:
+        """
+        Extract text các trang [start, end) (đánh số từ 0)
+
+        Returns:
+            List (số trang bắt đầu từ 1, text hoặc None, lỗi hoặc None) theo thứ tự trang
+        """
@@ -0,0 +1,26 @@
+from typing import List
+
+import pypdf
+
+from services.pdf_backends.base import PdfBackend, PageResult
+
+
+class PypdfBackend(PdfBackend):
+    """Backend pypdf (pure Python, luôn có sẵn)"""
+
+    name = "pypdf"
+
+    def page_count(self, file_path: str) -> int:
+        with open(file_path, "rb") as file:
+            return len(pypdf.PdfReader(file).pages)
+
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[PageResult]:
+        results = []
+        with open(file_path, "rb") as file:
+            reader = pypdf.PdfReader(file)
+            for page_num in range(start, min(end, len(reader.pages))):
+                try:
+                    results.append((page_num + 1, reader.pages[page_num].extract_text(), None))
+                except Exception as e:
+                    results.append((page_num + 1, None, str(e)))
+        return results
@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from services.pdf_backends import PageResult, create_pdf_backend
+
+logger = logging.getLogger(__name__)
+
+# Process pool theo số workers, tạo khi cần và dùng lại giữa các lần extract
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _extract_range(backend_name: str, file_path: str, start: int, end: int) -> List[PageResult]:
+    """Chạy trong process con: extract một khoảng trang bằng backend theo tên"""
+    return create_pdf_backend(backend_name).extract_pages(file_path, start, end)
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    workers = settings.pdf_extraction_workers if workers is None else workers
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn: không fork process đang có thread (uvicorn, torch, llama.cpp)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def _discard_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    """Bỏ pool bị hỏng (worker chết, vd. segfault khi parse) để lần sau tạo pool mới"""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def resolve_backend_name(name: Optional[str] = None) -> str:
+    """Backend được cấu hình, hoặc pypdf nếu thư viện của backend đó chưa được cài"""
+    name = name or settings.pdf_backend
+    try:
+        create_pdf_backend(name)
+        return name
+    except ImportError:
+        logger.warning(f"PDF backend '{name}' chưa được cài, dùng pypdf")
+        return "pypdf"
+
+
+def extract_pdf_pages(
+    file_path: str,
+    backend_name: Optional[str] = None,
+    workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None
+) -> List[PageResult]:
+    """
+    Extract text từng trang của PDF, song song theo khoảng trang trên process pool
+
+    PDF ít hơn ``pdf_parallel_min_pages`` trang (hoặc workers = 1) được extract
+    tuần tự trong thread hiện tại. Lỗi của một trang (hoặc của cả một khoảng
+    trang nếu worker gặp sự cố) chỉ làm mất các trang đó.
+
+    Args:
+        file_path: Đường dẫn PDF
+        backend_name: Tên backend (mặc định theo settings)
+        workers: Số processes (mặc định theo settings, 0 = số CPU)
+        pages_per_task: Số trang mỗi task gửi cho worker
+
+    Returns:
+        List (số trang, text hoặc None, lỗi hoặc None) theo thứ tự trang
+    """
+    backend_name = resolve_backend_name(backend_name)
+    backend = create_pdf_backend(backend_name)
+    total_pages = backend.page_count(file_path)
+    workers = _resolve_workers(workers)
+    pages_per_task = max(1, pages_per_task or settings.pdf_pages_per_task)
+
+    if workers <= 1 or total_pages < settings.pdf_parallel_min_pages:
+        return backend.extract_pages(file_path, 0, total_pages)
+
+    ranges = [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+    extracted: Dict[Tuple[int, int], List[PageResult]] = {}
+    errors: Dict[Tuple[int, int], str] = {}
+
+    # Pool bị hỏng (worker chết giữa chừng): tạo pool mới và chạy lại các khoảng trang chưa xong một lần
+    pending = ranges
+    for attempt in range(2):
+        pool = _get_pool(workers)
+        broken = []
+        try:
+            futures = [(page_range, pool.submit(_extract_range, backend_name, file_path, *page_range)) for page_range in pending]
+        except BrokenProcessPool as e:
+            _discard_pool(workers, pool)
+            errors.update((page_range, str(e)) for page_range in pending)
+            continue
+
+        for page_range, future in futures:
+            try:
+                extracted[page_range] = future.result()
+            except BrokenProcessPool as e:
+                broken.append(page_range)
+                errors[page_range] = str(e) or "Process pool bị hỏng"
+            except Exception as e:
+                errors[page_range] = str(e)
+
+        if not broken:
+            break
+        logger.warning(f"Process pool extract PDF bị hỏng ({len(broken)} khoảng trang), tạo lại pool")
+        _discard_pool(workers, pool)
+        pending = broken
+
+    results: List[PageResult] = []
+    for start, end in ranges:
+        if (start, end) in extracted:
+            results.extend(extracted[(start, end)])
+        else:
+            error = errors.get((start, end), "Không có kết quả")
+            logger.warning(f"Không thể extract trang {start + 1}-{end}: {error}")
+            results.extend((page_num + 1, None, error) for page_num in range(start, end))
+    return results
+
+
+def shutdown_pdf_pools() -> None:
+    """Dừng các process pool (gọi khi shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
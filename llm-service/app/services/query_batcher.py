@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+from core.config import settings
+from core.embedding_config import embedding_manager
+from database.async_db import InstrumentedExecutor
+
+logger = logging.getLogger(__name__)
+
+# Số mẫu gần nhất dùng để tính percentile
+STATS_WINDOW = 1000
+# Khoảng thời gian tính throughput (giây)
+THROUGHPUT_WINDOW = 60.0
+
+
+def _percentile(values, percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * percent))], 2)
+
+
+class QueryBatcher:
+    """
+    Gom các search queries đến gần như cùng lúc để embed trong một lần gọi model
+
+    Query đầu tiên của batch mở một cửa sổ ``max_wait_ms``; các query đến trong
+    cửa sổ đó (tối đa ``max_batch_size``) được embed chung bằng ``embed_texts``.
+    Model chạy trên một worker thread riêng nên event loop không bị chặn, và
+    trong lúc một batch đang embed thì batch kế tiếp tiếp tục được gom.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.max_batch_size = max_batch_size or settings.search_batch_max_size
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.search_batch_max_wait_ms) / 1000
+        self.executor = InstrumentedExecutor("embedding", 1)
+        self.pending: List[tuple] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks = set()
+
+        self.total_queries = 0
+        self.total_batches = 0
+        self.failed_batches = 0
+        self.batch_sizes = deque(maxlen=STATS_WINDOW)
+        self.wait_ms = deque(maxlen=STATS_WINDOW)
+        self.embed_ms = deque(maxlen=STATS_WINDOW)
+        self.latency_ms = deque(maxlen=STATS_WINDOW)
+        self.completed_at = deque()
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embed một query (được gộp với các query đồng thời khác)
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        text = text.strip()
+        if not text:
+            raise ValueError("Text không được rỗng")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future, time.perf_counter()))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    async def embed_query(self, text: str) -> List[float]:
+        """
+        Embed query trên embedding worker: gộp batch nếu bật search batching,
+        ngược lại embed riêng (vẫn không chặn event loop)
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        if settings.search_batching_enabled:
+            return await self.embed(text)
+        return await self.executor.run("embed_query", embedding_manager.embed_text, text)
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed nhiều queries (tự chia theo max_batch_size và gộp với request khác)
+
+        Args:
+            texts: List query texts
+
+        Returns:
+            List embedding vectors theo đúng thứ tự
+        """
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self) -> None:
+        """Tách tối đa max_batch_size queries đang chờ thành một batch và chạy"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        while self.pending:
+            batch = self.pending[:self.max_batch_size]
+            self.pending = self.pending[self.max_batch_size:]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+            # Phần còn lại chưa đủ batch: chờ thêm query trong cửa sổ mới
+            if len(self.pending) < self.max_batch_size:
+                break
+
+        if self.pending:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    async def _run_batch(self, batch: List[tuple]) -> None:
+        started_at = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+
+        try:
+            embeddings = await self.executor.run("embed_batch", embedding_manager.embed_texts, texts)
+            if len(embeddings) != len(texts):
+                raise RuntimeError(f"Số embeddings ({len(embeddings)}) khác số queries ({len(texts)})")
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"Lỗi khi embed batch {len(texts)} queries: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished_at = time.perf_counter()
+        for (_, future, enqueued_at), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+            self.wait_ms.append((started_at - enqueued_at) * 1000)
+            self.latency_ms.append((finished_at - enqueued_at) * 1000)
+
+        self.total_queries += len(batch)
+        self.total_batches += 1
+        self.batch_sizes.append(len(batch))
+        self.embed_ms.append((finished_at - started_at) * 1000)
+
+        now = time.monotonic()
+        self.completed_at.extend([now] * len(batch))
+        while self.completed_at and self.completed_at[0] < now - THROUGHPUT_WINDOW:
+            self.completed_at.popleft()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê batching: kích thước batch, độ trễ, throughput
+
+        Returns:
+            Stats dictionary
+        """
+        now = time.monotonic()
+        recent = sum(1 for t in self.completed_at if t >= now - THROUGHPUT_WINDOW)
+        return {
+            "enabled": settings.search_batching_enabled,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "total_queries": self.total_queries,
+            "total_batches": self.total_batches,
+            "failed_batches": self.failed_batches,
+            "pending": len(self.pending),
+            "avg_batch_size": round(sum(self.batch_sizes) / len(self.batch_sizes), 2) if self.batch_sizes else 0.0,
+            "queue_wait_ms": {"p50": _percentile(self.wait_ms, 0.5), "p95": _percentile(self.wait_ms, 0.95)},
+            "embed_batch_ms": {"p50": _percentile(self.embed_ms, 0.5), "p95": _percentile(self.embed_ms, 0.95)},
+            "query_latency_ms": {"p50": _percentile(self.latency_ms, 0.5), "p95": _percentile(self.latency_ms, 0.95)},
+            "throughput_qps": round(recent / THROUGHPUT_WINDOW, 2)
+        }
+
+
+# Singleton instance
+query_batcher = QueryBatcher()
@@ -2,6 +2,7 @@ import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import asyncio
+from functools import partial
 
 from llama_index.core import VectorStoreIndex, QueryBundle
 from llama_index.core.retrievers import VectorIndexRetriever
@@ -9,13 +10,32 @@ from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.response_synthesizers import ResponseMode
 
 from core.config import settings
-from core.llm_config import get_llm
 from core.embedding_config import get_embed_model
 from database.vector_store import vector_store_manager
+from database.async_db import async_vector_store
+from database.fact_store import fact_store
+from database.content_store import content_store
+from services.summary_service import summary_service
+from services.fact_extractor import fact_extractor
+from services.hierarchical_retriever import hierarchical_retriever
+from services.chunk_dedup import chunk_deduplicator
+from services.query_batcher import query_batcher
 from models.schemas import SearchResult
+from utils.single_flight import SingleFlight, make_key, normalize_text
 
 logger = logging.getLogger(__name__)
 
+# Dùng chung giữa các instance RAGService (mỗi router tạo một instance riêng)
+search_flight = SingleFlight(
+    "rag_search", settings.single_flight_search_timeout_seconds, settings.single_flight_enabled
+)
+query_flight = SingleFlight(
+    "rag_query",
+    # Thời gian chờ LLM lock được giới hạn riêng (llm_manager.acomplete)
+    settings.llm_lock_timeout_seconds + settings.single_flight_llm_timeout_seconds,
+    settings.single_flight_enabled
+)
+
 
 class RAGService:
     """
@@ -67,6 +87,9 @@ class RAGService:
         """
         Tìm kiếm trong knowledge base
         
+        Các request giống nhau (cùng query đã chuẩn hóa, user, top_k, filters)
+        đang chạy đồng thời dùng chung một lần search.
+        
         Args:
             query: Query text
             user_id: ID của user (None = search global)
@@ -76,14 +99,52 @@ class RAGService:
         Returns:
             List of SearchResult
         """
+        key = make_key("search", normalize_text(query), user_id, top_k, filters or {})
         try:
-            # Sử dụng vector store manager search
-            raw_results = vector_store_manager.search(
-                query=query,
-                user_id=user_id,
-                n_results=top_k,
-                filter_metadata=filters
+            return await search_flight.do(
+                key, lambda: self._search(query, user_id, top_k, filters)
             )
+        except asyncio.TimeoutError:
+            logger.error(f"Search timeout cho query: '{query[:50]}...'")
+            return []
+    
+    async def _search(
+        self,
+        query: str,
+        user_id: Optional[int],
+        top_k: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[SearchResult]:
+        """Thực hiện search (không qua single-flight)"""
+        try:
+            # Embed query một lần, dùng cho cả hai bước khi search phân cấp
+            # Các query đồng thời được gộp vào một lần embed (micro-batching)
+            query_embedding = await query_batcher.embed_query(query)
+            
+            raw_results = []
+            if settings.hierarchical_retrieval_enabled:
+                raw_results = await async_vector_store.run(
+                    "hierarchical_search",
+                    hierarchical_retriever.search,
+                    query_embedding=query_embedding,
+                    user_id=user_id,
+                    n_results=top_k,
+                    filter_metadata=filters
+                )
+            
+            # Sử dụng vector store manager search
+            if not raw_results:
+                raw_results = await async_vector_store.run(
+                    "search",
+                    chunk_deduplicator.scoped_search,
+                    partial(vector_store_manager.search, query=query, user_id=user_id, query_embedding=query_embedding),
+                    user_id,
+                    top_k,
+                    filters
+                )
+            
+            # Gắn các documents khác có chunk gần trùng (vector dùng chung sau dedup)
+            chunk_deduplicator.attach_sources(raw_results)
             
             # Convert to SearchResult format
             search_results = []
@@ -105,6 +166,48 @@ class RAGService:
             logger.error(f"Error during search: {str(e)}")
             return []
     
+    async def search_overview(
+        self,
+        query: str,
+        user_id: int,
+        top_k: int = 1
+    ) -> List[SearchResult]:
+        """
+        Tìm summary cấp document cho câu hỏi tổng quan
+        
+        Args:
+            query: Câu hỏi
+            user_id: ID của user
+            top_k: Số summaries tối đa
+            
+        Returns:
+            List of SearchResult (rỗng nếu chưa có summary)
+        """
+        try:
+            if not vector_store_manager.has_collection(summary_service.collection_name):
+                return []
+            query_embedding = await query_batcher.embed_query(query)
+            raw_results = await async_vector_store.run(
+                "summary_search",
+                summary_service.search_summaries,
+                query,
+                user_id,
+                top_k=top_k,
+                query_embedding=query_embedding
+            )
+            return [
+                SearchResult(
+                    text=result["text"],
+                    score=result["score"],
+                    metadata=result.get("metadata", {}),
+                    source=result.get("metadata", {}).get("file_name")
+                )
+                for result in raw_results
+            ]
+        except Exception as e:
+            logger.warning(f"Cannot search summaries: {str(e)}")
+            return []
+    
     async def query_with_context(
         self,
         query: str,
@@ -124,13 +227,40 @@ class RAGService:
         Returns:
             Query result với context
         """
+        key = make_key("query", normalize_text(query), user_id, use_llm, response_mode)
         try:
-            # Search for relevant chunks
-            search_results = await self.search(
-                query=query,
-                user_id=user_id,
-                top_k=settings.top_k_results
+            return await query_flight.do(
+                key, lambda: self._query_with_context(query, user_id, use_llm, response_mode)
             )
+        except asyncio.TimeoutError:
+            logger.error(f"Query timeout: '{query[:50]}...'")
+            return {
+                "answer": "Hết thời gian xử lý câu hỏi, vui lòng thử lại.",
+                "sources": [],
+                "confidence": 0.0
+            }
+    
+    async def _query_with_context(
+        self,
+        query: str,
+        user_id: int,
+        use_llm: bool,
+        response_mode: str
+    ) -> Dict[str, Any]:
+        """Thực hiện query_with_context (không qua single-flight)"""
+        try:
+            # Câu hỏi tổng quan: dùng summary của document thay cho nhiều chunks
+            search_results = []
+            if summary_service.is_overview_question(query):
+                search_results = await self.search_overview(query, user_id)
+            
+            # Search for relevant chunks
+            if not search_results:
+                search_results = await self.search(
+                    query=query,
+                    user_id=user_id,
+                    top_k=settings.top_k_results
+                )
             
             if not search_results:
                 return {
@@ -153,8 +283,7 @@ class RAGService:
                 }
             
             # Sử dụng LLM để tổng hợp answer
-            llm = get_llm()
-            
+
             # Tạo prompt cho LLM
             context_str = "\n\n".join(context_texts)
             prompt = llm_manager.create_prompt_template(
@@ -164,7 +293,7 @@ class RAGService:
             )
             
             # Generate answer
-            answer = llm.complete(prompt).text
+            answer = (await llm_manager.acomplete(prompt)).text
             
             # Calculate confidence based on search scores
             avg_score = sum(r.score for r in search_results) / len(search_results)
@@ -204,7 +333,7 @@ class RAGService:
             
             # Check user collection
             user_collection_name = vector_store_manager.get_user_collection_name(user_id)
-            user_stats = vector_store_manager.get_collection_stats(user_collection_name)
+            user_stats = await async_vector_store.get_collection_stats(user_collection_name)
             
             if "error" not in user_stats:
                 stats["collections"].append({
@@ -215,29 +344,20 @@ class RAGService:
                 stats["total_chunks"] += user_stats.get("count", 0)
             
             # Check global collection for user's documents
-            global_collection = vector_store_manager.collections.get(settings.chroma_collection_name)
-            if global_collection:
-                try:
-                    # Query để đếm documents của user trong global collection
-                    results = global_collection.query(
-                        query_texts=[""],  # Empty query
-                        where={"user_id": {"$eq": str(user_id)}},
-                        n_results=1,
-                        include=[]
-                    )
-                    
-                    # ChromaDB không có direct count với filter, estimate từ query
-                    # Trong production nên track riêng hoặc dùng database khác
-                    global_count = len(results.get("ids", [[]])[0])
-                    
-                    stats["collections"].append({
-                        "name": settings.chroma_collection_name,
-                        "type": "global",
-                        "count": global_count
-                    })
-                    
-                except Exception as e:
-                    logger.warning(f"Cannot get global stats: {str(e)}")
+            if vector_store_manager.has_collection(settings.chroma_collection_name):
+                global_count = await async_vector_store.count_where(
+                    {"user_id": str(user_id)},
+                    collection_name=settings.chroma_collection_name
+                )
+                stats["collections"].append({
+                    "name": settings.chroma_collection_name,
+                    "type": "global",
+                    "count": global_count
+                })
+                
+                # Single mode: global collection là nơi lưu duy nhất
+                if settings.vector_storage_mode == "single":
+                    stats["total_chunks"] = global_count
             
             # Estimate storage (rough calculation)
             # Assume average chunk size ~ 1KB
@@ -271,17 +391,16 @@ class RAGService:
             Số chunks
         """
         try:
-            # Search với filter document_id
-            filter_metadata = {"document_id": str(document_id)}
-            
-            results = vector_store_manager.search(
-                query="",  # Empty query
-                user_id=user_id,
-                n_results=1000,  # Get all chunks
-                filter_metadata=filter_metadata
+            # Đếm trực tiếp theo metadata, không cần search
+            stored = await async_vector_store.count_where(
+                {"user_id": str(user_id), "document_id": document_id},
+                collection_name=settings.chroma_collection_name
             )
-            
-            return len(results)
+            # Cộng các chunks bị dedup (dùng vector của document khác)
+            references = await async_vector_store.run(
+                "dedup_count", chunk_deduplicator.count_references, user_id, document_id
+            )
+            return stored + references
             
         except Exception as e:
             logger.error(f"Error counting document chunks: {str(e)}")
@@ -306,6 +425,11 @@ class RAGService:
             deleted_count = 0
             
             for doc_id in document_ids:
+                # Giữ lại vectors đang được documents khác dùng chung (dedup) trước khi xóa
+                await async_vector_store.run(
+                    "dedup_release", chunk_deduplicator.release_document, user_id, doc_id
+                )
+                
                 # Generate chunk IDs pattern
                 chunk_ids = []
                 
@@ -315,8 +439,8 @@ class RAGService:
                 
                 # Delete from user collection
                 user_collection_name = vector_store_manager.get_user_collection_name(user_id)
-                if user_collection_name in vector_store_manager.collections:
-                    count = vector_store_manager.delete_documents(
+                if vector_store_manager.has_collection(user_collection_name):
+                    count = await async_vector_store.delete_documents(
                         document_ids=chunk_ids,
                         collection_name=user_collection_name
                     )
@@ -324,12 +448,30 @@ class RAGService:
                         deleted_count += 1
                 
                 # Delete from global collection
-                count = vector_store_manager.delete_documents(
+                count = await async_vector_store.delete_documents(
                     document_ids=chunk_ids,
                     collection_name=settings.chroma_collection_name
                 )
                 if count > 0 and deleted_count == 0:
                     deleted_count += 1
+                
+                # Document có hơn 1000 chunks (vd: bảng tính lớn): xóa phần còn lại theo metadata
+                for collection_name in (user_collection_name, settings.chroma_collection_name):
+                    if vector_store_manager.has_collection(collection_name):
+                        await async_vector_store.run(
+                            "delete_where",
+                            vector_store_manager.delete_where,
+                            {"$and": [
+                                {"user_id": {"$eq": str(user_id)}},
+                                {"document_id": {"$eq": doc_id}}
+                            ]},
+                            collection_name=collection_name
+                        )
+            
+            if document_ids:
+                for doc_id in document_ids:
+                    await async_vector_store.run("document_cleanup", self._cleanup_document, user_id, doc_id)
+                vector_store_manager.bump_knowledge_version(user_id)
             
             logger.info(f"Deleted knowledge for {deleted_count} documents")
             return deleted_count
@@ -338,6 +480,29 @@ class RAGService:
             logger.error(f"Error deleting documents: {str(e)}")
             return 0
     
+    @staticmethod
+    def _cleanup_document(user_id: int, document_id: Any) -> None:
+        """Xóa facts, content reference, summaries và document index của một document"""
+        fact_extractor.cancel(user_id, document_id)
+        fact_store.delete_document_facts(user_id, document_id)
+        if content_store.conn is not None:
+            content_store.release(user_id, document_id)
+        summary_service.cancel(user_id, document_id)
+        summary_service.delete_document_summaries(user_id, document_id)
+        hierarchical_retriever.remove_document(user_id, document_id)
+    
+    @staticmethod
+    def _cleanup_user(user_id: int) -> None:
+        """Xóa facts, content references, dữ liệu dedup, summaries và document index của user"""
+        fact_extractor.cancel(user_id)
+        fact_store.delete_user_facts(user_id)
+        if content_store.conn is not None:
+            content_store.release_user(user_id)
+        chunk_deduplicator.release_user(user_id)
+        summary_service.cancel(user_id)
+        summary_service.delete_user_summaries(user_id)
+        hierarchical_retriever.remove_user(user_id)
+    
     async def clear_user_knowledge(self, user_id: int) -> bool:
         """
         Xóa toàn bộ knowledge của user
@@ -349,7 +514,8 @@ class RAGService:
             Success status
         """
         try:
-            success = vector_store_manager.clear_user_knowledge(user_id)
+            success = await async_vector_store.clear_user_knowledge(user_id)
+            await async_vector_store.run("user_cleanup", self._cleanup_user, user_id)
             
             # Clear cached indices
             user_collection_name = vector_store_manager.get_user_collection_name(user_id)
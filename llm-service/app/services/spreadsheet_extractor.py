@@ -0,0 +1,179 @@
+"""
+Đọc bảng tính (XLSX, CSV) theo từng nhóm dòng và tạo chunks có header
+
+Không nạp cả sheet vào bộ nhớ: XLSX đọc bằng openpyxl read-only (duyệt XML
+tuần tự), CSV đọc từng dòng. Mỗi dòng được viết thành các cặp
+``Header: giá trị`` để chunk tự mô tả (không phụ thuộc dòng header ở chunk
+khác), các dòng liên tiếp được gộp thành chunk theo số tokens của tokenizer
+embedding model (như ``TokenChunker``).
+"""
+import csv
+import logging
+import os
+from datetime import date, datetime, time
+from typing import Iterator, List, Dict, Any, Tuple, Optional
+
+from core.config import settings
+from services.token_chunker import token_chunker
+
+logger = logging.getLogger(__name__)
+
+SPREADSHEET_EXTENSIONS = (".xlsx", ".csv")
+CSV_ENCODINGS = ("utf-8-sig", "cp1258", "latin-1")
+# Số dòng tokenize trong một lần gọi tokenizer
+TOKENIZE_BATCH = 512
+
+
+def _format_value(value: Any) -> str:
+    """Giá trị cell thành text (ngày giờ theo định dạng dd/mm/yyyy như trong tài liệu)"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        if value.time() == time(0, 0):
+            return value.strftime("%d/%m/%Y")
+        return value.strftime("%H:%M %d/%m/%Y")
+    if isinstance(value, date):
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return " ".join(str(value).split())
+
+
+def _iter_xlsx_sheets(file_path: str) -> Iterator[Tuple[str, Iterator[List[str]]]]:
+    from openpyxl import load_workbook
+
+    # read_only: các dòng được đọc tuần tự từ XML, không dựng toàn bộ sheet
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = (
+                [_format_value(value) for value in row]
+                for row in sheet.iter_rows(values_only=True)
+            )
+            yield sheet.title, rows
+    finally:
+        workbook.close()
+
+
+def _detect_csv_encoding(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        sample = f.read(64 * 1024)
+    for encoding in CSV_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def _iter_csv_sheets(file_path: str) -> Iterator[Tuple[str, Iterator[List[str]]]]:
+    encoding = _detect_csv_encoding(file_path)
+    with open(file_path, newline="", encoding=encoding, errors="replace") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        rows = ([_format_value(value) for value in row] for row in csv.reader(f, dialect))
+        yield os.path.splitext(os.path.basename(file_path))[0], rows
+
+
+def iter_sheet_rows(file_path: str) -> Iterator[Tuple[str, List[str], Iterator[Tuple[int, List[str]]]]]:
+    """
+    Duyệt các sheet của file
+
+    Yields:
+        (tên sheet, headers, iterator (số dòng bắt đầu từ 1, cells)) với dòng
+        không rỗng đầu tiên là header; sheet rỗng bị bỏ qua
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    sheets = _iter_xlsx_sheets(file_path) if extension == ".xlsx" else _iter_csv_sheets(file_path)
+
+    for sheet_name, rows in sheets:
+        numbered = ((number, cells) for number, cells in enumerate(rows, start=1) if any(cells))
+        first = next(numbered, None)
+        if first is None:
+            continue
+        _, header_cells = first
+        headers = [cell or f"Cột {i + 1}" for i, cell in enumerate(header_cells)]
+        yield sheet_name, headers, numbered
+
+
+def render_row(headers: List[str], cells: List[str]) -> str:
+    """Một dòng thành ``Header: giá trị; ...`` (bỏ cell rỗng)"""
+    parts = []
+    for i, cell in enumerate(cells):
+        if cell:
+            header = headers[i] if i < len(headers) else f"Cột {i + 1}"
+            parts.append(f"{header}: {cell}")
+    return "; ".join(parts)
+
+
+def iter_spreadsheet_chunks(file_path: str, max_tokens: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Tạo chunks từ bảng tính, mỗi chunk là một nhóm dòng liên tiếp của một sheet
+
+    Args:
+        file_path: Đường dẫn XLSX/CSV
+        max_tokens: Số tokens tối đa mỗi chunk (mặc định theo ``token_chunker``)
+
+    Yields:
+        {"text", "token_count", "sheet", "row_start", "row_end"}; text bắt đầu
+        bằng dòng ``[Sheet tên] Dòng a-b``
+    """
+    max_tokens = max_tokens or token_chunker.max_tokens
+    max_rows = settings.spreadsheet_rows_per_chunk
+
+    for sheet_name, headers, rows in iter_sheet_rows(file_path):
+        current: List[Tuple[int, str, int]] = []
+        current_tokens = 0
+
+        def emit() -> Dict[str, Any]:
+            row_start, row_end = current[0][0], current[-1][0]
+            title = f"[Sheet {sheet_name}] Dòng {row_start}-{row_end}"
+            return {
+                "text": title + "\n" + "\n".join(text for _, text, _ in current),
+                "token_count": current_tokens + header_tokens,
+                "sheet": sheet_name,
+                "row_start": row_start,
+                "row_end": row_end
+            }
+
+        # Ước lượng tokens của dòng tiêu đề (số dòng thay đổi theo chunk)
+        header_tokens = token_chunker.count_tokens([f"[Sheet {sheet_name}] Dòng 100000-100000"])[0]
+        budget = max(max_tokens - header_tokens, 1)
+
+        while True:
+            batch = []
+            for number, cells in rows:
+                text = render_row(headers, cells)
+                if text:
+                    batch.append((number, text))
+                if len(batch) >= TOKENIZE_BATCH:
+                    break
+            if not batch:
+                break
+
+            token_counts = token_chunker.count_tokens([text for _, text in batch])
+            for (number, text), tokens in zip(batch, token_counts):
+                # +1 token cho xuống dòng giữa các dòng
+                if current and (current_tokens + tokens + 1 > budget or len(current) >= max_rows):
+                    yield emit()
+                    current, current_tokens = [], 0
+                current.append((number, text, tokens))
+                current_tokens += tokens + (1 if len(current) > 1 else 0)
+
+            if len(batch) < TOKENIZE_BATCH:
+                break
+
+        if current:
+            yield emit()
+
+
+def extract_spreadsheet_text(file_path: str) -> str:
+    """Toàn bộ text của bảng tính (cho tools đánh giá; ingest dùng ``iter_spreadsheet_chunks``)"""
+    return "\n\n".join(chunk["text"] for chunk in iter_spreadsheet_chunks(file_path))
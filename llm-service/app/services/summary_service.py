@@ -0,0 +1,326 @@
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from core.config import settings
+from core.embedding_config import embedding_manager
+from database.vector_store import vector_store_manager
+from database.fact_store import normalize_for_match
+from database.shared_state import JobGenerations
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryService:
+    """
+    Tóm tắt phân cấp cho từng document (section -> toàn bộ document)
+
+    Summaries được tạo bởi một background job độ ưu tiên thấp sau khi ingest,
+    lưu cùng embedding riêng trong collection ``<global>_summaries`` và được
+    dùng làm context cho các câu hỏi tổng quan ("môn này học gì?").
+    """
+
+    # Các cụm từ (đã bỏ dấu) cho thấy câu hỏi mang tính tổng quan
+    OVERVIEW_PATTERNS = [
+        "hoc gi", "hoc nhung gi", "tong quan", "gioi thieu", "noi dung chinh",
+        "noi dung mon", "noi dung khoa hoc", "tom tat", "muc tieu mon",
+        "mon nay la gi", "mon nay ve", "overview", "summary", "summarize",
+        "what is this course", "what will we learn", "course about"
+    ]
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker_task: Optional[asyncio.Task] = None
+        # Một thread riêng cho LLM để job nền không chiếm hết thread pool mặc định
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Lần schedule mới nhất của mỗi document (dùng chung giữa các workers): job
+        # của document đã bị xóa hoặc đã được schedule lại bị bỏ qua, không ghi summaries
+        self.generations = JobGenerations("summary")
+        self.stats = {"scheduled": 0, "completed": 0, "failed": 0, "discarded": 0}
+
+    @property
+    def collection_name(self) -> str:
+        return f"{settings.chroma_collection_name}_summaries"
+
+    def is_overview_question(self, question: str) -> bool:
+        """Kiểm tra câu hỏi có phải dạng tổng quan về môn học/tài liệu không"""
+        normalized = normalize_for_match(question)
+        return any(pattern in normalized for pattern in self.OVERVIEW_PATTERNS)
+
+    def start(self) -> None:
+        """Khởi động background worker (gọi trong lifespan)"""
+        if self.worker_task is None:
+            # Collection luôn được mở để có thể tìm/xóa summaries đã tạo trước đó
+            vector_store_manager.ensure_collection(self.collection_name)
+            self.loop = asyncio.get_running_loop()
+            self.queue = asyncio.Queue()
+            self.worker_task = asyncio.create_task(self._worker())
+            logger.info("Summary worker đã khởi động")
+
+    async def stop(self) -> None:
+        """Dừng background worker"""
+        if self.worker_task is not None:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+            self.worker_task = None
+            self.queue = None
+        self.executor.shutdown(wait=False)
+
+    def schedule(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        Đưa document vào hàng đợi tóm tắt (an toàn khi gọi từ thread khác)
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            chunks: Chunks của document (như khi thêm vào vector store)
+
+        Returns:
+            True nếu đã đưa vào hàng đợi
+        """
+        if not settings.document_summaries_enabled or self.queue is None or not chunks:
+            return False
+        if self.loop is None or self.loop.is_closed():
+            return False
+
+        job = (user_id, document_id, chunks, self.generations.next(user_id, document_id))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.queue.put_nowait(job)
+        else:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, job)
+        self.stats["scheduled"] += 1
+        return True
+
+    def cancel(self, user_id: int, document_id: Any = None) -> None:
+        """
+        Bỏ các job đang chờ/đang chạy của document (hoặc của cả user) khi bị xóa
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document (None = mọi document của user)
+        """
+        self.generations.cancel(user_id, document_id)
+
+    async def _worker(self) -> None:
+        """Xử lý lần lượt từng document trong hàng đợi"""
+        while True:
+            user_id, document_id, chunks, generation = await self.queue.get()
+            try:
+                if not self.generations.is_current(user_id, document_id, generation):
+                    # Document đã bị xóa hoặc đã được schedule lại
+                    self.stats["discarded"] += 1
+                    continue
+                if await self.summarize_document(user_id, document_id, chunks, generation):
+                    self.stats["completed"] += 1
+                else:
+                    self.stats["discarded"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"Lỗi tóm tắt document {document_id}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def _split_sections(self, chunks: List[Dict[str, Any]]) -> List[str]:
+        """Gom các chunks liên tiếp thành sections có độ dài giới hạn"""
+        sections, current, length = [], [], 0
+        for chunk in chunks:
+            text = chunk.get("text", "")
+            if current and length + len(text) > settings.summary_section_chars:
+                sections.append("\n".join(current))
+                current, length = [], 0
+            current.append(text)
+            length += len(text)
+        if current:
+            sections.append("\n".join(current))
+        return sections
+
+    async def _summarize(self, text: str, instruction: str) -> str:
+        """Gọi LLM trong thread riêng, nghỉ một chút để nhường request khác"""
+        from core.llm_config import llm_manager
+
+        prompt = llm_manager.create_prompt_template(instruction=instruction, context=text)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor,
+            lambda: llm_manager.complete(
+                prompt, temperature=0.2, max_tokens=settings.summary_max_tokens
+            ).text
+        )
+        await asyncio.sleep(settings.summary_job_delay_seconds)
+        return response.strip()
+
+    async def summarize_document(
+        self,
+        user_id: int,
+        document_id: Any,
+        chunks: List[Dict[str, Any]],
+        generation: Optional[int] = None
+    ) -> int:
+        """
+        Tạo summaries cho từng section rồi cho toàn bộ document và lưu vào vector store
+
+        Args:
+            user_id: ID của user
+            document_id: ID của document
+            chunks: Chunks của document
+            generation: Lần schedule của job (None = không kiểm tra)
+
+        Returns:
+            Số summaries đã lưu (0 nếu document đã bị xóa trong lúc tóm tắt)
+        """
+        base_metadata = chunks[0].get("metadata", {})
+        source = base_metadata.get("original_name") or base_metadata.get("file_name") or ""
+
+        sections = self._split_sections(chunks)
+        section_summaries = []
+        for section in sections:
+            summary = await self._summarize(
+                section,
+                "Tóm tắt ngắn gọn nội dung chính của đoạn tài liệu sau bằng tiếng Việt."
+            )
+            # LLM trả về rỗng: dùng phần đầu section để không mất section đó
+            section_summaries.append(summary or section[:500])
+
+        if len(section_summaries) > 1:
+            document_summary = await self._summarize(
+                "\n\n".join(section_summaries),
+                "Dựa vào các bản tóm tắt từng phần, hãy viết bản tóm tắt tổng quan "
+                "cho toàn bộ tài liệu: chủ đề, nội dung chính và mục tiêu."
+            ) or "\n".join(section_summaries)
+        else:
+            document_summary = section_summaries[0]
+
+        summaries = []
+        for i, summary in enumerate(section_summaries):
+            summaries.append({
+                "id": f"summary_{user_id}_{document_id}_section_{i}",
+                "text": summary,
+                "metadata": {
+                    "user_id": str(user_id),
+                    "document_id": str(document_id),
+                    "level": "section",
+                    "section_index": i,
+                    "file_name": source
+                }
+            })
+        summaries.append({
+            "id": f"summary_{user_id}_{document_id}_document",
+            "text": document_summary,
+            "metadata": {
+                "user_id": str(user_id),
+                "document_id": str(document_id),
+                "level": "document",
+                "total_sections": len(section_summaries),
+                "file_name": source
+            }
+        })
+
+        loop = asyncio.get_running_loop()
+        stored = await loop.run_in_executor(
+            self.executor, self._store_summaries, user_id, document_id, summaries, generation
+        )
+        if stored:
+            logger.info(f"Đã tạo {stored} summaries cho document {document_id}")
+        else:
+            logger.info(f"Bỏ summaries của document {document_id} (đã bị xóa hoặc extract lại)")
+        return stored
+
+    def _store_summaries(
+        self,
+        user_id: int,
+        document_id: Any,
+        summaries: List[Dict[str, Any]],
+        generation: Optional[int]
+    ) -> int:
+        """Embed và ghi summaries (thay summaries cũ) nếu job còn hiệu lực"""
+        embeddings = embedding_manager.embed_texts([s["text"] for s in summaries])
+
+        # Giữ lock khi ghi: delete chạy sau cancel nên không thể xen vào giữa kiểm tra và ghi
+        with self.generations.locked():
+            if not self.generations.is_current(user_id, document_id, generation):
+                return 0
+            # Xóa summaries cũ của document (trường hợp extract lại)
+            self.delete_document_summaries(user_id, document_id)
+            vector_store_manager.add_documents(
+                documents=summaries,
+                collection_name=self.collection_name,
+                embeddings=embeddings
+            )
+        # Summaries được ghi sau khi ingest đã tăng version: /fill đã cache phải hết hạn
+        vector_store_manager.bump_knowledge_version(user_id)
+        return len(summaries)
+
+    def search_summaries(
+        self,
+        question: str,
+        user_id: int,
+        top_k: int = 1,
+        level: str = "document",
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tìm summaries phù hợp với câu hỏi
+
+        Args:
+            question: Câu hỏi
+            user_id: ID của user
+            top_k: Số summaries trả về
+            level: "document" hoặc "section"
+            query_embedding: Vector của câu hỏi nếu đã embed sẵn
+
+        Returns:
+            List kết quả giống ``VectorStoreManager.search``
+        """
+        if not vector_store_manager.has_collection(self.collection_name):
+            return []
+
+        return vector_store_manager.search(
+            query=question,
+            collection_name=self.collection_name,
+            n_results=top_k,
+            filter_metadata={"user_id": str(user_id), "level": level},
+            query_embedding=query_embedding if query_embedding is not None else embedding_manager.embed_text(question)
+        )
+
+    def delete_document_summaries(self, user_id: int, document_id: Any) -> None:
+        """Xóa summaries của một document"""
+        vector_store_manager.delete_where(
+            {"$and": [
+                {"user_id": {"$eq": str(user_id)}},
+                {"document_id": {"$eq": str(document_id)}}
+            ]},
+            collection_name=self.collection_name
+        )
+
+    def delete_user_summaries(self, user_id: int) -> None:
+        """Xóa toàn bộ summaries của user"""
+        vector_store_manager.delete_where(
+            {"user_id": {"$eq": str(user_id)}},
+            collection_name=self.collection_name
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê về summary job"""
+        return {
+            **self.stats,
+            "enabled": settings.document_summaries_enabled,
+            "pending": self.queue.qsize() if self.queue else 0
+        }
+
+
+# Singleton instance
+summary_service = SummaryService()
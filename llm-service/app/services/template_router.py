@@ -0,0 +1,368 @@
+import logging
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.embedding_config import embedding_manager
+from database.mysql_client import mysql_client
+from database.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+
+class UserTemplateIndex:
+    """
+    Index embedding các template của một user
+    Mỗi hàng của ``matrix`` là vector (đã normalize) của một template
+    """
+
+    def __init__(self, user_id: int, dimension: int):
+        self.user_id = user_id
+        self.template_ids: List[int] = []
+        self.fingerprints: Dict[int, str] = {}
+        self.info: Dict[int, Dict[str, Any]] = {}
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        # Lần cuối đối chiếu với templates trong MySQL, và version sync của user lúc đó
+        self.checked_at = time.monotonic()
+        self.sync_version = 0
+
+    def position(self, template_id: int) -> Optional[int]:
+        """Vị trí hàng của template trong matrix (None nếu chưa có)"""
+        try:
+            return self.template_ids.index(template_id)
+        except ValueError:
+            return None
+
+    def upsert(self, template_id: int, vector: np.ndarray, fingerprint: str, info: Dict[str, Any]) -> None:
+        """Thêm mới hoặc thay thế vector của một template"""
+        pos = self.position(template_id)
+        if pos is None:
+            self.template_ids.append(template_id)
+            self.matrix = np.vstack([self.matrix, vector[np.newaxis, :]])
+        else:
+            self.matrix[pos] = vector
+        self.fingerprints[template_id] = fingerprint
+        self.info[template_id] = info
+
+    def remove(self, template_id: int) -> bool:
+        """Xóa template khỏi index"""
+        pos = self.position(template_id)
+        if pos is None:
+            return False
+        self.template_ids.pop(pos)
+        self.matrix = np.delete(self.matrix, pos, axis=0)
+        self.fingerprints.pop(template_id, None)
+        self.info.pop(template_id, None)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.template_ids)
+
+
+class TemplateRouter:
+    """
+    Semantic routing: chọn template phù hợp nhất cho câu hỏi
+
+    Giữ một matrix NumPy cho mỗi user đang hoạt động (LRU eviction).
+    Index được build lazy từ MySQL ở lần route đầu tiên và được cập nhật
+    tăng dần khi template thay đổi (chỉ embed lại template bị sửa): ngay khi
+    backend gọi ``/route/sync``; ở các worker process khác khi thấy version
+    sync của user (shared state) thay đổi; và sau mỗi
+    ``template_router_refresh_seconds`` (template được tạo/sửa mà không sync),
+    bằng cách so fingerprint với danh sách templates trong MySQL.
+    """
+
+    def __init__(self, max_users: Optional[int] = None):
+        self.max_users = max_users or settings.template_router_max_users
+        self.indices: "OrderedDict[int, UserTemplateIndex]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {
+            "routes": 0,
+            "index_builds": 0,
+            "index_refreshes": 0,
+            "templates_embedded": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def build_template_text(template: Dict[str, Any]) -> str:
+        """
+        Tạo text đại diện cho template để embedding
+        Placeholder ``{{var}}`` được thay bằng tên biến cho dễ đọc
+
+        Args:
+            template: Template dict (name, category, content)
+
+        Returns:
+            Text dùng để embedding
+        """
+        content = re.sub(r'\{\{\s*(\w+)\s*\}\}', lambda m: m.group(1).replace("_", " "), template.get("content") or "")
+        parts = [template.get("name") or "", template.get("category") or "", content]
+        return "\n".join(part.strip() for part in parts if part and part.strip())
+
+    @staticmethod
+    def _fingerprint(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _normalize(vectors: List[List[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @staticmethod
+    def _sync_key(user_id: int) -> str:
+        return f"template_index:{int(user_id)}"
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = embedding_manager.embed_texts(texts)
+        if len(embeddings) != len(texts):
+            raise ValueError("Số embeddings không khớp với số templates")
+        self.stats["templates_embedded"] += len(texts)
+        return self._normalize(embeddings)
+
+    def _build_user_index(self, user_id: int) -> UserTemplateIndex:
+        """Build index cho user từ danh sách templates trong MySQL"""
+        sync_version = shared_state.get(self._sync_key(user_id))
+        templates = mysql_client.get_user_templates(user_id)
+
+        texts = [self.build_template_text(t) for t in templates]
+        valid = [(t, text) for t, text in zip(templates, texts) if text]
+
+        if valid:
+            matrix = self._embed([text for _, text in valid])
+            index = UserTemplateIndex(user_id, matrix.shape[1])
+            for (template, text), vector in zip(valid, matrix):
+                index.upsert(
+                    template["id"],
+                    vector,
+                    self._fingerprint(text),
+                    {"name": template.get("name"), "category": template.get("category")}
+                )
+        else:
+            index = UserTemplateIndex(user_id, 0)
+        index.sync_version = sync_version
+
+        self.stats["index_builds"] += 1
+        logger.info(f"Built template index cho user {user_id}: {len(index)} templates")
+        return index
+
+    def _refresh_user_index(self, index: UserTemplateIndex) -> None:
+        """Đối chiếu index với templates trong MySQL: embed lại template mới/bị sửa, bỏ template đã xóa"""
+        try:
+            sync_version = shared_state.get(self._sync_key(index.user_id))
+            templates = mysql_client.get_user_templates(index.user_id)
+        except Exception as e:
+            logger.warning(f"Không thể refresh template index của user {index.user_id}: {str(e)}")
+            return
+
+        current = set()
+        changed = []
+        for template in templates:
+            text = self.build_template_text(template)
+            if not text:
+                continue
+            current.add(template["id"])
+            fingerprint = self._fingerprint(text)
+            if index.fingerprints.get(template["id"]) != fingerprint:
+                changed.append((template, text, fingerprint))
+
+        matrix = self._embed([text for _, text, _ in changed]) if changed else None
+        with self._lock:
+            removed = [template_id for template_id in index.template_ids if template_id not in current]
+            for template_id in removed:
+                index.remove(template_id)
+            if matrix is not None:
+                if len(index) == 0:
+                    index.matrix = np.zeros((0, matrix.shape[1]), dtype=np.float32)
+                for (template, _, fingerprint), vector in zip(changed, matrix):
+                    index.upsert(
+                        template["id"],
+                        vector,
+                        fingerprint,
+                        {"name": template.get("name"), "category": template.get("category")}
+                    )
+            index.sync_version = sync_version
+        self.stats["index_refreshes"] += 1
+        if changed or removed:
+            logger.info(
+                f"Refresh template index của user {index.user_id}: "
+                f"{len(changed)} templates embed lại, {len(removed)} templates bị xóa"
+            )
+
+    def _get_user_index(self, user_id: int) -> UserTemplateIndex:
+        """
+        Lấy index của user (build nếu chưa có, refresh nếu quá hạn hoặc templates
+        đã được sync ở process khác), cập nhật thứ tự LRU
+        """
+        sync_version = shared_state.get(self._sync_key(user_id))
+        with self._lock:
+            index = self.indices.get(user_id)
+            if index is not None:
+                self.indices.move_to_end(user_id)
+                if (
+                    index.sync_version == sync_version
+                    and time.monotonic() - index.checked_at < settings.template_router_refresh_seconds
+                ):
+                    return index
+                # Đánh dấu trước khi refresh để các request đồng thời không refresh lại
+                index.checked_at = time.monotonic()
+                index.sync_version = sync_version
+
+        if index is not None:
+            self._refresh_user_index(index)
+            return index
+
+        index = self._build_user_index(user_id)
+
+        with self._lock:
+            self.indices[user_id] = index
+            self.indices.move_to_end(user_id)
+            while len(self.indices) > self.max_users:
+                evicted_user, _ = self.indices.popitem(last=False)
+                self.stats["evictions"] += 1
+                logger.debug(f"Evict template index của user {evicted_user}")
+        return index
+
+    def route(
+        self,
+        user_id: int,
+        question: str,
+        top_k: Optional[int] = None,
+        category: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tìm các template phù hợp nhất với câu hỏi
+
+        Args:
+            user_id: ID của user sở hữu templates
+            question: Câu hỏi từ sinh viên
+            top_k: Số template trả về
+            category: Chỉ xét template thuộc category này (optional)
+            query_embedding: Vector của câu hỏi nếu đã embed sẵn
+
+        Returns:
+            List [{"template_id", "name", "category", "score"}] sắp xếp theo score giảm dần
+        """
+        top_k = top_k or settings.template_router_top_k
+        index = self._get_user_index(user_id)
+        self.stats["routes"] += 1
+
+        if len(index) == 0:
+            return []
+
+        if query_embedding is None:
+            query_embedding = embedding_manager.embed_text(question)
+        query_vector = self._normalize(query_embedding)[0]
+
+        with self._lock:
+            template_ids = list(index.template_ids)
+            scores = index.matrix @ query_vector
+            info = dict(index.info)
+
+        if category:
+            mask = np.array([info[tid].get("category") == category for tid in template_ids])
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(top_k, len(template_ids))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        matches = []
+        for pos in candidates:
+            if not np.isfinite(scores[pos]):
+                continue
+            template_id = template_ids[pos]
+            matches.append({
+                "template_id": template_id,
+                "name": info[template_id].get("name"),
+                "category": info[template_id].get("category"),
+                "score": float(max(0.0, min(1.0, scores[pos])))
+            })
+        return matches
+
+    def upsert_template(self, user_id: int, template: Dict[str, Any]) -> bool:
+        """
+        Cập nhật một template trong index của user
+        Chỉ embed lại khi nội dung thay đổi. Nếu user chưa có index
+        trong RAM thì bỏ qua (index sẽ được build lazy khi cần)
+
+        Returns:
+            True nếu template được embed lại
+        """
+        with self._lock:
+            index = self.indices.get(user_id)
+        if index is None:
+            return False
+
+        text = self.build_template_text(template)
+        fingerprint = self._fingerprint(text)
+        if index.fingerprints.get(template["id"]) == fingerprint:
+            return False
+
+        vector = self._embed([text])[0]
+        with self._lock:
+            if len(index) == 0:
+                index.matrix = np.zeros((0, vector.shape[0]), dtype=np.float32)
+            index.upsert(
+                template["id"],
+                vector,
+                fingerprint,
+                {"name": template.get("name"), "category": template.get("category")}
+            )
+        return True
+
+    def remove_template(self, user_id: int, template_id: int) -> bool:
+        """Xóa template khỏi index của user"""
+        with self._lock:
+            index = self.indices.get(user_id)
+            if index is None:
+                return False
+            return index.remove(template_id)
+
+    def sync_template(self, user_id: int, template_id: int) -> str:
+        """
+        Đồng bộ một template từ MySQL vào index (gọi khi backend sửa/xóa template)
+
+        Index của user ở các processes khác được refresh ở lần route tiếp theo
+        (version sync của user trong shared state tăng).
+
+        Returns:
+            "updated", "unchanged" hoặc "removed"
+        """
+        shared_state.bump(self._sync_key(user_id))
+        template = mysql_client.get_template_by_id(template_id)
+        if not template or template["owner_id"] != user_id:
+            self.remove_template(user_id, template_id)
+            return "removed"
+        return "updated" if self.upsert_template(user_id, template) else "unchanged"
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Bỏ index của user, sẽ build lại (ở process khác: refresh) ở lần route tiếp theo"""
+        shared_state.bump(self._sync_key(user_id))
+        with self._lock:
+            self.indices.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê về router"""
+        with self._lock:
+            return {
+                **self.stats,
+                "active_users": len(self.indices),
+                "max_users": self.max_users,
+                "indexed_templates": sum(len(index) for index in self.indices.values())
+            }
+
+
+# Singleton instance
+template_router = TemplateRouter()
@@ -2,13 +2,24 @@ import logging
 import re
 from typing import List, Dict, Any, Optional, Tuple
 import json
+import asyncio
 
-from core.llm_config import get_llm, llm_manager
+from core.llm_config import llm_manager, LLMBusyError
 from core.config import settings
+from utils.single_flight import SingleFlight, make_key, normalize_text
 
 logger = logging.getLogger(__name__)
 
 
+# Dùng chung giữa các instance TemplateService
+fill_flight = SingleFlight(
+    "template_fill",
+    # Thời gian chờ LLM lock được giới hạn riêng (llm_manager.acomplete)
+    settings.llm_lock_timeout_seconds + settings.single_flight_llm_timeout_seconds,
+    settings.single_flight_enabled
+)
+
+
 class TemplateService:
     """
     Service xử lý template và điền thông tin
@@ -241,13 +252,29 @@ class TemplateService:
         
         return query
     
+    def apply_values(self, template: str, values: Dict[str, str]) -> str:
+        """
+        Thay các biến đã biết giá trị vào template
+        
+        Args:
+            template: Template content
+            values: Dict {variable: value}
+            
+        Returns:
+            Template với các biến đã được thay
+        """
+        for var, value in values.items():
+            template = template.replace(f"{{{{{var}}}}}", str(value))
+        return template
+    
     async def fill_template_with_llm(
         self,
         template: str,
         variables: List[str],
         question: str,
         context: Optional[Dict[str, Any]] = None,
-        relevant_info: Optional[List[str]] = None
+        relevant_info: Optional[List[str]] = None,
+        prefilled: Optional[Dict[str, str]] = None
     ) -> Dict[str, Any]:
         """
         Sử dụng LLM để điền template
@@ -258,10 +285,58 @@ class TemplateService:
             question: Câu hỏi từ user
             context: Context dictionary
             relevant_info: Thông tin từ RAG
+            prefilled: Các biến đã có giá trị (vd: từ fact store), LLM chỉ điền phần còn lại
             
         Returns:
             Dict với filled_content và variables_filled
         """
+        # Các request giống nhau đang chạy đồng thời dùng chung một lần gọi LLM
+        key = make_key(
+            "fill", template, sorted(variables), normalize_text(question),
+            context or {}, relevant_info or [], prefilled or {}
+        )
+        try:
+            return await fill_flight.do(
+                key,
+                lambda: self._fill_template_with_llm(
+                    template, variables, question, context, relevant_info, prefilled
+                )
+            )
+        except (asyncio.TimeoutError, LLMBusyError) as e:
+            logger.error(f"Không điền được template bằng LLM: {str(e) or 'timeout'}")
+            remaining = [var for var in variables if not prefilled or var not in prefilled]
+            return {
+                "filled_content": self.apply_values(template, prefilled) if prefilled else template,
+                "variables_filled": {
+                    **(prefilled or {}),
+                    **{var: "[Không tìm thấy thông tin]" for var in remaining}
+                },
+                # Kết quả tạm khi LLM quá tải: không lưu vào fill cache
+                "degraded": True
+            }
+    
+    async def _fill_template_with_llm(
+        self,
+        template: str,
+        variables: List[str],
+        question: str,
+        context: Optional[Dict[str, Any]],
+        relevant_info: Optional[List[str]],
+        prefilled: Optional[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """Điền template bằng LLM (không qua single-flight)"""
+        if prefilled:
+            template = self.apply_values(template, prefilled)
+            variables = [var for var in variables if var not in prefilled]
+            if not variables:
+                return {"filled_content": template, "variables_filled": dict(prefilled)}
+            
+            result = await self._fill_template_with_llm(
+                template, variables, question, context, relevant_info, None
+            )
+            result["variables_filled"] = {**prefilled, **result["variables_filled"]}
+            return result
+        
         try:
             # Prepare context cho LLM
             llm_context = []
@@ -287,14 +362,17 @@ class TemplateService:
             )
             
             # Call LLM
-            llm = get_llm()
-            response = llm.complete(prompt, temperature=0.3)  # Lower temperature for consistency
+            # Chạy trong thread để event loop nhận các request khác (và gộp được request trùng);
+            # llm_manager tuần tự hóa các lời gọi llama.cpp, job bị bỏ nếu request hết hạn khi chờ
+            response = await llm_manager.acomplete(prompt, temperature=0.3)  # Lower temperature for consistency
             
             # Parse response
             filled_result = self._parse_llm_response(response.text, template, variables)
             
             return filled_result
             
+        except LLMBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error filling template with LLM: {str(e)}")
             # Fallback: return template with empty values
@@ -0,0 +1,259 @@
+import logging
+import re
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.embedding_config import embedding_manager
+
+logger = logging.getLogger(__name__)
+
+# Marker trang/slide do các extractor thêm vào đầu mỗi trang PDF / slide PPTX
+SECTION_MARKER = re.compile(r"^\[(Trang|Slide) (\d+)\]\s*$", re.MULTILINE)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+# Chỉ cắt ở ranh giới paragraph nếu chunk đã đầy ít nhất tỉ lệ này
+MIN_FILL_FOR_PARAGRAPH_CUT = 0.5
+STATS_WINDOW = 5000
+HISTOGRAM_BUCKET = 32
+
+
+class ChunkStats:
+    """Phân bố số tokens của các chunks đã tạo (cửa sổ các chunks gần nhất)"""
+
+    def __init__(self):
+        self.lengths = deque(maxlen=STATS_WINDOW)
+        self.total_chunks = 0
+        self.over_limit = 0
+        self.lock = threading.Lock()
+
+    def record(self, token_counts: List[int], limit: int) -> None:
+        with self.lock:
+            self.lengths.extend(token_counts)
+            self.total_chunks += len(token_counts)
+            self.over_limit += sum(1 for count in token_counts if count > limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lengths = np.asarray(self.lengths, dtype=np.int32)
+            over_limit, total = self.over_limit, self.total_chunks
+
+        if not len(lengths):
+            return {"total_chunks": total, "window": 0}
+
+        buckets = np.bincount(lengths // HISTOGRAM_BUCKET)
+        return {
+            "total_chunks": total,
+            "window": int(len(lengths)),
+            "over_model_limit": over_limit,
+            "min": int(lengths.min()),
+            "mean": round(float(lengths.mean()), 1),
+            "p50": int(np.percentile(lengths, 50)),
+            "p95": int(np.percentile(lengths, 95)),
+            "max": int(lengths.max()),
+            "histogram": {
+                f"{i * HISTOGRAM_BUCKET}-{(i + 1) * HISTOGRAM_BUCKET - 1}": int(count)
+                for i, count in enumerate(buckets) if count
+            }
+        }
+
+
+class _Unit:
+    """Một câu (hoặc đoạn) cùng token ids của nó"""
+    __slots__ = ("text", "ids", "paragraph_end")
+
+    def __init__(self, text: str, ids: List[int], paragraph_end: bool):
+        self.text = text
+        self.ids = ids
+        self.paragraph_end = paragraph_end
+
+
+class TokenChunker:
+    """
+    Chia text thành chunks đo bằng tokenizer của chính embedding model
+
+    - Không chunk nào vượt ``max_tokens`` (mặc định = max_seq_length của model
+      trừ các special tokens), nên không có phần text nào bị cắt khi embed.
+    - Chunk không vượt qua ranh giới trang/slide (marker ``[Trang N]``,
+      ``[Slide N]`` của extractor) và ưu tiên cắt ở cuối paragraph.
+    - Mỗi câu được tokenize đúng một lần (một lần gọi tokenizer cho cả
+      document); việc gộp câu thành chunk chỉ cộng số tokens đã có. Câu dài
+      hơn giới hạn được cắt trực tiếp trên token ids.
+    - ``token_count`` của chunk được đo lại trên text cuối cùng (một lần gọi
+      tokenizer cho mọi chunks), nên thống kê phát hiện được chunk vượt giới hạn.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None):
+        self._max_tokens = max_tokens
+        self.overlap_tokens = settings.chunk_overlap if overlap_tokens is None else overlap_tokens
+
+    @property
+    def tokenizer(self):
+        return embedding_manager.get_tokenizer()
+
+    @property
+    def max_tokens(self) -> int:
+        if self._max_tokens is None:
+            model_limit = embedding_manager.get_max_seq_length() - self.tokenizer.num_special_tokens_to_add()
+            self._max_tokens = min(settings.chunk_max_tokens or model_limit, model_limit)
+        return self._max_tokens
+
+    @staticmethod
+    def split_sections(text: str) -> List[Dict[str, Any]]:
+        """
+        Tách text theo marker trang/slide
+
+        Returns:
+            List {"header", "kind", "number", "body"} (header rỗng nếu không có marker)
+        """
+        sections = []
+        matches = list(SECTION_MARKER.finditer(text))
+        if not matches or matches[0].start() > 0:
+            end = matches[0].start() if matches else len(text)
+            sections.append({"header": "", "kind": None, "number": None, "body": text[:end]})
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            sections.append({
+                "header": match.group(0).strip(),
+                "kind": "page" if match.group(1) == "Trang" else "slide",
+                "number": int(match.group(2)),
+                "body": text[match.end():end]
+            })
+        return [section for section in sections if section["body"].strip()]
+
+    @staticmethod
+    def split_sentences(body: str) -> List[tuple]:
+        """
+        Tách body thành các câu, đánh dấu câu cuối của mỗi paragraph
+
+        Returns:
+            List (sentence, paragraph_end)
+        """
+        sentences = []
+        for paragraph in PARAGRAPH_BREAK.split(body):
+            parts = [part.strip() for part in SENTENCE_END.split(paragraph.strip()) if part.strip()]
+            for j, part in enumerate(parts):
+                sentences.append((part, j == len(parts) - 1))
+        return sentences
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Số tokens (không tính special tokens) của từng text"""
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def chunk(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Chia text thành chunks
+
+        Args:
+            text: Text đã extract (paragraph cách nhau bởi dòng trống)
+
+        Returns:
+            List {"text", "token_count" (đo trên text của chunk), "page"/"slide" (nếu có)}
+        """
+        sections = self.split_sections(text)
+        sentences_per_section = [self.split_sentences(section["body"]) for section in sections]
+
+        # Tokenize toàn bộ câu và header trong một lần gọi
+        flat = [sentence for sentences in sentences_per_section for sentence, _ in sentences]
+        headers = [section["header"] for section in sections]
+        encoded = self.tokenizer(flat + headers, add_special_tokens=False)["input_ids"] if flat else []
+
+        chunks = []
+        position = 0
+        for s, (section, sentences) in enumerate(zip(sections, sentences_per_section)):
+            header_ids = encoded[len(flat) + s] if section["header"] else []
+            units = []
+            for sentence, paragraph_end in sentences:
+                units.append(_Unit(sentence, encoded[position], paragraph_end))
+                position += 1
+
+            for chunk_text, token_count in self._pack(units, self.max_tokens - len(header_ids)):
+                chunk = {
+                    "text": f"{section['header']}\n{chunk_text}" if section["header"] else chunk_text,
+                    "token_count": token_count + len(header_ids)
+                }
+                if section["kind"]:
+                    chunk[section["kind"]] = section["number"]
+                chunks.append(chunk)
+
+        # Số tokens thực của text cuối cùng (ghép câu / decode có thể khác tổng
+        # số tokens từng câu), dùng cho metadata và thống kê vượt giới hạn
+        for chunk, token_count in zip(chunks, self.count_tokens([chunk["text"] for chunk in chunks])):
+            chunk["token_count"] = token_count
+
+        return chunks
+
+    def _pack(self, units: List[_Unit], budget: int):
+        """Gộp các câu liên tiếp thành chunks không vượt budget tokens"""
+        budget = max(budget, 1)
+        current: List[_Unit] = []
+        current_tokens = 0
+
+        def render(group: List[_Unit]) -> str:
+            parts = []
+            for i, unit in enumerate(group):
+                if i:
+                    parts.append("\n\n" if group[i - 1].paragraph_end else " ")
+                parts.append(unit.text)
+            return "".join(parts)
+
+        for unit in units:
+            # Câu dài hơn budget: cắt theo token ids
+            if len(unit.ids) > budget:
+                if current:
+                    yield render(current), current_tokens
+                    current, current_tokens = [], 0
+                step = max(budget - self.overlap_tokens, 1)
+                for start in range(0, len(unit.ids), step):
+                    window = unit.ids[start:start + budget]
+                    yield self.tokenizer.decode(window).strip(), len(window)
+                    if start + budget >= len(unit.ids):
+                        break
+                continue
+
+            if current and current_tokens + len(unit.ids) > budget:
+                # Ưu tiên cắt ở cuối paragraph gần nhất nếu chunk đủ đầy
+                cut, running = len(current), 0
+                for i, item in enumerate(current):
+                    running += len(item.ids)
+                    if item.paragraph_end and i < len(current) - 1 and running >= budget * MIN_FILL_FOR_PARAGRAPH_CUT:
+                        cut = i + 1
+                emitted, rest = current[:cut], current[cut:]
+                yield render(emitted), sum(len(item.ids) for item in emitted)
+
+                if rest:
+                    # Các câu sau chỗ cắt chưa được emit: giữ nguyên, hoặc emit
+                    # thành chunk riêng nếu không đủ chỗ cho câu tiếp theo
+                    current, current_tokens = rest, sum(len(item.ids) for item in rest)
+                    if current_tokens + len(unit.ids) > budget:
+                        yield render(current), current_tokens
+                        current, current_tokens = [], 0
+                else:
+                    # Overlap: các câu cuối của chunk vừa tạo (trong giới hạn
+                    # overlap_tokens), chỉ bỏ bớt overlap khi không đủ chỗ
+                    current, current_tokens = [], 0
+                    for item in reversed(emitted):
+                        if current_tokens + len(item.ids) > self.overlap_tokens:
+                            break
+                        current.insert(0, item)
+                        current_tokens += len(item.ids)
+                    while current and current_tokens + len(unit.ids) > budget:
+                        current_tokens -= len(current.pop(0).ids)
+
+            current.append(unit)
+            current_tokens += len(unit.ids)
+
+        if current:
+            yield render(current), current_tokens
+
+
+# Singleton instances
+token_chunker = TokenChunker()
+chunk_stats = ChunkStats()
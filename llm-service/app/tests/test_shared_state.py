@@ -0,0 +1,78 @@
+"""
+Test SharedState/JobGenerations với database tạm, thay đổi từ process khác
+
+Chạy từ thư mục app/:
+    python -m pytest tests
+"""
+import multiprocessing
+
+import pytest
+
+from core.config import settings
+from database.shared_state import JobGenerations, shared_state
+
+
+@pytest.fixture(autouse=True)
+def shared_state_path(tmp_path, monkeypatch):
+    shared_state.close()
+    monkeypatch.setattr(settings, "shared_state_path", tmp_path / "shared_state.sqlite3")
+    yield
+    shared_state.close()
+
+
+def _bump_in_child(path: str, key: str, times: int) -> None:
+    settings.shared_state_path = type(settings.shared_state_path)(path)
+    shared_state.conn = None
+    for _ in range(times):
+        shared_state.bump(key)
+
+
+def _cancel_in_child(path: str, user_id: int) -> None:
+    settings.shared_state_path = type(settings.shared_state_path)(path)
+    shared_state.conn = None
+    JobGenerations("summary").cancel(user_id)
+
+
+def _run_child(target, *args) -> None:
+    process = multiprocessing.get_context("fork").Process(target=target, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+def test_bump_from_other_processes_is_visible():
+    path = str(settings.shared_state_path)
+    assert shared_state.get("knowledge:1") == 0
+    assert shared_state.bump("knowledge:1") == 1
+
+    for _ in range(2):
+        _run_child(_bump_in_child, path, "knowledge:1", 50)
+
+    assert shared_state.get("knowledge:1") == 101
+    assert shared_state.get("knowledge:2") == 0
+
+
+def test_cancel_in_other_process_invalidates_user_jobs():
+    generations = JobGenerations("summary")
+    first = generations.next(7, "a")
+    second = generations.next(7, "b")
+    other_user = generations.next(17, "a")
+
+    _run_child(_cancel_in_child, str(settings.shared_state_path), 7)
+
+    assert not generations.is_current(7, "a", first)
+    assert not generations.is_current(7, "b", second)
+    assert generations.is_current(17, "a", other_user)
+    assert generations.is_current(7, "a", None)
+
+
+def test_next_generation_supersedes_previous_job():
+    generations = JobGenerations("facts")
+    old = generations.next(1, 10)
+    new = generations.next(1, 10)
+
+    assert not generations.is_current(1, 10, old)
+    assert generations.is_current(1, 10, new)
+    # Prefix của user 1 không khớp key của user 10
+    generations.cancel(10)
+    assert generations.is_current(1, 10, new)
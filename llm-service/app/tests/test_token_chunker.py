@@ -0,0 +1,112 @@
+"""
+Test TokenChunker với tokenizer giả (mỗi từ là một token)
+
+Chạy từ thư mục app/:
+    python -m pytest tests
+"""
+import random
+
+from services.token_chunker import TokenChunker
+
+
+class WordTokenizer:
+    """Tokenizer tách theo khoảng trắng, đủ interface mà TokenChunker dùng"""
+
+    def __init__(self):
+        self.vocab = []
+        self.ids = {}
+
+    def _id(self, word: str) -> int:
+        if word not in self.ids:
+            self.ids[word] = len(self.vocab)
+            self.vocab.append(word)
+        return self.ids[word]
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [[self._id(word) for word in text.split()] for text in texts]}
+
+    def decode(self, ids):
+        return " ".join(self.vocab[i] for i in ids)
+
+    def num_special_tokens_to_add(self):
+        return 0
+
+
+class WordChunker(TokenChunker):
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        super().__init__(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        self._tokenizer = WordTokenizer()
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer
+
+
+def _sentence(tag: str, words: int) -> str:
+    return " ".join(f"{tag}w{i}" for i in range(words)) + "."
+
+
+def _assert_covered(chunker: TokenChunker, text: str) -> None:
+    chunks = chunker.chunk(text)
+    for chunk in chunks:
+        assert chunk["token_count"] <= chunker.max_tokens
+    for sentence, _ in chunker.split_sentences(text):
+        assert any(sentence in chunk["text"] for chunk in chunks), f"Mất câu: {sentence[:40]}"
+
+
+def test_sentences_after_paragraph_cut_are_kept():
+    # Paragraph 59 tokens, rồi câu 29 tokens và 79 tokens (budget 100)
+    chunker = WordChunker(max_tokens=100, overlap_tokens=20)
+    text = _sentence("a", 59) + "\n\n" + _sentence("b", 29) + " " + _sentence("c", 79)
+    chunks = chunker.chunk(text)
+
+    assert [chunk["token_count"] for chunk in chunks] == [59, 29, 79]
+    _assert_covered(chunker, text)
+
+
+def test_every_sentence_appears_in_some_chunk():
+    rng = random.Random(42)
+    for case in range(200):
+        chunker = WordChunker(max_tokens=rng.choice([20, 50, 100]), overlap_tokens=rng.choice([0, 5, 20]))
+        paragraphs = []
+        for p in range(rng.randint(1, 6)):
+            sentences = [
+                _sentence(f"x{case}p{p}s{s}", rng.randint(1, 90))
+                for s in range(rng.randint(1, 5))
+            ]
+            paragraphs.append(" ".join(sentences))
+        text = "\n\n".join(paragraphs)
+
+        chunks = chunker.chunk(text)
+        for sentence, _ in chunker.split_sentences(text):
+            words = sentence.split()
+            if len(words) > chunker.max_tokens:
+                # Câu dài hơn budget bị cắt theo tokens: mọi từ phải có trong chunks
+                joined = " ".join(chunk["text"] for chunk in chunks)
+                assert all(word in joined for word in words)
+            else:
+                assert any(sentence in chunk["text"] for chunk in chunks), f"Mất câu: {sentence[:40]}"
+        assert all(chunk["token_count"] <= chunker.max_tokens for chunk in chunks)
+
+
+class NewlineTokenizer(WordTokenizer):
+    """Mỗi dấu xuống dòng cũng là một token: text ghép nhiều tokens hơn tổng từng câu"""
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {
+            "input_ids": [
+                [self._id(word) for word in text.split()] + [self._id("\n")] * text.count("\n")
+                for text in texts
+            ]
+        }
+
+
+def test_token_count_is_measured_on_chunk_text():
+    chunker = WordChunker(max_tokens=100, overlap_tokens=0)
+    chunker._tokenizer = NewlineTokenizer()
+    text = "\n\n".join(_sentence(f"p{p}", 33) for p in range(3))
+    chunks = chunker.chunk(text)
+
+    assert [chunk["token_count"] for chunk in chunks] == chunker.count_tokens([chunk["text"] for chunk in chunks])
+    # 99 từ + 4 dấu xuống dòng giữa các paragraph: vượt giới hạn và được ghi nhận
+    assert any(chunk["token_count"] > chunker.max_tokens for chunk in chunks)
@@ -0,0 +1,262 @@
+"""
+Index lại toàn bộ documents từ bảng ``documents`` của backend (offline)
+
+Dùng khi đổi embedding model hoặc khôi phục vector store sau sự cố:
+    - đọc documents từ MySQL theo từng batch (phân trang keyset theo id)
+    - extract text và chia chunks trong process pool
+    - embed nhiều chunks trong một lần gọi model
+    - ghi vectors (thay thế chunks cũ của document) và cập nhật facts/document index
+    - lưu checkpoint sau mỗi lần ghi để chạy tiếp được khi bị dừng
+
+Cách chạy (từ thư mục app/, khi service đang dừng):
+    python -m tools.backfill_index --workers 4 --embed-batch 512
+    python -m tools.backfill_index --user-id 12 --reset
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any
+
+from core.config import settings, BASE_DIR
+from utils.file_utils import InstanceLockError, acquire_instance_lock
+
+DEFAULT_CHECKPOINT = BASE_DIR / "data" / "backfill_checkpoint.json"
+
+# DocumentProcessor riêng cho mỗi worker process
+_processor = None
+
+
+def init_worker() -> None:
+    """
+    Khởi tạo worker process
+
+    Mỗi worker đã là một process parse riêng: extract PDF tuần tự trong worker
+    thay vì mở thêm process pool lồng bên trong.
+    """
+    settings.pdf_extraction_workers = 1
+
+
+def parse_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract text và chia chunks cho một document (chạy trong worker process)
+
+    Returns:
+        {"doc", "chunks", "doc_metadata"} hoặc {"doc", "error"}
+    """
+    global _processor
+    try:
+        if _processor is None:
+            from services.document_processor import DocumentProcessor
+            _processor = DocumentProcessor()
+
+        if not doc["file_path"] or not os.path.exists(doc["file_path"]):
+            return {"doc": doc, "error": f"File không tồn tại: {doc['file_path']}"}
+
+        text_content = asyncio.run(_processor._extract_text(doc["file_path"]))
+        if not text_content or len(text_content.strip()) < 10:
+            return {"doc": doc, "chunks": [], "doc_metadata": {}}
+
+        metadata = {
+            "document_id": doc["id"],
+            "original_name": doc["original_name"],
+            "file_type": doc["file_type"],
+            "owner_name": doc.get("owner_name") or "",
+            "owner_email": doc.get("owner_email") or ""
+        }
+        chunks, doc_metadata = _processor.build_chunks(
+            text_content, doc["file_path"], doc["owner_id"], metadata
+        )
+        return {"doc": doc, "chunks": chunks, "doc_metadata": doc_metadata}
+
+    except Exception as e:
+        return {"doc": doc, "error": str(e)}
+
+
+class Backfill:
+    """Điều phối đọc MySQL -> parse (process pool) -> embed theo batch lớn -> ghi"""
+
+    def __init__(self, args):
+        self.args = args
+        self.checkpoint_path = Path(args.checkpoint)
+        self.checkpoint = self._load_checkpoint()
+        self.pending: List[Dict[str, Any]] = []
+        self.pending_chunks = 0
+        self.start_time = time.time()
+        self.run_documents = 0
+        self.run_chunks = 0
+
+        from services.document_processor import DocumentProcessor
+        self.processor = DocumentProcessor()
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if self.args.reset or not self.checkpoint_path.exists():
+            return {"last_document_id": 0, "documents": 0, "chunks": 0, "empty": 0, "failed": []}
+        return json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+
+    def _save_checkpoint(self) -> None:
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.checkpoint, ensure_ascii=False, default=str), encoding="utf-8")
+        tmp_path.replace(self.checkpoint_path)
+
+    def _report(self) -> None:
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        print(
+            f"\rdocs {self.checkpoint['documents']} (+{self.run_documents}) | "
+            f"chunks {self.checkpoint['chunks']} (+{self.run_chunks}) | "
+            f"{self.run_documents / elapsed:.2f} docs/s | {self.run_chunks / elapsed:.1f} chunks/s | "
+            f"lỗi {len(self.checkpoint['failed'])} | id {self.checkpoint['last_document_id']}",
+            end="", flush=True
+        )
+
+    def handle(self, result: Dict[str, Any]) -> None:
+        """Nhận kết quả parse, embed + ghi khi đủ batch"""
+        doc = result["doc"]
+        if "error" in result:
+            self.checkpoint["failed"].append({"id": doc["id"], "error": result["error"]})
+        elif not result["chunks"]:
+            self.checkpoint["empty"] += 1
+        else:
+            self.pending.append(result)
+            self.pending_chunks += len(result["chunks"])
+
+        # Document lỗi/rỗng vẫn được tính là đã xử lý khi batch trước nó được ghi
+        self.pending.append({"marker": doc["id"]})
+        if self.pending_chunks >= self.args.embed_batch:
+            self.flush()
+
+    def flush(self) -> None:
+        """Embed toàn bộ chunks đang chờ trong một lần gọi và ghi vào vector store"""
+        from core.embedding_config import embedding_manager
+
+        parsed = [item for item in self.pending if "chunks" in item]
+        markers = [item["marker"] for item in self.pending if "marker" in item]
+        if parsed:
+            texts = [chunk["text"] for item in parsed for chunk in item["chunks"]]
+            embeddings = embedding_manager.embed_texts(texts)
+
+            offset = 0
+            for item in parsed:
+                count = len(item["chunks"])
+                self.processor.store_chunks(
+                    item["doc"]["owner_id"],
+                    item["chunks"],
+                    embeddings[offset:offset + count],
+                    item["doc_metadata"],
+                    replace=True,
+                    fact_llm_fallback=self.args.fact_llm
+                )
+                offset += count
+                self.run_documents += 1
+                self.run_chunks += count
+                self.checkpoint["documents"] += 1
+                self.checkpoint["chunks"] += count
+
+        if markers:
+            self.checkpoint["last_document_id"] = max(markers)
+        self.pending, self.pending_chunks = [], 0
+        self._save_checkpoint()
+        self._report()
+
+    def run(self, pool: ProcessPoolExecutor) -> None:
+        """
+        Args:
+            pool: Process pool parse documents (tạo bằng ``create_parse_pool`` trước khi load models)
+        """
+        from database.mysql_client import mysql_client
+
+        after_id = self.checkpoint["last_document_id"]
+        if after_id:
+            print(f"Tiếp tục từ document id > {after_id}")
+
+        seen = 0
+        for batch in mysql_client.iter_documents_keyset(
+            batch_size=self.args.batch_size, after_id=after_id, user_id=self.args.user_id
+        ):
+            if self.args.limit is not None:
+                batch = batch[:max(0, self.args.limit - seen)]
+                if not batch:
+                    break
+            seen += len(batch)
+
+            # map giữ thứ tự theo id nên checkpoint luôn tăng dần
+            for result in pool.map(parse_document, batch, chunksize=4):
+                self.handle(result)
+
+        self.flush()
+        print()
+        elapsed = time.time() - self.start_time
+        print(
+            f"Hoàn thành: {self.run_documents} documents, {self.run_chunks} chunks trong {elapsed:.1f}s "
+            f"({self.run_documents / max(elapsed, 1e-6):.2f} docs/s, {self.run_chunks / max(elapsed, 1e-6):.1f} chunks/s)"
+        )
+        if self.checkpoint["failed"]:
+            print(f"{len(self.checkpoint['failed'])} documents lỗi (xem {self.checkpoint_path})")
+
+
+def create_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool parse documents
+
+    spawn (không fork process đã load embedding model/LLM và có threads) và
+    được tạo trước khi load models; workers chỉ load tokenizer khi chia chunks.
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker
+    )
+    # Khởi động các workers ngay (trước khi process chính load models)
+    for future in [pool.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index lại toàn bộ documents từ MySQL")
+    parser.add_argument("--user-id", type=int, default=None, help="Chỉ index documents của user này")
+    parser.add_argument("--batch-size", type=int, default=200, help="Số documents mỗi lần đọc MySQL")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--embed-batch", type=int, default=512, help="Số chunks mỗi lần embed + ghi")
+    parser.add_argument("--limit", type=int, default=None, help="Số documents tối đa trong lần chạy này")
+    parser.add_argument("--checkpoint", default=str(DEFAULT_CHECKPOINT))
+    parser.add_argument("--reset", action="store_true", help="Bỏ checkpoint cũ, chạy lại từ đầu")
+    parser.add_argument("--fact-llm", action="store_true", help="Dùng LLM fallback khi trích xuất facts (chậm)")
+    args = parser.parse_args()
+
+    try:
+        instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+    except InstanceLockError as e:
+        parser.exit(1, f"{e}\nDừng llm-service và model server (hoặc chạy model server với --models-only) trước khi chạy tool này\n")
+
+    # Pool được tạo trước khi load models
+    with instance_lock, create_parse_pool(args.workers) as pool:
+        from core.embedding_config import initialize_embeddings
+        from database.mysql_client import mysql_client
+        from database.vector_store import vector_store_manager
+        from database.fact_store import initialize_fact_store
+        from database.dedup_store import initialize_dedup_store
+
+        mysql_client.initialize()
+        initialize_embeddings()
+        vector_store_manager.initialize(run_self_test=False)
+        initialize_fact_store()
+        initialize_dedup_store()
+        if args.fact_llm:
+            from core.llm_config import initialize_llm
+            initialize_llm()
+
+        print(
+            f"Backend: {settings.vector_backend}, storage mode: {settings.vector_storage_mode}, "
+            f"workers: {args.workers}, embed batch: {args.embed_batch}"
+        )
+        Backfill(args).run(pool)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark retrieval phẳng (flat) và retrieval hai bước (hierarchical)
+
+Sinh corpus tổng hợp (mỗi document là một cụm vectors quanh một "chủ đề"),
+ghi vào một ChromaDB tạm, rồi đo latency p50/p99 và recall@k của hai cách
+search khi global collection tăng kích thước.
+
+Cách chạy (từ thư mục app/):
+    python -m tools.benchmark_hierarchical --sizes 10000 100000 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+from database.vector_backends import create_backend
+from database.vector_store import VectorStoreManager
+from services.hierarchical_retriever import HierarchicalRetriever
+
+CHUNK_COLLECTION = "bench_chunks"
+DOCUMENT_COLLECTION = "bench_documents"
+WRITE_BATCH = 5000
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+def build_corpus(store: VectorStoreManager, retriever: HierarchicalRetriever, args) -> Dict[str, Any]:
+    """Sinh và ghi corpus tổng hợp, trả về dữ liệu để tính ground truth"""
+    rng = np.random.default_rng(args.seed)
+    n_docs = max(1, args.size // args.chunks_per_doc)
+    centers = _normalize(rng.normal(size=(n_docs, args.dim)).astype(np.float32))
+
+    store._ensure_collection(CHUNK_COLLECTION)
+    vectors, owners = [], []
+    batch_ids, batch_vectors, batch_metas = [], [], []
+
+    def flush():
+        if batch_ids:
+            store.collections[CHUNK_COLLECTION].add(
+                ids=list(batch_ids),
+                embeddings=[v.tolist() for v in batch_vectors],
+                metadatas=list(batch_metas),
+                documents=["" for _ in batch_ids]
+            )
+            batch_ids.clear(); batch_vectors.clear(); batch_metas.clear()
+
+    for doc_id in range(n_docs):
+        user_id = doc_id % args.users
+        chunk_vectors = _normalize(
+            centers[doc_id] + args.noise * rng.normal(size=(args.chunks_per_doc, args.dim)).astype(np.float32)
+        )
+        for i, vector in enumerate(chunk_vectors):
+            batch_ids.append(f"c_{doc_id}_{i}")
+            batch_vectors.append(vector)
+            batch_metas.append({"user_id": str(user_id), "document_id": doc_id})
+            if len(batch_ids) >= WRITE_BATCH:
+                flush()
+        retriever.index_document(user_id, doc_id, chunk_vectors.tolist(), {"file_name": f"doc_{doc_id}"})
+        vectors.append(chunk_vectors)
+        owners.extend([user_id] * args.chunks_per_doc)
+    flush()
+
+    return {
+        "centers": centers,
+        "vectors": np.vstack(vectors),
+        "owners": np.asarray(owners),
+        "n_docs": n_docs,
+        "rng": rng
+    }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def run_size(args) -> List[Dict[str, Any]]:
+    """Chạy benchmark cho một kích thước corpus"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = VectorStoreManager()
+        store.client = create_backend(args.backend, Path(tmpdir))
+        retriever = HierarchicalRetriever(store, CHUNK_COLLECTION, DOCUMENT_COLLECTION)
+
+        start = time.time()
+        corpus = build_corpus(store, retriever, args)
+        build_time = time.time() - start
+
+        rng = corpus["rng"]
+        rows = []
+        for mode in ("flat", "hierarchical"):
+            latencies, recalls = [], []
+            for _ in range(args.queries):
+                doc_id = int(rng.integers(corpus["n_docs"]))
+                user_id = doc_id % args.users
+                query = _normalize(
+                    corpus["centers"][doc_id] + args.noise * rng.normal(size=args.dim).astype(np.float32)
+                )
+
+                # Ground truth: top-k chính xác trong chunks của user
+                mask = corpus["owners"] == user_id
+                user_indices = np.flatnonzero(mask)
+                scores = corpus["vectors"][user_indices] @ query
+                exact = {
+                    f"c_{i // args.chunks_per_doc}_{i % args.chunks_per_doc}"
+                    for i in user_indices[np.argsort(-scores)[:args.top_k]].tolist()
+                }
+
+                t0 = time.perf_counter()
+                if mode == "flat":
+                    results = store.search(
+                        query="",
+                        collection_name=CHUNK_COLLECTION,
+                        n_results=args.top_k,
+                        filter_metadata={"user_id": str(user_id)},
+                        query_embedding=query.tolist()
+                    )
+                else:
+                    results = retriever.search(
+                        query_embedding=query.tolist(),
+                        user_id=user_id,
+                        n_results=args.top_k,
+                        n_documents=args.top_documents
+                    )
+                latencies.append(time.perf_counter() - t0)
+
+                found = {result["id"] for result in results}
+                recalls.append(len(found & exact) / max(1, len(exact)))
+
+            rows.append({
+                "chunks": args.size,
+                "documents": corpus["n_docs"],
+                "mode": mode,
+                "p50_ms": _percentile(latencies, 50),
+                "p99_ms": _percentile(latencies, 99),
+                "recall": float(np.mean(recalls)),
+                "build_s": build_time
+            })
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flat vs hierarchical retrieval")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--chunks-per-doc", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--top-documents", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=["chroma", "hnsw"], default="chroma")
+    args = parser.parse_args()
+
+    print(f"{'chunks':>10} {'docs':>8} {'mode':>13} {'p50 ms':>9} {'p99 ms':>9} {'recall':>8} {'build s':>9}")
+    for size in args.sizes:
+        args.size = size
+        for row in run_size(args):
+            print(
+                f"{row['chunks']:>10} {row['documents']:>8} {row['mode']:>13} "
+                f"{row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['recall']:>8.3f} {row['build_s']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
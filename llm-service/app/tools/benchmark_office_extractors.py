@@ -0,0 +1,177 @@
+"""
+Benchmark extractor DOCX/PPTX: python-docx/python-pptx ("library") và lxml iterparse ("stream")
+
+Sinh các file DOCX (paragraphs xen kẽ bảng lớn) và PPTX (nhiều slides có bảng)
+với kích thước tăng dần, hoặc dùng file có sẵn, rồi đo cho mỗi extractor:
+    - thời gian extract (gồm _clean_text như khi ingest)
+    - RSS tăng thêm khi extract (mỗi lần chạy trong một process riêng)
+    - số dòng text chỉ có ở một extractor (stream lấy cả bảng trong PPTX,
+      nên khác biệt ở PPTX có bảng là bình thường)
+
+Cách chạy (từ thư mục app/):
+    python -m tools.benchmark_office_extractors --table-rows 500 2000 8000
+    python -m tools.benchmark_office_extractors --files data/sample_docs/handbook.docx data/sample_docs/unit.pptx
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any
+from xml.sax.saxutils import escape
+
+EXTRACTORS = ["library", "stream"]
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+PACKAGE_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _paragraph(text: str) -> str:
+    return f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(text)}</w:t></w:r></w:p>"
+
+
+def generate_docx(path: Path, tables: int, rows: int, cols: int, paragraphs: int) -> None:
+    """DOCX tối giản: paragraphs xen kẽ ``tables`` bảng rows x cols (ghi XML trực tiếp cho nhanh)"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", PACKAGE_RELS)
+        with archive.open("word/document.xml", "w") as xml:
+            xml.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                      f'<w:document xmlns:w="{W_NS}"><w:body>'.encode("utf-8"))
+            for t in range(tables):
+                for p in range(paragraphs):
+                    xml.write(_paragraph(
+                        f"Phần {t + 1}.{p + 1}: sinh viên hoàn thành bài tập theo hướng dẫn của giảng viên."
+                    ).encode("utf-8"))
+                xml.write(b"<w:tbl><w:tblGrid>" + b"<w:gridCol/>" * cols + b"</w:tblGrid>")
+                for r in range(rows):
+                    cells = "".join(
+                        f"<w:tc>{_paragraph(f'Bảng {t + 1} dòng {r + 1} cột {c + 1}')}</w:tc>"
+                        for c in range(cols)
+                    )
+                    xml.write(f"<w:tr>{cells}</w:tr>".encode("utf-8"))
+                xml.write(b"</w:tbl>")
+            xml.write(b"<w:sectPr/></w:body></w:document>")
+
+
+def generate_pptx(path: Path, slides: int, rows: int, cols: int) -> None:
+    """PPTX gồm ``slides`` slides, mỗi slide có title, body và một bảng rows x cols"""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for s in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {s + 1}: Learning outcome {s % 4 + 1}"
+        slide.placeholders[1].text = "\n".join(
+            f"Tiêu chí {s + 1}.{i + 1}: đánh giá mức Pass/Merit/Distinction" for i in range(5)
+        )
+        table = slide.shapes.add_table(rows, cols, Inches(0.5), Inches(4), Inches(9), Inches(2)).table
+        for r in range(rows):
+            for c in range(cols):
+                table.cell(r, c).text = f"S{s + 1} R{r + 1} C{c + 1}"
+    presentation.save(str(path))
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker(extractor: str, file_path: str, output: str) -> None:
+    """Chạy một extractor trong process hiện tại, in kết quả dạng JSON"""
+    from core.config import settings
+    from services.document_processor import DocumentProcessor
+
+    settings.office_extractor = extractor
+    processor = DocumentProcessor()
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    text = asyncio.run(processor._extract_text(file_path))
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    Path(output).write_text(text, encoding="utf-8")
+    print(json.dumps({"seconds": elapsed, "rss_delta_mb": max(0.0, peak_mb - rss_before), "chars": len(text)}))
+
+
+def run_file(file_path: Path, tmpdir: Path) -> List[Dict[str, Any]]:
+    """Chạy cả hai extractor trên một file (mỗi extractor một process)"""
+    rows, texts = [], {}
+    for extractor in EXTRACTORS:
+        output = tmpdir / f"{file_path.stem}.{extractor}.txt"
+        result = subprocess.run(
+            [sys.executable, "-m", "tools.benchmark_office_extractors", "--worker", extractor, str(file_path), str(output)],
+            capture_output=True, text=True, check=True
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        texts[extractor] = Counter(line.strip() for line in output.read_text(encoding="utf-8").splitlines() if line.strip())
+        rows.append({"file": file_path.name, "extractor": extractor, **stats})
+
+    only_library = sum((texts["library"] - texts["stream"]).values())
+    only_stream = sum((texts["stream"] - texts["library"]).values())
+    for row in rows:
+        row["diff_lines"] = only_library if row["extractor"] == "library" else only_stream
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extractor DOCX/PPTX: python-docx/pptx vs lxml iterparse")
+    parser.add_argument("--files", nargs="*", default=[], help="File DOCX/PPTX có sẵn (bỏ qua phần sinh file)")
+    parser.add_argument("--table-rows", type=int, nargs="+", default=[500, 2000, 8000],
+                        help="Số dòng mỗi bảng của các DOCX sinh ra")
+    parser.add_argument("--tables", type=int, default=3)
+    parser.add_argument("--table-cols", type=int, default=6)
+    parser.add_argument("--paragraphs", type=int, default=200, help="Số paragraphs trước mỗi bảng")
+    parser.add_argument("--slides", type=int, nargs="+", default=[50, 300])
+    parser.add_argument("--worker", nargs=3, metavar=("EXTRACTOR", "FILE", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        files = [Path(f) for f in args.files]
+        if not files:
+            for rows in args.table_rows:
+                path = tmpdir / f"tables_{rows}.docx"
+                generate_docx(path, args.tables, rows, args.table_cols, args.paragraphs)
+                files.append(path)
+            for slides in args.slides:
+                path = tmpdir / f"slides_{slides}.pptx"
+                generate_pptx(path, slides, 8, 4)
+                files.append(path)
+
+        print(f"{'file':>24} {'size MB':>8} {'extractor':>9} {'seconds':>9} {'RSS +MB':>8} {'chars':>10} {'diff lines':>10}")
+        for path in files:
+            size_mb = path.stat().st_size / 1024 / 1024
+            for row in run_file(path, tmpdir):
+                print(
+                    f"{row['file']:>24} {size_mb:>8.2f} {row['extractor']:>9} {row['seconds']:>9.2f} "
+                    f"{row['rss_delta_mb']:>8.1f} {row['chars']:>10} {row['diff_lines']:>10}"
+                )
+
+
+if __name__ == "__main__":
+    main()
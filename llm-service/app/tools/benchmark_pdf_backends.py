@@ -0,0 +1,117 @@
+"""
+Benchmark extract PDF: pages/s theo backend và số processes
+
+Với mỗi PDF (file có sẵn hoặc PDF sinh ra với số trang cho trước), chạy từng
+backend đã cài (pypdf, pypdfium2) với các số workers khác nhau và báo:
+số trang, thời gian, pages/s, số ký tự và số trang lỗi. Lần chạy đầu của mỗi
+số workers có thêm chi phí khởi động process pool nên được chạy khởi động
+(warm-up) trước khi đo.
+
+Cách chạy (từ thư mục app/):
+    python -m tools.benchmark_pdf_backends --pages 50 200 --workers 1 4 8
+    python -m tools.benchmark_pdf_backends --files data/sample_docs/handbook.pdf
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from core.config import settings
+from services.pdf_backends import available_pdf_backends
+from services.pdf_extraction import extract_pdf_pages, shutdown_pdf_pools
+
+LINES_PER_PAGE = 45
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def generate_pdf(path: Path, pages: int) -> None:
+    """PDF tối giản (font Helvetica, ASCII) với ``pages`` trang đầy text"""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages, điền sau khi biết ID các trang
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_ids = []
+    for page in range(pages):
+        lines = [
+            f"Unit {page % 20 + 1} page {page + 1} line {line + 1}: learners must submit the assignment "
+            f"before the deadline and follow the BTEC assessment criteria."
+            for line in range(LINES_PER_PAGE)
+        ]
+        content = "BT /F1 9 Tf 12 TL 40 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = content.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode("ascii")
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pages/s của các PDF backend")
+    parser.add_argument("--files", nargs="*", default=[], help="PDF có sẵn (bỏ qua phần sinh file)")
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200], help="Số trang của các PDF sinh ra")
+    parser.add_argument("--backends", nargs="+", default=None, help="Mặc định: mọi backend đã cài")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Số processes (1 = tuần tự)")
+    parser.add_argument("--pages-per-task", type=int, default=settings.pdf_pages_per_task)
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo mỗi cấu hình (lấy lần nhanh nhất)")
+    args = parser.parse_args()
+
+    backends = args.backends or available_pdf_backends()
+    # Đo song song cả với PDF ngắn
+    settings.pdf_parallel_min_pages = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [Path(f) for f in args.files]
+        if not files:
+            for pages in args.pages:
+                path = Path(tmp) / f"generated_{pages}.pdf"
+                generate_pdf(path, pages)
+                files.append(path)
+
+        print(f"{'file':>22} {'backend':>10} {'workers':>7} {'pages':>6} {'seconds':>8} {'pages/s':>9} {'chars':>10} {'failed':>6}")
+        try:
+            for path in files:
+                for backend in backends:
+                    for workers in args.workers:
+                        # Warm-up: khởi động process pool và import backend trong workers
+                        extract_pdf_pages(str(path), backend, workers, args.pages_per_task)
+                        best, pages = None, []
+                        for _ in range(args.repeat):
+                            start = time.perf_counter()
+                            pages = extract_pdf_pages(str(path), backend, workers, args.pages_per_task)
+                            elapsed = time.perf_counter() - start
+                            best = elapsed if best is None else min(best, elapsed)
+
+                        chars = sum(len(text or "") for _, text, _ in pages)
+                        failed = sum(1 for _, _, error in pages if error)
+                        print(
+                            f"{path.name:>22} {backend:>10} {workers:>7} {len(pages):>6} {best:>8.2f} "
+                            f"{len(pages) / best:>9.1f} {chars:>10} {failed:>6}"
+                        )
+        finally:
+            shutdown_pdf_pools()
+
+
+if __name__ == "__main__":
+    main()
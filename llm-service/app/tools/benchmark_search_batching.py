@@ -0,0 +1,100 @@
+"""
+Benchmark embedding query dưới tải đồng thời: từng query riêng lẻ vs micro-batching
+
+Mô phỏng ``--concurrency`` clients gửi liên tục tổng cộng ``--requests`` queries:
+    - single: mỗi query gọi ``embed_text`` trên thread pool (như trước khi có batcher)
+    - batched: các query đi qua ``QueryBatcher`` với max batch size / max wait đã cho
+In throughput (queries/s) và độ trễ p50/p95 của mỗi chế độ.
+
+Cách chạy (từ thư mục app/):
+    python -m tools.benchmark_search_batching --concurrency 32 --requests 2000
+    python -m tools.benchmark_search_batching --max-batch-size 64 --max-wait-ms 10
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List, Dict, Any
+
+import numpy as np
+
+from core.embedding_config import embedding_manager, initialize_embeddings
+
+SAMPLE_QUERIES = [
+    "Deadline nộp assignment môn lập trình là khi nào?",
+    "Lịch thi cuối kỳ lớp SE07102",
+    "Yêu cầu của bài tập lớn môn cơ sở dữ liệu",
+    "Tiêu chí chấm điểm merit và distinction",
+    "Giảng viên phụ trách môn mạng máy tính",
+    "Hình thức nộp bài và số trang tối đa",
+    "Nội dung chính của chương 3",
+    "Điều kiện để được dự thi",
+]
+
+
+async def run_mode(mode: str, args, queries: List[str]) -> Dict[str, Any]:
+    from services.query_batcher import QueryBatcher
+    from database.async_db import InstrumentedExecutor
+
+    batcher = QueryBatcher(args.max_batch_size, args.max_wait_ms)
+    single_executor = InstrumentedExecutor("embedding-single", args.single_workers)
+    latencies: List[float] = []
+    position = 0
+
+    async def client():
+        nonlocal position
+        while position < len(queries):
+            query = queries[position]
+            position += 1
+            start = time.perf_counter()
+            if mode == "batched":
+                await batcher.embed(query)
+            else:
+                await single_executor.run("embed_text", embedding_manager.embed_text, query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    single_executor.shutdown()
+
+    result = {
+        "mode": mode,
+        "qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+    }
+    if mode == "batched":
+        result["avg_batch_size"] = batcher.get_stats()["avg_batch_size"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batching embedding query")
+    parser.add_argument("--concurrency", type=int, default=32, help="Số clients đồng thời")
+    parser.add_argument("--requests", type=int, default=1000, help="Tổng số queries")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--single-workers", type=int, default=4, help="Số threads cho chế độ single")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    initialize_embeddings()
+    rng = random.Random(args.seed)
+    # Thêm số thứ tự để mỗi query khác nhau (tránh cache ở tầng dưới nếu có)
+    queries = [f"{rng.choice(SAMPLE_QUERIES)} ({i})" for i in range(args.requests)]
+
+    # Warm-up model
+    embedding_manager.embed_texts(queries[:8])
+
+    print(f"{'mode':<10}{'qps':>10}{'p50 ms':>10}{'p95 ms':>10}{'batch':>8}")
+    for mode in ("single", "batched"):
+        result = asyncio.run(run_mode(mode, args, queries))
+        print(
+            f"{result['mode']:<10}{result['qps']:>10.1f}{result['p50_ms']:>10.1f}"
+            f"{result['p95_ms']:>10.1f}{result.get('avg_batch_size', 1):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
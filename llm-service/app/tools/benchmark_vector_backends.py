@@ -0,0 +1,137 @@
+"""
+Benchmark các vector backends (ChromaDB và HNSW) với cùng một workload
+
+Mỗi backend chạy trên một thư mục tạm, cùng corpus vectors đã normalize và
+cùng bộ queries:
+    - ghi vectors theo batch (vectors/s)
+    - search không filter và search có filter ``user_id`` (p50/p99, recall@k
+      so với kết quả chính xác tính bằng NumPy)
+    - xóa theo filter và đếm
+    - dung lượng trên đĩa
+
+Cách chạy (từ thư mục app/):
+    python -m tools.benchmark_vector_backends --size 100000 --backends chroma hnsw
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+from database.vector_backends import create_backend
+from utils.file_utils import get_directory_size_mb
+
+COLLECTION = "bench_backend"
+WRITE_BATCH = 5000
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def make_workload(args) -> Dict[str, Any]:
+    """Sinh corpus, metadata và queries dùng chung cho mọi backend"""
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.normal(size=(args.size, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    users = np.arange(args.size) % args.users
+
+    # Queries là vectors trong corpus cộng nhiễu để có láng giềng gần thật sự
+    picks = rng.integers(args.size, size=args.queries)
+    queries = vectors[picks] + args.noise * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    return {"vectors": vectors, "users": users, "queries": queries, "query_users": users[picks]}
+
+
+def exact_top_k(workload: Dict[str, Any], query: np.ndarray, k: int, user: int = None) -> set:
+    """Top k chính xác theo cosine (vectors đã normalize nên trùng thứ tự với L2)"""
+    vectors, users = workload["vectors"], workload["users"]
+    candidates = np.arange(len(vectors)) if user is None else np.flatnonzero(users == user)
+    scores = vectors[candidates] @ query
+    top = candidates[np.argsort(-scores)[:k]]
+    return {f"v_{i}" for i in top}
+
+
+def run_backend(name: str, workload: Dict[str, Any], args) -> Dict[str, Any]:
+    """Chạy workload trên một backend"""
+    vectors, users = workload["vectors"], workload["users"]
+    row: Dict[str, Any] = {"backend": name}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = create_backend(name, Path(tmpdir))
+        collection = backend.get_or_create_collection(COLLECTION, metadata={"hnsw:space": args.space})
+
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), WRITE_BATCH):
+            end = min(offset + WRITE_BATCH, len(vectors))
+            collection.add(
+                ids=[f"v_{i}" for i in range(offset, end)],
+                documents=["" for _ in range(offset, end)],
+                metadatas=[{"user_id": str(users[i])} for i in range(offset, end)],
+                embeddings=vectors[offset:end].tolist()
+            )
+        row["insert_per_s"] = len(vectors) / (time.perf_counter() - start)
+
+        for mode in ("all", "user"):
+            latencies, recalls = [], []
+            for query, user in zip(workload["queries"], workload["query_users"]):
+                where = {"user_id": {"$eq": str(user)}} if mode == "user" else None
+                start = time.perf_counter()
+                result = collection.query(
+                    query_embeddings=[query.tolist()],
+                    n_results=args.top_k,
+                    where=where,
+                    include=["distances"]
+                )
+                latencies.append(time.perf_counter() - start)
+                exact = exact_top_k(workload, query, args.top_k, int(user) if mode == "user" else None)
+                recalls.append(len(set(result["ids"][0]) & exact) / max(1, len(exact)))
+            row[f"{mode}_p50_ms"] = _percentile(latencies, 50)
+            row[f"{mode}_p99_ms"] = _percentile(latencies, 99)
+            row[f"{mode}_recall"] = float(np.mean(recalls))
+
+        row["disk_mb"] = get_directory_size_mb(tmpdir)
+
+        start = time.perf_counter()
+        for user in range(0, args.users, 10):
+            collection.delete(where={"user_id": {"$eq": str(user)}})
+        row["delete_s"] = time.perf_counter() - start
+        row["count_after_delete"] = collection.count()
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChromaDB vs HNSW vector backend")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "hnsw"], choices=["chroma", "hnsw"])
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default="cosine")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workload = make_workload(args)
+
+    print(
+        f"{'backend':>8} {'insert/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7} "
+        f"{'user p50':>9} {'user p99':>9} {'u recall':>9} {'disk MB':>8} {'delete s':>9}"
+    )
+    for name in args.backends:
+        row = run_backend(name, workload, args)
+        print(
+            f"{row['backend']:>8} {row['insert_per_s']:>10.0f} {row['all_p50_ms']:>8.2f} "
+            f"{row['all_p99_ms']:>8.2f} {row['all_recall']:>7.3f} {row['user_p50_ms']:>9.2f} "
+            f"{row['user_p99_ms']:>9.2f} {row['user_recall']:>9.3f} {row['disk_mb']:>8.1f} "
+            f"{row['delete_s']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
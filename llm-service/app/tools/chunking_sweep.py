@@ -0,0 +1,252 @@
+"""
+Sweep tham số chia chunks: số chunks, thời gian embed, dung lượng index, latency, recall
+
+Extract một corpus mẫu một lần, rồi với mỗi bộ (chunker, chunk size, overlap):
+    - chia chunks và đếm tokens (tokenizer của embedding model, số chunks bị cắt khi embed)
+    - embed toàn bộ chunks (đo thời gian)
+    - ghi vào một collection tạm (backend đang cấu hình) và đo dung lượng trên đĩa
+    - với mỗi top_k: search bộ câu hỏi có nhãn, đo p50/p99 và recall@k
+
+Bộ câu hỏi là file JSONL, mỗi dòng:
+    {"question": "Deadline ASM môn Toán?", "answer": "23:59 ngày 31/07/2025", "file": "syllabus.pdf"}
+``answer`` là đoạn text (hoặc list các đoạn) phải xuất hiện trong chunk trả về;
+``file`` (optional) giới hạn chunk đúng phải thuộc file đó. Recall@k là tỉ lệ câu
+hỏi có ít nhất một chunk đúng trong top k; tiêu chí này không phụ thuộc cách chia
+chunks nên so sánh được giữa các bộ tham số.
+
+Cách chạy (từ thư mục app/):
+    python -m tools.chunking_sweep --corpus data/sample_docs --questions data/sample_questions.jsonl
+    python -m tools.chunking_sweep --corpus data/sample_docs --questions q.jsonl \\
+        --chunker token sentence --chunk-size 128 256 512 --overlap 0 50 --top-k 3 5 10 --csv sweep.csv
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+from core.config import settings
+from utils.file_utils import get_directory_size_mb
+
+COLLECTION = "chunking_sweep"
+WRITE_BATCH = 2000
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def load_corpus(corpus_dir: Path) -> Dict[str, str]:
+    """Extract text của mọi file được hỗ trợ trong thư mục (một lần cho cả sweep)"""
+    from services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    texts = {}
+    for path in sorted(corpus_dir.rglob("*")):
+        if path.suffix.lower() not in settings.allowed_extensions:
+            continue
+        text = asyncio.run(processor._extract_text(str(path)))
+        if text and text.strip():
+            texts[path.name] = text
+    return texts
+
+
+def load_questions(path: Path) -> List[Dict[str, Any]]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            answers = item["answer"] if isinstance(item["answer"], list) else [item["answer"]]
+            questions.append({
+                "question": item["question"],
+                "answers": [_normalize(answer) for answer in answers],
+                "file": item.get("file")
+            })
+    return questions
+
+
+def build_chunks(texts: Dict[str, str], chunker: str, size: int, overlap: int) -> List[Dict[str, Any]]:
+    """Chia toàn bộ corpus với một bộ tham số"""
+    chunks = []
+    if chunker == "token":
+        from services.token_chunker import TokenChunker, token_chunker
+
+        # Không vượt giới hạn của model dù size lớn hơn
+        splitter = TokenChunker(max_tokens=min(size, token_chunker.max_tokens), overlap_tokens=overlap)
+        for file_name, text in texts.items():
+            for piece in splitter.chunk(text):
+                chunks.append({"file": file_name, "text": piece["text"]})
+    else:
+        from llama_index.core import Document as LlamaDocument
+        from llama_index.core.text_splitter import SentenceSplitter
+
+        splitter = SentenceSplitter(
+            chunk_size=size,
+            chunk_overlap=overlap,
+            separator=" ",
+            paragraph_separator="\n\n",
+            secondary_chunking_regex="[.!?]"
+        )
+        for file_name, text in texts.items():
+            for node in splitter.get_nodes_from_documents([LlamaDocument(text=text)]):
+                if node.get_content().strip():
+                    chunks.append({"file": file_name, "text": node.get_content()})
+    return chunks
+
+
+def run_setting(
+    texts: Dict[str, str],
+    questions: List[Dict[str, Any]],
+    query_embeddings: List[List[float]],
+    chunker: str,
+    size: int,
+    overlap: int,
+    args
+) -> List[Dict[str, Any]]:
+    """Chạy một bộ (chunker, size, overlap) cho mọi top_k"""
+    from core.embedding_config import embedding_manager
+    from database.vector_backends import create_backend
+    from database.vector_store import VectorStoreManager
+    from services.token_chunker import token_chunker
+
+    start = time.perf_counter()
+    chunks = build_chunks(texts, chunker, size, overlap)
+    chunk_s = time.perf_counter() - start
+
+    token_counts = np.asarray(token_chunker.count_tokens([chunk["text"] for chunk in chunks]))
+    model_limit = token_chunker.max_tokens
+
+    start = time.perf_counter()
+    embeddings = embedding_manager.embed_texts([chunk["text"] for chunk in chunks])
+    embed_s = time.perf_counter() - start
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = VectorStoreManager()
+        store.client = create_backend(args.backend, Path(tmpdir))
+        collection = store._ensure_collection(COLLECTION)
+        for offset in range(0, len(chunks), WRITE_BATCH):
+            batch = chunks[offset:offset + WRITE_BATCH]
+            collection.add(
+                ids=[f"c_{offset + i}" for i in range(len(batch))],
+                documents=[chunk["text"] for chunk in batch],
+                metadatas=[{"file": chunk["file"]} for chunk in batch],
+                embeddings=embeddings[offset:offset + len(batch)]
+            )
+        index_mb = get_directory_size_mb(tmpdir)
+
+        for top_k in args.top_k:
+            latencies, hits = [], 0
+            for question, embedding in zip(questions, query_embeddings):
+                t0 = time.perf_counter()
+                results = collection.query(
+                    query_embeddings=[embedding],
+                    n_results=top_k,
+                    include=["documents", "metadatas"]
+                )
+                latencies.append(time.perf_counter() - t0)
+
+                for document, metadata in zip(results["documents"][0], results["metadatas"][0]):
+                    if question["file"] and metadata.get("file") != question["file"]:
+                        continue
+                    text = _normalize(document)
+                    if any(answer in text for answer in question["answers"]):
+                        hits += 1
+                        break
+
+            rows.append({
+                "chunker": chunker,
+                "size": size,
+                "overlap": overlap,
+                "chunks": len(chunks),
+                "avg_tokens": float(token_counts.mean()) if len(token_counts) else 0.0,
+                "truncated": int((token_counts > model_limit).sum()),
+                "chunk_s": chunk_s,
+                "embed_s": embed_s,
+                "index_mb": index_mb,
+                "top_k": top_k,
+                "p50_ms": _percentile(latencies, 50),
+                "p99_ms": _percentile(latencies, 99),
+                "recall": hits / max(1, len(questions))
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep tham số chia chunks trên corpus mẫu")
+    parser.add_argument("--corpus", required=True, help="Thư mục chứa documents mẫu")
+    parser.add_argument("--questions", required=True, help="File JSONL câu hỏi có nhãn")
+    parser.add_argument("--chunker", nargs="+", default=["token", "sentence"], choices=["token", "sentence"])
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[128, 256, 512],
+                        help="Token tối đa (token chunker, bị giới hạn bởi max_seq_length) hoặc chunk_size (sentence)")
+    parser.add_argument("--overlap", type=int, nargs="+", default=[0, 50])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--backend", choices=["chroma", "hnsw"], default=settings.vector_backend)
+    parser.add_argument("--csv", help="Ghi kết quả ra file CSV")
+    args = parser.parse_args()
+
+    from core.embedding_config import initialize_embeddings, embedding_manager
+
+    initialize_embeddings()
+    texts = load_corpus(Path(args.corpus))
+    questions = load_questions(Path(args.questions))
+    if not texts or not questions:
+        raise SystemExit("Corpus hoặc bộ câu hỏi rỗng")
+    print(f"Corpus: {len(texts)} files, {sum(len(t) for t in texts.values())} ký tự, {len(questions)} câu hỏi")
+
+    # Queries không phụ thuộc cách chia chunks: embed một lần
+    query_embeddings = embedding_manager.embed_texts([q["question"] for q in questions])
+
+    rows = []
+    print(
+        f"{'chunker':>8} {'size':>5} {'ovl':>4} {'chunks':>7} {'avg tok':>8} {'trunc':>6} "
+        f"{'embed s':>8} {'index MB':>9} {'k':>3} {'p50 ms':>7} {'p99 ms':>7} {'recall':>7}"
+    )
+    for chunker, size, overlap in itertools.product(args.chunker, args.chunk_size, args.overlap):
+        if overlap >= size:
+            continue
+        for row in run_setting(texts, questions, query_embeddings, chunker, size, overlap, args):
+            rows.append(row)
+            print(
+                f"{row['chunker']:>8} {row['size']:>5} {row['overlap']:>4} {row['chunks']:>7} "
+                f"{row['avg_tokens']:>8.1f} {row['truncated']:>6} {row['embed_s']:>8.1f} "
+                f"{row['index_mb']:>9.2f} {row['top_k']:>3} {row['p50_ms']:>7.2f} "
+                f"{row['p99_ms']:>7.2f} {row['recall']:>7.3f}"
+            )
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Đã ghi {len(rows)} dòng vào {args.csv}")
+
+    # Gợi ý: recall cao nhất, hòa thì ít chunks hơn (index nhỏ, ingest nhanh)
+    best = max(rows, key=lambda row: (round(row["recall"], 3), -row["chunks"], -row["p99_ms"]))
+    print(
+        f"\nRecall cao nhất: chunker={best['chunker']} size={best['size']} overlap={best['overlap']} "
+        f"top_k={best['top_k']} (recall {best['recall']:.3f}, {best['chunks']} chunks)"
+    )
+    print(f"CHUNKER={best['chunker']}")
+    if best["chunker"] == "token":
+        print(f"CHUNK_MAX_TOKENS={best['size']}")
+    else:
+        print(f"CHUNK_SIZE={best['size']}")
+    print(f"CHUNK_OVERLAP={best['overlap']}")
+    print(f"TOP_K_RESULTS={best['top_k']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Sweep tham số HNSW (space, M, construction ef, search ef) trên một bộ query giữ lại
+
+Lấy vectors từ một collection thật (hoặc sinh ngẫu nhiên), tách riêng một
+phần làm queries (không có trong index), build index hnswlib cho từng bộ
+(space, M, construction_ef) rồi đo với từng search_ef:
+    - recall@k so với kết quả chính xác (NumPy)
+    - latency p50/p99 mỗi query
+    - dung lượng index (kích thước file index, xấp xỉ bộ nhớ khi load)
+
+ChromaDB và HNSW backend đều dùng hnswlib nên kết quả áp dụng được cho cả hai.
+In ra biến môi trường đề xuất cho loại collection đã chọn.
+
+Cách chạy (từ thư mục app/):
+    python -m tools.hnsw_sweep --collection ta_edu_knowledge --class global
+    python -m tools.hnsw_sweep --synthetic 100000 --m 8 16 32 --search-ef 10 50 100 200
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from typing import List, Dict, Any
+
+import hnswlib
+import numpy as np
+
+PAGE_SIZE = 5000
+
+
+def load_collection_vectors(collection_name: str, limit: int) -> np.ndarray:
+    """Đọc embeddings từ collection của vector store đang cấu hình"""
+    from database.vector_store import vector_store_manager
+
+    vector_store_manager.initialize(run_self_test=False)
+    collection = vector_store_manager.client.get_collection(collection_name)
+
+    vectors, offset = [], 0
+    while len(vectors) < limit:
+        page = collection.get(limit=min(PAGE_SIZE, limit - len(vectors)), offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        vectors.extend(page["embeddings"])
+        offset += len(page["ids"])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def synthetic_vectors(size: int, dim: int, seed: int) -> np.ndarray:
+    """Vectors tổng hợp có cấu trúc cụm (giống embeddings của chunks cùng tài liệu)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=size)] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Top k chính xác theo cùng quy ước khoảng cách với hnswlib"""
+    if space == "cosine":
+        corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    results = []
+    for start in range(0, len(queries), 256):
+        batch = queries[start:start + 256]
+        if space == "l2":
+            distances = (batch ** 2).sum(axis=1)[:, None] - 2 * batch @ corpus.T + (corpus ** 2).sum(axis=1)[None, :]
+        else:
+            distances = -batch @ corpus.T
+        results.append(np.argsort(distances, axis=1)[:, :k])
+    return np.vstack(results)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def sweep(corpus: np.ndarray, queries: np.ndarray, args) -> List[Dict[str, Any]]:
+    """Chạy toàn bộ các tổ hợp tham số"""
+    rows = []
+    labels = np.arange(len(corpus))
+    for space in args.space:
+        truth = exact_neighbors(corpus, queries, args.top_k, space)
+        for m, construction_ef in itertools.product(args.m, args.construction_ef):
+            index = hnswlib.Index(space=space, dim=corpus.shape[1])
+            start = time.perf_counter()
+            index.init_index(max_elements=len(corpus), ef_construction=construction_ef, M=m)
+            index.add_items(corpus, labels)
+            build_s = time.perf_counter() - start
+
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, "index.bin")
+                index.save_index(path)
+                index_mb = os.path.getsize(path) / (1024 * 1024)
+
+            for search_ef in args.search_ef:
+                index.set_ef(max(search_ef, args.top_k))
+                latencies, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    found, _ = index.knn_query(query, k=args.top_k)
+                    latencies.append(time.perf_counter() - start)
+                    recalls.append(len(set(found[0]) & set(expected)) / args.top_k)
+
+                rows.append({
+                    "space": space,
+                    "M": m,
+                    "construction_ef": construction_ef,
+                    "search_ef": search_ef,
+                    "build_s": build_s,
+                    "recall": float(np.mean(recalls)),
+                    "p50_ms": _percentile(latencies, 50),
+                    "p99_ms": _percentile(latencies, 99),
+                    "index_mb": index_mb
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep tham số HNSW: recall@k, latency, bộ nhớ")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--collection", help="Lấy vectors từ collection của vector store")
+    source.add_argument("--synthetic", type=int, help="Số vectors tổng hợp")
+    parser.add_argument("--limit", type=int, default=200000, help="Số vectors tối đa đọc từ collection")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500, help="Số vectors giữ lại làm queries")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--space", nargs="+", default=["cosine", "l2"], choices=["cosine", "l2", "ip"])
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--class", dest="collection_class", choices=["user", "global"], default="global")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    vectors = (
+        load_collection_vectors(args.collection, args.limit) if args.collection
+        else synthetic_vectors(args.synthetic, args.dim, args.seed)
+    )
+    if len(vectors) <= args.queries:
+        raise SystemExit(f"Cần nhiều hơn {args.queries} vectors, chỉ có {len(vectors)}")
+
+    # Tách queries giữ lại (không nằm trong index)
+    order = np.random.default_rng(args.seed).permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    print(f"Corpus: {len(corpus)} vectors x {corpus.shape[1]} chiều, {len(queries)} queries, k={args.top_k}")
+
+    rows = sweep(corpus, queries, args)
+    print(
+        f"{'space':>7} {'M':>4} {'c_ef':>5} {'s_ef':>5} {'build s':>8} "
+        f"{'recall':>7} {'p50 ms':>7} {'p99 ms':>7} {'index MB':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['space']:>7} {row['M']:>4} {row['construction_ef']:>5} {row['search_ef']:>5} "
+            f"{row['build_s']:>8.1f} {row['recall']:>7.3f} {row['p50_ms']:>7.3f} "
+            f"{row['p99_ms']:>7.3f} {row['index_mb']:>9.1f}"
+        )
+
+    # Đề xuất: p99 thấp nhất trong các bộ đạt recall mục tiêu (hòa thì chọn index nhỏ hơn)
+    eligible = [row for row in rows if row["recall"] >= args.target_recall]
+    if not eligible:
+        print(f"\nKhông có bộ tham số nào đạt recall@{args.top_k} >= {args.target_recall}")
+        return
+    best = min(eligible, key=lambda row: (row["p99_ms"], row["index_mb"]))
+    prefix = args.collection_class.upper()
+    print(f"\nĐề xuất cho collection loại '{args.collection_class}' (recall {best['recall']:.3f}):")
+    print(f"{prefix}_HNSW_SPACE={best['space']}")
+    print(f"{prefix}_HNSW_M={best['M']}")
+    print(f"{prefix}_HNSW_CONSTRUCTION_EF={best['construction_ef']}")
+    print(f"{prefix}_HNSW_SEARCH_EF={best['search_ef']}")
+
+
+if __name__ == "__main__":
+    main()
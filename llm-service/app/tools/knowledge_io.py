@@ -0,0 +1,250 @@
+"""
+Export/import knowledge base (chunks + vectors) không cần extract lại file
+
+Định dạng export là một thư mục:
+    manifest.json   - phiên bản định dạng, embedding model, số chiều, số chunks
+    vectors.npy     - ma trận float16 (n x dim), đọc bằng memory map
+    records.jsonl   - mỗi dòng {"id", "text", "metadata"} theo đúng thứ tự hàng của vectors.npy
+
+Import đọc vectors.npy bằng ``mmap_mode="r"`` và ghi theo batch với embeddings
+có sẵn, nên tốc độ phụ thuộc vào disk và vector store chứ không phải model.
+
+Cách chạy (từ thư mục app/, khi service đang dừng):
+    python -m tools.knowledge_io export --user-id 12 --output data/exports/user_12
+    python -m tools.knowledge_io export --output data/exports/all
+    python -m tools.knowledge_io import --input data/exports/user_12
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from core.config import settings
+from utils.file_utils import InstanceLockError, acquire_instance_lock
+
+FORMAT_VERSION = 1
+PAGE_SIZE = 2000
+
+
+def export_knowledge(output: Path, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Export chunks của một user (hoặc toàn hệ thống) từ global collection
+
+    Global collection chứa chunks của mọi user ở cả chế độ dual và single,
+    nên không cần đọc các collection user_{id}_knowledge.
+
+    Args:
+        output: Thư mục đích
+        user_id: ID của user (None = toàn hệ thống)
+
+    Returns:
+        Manifest đã ghi
+    """
+    from database.vector_store import vector_store_manager
+
+    collection = vector_store_manager.collections[settings.chroma_collection_name]
+    where = {"user_id": {"$eq": str(user_id)}} if user_id is not None else None
+    total = (
+        vector_store_manager.count_where({"user_id": str(user_id)}) if user_id is not None
+        else collection.count()
+    )
+
+    output.mkdir(parents=True, exist_ok=True)
+    vectors = None
+    written, offset, start = 0, 0, time.time()
+
+    with vector_store_manager.write_lock, open(output / "records.jsonl", "w", encoding="utf-8") as records:
+        while written < total:
+            page = collection.get(
+                where=where,
+                limit=PAGE_SIZE,
+                offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    output / "vectors.npy", mode="w+", dtype=np.float16,
+                    shape=(total, len(page["embeddings"][0]))
+                )
+
+            count = min(len(page["ids"]), total - written)
+            vectors[written:written + count] = np.asarray(page["embeddings"][:count], dtype=np.float16)
+            for i in range(count):
+                records.write(json.dumps({
+                    "id": page["ids"][i],
+                    "text": page["documents"][i],
+                    "metadata": page["metadatas"][i]
+                }, ensure_ascii=False) + "\n")
+            written += count
+            print(f"\rExport {written}/{total} chunks", end="", flush=True)
+    print()
+
+    if vectors is None:
+        # Không có chunk nào: vẫn ghi file rỗng để import không lỗi
+        vectors = np.lib.format.open_memmap(output / "vectors.npy", mode="w+", dtype=np.float16, shape=(0, 0))
+    vectors.flush()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "scope": {"user_id": user_id} if user_id is not None else "all",
+        "embedding_model": settings.embedding_model,
+        "dim": int(vectors.shape[1]) if written else 0,
+        "count": written,
+        "dtype": "float16",
+        "source_collection": settings.chroma_collection_name,
+        "seconds": round(time.time() - start, 2)
+    }
+    (output / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return manifest
+
+
+def import_knowledge(source: Path, batch_size: int = PAGE_SIZE, force: bool = False,
+                     rebuild_document_index: bool = True) -> Dict[str, Any]:
+    """
+    Import chunks và vectors từ thư mục export (không embed lại)
+
+    Chunks được ghi đè theo ID vào global collection (và collection của user
+    ở chế độ dual), document index cho hierarchical retrieval được tính lại
+    từ vectors.
+
+    Args:
+        source: Thư mục export
+        batch_size: Số chunks mỗi lần ghi
+        force: Bỏ qua kiểm tra embedding model
+        rebuild_document_index: Tính lại centroid của từng document
+
+    Returns:
+        Thống kê import
+    """
+    from database.vector_store import vector_store_manager
+    from services.hierarchical_retriever import hierarchical_retriever
+
+    manifest = json.loads((source / "manifest.json").read_text(encoding="utf-8"))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Không hỗ trợ format_version {manifest.get('format_version')}")
+    if manifest["embedding_model"] != settings.embedding_model and not force:
+        raise ValueError(
+            f"Export dùng embedding model '{manifest['embedding_model']}', service đang dùng "
+            f"'{settings.embedding_model}'. Dùng --force nếu chắc chắn hai model tương thích"
+        )
+
+    vectors = np.load(source / "vectors.npy", mmap_mode="r")
+    users = set()
+    documents: Dict[tuple, Dict[str, Any]] = {}
+    imported, start = 0, time.time()
+
+    with open(source / "records.jsonl", encoding="utf-8") as records:
+        while True:
+            batch = [json.loads(line) for line in islice(records, batch_size)]
+            if not batch:
+                break
+            embeddings = np.asarray(vectors[imported:imported + len(batch)], dtype=np.float32)
+
+            # Gom theo user để ghi vào đúng collection của user (dual mode)
+            by_user: Dict[str, list] = {}
+            for i, record in enumerate(batch):
+                user_id = str(record["metadata"].get("user_id", ""))
+                by_user.setdefault(user_id, []).append(i)
+
+                document_id = record["metadata"].get("document_id")
+                if rebuild_document_index and document_id is not None and user_id:
+                    entry = documents.setdefault((user_id, document_id), {
+                        "sum": np.zeros(embeddings.shape[1], dtype=np.float32),
+                        "count": 0,
+                        "metadata": record["metadata"]
+                    })
+                    entry["sum"] += embeddings[i]
+                    entry["count"] += 1
+
+            for user_id, rows in by_user.items():
+                chunks = [batch[i] for i in rows]
+                user_vectors = embeddings[rows].tolist()
+                if user_id and settings.vector_storage_mode != "single":
+                    vector_store_manager.add_documents(
+                        documents=chunks,
+                        collection_name=vector_store_manager.get_user_collection_name(user_id),
+                        embeddings=user_vectors,
+                        upsert=True
+                    )
+                vector_store_manager.add_documents(
+                    documents=chunks,
+                    collection_name=settings.chroma_collection_name,
+                    embeddings=user_vectors,
+                    upsert=True
+                )
+                if user_id:
+                    users.add(user_id)
+
+            imported += len(batch)
+            elapsed = max(time.time() - start, 1e-6)
+            print(f"\rImport {imported}/{manifest['count']} chunks ({imported / elapsed:.0f}/s)", end="", flush=True)
+    print()
+
+    # Trung bình các vectors chunk của document (centroid được normalize khi ghi)
+    for (user_id, document_id), entry in documents.items():
+        hierarchical_retriever.index_document(
+            int(user_id), document_id, [(entry["sum"] / entry["count"]).tolist()], entry["metadata"],
+            total_chunks=entry["count"]
+        )
+
+    for user_id in users:
+        vector_store_manager.bump_knowledge_version(int(user_id))
+
+    return {
+        "imported": imported,
+        "users": len(users),
+        "documents": len(documents),
+        "seconds": round(time.time() - start, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import knowledge base")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export chunks + vectors")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--user-id", type=int, default=None, help="Chỉ export knowledge của user này")
+
+    import_parser = subparsers.add_parser("import", help="Import từ thư mục export")
+    import_parser.add_argument("--input", required=True)
+    import_parser.add_argument("--batch-size", type=int, default=PAGE_SIZE)
+    import_parser.add_argument("--force", action="store_true", help="Bỏ qua kiểm tra embedding model")
+    import_parser.add_argument("--skip-document-index", action="store_true")
+
+    args = parser.parse_args()
+
+    try:
+        instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+    except InstanceLockError as e:
+        parser.exit(1, f"{e}\nDừng llm-service và model server (hoặc chạy model server với --models-only) trước khi chạy tool này\n")
+
+    with instance_lock:
+        from database.vector_store import vector_store_manager
+        vector_store_manager.initialize(run_self_test=False)
+
+        if args.command == "export":
+            manifest = export_knowledge(Path(args.output), args.user_id)
+            print(f"Đã export {manifest['count']} chunks ({manifest['dim']} chiều) vào {args.output}")
+        else:
+            stats = import_knowledge(
+                Path(args.input), args.batch_size, args.force, not args.skip_document_index
+            )
+            print(
+                f"Đã import {stats['imported']} chunks của {stats['users']} users, "
+                f"{stats['documents']} documents trong {stats['seconds']}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Gộp các collection ``user_{id}_knowledge`` vào global collection (single mode)
+
+Ở chế độ "dual" mỗi chunk được lưu hai lần: một bản trong collection riêng
+của user và một bản trong global collection. Script này:
+
+1. Copy các chunks chỉ có trong collection của user sang global collection
+   (giữ nguyên ID, embedding và metadata, thêm ``user_id`` nếu thiếu)
+2. Kiểm tra global collection đã chứa đủ chunks của user
+3. Xóa collection của user
+4. In báo cáo số vectors và dung lượng index trước/sau
+
+Sau khi chạy, đặt ``VECTOR_STORAGE_MODE=single``.
+
+Cách chạy (từ thư mục app/, khi service đang dừng):
+    python -m tools.migrate_single_collection --dry-run
+    python -m tools.migrate_single_collection --vacuum
+"""
+import argparse
+import re
+import sqlite3
+from typing import Dict, Any
+
+from core.config import settings
+from database.vector_store import vector_store_manager
+from utils.file_utils import InstanceLockError, acquire_instance_lock
+from utils.file_utils import get_directory_size_mb
+
+USER_COLLECTION_PATTERN = re.compile(r"^user_(\d+)_knowledge$")
+PAGE_SIZE = 1000
+
+
+def collect_sizes() -> Dict[str, Any]:
+    """Số vectors của từng collection và dung lượng thư mục lưu vector store"""
+    counts = {
+        collection.name: collection.count()
+        for collection in vector_store_manager.client.list_collections()
+    }
+    return {
+        "collections": counts,
+        "total_vectors": sum(counts.values()),
+        "disk_mb": get_directory_size_mb(str(
+            settings.chroma_persist_directory if settings.vector_backend == "chroma"
+            else settings.hnsw_persist_directory
+        ))
+    }
+
+
+def migrate_user_collection(name: str, user_id: str, dry_run: bool) -> Dict[str, int]:
+    """
+    Copy chunks còn thiếu của một user collection sang global collection rồi xóa nó
+
+    Returns:
+        {"scanned", "copied", "already_present"}
+    """
+    source = vector_store_manager.client.get_collection(name)
+    target = vector_store_manager.collections[settings.chroma_collection_name]
+    stats = {"scanned": 0, "copied": 0, "already_present": 0}
+
+    offset = 0
+    while True:
+        page = source.get(
+            limit=PAGE_SIZE,
+            offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        offset += len(ids)
+        stats["scanned"] += len(ids)
+
+        existing = set(target.get(ids=ids, include=[]).get("ids", []))
+        missing = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+        stats["already_present"] += len(ids) - len(missing)
+        if not missing:
+            continue
+
+        metadatas = []
+        for i in missing:
+            metadata = dict(page["metadatas"][i] or {})
+            metadata.setdefault("user_id", user_id)
+            metadatas.append(metadata)
+
+        if not dry_run:
+            target.add(
+                ids=[ids[i] for i in missing],
+                documents=[page["documents"][i] for i in missing],
+                metadatas=metadatas,
+                embeddings=[page["embeddings"][i] for i in missing]
+            )
+        stats["copied"] += len(missing)
+
+    if not dry_run:
+        global_count = vector_store_manager.count_where(
+            {"user_id": user_id},
+            collection_name=settings.chroma_collection_name
+        )
+        if global_count < stats["scanned"]:
+            raise RuntimeError(
+                f"Global collection chỉ có {global_count}/{stats['scanned']} chunks của user {user_id}, "
+                f"giữ lại collection '{name}'"
+            )
+        vector_store_manager.client.delete_collection(name)
+        vector_store_manager.collections.pop(name, None)
+
+    return stats
+
+
+def vacuum() -> None:
+    """Thu hồi dung lượng file SQLite của ChromaDB sau khi xóa collections"""
+    if settings.vector_backend != "chroma":
+        return
+    db_path = settings.chroma_persist_directory / "chroma.sqlite3"
+    if db_path.exists():
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("VACUUM")
+        conn.close()
+
+
+def _print_sizes(label: str, sizes: Dict[str, Any]) -> None:
+    user_collections = [name for name in sizes["collections"] if USER_COLLECTION_PATTERN.match(name)]
+    print(
+        f"{label}: {sizes['total_vectors']} vectors trong {len(sizes['collections'])} collections "
+        f"({len(user_collections)} user collections), {sizes['disk_mb']:.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gộp user collections vào global collection")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không ghi/xóa")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM chroma.sqlite3 sau khi gộp")
+    args = parser.parse_args()
+
+    try:
+        instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+    except InstanceLockError as e:
+        parser.exit(1, f"{e}\nDừng llm-service và model server (hoặc chạy model server với --models-only) trước khi chạy tool này\n")
+
+    with instance_lock:
+        vector_store_manager.initialize(run_self_test=False)
+
+        before = collect_sizes()
+        _print_sizes("Trước", before)
+
+        totals = {"scanned": 0, "copied": 0, "already_present": 0}
+        failed = []
+        for name in sorted(before["collections"]):
+            match = USER_COLLECTION_PATTERN.match(name)
+            if not match:
+                continue
+            try:
+                stats = migrate_user_collection(name, match.group(1), args.dry_run)
+            except Exception as e:
+                failed.append(name)
+                print(f"  {name}: LỖI - {str(e)}")
+                continue
+            for key in totals:
+                totals[key] += stats[key]
+            print(
+                f"  {name}: {stats['scanned']} chunks, copy {stats['copied']}, "
+                f"đã có sẵn {stats['already_present']}"
+            )
+
+        if args.vacuum and not args.dry_run:
+            vacuum()
+
+        after = collect_sizes()
+        _print_sizes("Sau", after)
+
+        print(
+            f"Tổng: {totals['scanned']} chunks, copy {totals['copied']}, đã có sẵn {totals['already_present']}. "
+            f"Vectors {before['total_vectors']} -> {after['total_vectors']}, "
+            f"dung lượng {before['disk_mb']:.1f} MB -> {after['disk_mb']:.1f} MB"
+        )
+        if args.dry_run:
+            print("Dry run: không có thay đổi nào được ghi")
+        if failed:
+            print(f"Các collection chưa gộp được: {', '.join(failed)}")
+        else:
+            print("Đặt VECTOR_STORAGE_MODE=single để dùng chế độ single-collection")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Re-embed các collections có vectors của embedding model khác model hiện tại
+
+Collections tạo trước khi service tự embed chunks (dùng embedding function
+mặc định của ChromaDB) hoặc trước khi đổi ``EMBEDDING_MODEL`` có dimension /
+không gian vector khác, nên bị chặn ghi và search khi khởi động (xem
+``VectorStoreManager.check_embedding_compatibility``). Script này:
+
+1. Build lại từng collection với embeddings tính từ text đã lưu (giữ ID và
+   metadata, đổi tên để thay collection cũ như khi rebuild bảo trì)
+2. Tính lại document index (centroid các chunks) từ embeddings mới
+
+Cách chạy (từ thư mục app/, khi service đang dừng):
+    python -m tools.reembed_collections --dry-run
+    python -m tools.reembed_collections
+    python -m tools.reembed_collections --all
+"""
+import argparse
+import time
+
+from core.config import settings
+from core.embedding_config import initialize_embeddings
+from database.vector_store import vector_store_manager
+from services.hierarchical_retriever import hierarchical_retriever
+from services.index_maintenance import index_maintenance, REBUILD_SUFFIX, OLD_SUFFIX
+from utils.file_utils import InstanceLockError, acquire_instance_lock
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed collections bằng embedding model hiện tại")
+    parser.add_argument("--all", action="store_true", help="Re-embed mọi collection (mặc định: chỉ collection không tương thích)")
+    parser.add_argument("--collections", nargs="*", default=None, help="Chỉ re-embed các collections này")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê collections cần re-embed")
+    args = parser.parse_args()
+
+    try:
+        instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+    except InstanceLockError as e:
+        parser.exit(1, f"{e}\nDừng llm-service và model server (hoặc chạy model server với --models-only) trước khi chạy tool này\n")
+
+    with instance_lock:
+        initialize_embeddings()
+        vector_store_manager.initialize(run_self_test=False)
+
+        incompatible = dict(vector_store_manager.incompatible_collections)
+        if args.collections:
+            names = list(args.collections)
+        elif args.all:
+            names = [
+                collection.name for collection in vector_store_manager.client.list_collections()
+                if not collection.name.endswith((REBUILD_SUFFIX, OLD_SUFFIX))
+            ]
+        else:
+            names = list(incompatible)
+
+        document_index = hierarchical_retriever.document_collection
+        rebuild_document_index = document_index in names
+        names = sorted(name for name in names if name != document_index)
+
+        print(f"Embedding model: {settings.embedding_model}")
+        for name in names + ([document_index] if rebuild_document_index else []):
+            info = incompatible.get(name)
+            detail = f"dimension {info['stored_dimension']} -> {info['model_dimension']}" if info else "tương thích"
+            print(f"  {name}: {detail}")
+        if args.dry_run or not (names or rebuild_document_index):
+            return
+
+        failed = []
+        for name in names:
+            start = time.time()
+            try:
+                result = index_maintenance.rebuild_collection(name, reembed=True)
+            except Exception as e:
+                failed.append(name)
+                print(f"  {name}: LỖI - {str(e)}")
+                continue
+            print(f"  {name}: {result['count']} vectors trong {time.time() - start:.1f}s")
+
+        if rebuild_document_index:
+            if failed:
+                print(f"Bỏ qua document index vì re-embed lỗi: {', '.join(failed)}")
+            else:
+                count = hierarchical_retriever.rebuild_index()
+                print(f"  {document_index}: {count} documents")
+
+        remaining = vector_store_manager.check_embedding_compatibility()
+        print(f"Còn {len(remaining)} collections không tương thích" if remaining else "Tất cả collections đã tương thích")
+
+
+if __name__ == "__main__":
+    main()
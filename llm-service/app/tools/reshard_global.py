@@ -0,0 +1,87 @@
+"""
+Chia lại global collection theo số shards hiện tại trong settings
+
+Dùng khi đổi ``VECTOR_SHARD_COUNT`` hoặc ``VECTOR_SHARD_KEY``: các collections
+theo bố cục cũ được đổi tên tạm, vectors (kèm embeddings) được ghi lại theo
+bố cục mới, rồi bố cục cũ bị xóa khi số vectors khớp.
+
+Cách chạy (từ thư mục app/, khi service đang dừng):
+    VECTOR_SHARD_COUNT=8 python -m tools.reshard_global --from-shards 1
+"""
+import argparse
+import time
+
+from core.config import settings
+from database.vector_backends.sharded import shard_collection_name
+from database.vector_store import vector_store_manager
+from utils.file_utils import InstanceLockError, acquire_instance_lock
+
+PAGE_SIZE = 2000
+SOURCE_SUFFIX = "__reshard"
+
+
+def source_names(from_shards: int):
+    name = settings.chroma_collection_name
+    if from_shards <= 1:
+        return [name]
+    return [shard_collection_name(name, i) for i in range(from_shards)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chia lại global collection thành VECTOR_SHARD_COUNT shards")
+    parser.add_argument("--from-shards", type=int, required=True, help="Số shards của bố cục hiện có (1 = không chia)")
+    args = parser.parse_args()
+
+    try:
+        instance_lock = acquire_instance_lock(str(settings.instance_lock_path))
+    except InstanceLockError as e:
+        parser.exit(1, f"{e}\nDừng llm-service và model server (hoặc chạy model server với --models-only) trước khi chạy tool này\n")
+
+    with instance_lock:
+        vector_store_manager.initialize(run_self_test=False)
+        client = vector_store_manager.client
+
+        # Đổi tên bố cục cũ trước (tên shard cũ và mới có thể trùng nhau)
+        vector_store_manager.collections.pop(settings.chroma_collection_name, None)
+        renamed = []
+        for name in source_names(args.from_shards):
+            try:
+                client.rename_collection(name, name + SOURCE_SUFFIX)
+                renamed.append(name + SOURCE_SUFFIX)
+            except ValueError:
+                print(f"Bỏ qua '{name}': không tồn tại")
+
+        target = vector_store_manager._ensure_collection(settings.chroma_collection_name)
+        total, start = 0, time.time()
+        for name in renamed:
+            source = client.get_collection(name)
+            offset = 0
+            while True:
+                page = source.get(limit=PAGE_SIZE, offset=offset, include=["documents", "metadatas", "embeddings"])
+                if not page["ids"]:
+                    break
+                target.add(
+                    ids=page["ids"],
+                    documents=page["documents"],
+                    metadatas=page["metadatas"],
+                    embeddings=page["embeddings"]
+                )
+                offset += len(page["ids"])
+                total += len(page["ids"])
+                print(f"\r{total} vectors ({total / max(time.time() - start, 1e-6):.0f}/s)", end="", flush=True)
+        print()
+
+        expected = sum(client.get_collection(name).count() for name in renamed)
+        if target.count() < expected:
+            raise SystemExit(f"Chỉ ghi được {target.count()}/{expected} vectors, giữ lại các collection '*{SOURCE_SUFFIX}'")
+
+        for name in renamed:
+            client.delete_collection(name)
+        print(
+            f"Đã chia {expected} vectors thành {settings.vector_shard_count} shards "
+            f"theo '{settings.vector_shard_key}' trong {time.time() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import os
+import fcntl
+import hashlib
+import tempfile
 import aiofiles
-from typing import Optional
+from typing import Optional, AsyncIterator, Tuple, TextIO
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,6 +39,76 @@ def get_file_size_mb(file_path: str) -> float:
         return 0.0
 
 
+def get_directory_size_mb(directory: str) -> float:
+    """
+    Lấy tổng kích thước các file trong directory (đệ quy) tính bằng MB
+    
+    Args:
+        directory: Đường dẫn directory
+        
+    Returns:
+        Kích thước directory (MB)
+    """
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total / (1024 * 1024)
+
+
+class FileTooLargeError(Exception):
+    """File upload vượt quá giới hạn kích thước"""
+
+
+async def spool_stream_to_file(
+    chunks: AsyncIterator[bytes],
+    directory: str,
+    suffix: str,
+    max_bytes: int
+) -> Tuple[str, int, str]:
+    """
+    Ghi stream bytes vào file tạm, kiểm tra giới hạn kích thước trong lúc nhận
+    
+    Args:
+        chunks: Stream bytes (vd: ``request.stream()``)
+        directory: Thư mục chứa file tạm
+        suffix: Extension của file tạm (parser chọn theo extension)
+        max_bytes: Kích thước tối đa
+        
+    Returns:
+        (đường dẫn file tạm, số bytes, SHA-256)
+        
+    Raises:
+        FileTooLargeError: Nếu stream vượt quá max_bytes (file tạm đã bị xóa)
+    """
+    ensure_directory(directory)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    os.close(fd)
+    
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, mode='wb') as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FileTooLargeError(f"File vượt quá giới hạn {max_bytes} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        # Kể cả khi client ngắt kết nối giữa chừng
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    
+    return path, size, digest.hexdigest()
+
+
 async def read_text_file(file_path: str, encoding: str = 'utf-8') -> str:
     """
     Đọc nội dung text file async
@@ -91,6 +164,42 @@ def validate_file_path(file_path: str) -> bool:
     return True
 
 
+class InstanceLockError(RuntimeError):
+    """Thư mục data đang được một process khác sử dụng"""
+    pass
+
+
+def acquire_instance_lock(lock_path: str) -> TextIO:
+    """
+    Giữ lock độc quyền trên thư mục data (chỉ một process được ghi)
+    
+    Lock được giải phóng khi đóng file trả về hoặc khi process kết thúc.
+    
+    Args:
+        lock_path: Đường dẫn lock file
+        
+    Returns:
+        File đang giữ lock (giữ tham chiếu đến khi dừng)
+        
+    Raises:
+        InstanceLockError: Nếu process khác đang giữ lock
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    handle = open(lock_path, "a+")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.seek(0)
+        owner = handle.read().strip() or "khác"
+        handle.close()
+        raise InstanceLockError(f"Thư mục data đang được process {owner} sử dụng ({lock_path})")
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
 def ensure_directory(directory: str) -> None:
     """
     Đảm bảo directory tồn tại
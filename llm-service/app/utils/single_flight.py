@@ -0,0 +1,146 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Các group đã tạo, dùng cho endpoint thống kê
+_groups: List["SingleFlight"] = []
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa text cho key: chữ thường, gộp khoảng trắng"""
+    return " ".join((text or "").lower().split())
+
+
+def make_key(*parts: Any) -> str:
+    """Tạo key ổn định (sha1) từ các thành phần JSON-serializable"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Gộp các request giống nhau đang chạy đồng thời vào một lần tính toán
+
+    Request đầu tiên với một key (leader) chạy hàm; các request cùng key đến
+    trong lúc đó (waiters) chờ chung kết quả thay vì chạy lại retrieval/LLM.
+    Kết quả được deep copy cho mỗi waiter để việc sửa kết quả của một request
+    không ảnh hưởng request khác. Khi quá ``timeout`` giây, tính toán bị hủy,
+    mọi request của key nhận ``asyncio.TimeoutError`` và key được giải phóng.
+    Tính toán cũng bị hủy khi mọi request của key đều đã bị hủy (không còn ai
+    nhận kết quả), vd. để job LLM đang chờ lock được bỏ.
+    """
+
+    def __init__(self, name: str, timeout: Optional[float] = None, enabled: bool = True):
+        self.name = name
+        self.timeout = timeout
+        self.enabled = enabled
+        self.inflight: Dict[Hashable, asyncio.Task] = {}
+        self.waiters: Dict[Hashable, int] = {}
+        # Số request (leader + waiters) còn đang chờ kết quả của mỗi tính toán
+        self.active: Dict[asyncio.Task, int] = {}
+        self.stats = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "abandoned": 0,
+            "max_waiters": 0
+        }
+        _groups.append(self)
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Chạy ``func`` hoặc chờ lần chạy đang diễn ra của cùng key
+
+        Args:
+            key: Key đã chuẩn hóa của request
+            func: Hàm async không tham số thực hiện tính toán
+            timeout: Timeout cho key này (mặc định self.timeout)
+
+        Returns:
+            Kết quả của func
+        """
+        if not self.enabled:
+            return await func()
+
+        self.stats["calls"] += 1
+        task = self.inflight.get(key)
+        leader = task is None
+
+        if leader:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(self._execute(key, func, timeout or self.timeout))
+            self.inflight[key] = task
+            self.waiters[key] = 0
+        else:
+            self.stats["coalesced"] += 1
+            self.waiters[key] += 1
+            self.stats["max_waiters"] = max(self.stats["max_waiters"], self.waiters[key])
+
+        # shield: request bị hủy (client ngắt kết nối) không hủy tính toán dùng chung
+        # khi vẫn còn request khác chờ
+        self.active[task] = self.active.get(task, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.active[task] == 1 and not task.done():
+                self.stats["abandoned"] += 1
+                task.cancel()
+            raise
+        finally:
+            self.active[task] -= 1
+            if not self.active[task]:
+                del self.active[task]
+        return result if leader else copy.deepcopy(result)
+
+    async def _execute(self, key: Hashable, func: Callable[[], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        try:
+            if timeout:
+                return await asyncio.wait_for(func(), timeout)
+            return await func()
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(
+                f"Single-flight '{self.name}': quá {timeout}s, "
+                f"{self.waiters.get(key, 0)} requests chờ chung nhận timeout"
+            )
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.inflight.pop(key, None)
+            self.waiters.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê của group
+
+        Returns:
+            Stats dictionary
+        """
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "timeout_seconds": self.timeout,
+            "inflight_keys": len(self.inflight),
+            "current_waiters": sum(self.waiters.values()),
+            "coalesced_rate": round(self.stats["coalesced"] / calls, 3) if calls else 0.0
+        }
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    """Thống kê của mọi single-flight group theo tên"""
+    return {group.name: group.get_stats() for group in _groups}